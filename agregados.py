@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Agregados operativos para el tablero de métricas del laboratorio.
+
+Se actualizan al momento de escribir (save_order / save_results) para que las
+consultas del tablero cuesten O(cubetas) y no O(órdenes):
+- volumen e ingresos (Costo_MXN) por día de registro
+- órdenes por estudio y por estado
+- tiempo de entrega (registro -> firmado) con un sketch de cuantiles
+"""
+
+import os, json, math
+from datetime import datetime
+
+import pandas as pd
+
+from candados import CandadoArchivo
+
+
+AGREGADOS_PATH = "agregados_lis.json"
+VERSION_AGREGADOS = 1
+
+# Precisión relativa del sketch de cuantiles (1% de error sobre el valor)
+SKETCH_ALPHA = 0.01
+_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+
+_lock = CandadoArchivo(lambda: AGREGADOS_PATH + ".lock")
+_cache = {"mtime": None, "data": None}
+
+
+# -------------------------
+# Sketch de cuantiles (cubetas logarítmicas, estilo DDSketch)
+# -------------------------
+def sketch_nuevo():
+    return {"n": 0, "suma": 0.0, "min": None, "max": None, "cubetas": {}}
+
+def sketch_agregar(sk: dict, valor: float):
+    """
+    Agrega un valor (en horas) al sketch. Los valores <= 0 se guardan en la
+    cubeta "0" para no perder el conteo.
+    """
+    valor = float(valor)
+    idx = "0" if valor <= 0 else str(math.ceil(math.log(valor) / _LOG_GAMMA))
+    sk["cubetas"][idx] = sk["cubetas"].get(idx, 0) + 1
+    sk["n"] += 1
+    sk["suma"] += valor
+    sk["min"] = valor if sk["min"] is None else min(sk["min"], valor)
+    sk["max"] = valor if sk["max"] is None else max(sk["max"], valor)
+
+def sketch_cuantil(sk: dict, q: float):
+    """Cuantil aproximado q (0..1); None si el sketch está vacío."""
+    if not sk or not sk.get("n"):
+        return None
+    objetivo = q * (sk["n"] - 1)
+    acumulado = 0
+    claves = sorted(sk["cubetas"], key=lambda k: -math.inf if k == "0" else int(k))
+    for k in claves:
+        acumulado += sk["cubetas"][k]
+        if acumulado > objetivo:
+            if k == "0":
+                return 0.0
+            i = int(k)
+            # punto medio (relativo) de la cubeta
+            return 2 * _GAMMA ** i / (_GAMMA + 1)
+    return sk["max"]
+
+
+# -------------------------
+# Persistencia
+# -------------------------
+def _vacio():
+    return {
+        "version": VERSION_AGREGADOS,
+        "actualizado": None,
+        "por_dia": {},       # "aaaa-mm-dd" -> {"ordenes", "ingresos", "firmadas"}
+        "por_estudio": {},   # nombre -> {"ordenes", "firmadas"}
+        "por_estado": {},    # estado -> conteo actual
+        "entrega": {"global": sketch_nuevo(), "por_estudio": {}},
+    }
+
+def cargar_agregados() -> dict:
+    """
+    Lee agregados_lis.json (con caché por mtime e inodo: se reemplaza en cada
+    escritura, también desde otros procesos). Si no existe o está dañado,
+    regresa una estructura vacía.
+    """
+    with _lock:
+        if not os.path.exists(AGREGADOS_PATH):
+            return _vacio()
+        st_ = os.stat(AGREGADOS_PATH)
+        mtime = (st_.st_mtime_ns, st_.st_ino)
+        if _cache["mtime"] == mtime and _cache["data"] is not None:
+            return _cache["data"]
+        try:
+            with open(AGREGADOS_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != VERSION_AGREGADOS:
+                data = _vacio()
+        except Exception:
+            data = _vacio()
+        _cache.update(mtime=mtime, data=data)
+        return data
+
+def guardar_agregados(data: dict) -> None:
+    with _lock:
+        data["actualizado"] = datetime.now().isoformat(timespec="seconds")
+        tmp = AGREGADOS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, AGREGADOS_PATH)
+        st_ = os.stat(AGREGADOS_PATH)
+        _cache.update(mtime=(st_.st_mtime_ns, st_.st_ino), data=data)
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _dia(valor) -> str:
+    s = str(valor or "")
+    return s.split("T")[0].split(" ")[0] if s and s.lower() not in ("nan", "nat") else "sin_fecha"
+
+def _estudios(tipo_estudio) -> list:
+    # Mismo criterio que Laboratorio ("A; B", "A, B", "A/B"); app_core importa
+    # este módulo, así que se importa al usarse
+    from app_core import estudios_de_orden
+    return estudios_de_orden(tipo_estudio)
+
+def _horas_entre(inicio, fin):
+    try:
+        t0 = datetime.fromisoformat(str(inicio))
+        t1 = datetime.fromisoformat(str(fin))
+    except ValueError:
+        return None
+    return (t1 - t0).total_seconds() / 3600.0
+
+def _num(valor) -> float:
+    try:
+        x = float(valor or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(x) else x
+
+def _inc(d: dict, clave: str, campo: str, valor=1):
+    d.setdefault(clave, {})
+    d[clave][campo] = d[clave].get(campo, 0) + valor
+
+
+# -------------------------
+# Actualización incremental (llamadas desde app_core)
+# -------------------------
+def _aplicar_orden(data: dict, row: dict):
+    dia = _dia(row.get("Fecha_Registro"))
+    _inc(data["por_dia"], dia, "ordenes")
+    _inc(data["por_dia"], dia, "ingresos", _num(row.get("Costo_MXN")))
+    for est in _estudios(row.get("Tipo_Estudio")):
+        _inc(data["por_estudio"], est, "ordenes")
+    estado = str(row.get("Estado") or "pendiente")
+    data["por_estado"][estado] = data["por_estado"].get(estado, 0) + 1
+
+def _aplicar_transicion(data: dict, row: dict, estado_anterior: str, estado_nuevo: str, fecha_firma=None):
+    if estado_anterior == estado_nuevo:
+        return
+    if estado_anterior:
+        data["por_estado"][estado_anterior] = max(0, data["por_estado"].get(estado_anterior, 0) - 1)
+    data["por_estado"][estado_nuevo] = data["por_estado"].get(estado_nuevo, 0) + 1
+
+    if estado_nuevo == "firmado" and fecha_firma:
+        _inc(data["por_dia"], _dia(fecha_firma), "firmadas")
+        horas = _horas_entre(row.get("Fecha_Registro"), fecha_firma)
+        estudios = _estudios(row.get("Tipo_Estudio"))
+        for est in estudios:
+            _inc(data["por_estudio"], est, "firmadas")
+        if horas is not None:
+            sketch_agregar(data["entrega"]["global"], horas)
+            for est in estudios:
+                sk = data["entrega"]["por_estudio"].setdefault(est, sketch_nuevo())
+                sketch_agregar(sk, horas)
+
+def registrar_orden(row: dict) -> None:
+    """Suma una orden nueva a los agregados."""
+    with _lock:
+        data = cargar_agregados()
+        _aplicar_orden(data, row)
+        guardar_agregados(data)
+
+def registrar_transicion(row: dict, estado_anterior: str, estado_nuevo: str, fecha_firma=None) -> None:
+    """
+    Mueve una orden de estado. Si pasa a 'firmado', registra el tiempo de
+    entrega (Fecha_Registro -> fecha_firma).
+    """
+    with _lock:
+        data = cargar_agregados()
+        _aplicar_transicion(data, row, estado_anterior, estado_nuevo, fecha_firma)
+        guardar_agregados(data)
+
+def registrar_transiciones(transiciones: list) -> None:
+    """Varias transiciones [(row, estado_anterior, estado_nuevo, fecha_firma)] con una sola escritura."""
+    if not transiciones:
+        return
+    with _lock:
+        data = cargar_agregados()
+        for row, estado_anterior, estado_nuevo, fecha_firma in transiciones:
+            _aplicar_transicion(data, row, estado_anterior, estado_nuevo, fecha_firma)
+        guardar_agregados(data)
+
+def registrar_archivadas(por_estado: dict) -> None:
+    """
+    Descuenta de por_estado las órdenes que salieron de la tabla viva
+    (retencion.archivar). Las series por día, estudio y entrega son historia
+    y no cambian.
+    """
+    if not any(por_estado.values()):
+        return
+    with _lock:
+        data = cargar_agregados()
+        for estado, n in por_estado.items():
+            data["por_estado"][estado] = max(0, data["por_estado"].get(estado, 0) - n)
+        guardar_agregados(data)
+
+
+# -------------------------
+# Reconstrucción completa
+# -------------------------
+def reconstruir_agregados(df) -> dict:
+    """
+    Recalcula todos los agregados desde la tabla de órdenes (cifrada; solo se
+    usan columnas en claro). Útil tras migraciones o si el archivo se pierde.
+    """
+    data = _vacio()
+    for row in df.to_dict("records"):
+        estado = str(row.get("Estado") or "pendiente")
+        _aplicar_orden(data, {**row, "Estado": "pendiente"})
+        fecha_firma = row.get("Fecha_Firma")
+        if pd.isna(fecha_firma):  # NaN o NaT (read_csv tipa las fechas)
+            fecha_firma = None
+        _aplicar_transicion(data, row, "pendiente", estado, fecha_firma)
+    guardar_agregados(data)
+    return data
+
+def reconstruir_desde_csv() -> dict:
+    """
+    reconstruir_agregados sobre la tabla actual con el candado de escritura
+    de app_core tomado: un guardado entre la lectura y la escritura de los
+    agregados no se pierde.
+    """
+    import app_core
+    with app_core._LOCK_ESCRITURA:
+        return reconstruir_agregados(app_core.read_csv())
+
+
+# -------------------------
+# Consultas del tablero (O(cubetas))
+# -------------------------
+# Los registrar_* modifican el dict en caché con _lock tomado: las consultas
+# lo recorren con el mismo candado para no verlo cambiar a media iteración.
+def resumen_tablero(desde: str | None = None, hasta: str | None = None, top_estudios: int = 15) -> dict:
+    """
+    Regresa un resumen listo para graficar:
+    - serie diaria (ordenes/ingresos/firmadas) en [desde, hasta]
+    - conteo por estado
+    - top de estudios
+    - cuantiles del tiempo de entrega en horas
+    """
+    with _lock:
+        return _resumen(cargar_agregados(), desde, hasta, top_estudios)
+
+def _resumen(data: dict, desde, hasta, top_estudios: int) -> dict:
+    dias = sorted(
+        d for d in data["por_dia"]
+        if (not desde or d >= str(desde)) and (not hasta or d <= str(hasta))
+    )
+    serie = [
+        {
+            "Dia": d,
+            "Ordenes": data["por_dia"][d].get("ordenes", 0),
+            "Ingresos_MXN": round(data["por_dia"][d].get("ingresos", 0.0), 2),
+            "Firmadas": data["por_dia"][d].get("firmadas", 0),
+        }
+        for d in dias
+    ]
+    estudios = sorted(
+        ({"Estudio": k, "Ordenes": v.get("ordenes", 0), "Firmadas": v.get("firmadas", 0)}
+         for k, v in data["por_estudio"].items()),
+        key=lambda r: -r["Ordenes"],
+    )[:top_estudios]
+    sk = data["entrega"]["global"]
+    entrega = {
+        "n": sk.get("n", 0),
+        "promedio_h": (sk["suma"] / sk["n"]) if sk.get("n") else None,
+        "p50_h": sketch_cuantil(sk, 0.50),
+        "p90_h": sketch_cuantil(sk, 0.90),
+        "p95_h": sketch_cuantil(sk, 0.95),
+    }
+    return {
+        "serie_diaria": serie,
+        "por_estado": dict(data["por_estado"]),
+        "top_estudios": estudios,
+        "entrega": entrega,
+        "actualizado": data.get("actualizado"),
+    }
+
+def entrega_por_estudio(estudio: str, cuantiles=(0.5, 0.9, 0.95)) -> dict:
+    with _lock:
+        sk = cargar_agregados()["entrega"]["por_estudio"].get(estudio)
+        return {q: sketch_cuantil(sk, q) for q in cuantiles}
+
+def ordenes_por_estudio() -> dict:
+    """{estudio: órdenes} (frecuencia de pedido, p. ej. para ordenar el catálogo)."""
+    with _lock:
+        return {k: v.get("ordenes", 0) for k, v in cargar_agregados().get("por_estudio", {}).items()}
+
+
+if __name__ == "__main__":
+    # Uso: python agregados.py reconstruir
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "reconstruir":
+        d = reconstruir_desde_csv()
+        print(f"Agregados reconstruidos: {sum(d['por_estado'].values())} órdenes.")
+    else:
+        print(json.dumps(resumen_tablero(), ensure_ascii=False, indent=2))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén de PDFs de resultados direccionado por contenido.
+
+- escritura en streaming por bloques (no se carga el archivo completo)
+- SHA-256 del contenido como nombre: el mismo PDF se guarda una sola vez
+- cifrado en reposo (Fernet por bloque)
+- índice por folio con tamaño, hash y fecha de carga
+
+Formato del blob: secuencia de [4 bytes big-endian longitud][token Fernet].
+Al leer se recalcula el SHA-256 del contenido descifrado y se compara con el
+nombre del blob: Fernet autentica cada bloque, pero no detecta bloques de
+menos, repetidos o en otro orden.
+"""
+
+import os, json, hashlib, struct, tempfile
+from datetime import datetime
+
+from cryptography.fernet import InvalidToken
+
+from app_core import FERNET
+from candados import CandadoArchivo
+
+
+PDF_DIR = "resultados_pdf"
+BLOB_DIR = os.path.join(PDF_DIR, "blobs")
+INDICE_PATH = os.path.join(PDF_DIR, "indice.json")
+TAM_BLOQUE = 1024 * 1024  # 1 MiB
+
+_lock = CandadoArchivo(lambda: os.path.join(PDF_DIR, ".lock"))
+
+
+class BlobCorrupto(Exception):
+    """El blob no se puede descifrar o su contenido no coincide con su SHA-256."""
+
+
+# -------------------------
+# Índice por folio
+# -------------------------
+def cargar_indice() -> dict:
+    if not os.path.exists(INDICE_PATH):
+        return {}
+    try:
+        with open(INDICE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _guardar_indice(indice: dict) -> None:
+    os.makedirs(PDF_DIR, exist_ok=True)
+    tmp = INDICE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, INDICE_PATH)
+
+def metadata(folio) -> dict | None:
+    """{"hash", "tamano", "subido", "nombre"} del PDF del folio, o None."""
+    return cargar_indice().get(str(folio))
+
+
+# -------------------------
+# Blobs
+# -------------------------
+def _ruta_blob(digest: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], digest + ".bin")
+
+def _leer_bloques(archivo, tam: int = TAM_BLOQUE):
+    """Itera bloques de un archivo abierto, de bytes o de un UploadedFile de Streamlit."""
+    if isinstance(archivo, (bytes, bytearray, memoryview)):
+        datos = memoryview(archivo)
+        for i in range(0, len(datos), tam):
+            yield bytes(datos[i:i + tam])
+        return
+    if hasattr(archivo, "seek"):
+        archivo.seek(0)
+    while True:
+        bloque = archivo.read(tam)
+        if not bloque:
+            break
+        yield bloque
+
+def guardar_pdf(folio, archivo, nombre: str = "") -> dict:
+    """
+    Guarda el PDF de un folio. Si ya existe un blob con el mismo contenido no
+    se vuelve a escribir (dedup). Regresa la metadata registrada.
+    """
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    h = hashlib.sha256()
+    tamano = 0
+    fd, tmp = tempfile.mkstemp(prefix=".subida_", dir=BLOB_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for bloque in _leer_bloques(archivo):
+                h.update(bloque)
+                tamano += len(bloque)
+                token = FERNET.encrypt(bloque)
+                out.write(struct.pack(">I", len(token)))
+                out.write(token)
+        digest = h.hexdigest()
+        destino = _ruta_blob(digest)
+        # Un blob dañado con el mismo hash se repara con la nueva subida
+        if os.path.exists(destino) and blob_valido(digest):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(tmp, destino)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    meta = {
+        "hash": digest,
+        "tamano": tamano,
+        "subido": datetime.now().isoformat(timespec="seconds"),
+        "nombre": nombre or f"{folio}.pdf",
+    }
+    with _lock:
+        indice = cargar_indice()
+        indice[str(folio)] = meta
+        _guardar_indice(indice)
+    return meta
+
+def iterar_blob(digest: str):
+    """
+    Descifra un blob bloque por bloque. La verificación del SHA-256 completo
+    ocurre al terminar: quien consuma los bloques en streaming debe descartar
+    lo recibido si al final se lanza BlobCorrupto.
+    """
+    h = hashlib.sha256()
+    with open(_ruta_blob(digest), "rb") as f:
+        while True:
+            cab = f.read(4)
+            if not cab:
+                break
+            if len(cab) < 4:
+                raise BlobCorrupto(f"Blob {digest}: encabezado de bloque truncado.")
+            (n,) = struct.unpack(">I", cab)
+            token = f.read(n)
+            if len(token) < n:
+                raise BlobCorrupto(f"Blob {digest}: bloque truncado.")
+            try:
+                bloque = FERNET.decrypt(token)
+            except InvalidToken:
+                raise BlobCorrupto(f"Blob {digest}: bloque que no se puede descifrar.") from None
+            h.update(bloque)
+            yield bloque
+    if h.hexdigest() != digest:
+        raise BlobCorrupto(f"Blob {digest}: el SHA-256 del contenido no coincide.")
+
+def leer_blob(digest: str) -> bytes:
+    """Contenido completo del blob, ya verificado contra su SHA-256."""
+    return b"".join(iterar_blob(digest))
+
+def blob_valido(digest: str) -> bool:
+    try:
+        for _ in iterar_blob(digest):
+            pass
+    except (BlobCorrupto, OSError):
+        return False
+    return True
+
+def _ruta_legado(folio) -> str:
+    return os.path.join(PDF_DIR, f"{folio}.pdf")
+
+def existe_pdf(folio) -> bool:
+    return metadata(folio) is not None or os.path.exists(_ruta_legado(folio))
+
+def leer_pdf(folio) -> bytes | None:
+    """
+    Bytes del PDF del folio. Acepta PDFs guardados antes del almacén
+    (resultados_pdf/{folio}.pdf en claro). Lanza BlobCorrupto si el blob
+    no pasa la verificación.
+    """
+    meta = metadata(folio)
+    if meta:
+        return leer_blob(meta["hash"])
+    legado = _ruta_legado(folio)
+    if os.path.exists(legado):
+        with open(legado, "rb") as f:
+            return f.read()
+    return None
+
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def migrar_legados(borrar: bool = True) -> int:
+    """
+    Mueve resultados_pdf/{folio}.pdf (en claro) al almacén cifrado.
+    Regresa cuántos archivos se migraron.
+    """
+    if not os.path.isdir(PDF_DIR):
+        return 0
+    n = 0
+    for nombre in sorted(os.listdir(PDF_DIR)):
+        ruta = os.path.join(PDF_DIR, nombre)
+        if not (nombre.endswith(".pdf") and os.path.isfile(ruta)):
+            continue
+        folio = nombre[:-4]
+        with open(ruta, "rb") as f:
+            guardar_pdf(folio, f, nombre)
+        if borrar:
+            os.remove(ruta)
+        n += 1
+    return n
+
+def blobs_huerfanos() -> list[str]:
+    """Hashes en disco que ya no referencia ningún folio."""
+    usados = {m["hash"] for m in cargar_indice().values()}
+    huerfanos = []
+    if os.path.isdir(BLOB_DIR):
+        for raiz, _, archivos in os.walk(BLOB_DIR):
+            for a in archivos:
+                if a.endswith(".bin") and a[:-4] not in usados:
+                    huerfanos.append(a[:-4])
+    return huerfanos
+
+
+if __name__ == "__main__":
+    # Uso: python almacen_pdf.py migrar
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "migrar":
+        print(f"PDFs migrados: {migrar_legados()}")
+    else:
+        print(json.dumps(cargar_indice(), ensure_ascii=False, indent=2))
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+API HTTP (ASGI) sobre app_core para integraciones: analizadores, clínicas
+externas y facturación.
+
+Sin framework: `app` es un callable ASGI puro. Ejecutar con
+    uvicorn api_lis:app --host 0.0.0.0 --port 8600 --workers 4
+(varios workers comparten el almacén: app_core serializa las escrituras entre
+procesos y la llave de tokens se deriva de la misma fernet.key).
+
+Autenticación: POST /auth/token con usuario/contraseña de usuarios.json ->
+token firmado (HMAC) con el rol; luego `Authorization: Bearer <token>`.
+
+Rutas:
+    POST /auth/token
+    POST /ordenes                    (recepcion, admin)
+    POST /ordenes/lote               (recepcion, admin)
+    GET  /ordenes?q=&estado=&pagina=&por_pagina=
+    GET  /ordenes/{folio}             (también órdenes archivadas)
+    GET  /lista_trabajo?estado=&prefijo=&pagina=&por_pagina=   (lab, medico, admin)
+    GET  /catalogo/estudios?q=&limite=
+    GET  /ordenes/{folio}/pdf        (lab, medico, admin; también órdenes archivadas)
+    POST /resultados                 (lab, medico, admin)
+    POST /resultados/lote            (lab, medico, admin)
+    GET  /auditoria?folio=&usuario=&accion=&desde=&hasta=&limite=   (admin)
+
+El cifrado, el PBKDF2 y la lectura/escritura del CSV corren en un pool de
+hilos; el render de PDFs en un pool de procesos (reportlab no libera el GIL).
+"""
+
+import os, re, json, hmac, math, time, base64, hashlib, asyncio, logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+import app_core
+import auditoria
+import cache_pdf
+import catalogo_busqueda
+import lista_trabajo
+import retencion
+
+
+TOKEN_TTL_S = int(os.getenv("LIS_API_TOKEN_TTL", "28800"))  # 8 h
+MAX_CUERPO = 5 * 1024 * 1024
+MAX_LOTE = 500
+POR_PAGINA_MAX = 500
+
+ROLES_RECEPCION = ("recepcion", "admin")
+ROLES_LAB = ("lab", "medico", "admin")
+ROLES_AUDITORIA = ("admin",)
+
+_log = logging.getLogger(__name__)
+
+_hilos = ThreadPoolExecutor(max_workers=int(os.getenv("LIS_API_HILOS", "8")), thread_name_prefix="api")
+_procesos = None
+_despachador = None
+
+
+def _pool_procesos():
+    global _procesos
+    if _procesos is None:
+        _procesos = ProcessPoolExecutor(max_workers=int(os.getenv("LIS_API_PROCESOS", "2")))
+    return _procesos
+
+
+class ErrorAPI(Exception):
+    def __init__(self, status: int, mensaje: str):
+        super().__init__(mensaje)
+        self.status = status
+        self.mensaje = mensaje
+
+
+# -------------------------
+# Tokens (HMAC sobre la llave de la instalación)
+# -------------------------
+def _secreto() -> bytes:
+    env = os.getenv("LIS_API_SECRET")
+    if env:
+        return env.encode()
+    return hashlib.sha256(b"lis-api-token|" + app_core.load_or_create_key()).digest()
+
+_SECRETO = _secreto()
+
+def _b64(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+def emitir_token(usuario: str, rol: str, ttl_s: int = TOKEN_TTL_S) -> str:
+    carga = _b64(json.dumps({"sub": usuario, "rol": rol, "exp": int(time.time()) + ttl_s}).encode())
+    firma = _b64(hmac.new(_SECRETO, carga.encode(), hashlib.sha256).digest())
+    return f"{carga}.{firma}"
+
+def validar_token(token: str) -> dict:
+    try:
+        carga, firma = token.split(".", 1)
+    except ValueError:
+        raise ErrorAPI(401, "Token inválido.")
+    esperada = _b64(hmac.new(_SECRETO, carga.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(firma, esperada):
+        raise ErrorAPI(401, "Token inválido.")
+    datos = json.loads(_unb64(carga))
+    if datos.get("exp", 0) < time.time():
+        raise ErrorAPI(401, "Token expirado.")
+    # El rol se vuelve a leer de usuarios.json: un cambio de rol o un usuario
+    # borrado invalida el token sin esperar a que expire.
+    usuario = app_core.load_users_from_file().get(datos["sub"])
+    if not usuario:
+        raise ErrorAPI(401, "Usuario no existe.")
+    return {"usuario": datos["sub"], "rol": usuario.get("role", "sin_rol")}
+
+
+# -------------------------
+# Helpers
+# -------------------------
+async def _en_hilo(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hilos, lambda: fn(*args, **kwargs))
+
+def _requiere(sesion: dict, roles: tuple):
+    if sesion["rol"] not in roles:
+        raise ErrorAPI(403, "Tu rol no tiene permiso para esta operación.")
+
+def _costo(valor) -> float:
+    if valor is None or valor == "":
+        return 0.0
+    try:
+        costo = float(valor)
+    except (TypeError, ValueError):
+        costo = math.nan
+    if isinstance(valor, bool) or not math.isfinite(costo) or costo < 0:
+        raise ErrorAPI(400, "'costo' debe ser un número mayor o igual a 0.")
+    return costo
+
+def _fecha_programada(valor) -> str:
+    if not valor:
+        return time.strftime("%Y-%m-%d")
+    # Una fecha que no se entiende se guardaría como NaT sin avisar
+    try:
+        if not isinstance(valor, str):
+            raise ValueError
+        pd.to_datetime(valor, format="ISO8601")
+    except (ValueError, TypeError):
+        raise ErrorAPI(400, "'fecha_programada' debe ser una fecha ISO (AAAA-MM-DD).")
+    return valor
+
+def _orden_desde_json(o: dict) -> dict:
+    if not isinstance(o, dict) or not str(o.get("nombre", "")).strip():
+        raise ErrorAPI(400, "Cada orden requiere al menos 'nombre'.")
+    return {
+        "folio": o.get("folio"),
+        "fecha_prog": _fecha_programada(o.get("fecha_programada")),
+        "costo": _costo(o.get("costo")),
+        "nombre": o.get("nombre"),
+        "edad": o.get("edad"),
+        "genero": o.get("genero", "No especifica"),
+        "telefono": o.get("telefono", ""),
+        "direccion": o.get("direccion", ""),
+        "tipo": o.get("estudios", []),
+        "observaciones": o.get("observaciones", ""),
+        "emails": o.get("emails") or [],
+    }
+
+def _json_seguro(valor):
+    """Convierte NaN/NA/fechas/numpy a tipos JSON."""
+    if valor is None or (not isinstance(valor, (str, list, dict)) and pd.isna(valor)):
+        return None
+    if hasattr(valor, "isoformat"):
+        return app_core.fecha_texto(valor)
+    if hasattr(valor, "item"):
+        return valor.item()
+    return valor
+
+_cache_busqueda = {"firma": None, "df": None}
+
+def _tabla_descifrada():
+    firma = app_core.firma_datos()
+    if _cache_busqueda["firma"] != firma:
+        _cache_busqueda.update(firma=firma, df=app_core.decrypt_view(app_core.read_csv()))
+    return _cache_busqueda["df"]
+
+def _buscar(q: str, estado: str, pagina: int, por_pagina: int) -> dict:
+    if q:
+        # La búsqueda necesita los campos en claro; el descifrado se cachea
+        # hasta la siguiente escritura del CSV.
+        df = app_core.filter_df(_tabla_descifrada(), q)
+        if estado:
+            df = df[df["Estado"] == estado]
+        total = len(df)
+        pagina_df = df.iloc[(pagina - 1) * por_pagina: pagina * por_pagina]
+    else:
+        # Sin texto: se pagina sobre la tabla cifrada y solo se descifra la página
+        df = app_core.read_csv()
+        if estado:
+            df = df[df["Estado"] == estado]
+        total = len(df)
+        pagina_df = app_core.decrypt_view(df.iloc[(pagina - 1) * por_pagina: pagina * por_pagina])
+    columnas = ["Folio", "Fecha_Registro", "Fecha_Programada", "Nombre", "Tipo_Estudio", "Estado"]
+    items = [
+        {c: _json_seguro(r.get(c)) for c in columnas}
+        for r in pagina_df.reindex(columns=columnas).to_dict("records")
+    ]
+    return {"total": total, "pagina": pagina, "por_pagina": por_pagina, "items": items}
+
+
+# -------------------------
+# Handlers
+# -------------------------
+async def h_token(sesion, cuerpo, params, **_):
+    if not isinstance(cuerpo, dict):
+        raise ErrorAPI(400, "Se esperaba {'usuario': ..., 'password': ...}.")
+    usuario = str(cuerpo.get("usuario", ""))
+    password = str(cuerpo.get("password", ""))
+    usuarios = await _en_hilo(app_core.load_users_from_file)
+    ok = await _en_hilo(app_core.verify_user_login, usuario, password, usuarios)
+    if not ok:
+        raise ErrorAPI(401, "Usuario o contraseña incorrectos.")
+    rol = usuarios[usuario].get("role", "sin_rol")
+    return 200, {"token": emitir_token(usuario, rol), "rol": rol, "expira_en_s": TOKEN_TTL_S}
+
+async def h_crear_orden(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_RECEPCION)
+    folios = await _en_hilo(app_core.save_orders, [_orden_desde_json(cuerpo)], sesion["usuario"])
+    return 201, {"folio": folios[0]}
+
+async def h_crear_ordenes_lote(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_RECEPCION)
+    ordenes = cuerpo.get("ordenes") if isinstance(cuerpo, dict) else None
+    if not isinstance(ordenes, list) or not ordenes:
+        raise ErrorAPI(400, "Se esperaba {'ordenes': [...]}.")
+    if len(ordenes) > MAX_LOTE:
+        raise ErrorAPI(413, f"Máximo {MAX_LOTE} órdenes por lote.")
+    validas = []
+    for i, o in enumerate(ordenes, 1):
+        try:
+            validas.append(_orden_desde_json(o))
+        except ErrorAPI as e:
+            raise ErrorAPI(e.status, f"Orden {i}: {e.mensaje}")
+    folios = await _en_hilo(app_core.save_orders, validas, sesion["usuario"])
+    return 201, {"folios": folios}
+
+async def h_buscar(sesion, cuerpo, params, **_):
+    q = params.get("q", "")
+    estado = params.get("estado", "")
+    try:
+        pagina = max(1, int(params.get("pagina", 1)))
+        por_pagina = min(POR_PAGINA_MAX, max(1, int(params.get("por_pagina", 50))))
+    except ValueError:
+        raise ErrorAPI(400, "pagina/por_pagina deben ser enteros.")
+    return 200, await _en_hilo(_buscar, q, estado, pagina, por_pagina)
+
+async def h_lista_trabajo(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_LAB)
+    estados = [e for e in params.get("estado", "").split(",") if e] or lista_trabajo.ESTADOS_ACTIVOS
+    try:
+        pagina = max(1, int(params.get("pagina", 1)))
+        por_pagina = min(POR_PAGINA_MAX, max(1, int(params.get("por_pagina", 50))))
+    except ValueError:
+        raise ErrorAPI(400, "pagina/por_pagina deben ser enteros.")
+    lista = await _en_hilo(lista_trabajo.lista_compartida)
+    return 200, lista.pagina(estados, pagina, por_pagina, params.get("prefijo", ""))
+
+async def h_catalogo(sesion, cuerpo, params, **_):
+    try:
+        limite = min(POR_PAGINA_MAX, max(1, int(params.get("limite", catalogo_busqueda.LIMITE))))
+    except ValueError:
+        raise ErrorAPI(400, "limite debe ser entero.")
+    estudios = await _en_hilo(catalogo_busqueda.buscar_estudios, params.get("q", ""), limite)
+    return 200, {"estudios": estudios}
+
+async def h_orden(sesion, cuerpo, params, folio, **_):
+    info = await _en_hilo(app_core.get_order_summary, folio)
+    if not info:
+        # Órdenes antiguas movidas al archivo (retencion.py)
+        info = await _en_hilo(retencion.orden_archivada, folio)
+    if not info:
+        raise ErrorAPI(404, f"Folio no encontrado: {folio}")
+    info = {k: _json_seguro(v) for k, v in info.items()}
+    info["Resultados"] = app_core.parse_resultados(info.get("Resultados")) or info.get("Resultados")
+    return 200, info
+
+async def h_resultados(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_LAB)
+    folio = cuerpo.get("folio") if isinstance(cuerpo, dict) else None
+    if not folio:
+        raise ErrorAPI(400, "Falta 'folio'.")
+    liberar = bool(cuerpo.get("liberar", False))
+    # Por el mismo camino que el lote: valida contra los estudios de la orden
+    # y no deja quitar la firma de una orden ya firmada
+    r, = await _en_hilo(app_core.save_results_lote,
+                        [{"folio": folio, "resultados": cuerpo.get("resultados"), "liberar": liberar}],
+                        sesion["usuario"])
+    if not r["ok"]:
+        if r["error"].startswith("Folio no encontrado"):
+            raise ErrorAPI(404, r["error"])
+        raise ErrorAPI(409 if r["estado_anterior"] == "firmado" else 400, r["error"])
+    if liberar:
+        import notificaciones
+        await _en_hilo(notificaciones.encolar_resultado, folio, cuerpo.get("comentarios", ""))
+    return 200, {"folio": r["folio"], "estado": r["estado"]}
+
+async def h_resultados_lote(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_LAB)
+    items = cuerpo.get("resultados") if isinstance(cuerpo, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ErrorAPI(400, "Se esperaba {'resultados': [{folio, resultados, liberar}, ...]}.")
+    if len(items) > MAX_LOTE:
+        raise ErrorAPI(413, f"Máximo {MAX_LOTE} folios por lote.")
+
+    # Una sola lectura/escritura del CSV para todo el lote; cada folio se valida
+    # contra los estudios de su orden y trae su propio resultado
+    reporte = await _en_hilo(app_core.save_results_lote, items, sesion["usuario"])
+    firmados = [r["folio"] for r in reporte if r["ok"] and r["estado"] == "firmado"]
+    if firmados:
+        import notificaciones
+        await _en_hilo(notificaciones.encolar_resultados, firmados, cuerpo.get("comentarios", ""))
+    return 200, {"resultados": reporte,
+                 "aplicados": sum(r["ok"] for r in reporte), "rechazados": sum(not r["ok"] for r in reporte)}
+
+async def h_auditoria(sesion, cuerpo, params, **_):
+    _requiere(sesion, ROLES_AUDITORIA)
+    try:
+        limite = min(POR_PAGINA_MAX, max(1, int(params.get("limite", 100))))
+    except ValueError:
+        raise ErrorAPI(400, "limite debe ser entero.")
+    eventos = await _en_hilo(
+        auditoria.consultar, params.get("folio") or None, params.get("usuario") or None,
+        params.get("accion") or None, params.get("desde") or None, params.get("hasta") or None, limite,
+    )
+    return 200, {"eventos": eventos}
+
+async def h_pdf(sesion, cuerpo, params, folio, **_):
+    _requiere(sesion, ROLES_LAB)
+    info = await _en_hilo(app_core.get_order_summary, folio)
+    if not info:
+        # Órdenes antiguas movidas al archivo (retencion.py)
+        info = await _en_hilo(retencion.orden_archivada, folio)
+    if not info:
+        raise ErrorAPI(404, f"Folio no encontrado: {folio}")
+    config = await _en_hilo(app_core.load_labza_config)
+    solicitud = {
+        "id_solicitud": str(folio),
+        "nombre_paciente": info["Nombre"],
+        "fecha_registro": info["Fecha_Registro"],
+        "fecha_muestra": info["Fecha_Programada"],
+    }
+    resultados = app_core.parse_resultados(info["Resultados"])
+    comentarios = params.get("comentarios", "")
+    firmado = info["Estado"] == "firmado"
+
+    k = cache_pdf.llave(folio, solicitud, resultados, comentarios, config["lab_info"], config["doctor_info"])
+    pdf = await _en_hilo(cache_pdf.obtener, k) if firmado else None
+    if pdf is None:
+        loop = asyncio.get_running_loop()
+        pdf = await loop.run_in_executor(
+            _pool_procesos(), _render_pdf, solicitud, resultados, comentarios,
+            config["lab_info"], config["doctor_info"],
+        )
+        if firmado:
+            await _en_hilo(cache_pdf.guardar, k, folio,
+                           cache_pdf.hash_config(config["lab_info"], config["doctor_info"]), pdf)
+    return 200, pdf
+
+def _render_pdf(solicitud, resultados, comentarios, lab_info, doctor_info) -> bytes:
+    return app_core.generar_pdf_resultado(
+        solicitud, resultados, doctor_info=doctor_info, lab_info=lab_info, comentarios=comentarios,
+    )
+
+
+RUTAS = [
+    ("POST", re.compile(r"^/auth/token$"), h_token, False),
+    ("POST", re.compile(r"^/ordenes$"), h_crear_orden, True),
+    ("POST", re.compile(r"^/ordenes/lote$"), h_crear_ordenes_lote, True),
+    ("GET", re.compile(r"^/ordenes$"), h_buscar, True),
+    ("GET", re.compile(r"^/lista_trabajo$"), h_lista_trabajo, True),
+    ("GET", re.compile(r"^/catalogo/estudios$"), h_catalogo, True),
+    ("GET", re.compile(r"^/ordenes/(?P<folio>[\w\-]+)$"), h_orden, True),
+    ("GET", re.compile(r"^/ordenes/(?P<folio>[\w\-]+)/pdf$"), h_pdf, True),
+    ("POST", re.compile(r"^/resultados$"), h_resultados, True),
+    ("POST", re.compile(r"^/resultados/lote$"), h_resultados_lote, True),
+    ("GET", re.compile(r"^/auditoria$"), h_auditoria, True),
+]
+
+
+# -------------------------
+# ASGI
+# -------------------------
+async def _leer_cuerpo(receive) -> bytes:
+    partes, total = [], 0
+    while True:
+        msg = await receive()
+        partes.append(msg.get("body", b""))
+        total += len(partes[-1])
+        if total > MAX_CUERPO:
+            raise ErrorAPI(413, "Cuerpo demasiado grande.")
+        if not msg.get("more_body"):
+            return b"".join(partes)
+
+async def _responder(send, status: int, contenido, tipo: str | None = None):
+    if isinstance(contenido, bytes):
+        cuerpo, tipo = contenido, tipo or "application/pdf"
+    else:
+        cuerpo, tipo = json.dumps(contenido, ensure_ascii=False, default=str).encode(), "application/json"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", tipo.encode()), (b"content-length", str(len(cuerpo)).encode())],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+def _iniciar_despachador():
+    """
+    El envío de correos arranca con cada worker y no con la primera firma:
+    así también salen los reintentos pendientes. Solo si hay SMTP configurado.
+    """
+    global _despachador
+    if _despachador is None and os.getenv("SMTP_HOST"):
+        import notificaciones
+        _despachador = notificaciones.DespachadorNotificaciones().iniciar()
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await _en_hilo(_iniciar_despachador)
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                if _despachador is not None:
+                    await _en_hilo(_despachador.detener)
+                _hilos.shutdown(wait=False)
+                if _procesos is not None:
+                    _procesos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    metodo, ruta = scope["method"], scope["path"].rstrip("/") or "/"
+    try:
+        por_ruta = [(r, r[1].match(ruta)) for r in RUTAS if r[1].match(ruta)]
+        if not por_ruta:
+            raise ErrorAPI(404, "Ruta no encontrada.")
+        elegidas = [(r, c) for r, c in por_ruta if r[0] == metodo]
+        if not elegidas:
+            raise ErrorAPI(405, "Método no permitido.")
+        (_, _, handler, protegido), coincide = elegidas[0]
+
+        sesion = None
+        if protegido:
+            headers = dict(scope.get("headers") or [])
+            auth = headers.get(b"authorization", b"").decode()
+            if not auth.startswith("Bearer "):
+                raise ErrorAPI(401, "Falta el token (Authorization: Bearer ...).")
+            sesion = await _en_hilo(validar_token, auth[7:])
+
+        params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        cuerpo = {}
+        if metodo == "POST":
+            crudo = await _leer_cuerpo(receive)
+            try:
+                cuerpo = json.loads(crudo or b"{}")
+            except ValueError:
+                raise ErrorAPI(400, "JSON inválido.")
+            # Todos los endpoints POST reciben un objeto; una lista o un escalar
+            # es un error del cliente y no debe llegar a los handlers como 500
+            if not isinstance(cuerpo, dict):
+                raise ErrorAPI(400, "El cuerpo debe ser un objeto JSON.")
+
+        status, contenido = await handler(sesion, cuerpo, params, **coincide.groupdict())
+        await _responder(send, status, contenido)
+    except ErrorAPI as e:
+        await _responder(send, e.status, {"error": e.mensaje})
+    except Exception:
+        # El detalle queda en el log del servidor; al cliente no se le exponen internos
+        _log.exception("Error interno en %s %s", metodo, ruta)
+        await _responder(send, 500, {"error": "Error interno."})
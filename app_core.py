@@ -4,8 +4,8 @@ Core logic extracted from reto_cripto_1_2.py (Gradio version) for Streamlit usag
 Includes: config, Fernet helpers, password hashing, CSV I/O, study list, and core ops.
 """
 
-import re, secrets
-import os, json, base64, hashlib, time
+import re, csv, secrets, tempfile
+import os, json, base64, hashlib, hmac, time, threading
 from datetime import datetime, date
 import pandas as pd
 from cryptography.fernet import Fernet
@@ -15,6 +15,10 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.utils import ImageReader
 
+import agregados, cambios, auditoria, compresion
+from candados import CandadoArchivo
+from instrumentacion import medido
+
 
 # -------------------------
 # Config / archivos
@@ -44,6 +48,27 @@ DEFAULT_DOCTOR_INFO = {
     "especialidad": "",
 }
 
+def _guardar_json(path, data, **opciones) -> None:
+    """
+    Escribe `data` en un temporal único del mismo directorio y lo publica con
+    os.replace: dos escritores nunca comparten el temporal y quien lee nunca
+    ve un JSON a medias.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, **opciones)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# Leer lo previo (para la auditoría), escribir y auditar van bajo el mismo
+# candado: entre sesiones y réplicas no se pierde un cambio ni se audita mal
+_LOCK_CONFIG = CandadoArchivo(lambda: f"{CONFIG_PATH}.lock")
+
 def load_labza_config():
     lab_info = DEFAULT_LAB_INFO.copy()
     doctor_info = DEFAULT_DOCTOR_INFO.copy()
@@ -58,13 +83,21 @@ def load_labza_config():
             pass
     return {"lab_info": lab_info, "doctor_info": doctor_info}
 
-def save_labza_config(lab_info: dict, doctor_info: dict):
+def save_labza_config(lab_info: dict, doctor_info: dict, usuario=None):
     data = {
         "lab_info": lab_info,
         "doctor_info": doctor_info,
     }
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with _LOCK_CONFIG:
+        previa = load_labza_config()
+        _guardar_json(CONFIG_PATH, data, indent=2)
+        campos = [
+            f"{seccion}.{k}"
+            for seccion in ("lab_info", "doctor_info")
+            for k in sorted(set(data[seccion]) | set(previa[seccion]))
+            if data[seccion].get(k) != previa[seccion].get(k)
+        ]
+        auditoria.registrar("configuracion", usuario, campos=campos)
     return True
 
 _config = load_labza_config()
@@ -85,29 +118,67 @@ def load_or_create_key():
             pass
     # 2) Else use local file (on-prem)
     if os.path.exists(KEY_PATH):
-        return open(KEY_PATH, "rb").read()
+        return _leer_llave()
+    # Varias réplicas pueden arrancar a la vez: la llave se escribe completa en
+    # un temporal y se publica con os.link, que falla si otra ya la creó; en
+    # ese caso se usa la de la ganadora (nunca dos llaves distintas).
     key = Fernet.generate_key()
-    with open(KEY_PATH, "wb") as f:
-        f.write(key)
+    tmp = f"{KEY_PATH}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp, KEY_PATH)
+        except FileExistsError:
+            return _leer_llave()
+    finally:
+        os.remove(tmp)
     return key
 
+def _leer_llave() -> bytes:
+    with open(KEY_PATH, "rb") as f:
+        return f.read().strip()
+
 FERNET = Fernet(load_or_create_key())
 
+@medido("enc")
 def enc(s: str) -> str:
     if s is None: s = ""
-    return FERNET.encrypt(s.encode()).decode()
+    # Textos grandes van comprimidos en un sobre versionado (ver compresion.py)
+    return FERNET.encrypt(compresion.empacar(s.encode())).decode()
 
+@medido("dec")
 def dec(s: str) -> str:
     if not isinstance(s, str) or not s:
         return ""
     try:
-        return FERNET.decrypt(s.encode()).decode()
+        return compresion.desempacar(FERNET.decrypt(s.encode())).decode()
+    except compresion.DiccionarioNoDisponible:
+        # El dato existe pero falta su diccionario: vacío lo haría pasar por
+        # un campo sin capturar (y una captura encima lo borraría)
+        raise
     except Exception:
         return ""  # tolerante a valores antiguos/no cifrados
 
+_LLAVE_HUELLAS = hashlib.sha256(b"auditoria-lis:" + load_or_create_key()).digest()
+
+def huella(texto) -> str:
+    """
+    HMAC (con llave de la instalación) de un texto en claro: la auditoría
+    registra qué contenido se guardó sin guardarlo. Vacío -> "".
+    """
+    texto = str(texto or "")
+    if not texto:
+        return ""
+    return hmac.new(_LLAVE_HUELLAS, texto.encode(), hashlib.sha256).hexdigest()[:32]
+
 # -------------------------
 # Hash de contraseñas (PBKDF2 — demo)
 # -------------------------
+@medido("pbkdf2_hash")
 def pbkdf2_hash(password: str, salt: bytes) -> str:
     dk = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 200_000)
     return base64.b64encode(dk).decode()
@@ -131,6 +202,8 @@ def verify_password(password: str, salt_b64: str, hash_b64: str) -> bool:
 # -------------------------
 
 USERS_FILE = Path(__file__).with_name("usuarios.json")
+# Como _LOCK_CONFIG: la lectura previa, la escritura y la auditoría juntas
+_LOCK_USUARIOS = CandadoArchivo(lambda: f"{USERS_FILE}.lock")
 
 def load_users_from_file():
     """
@@ -149,12 +222,34 @@ def load_users_from_file():
             # Si el contenido no es JSON válido, lo tratamos como vacío
             return {}
 
-def save_users_to_file(users: dict) -> None:
+def save_users_to_file(users: dict, usuario=None) -> None:
     """
-    Guarda el diccionario de usuarios en usuarios.json.
+    Guarda el diccionario de usuarios en usuarios.json. 'usuario' es quien
+    hace el cambio (para la auditoría).
     """
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
+    with _LOCK_USUARIOS:
+        previos = load_users_from_file()
+        # Temporal único + os.replace: quien lo lea (login, respaldos) nunca ve un JSON a medias
+        _guardar_json(USERS_FILE, users, indent=2)
+        _auditar_usuarios(previos, users, usuario)
+
+def _auditar_usuarios(previos: dict, nuevos: dict, usuario) -> None:
+    """Un evento por usuario dado de alta, de baja o modificado (sin hashes)."""
+    for u in sorted(set(previos) | set(nuevos)):
+        antes, despues = previos.get(u), nuevos.get(u)
+        if antes == despues:
+            continue
+        if antes is None:
+            auditoria.registrar("usuario_alta", usuario, cuenta=u, rol=despues.get("role", ""))
+        elif despues is None:
+            auditoria.registrar("usuario_baja", usuario, cuenta=u)
+        else:
+            campos = sorted(
+                "contraseña" if k in ("salt", "hash") else k
+                for k in set(antes) | set(despues) if antes.get(k) != despues.get(k)
+            )
+            auditoria.registrar("usuario_cambio", usuario, cuenta=u, campos=sorted(set(campos)),
+                                rol=despues.get("role", ""))
 
 def verify_user_login(username: str, password: str, users: dict | None = None) -> bool:
     """
@@ -193,25 +288,183 @@ COLUMNS = [
     "Nombre_enc", "Edad", "Genero", "Telefono_enc", "Direccion_enc", "Emails_enc",
     # Orden / resultados
     "Tipo_Estudio", "Observaciones_enc", "Resultados_enc",
-    "Estado"  # pendiente|capturado|firmado
+    "Estado",  # pendiente|capturado|firmado
+    "Fecha_Firma",
 ]
 
+# -------------------------
+# Esquema explícito de la tabla
+# -------------------------
+try:
+    import pyarrow  # noqa: F401  (opcional: parser y cadenas en memoria Arrow)
+    _HAY_ARROW = True
+except ImportError:
+    _HAY_ARROW = False
+
+# Motor de pd.read_csv: "pyarrow" (multihilo) si está instalado, si no "c".
+CSV_MOTOR = os.getenv("LIS_CSV_MOTOR", "pyarrow" if _HAY_ARROW else "c")
+
+ESTADOS = ["pendiente", "capturado", "firmado"]
+_TEXTO = pd.StringDtype("pyarrow") if _HAY_ARROW else pd.StringDtype()
+
+# Columnas de fecha y su formato en el CSV
+COLUMNAS_FECHA = {
+    "Fecha_Registro": "%Y-%m-%dT%H:%M:%S",
+    "Fecha_Programada": "%Y-%m-%d",
+    "Fecha_Firma": "%Y-%m-%dT%H:%M:%S",
+}
+DTYPES = {
+    "Folio": _TEXTO,
+    "Costo_MXN": "float64",
+    "Nombre_enc": _TEXTO,
+    "Edad": "UInt8",
+    "Genero": "category",
+    "Telefono_enc": _TEXTO,
+    "Direccion_enc": _TEXTO,
+    "Emails_enc": _TEXTO,
+    "Tipo_Estudio": _TEXTO,
+    "Observaciones_enc": _TEXTO,
+    "Resultados_enc": _TEXTO,
+    "Estado": pd.CategoricalDtype(ESTADOS),
+}
+
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte las columnas presentes a los tipos de DTYPES / COLUMNAS_FECHA."""
+    for c in df.columns:
+        if c in COLUMNAS_FECHA:
+            if not pd.api.types.is_datetime64_any_dtype(df[c]):
+                df[c] = pd.to_datetime(df[c], format="ISO8601", errors="coerce")
+            # Misma unidad en todas las tablas para que concat no cambie el dtype
+            if df[c].dtype != "datetime64[ns]":
+                df[c] = df[c].astype("datetime64[ns]")
+        elif c == "Edad":
+            edad = pd.to_numeric(df[c], errors="coerce")
+            df[c] = edad.where((edad >= 0) & (edad <= 255)).round().astype("UInt8")
+        elif c == "Costo_MXN":
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+        elif c in DTYPES and df[c].dtype != DTYPES[c]:
+            df[c] = df[c].astype(DTYPES[c])
+    return df
+
+def fecha_texto(valor, solo_fecha: bool = False) -> str:
+    """Fecha (Timestamp, date o texto ISO) como texto ISO; "" si no hay."""
+    if isinstance(valor, str):
+        v = valor.strip()
+        if v.lower() in ("", "nan", "nat", "none"):
+            return ""
+        return v[:10] if solo_fecha else v
+    if valor is None or pd.isna(valor):
+        return ""
+    if solo_fecha:
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, datetime):
+        return valor.isoformat(timespec="seconds")
+    return valor.isoformat()
+
+def _fila_texto(row: dict) -> dict:
+    """Fila con fechas en texto ISO y sin tipos de pandas (para agregados/cambios)."""
+    out = dict(row)
+    for c in COLUMNAS_FECHA:
+        if c in out:
+            out[c] = fecha_texto(out[c], solo_fecha=(c == "Fecha_Programada"))
+    if "Estado" in out:
+        out["Estado"] = "" if pd.isna(out["Estado"]) else str(out["Estado"])
+    return out
+
+# Serializa las escrituras (leer-modificar-escribir) del CSV y de los agregados
+# entre sesiones de Streamlit (hilos) y entre procesos: réplicas de la app, la
+# API o la ingesta sobre el mismo directorio. Es el único escritor del CSV.
+_LOCK_ESCRITURA = CandadoArchivo(lambda: CSV_PATH + ".lock")
+
 def init_csv():
     if not os.path.exists(CSV_PATH):
-        df = pd.DataFrame(columns=COLUMNS)
-        df.to_csv(CSV_PATH, index=False)
+        # os.link no pisa un CSV que otra réplica haya creado (y quizá ya
+        # escrito) entre el exists y este punto.
+        tmp = f"{CSV_PATH}.{os.getpid()}.init"
+        pd.DataFrame(columns=COLUMNS).to_csv(tmp, index=False)
+        try:
+            os.link(tmp, CSV_PATH)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
 
-def read_csv():
-    init_csv()
-    return pd.read_csv(CSV_PATH)
+def _encabezado() -> list:
+    # El escritor de Arrow pone los nombres entre comillas
+    with open(CSV_PATH, "r", encoding="utf-8", newline="") as f:
+        return [c.strip() for c in next(csv.reader(f), []) if c.strip()]
 
+@medido("read_csv")
+def read_csv(columnas=None):
+    """
+    Tabla tipada según DTYPES; con 'columnas' solo se parsean esas (p. ej.
+    índices). Las columnas que falten en archivos antiguos se agregan vacías.
+    """
+    init_csv()
+    presentes = _encabezado()
+    usar = [c for c in columnas if c in presentes] if columnas else presentes
+    df = pd.read_csv(
+        CSV_PATH,
+        usecols=usar if columnas else None,
+        # Edad se convierte después: archivos antiguos la guardaron como "34.0"
+        dtype={c: DTYPES[c] for c in usar if c in DTYPES and c != "Edad"},
+        engine=CSV_MOTOR,
+    )
+    faltan = [c for c in (columnas or COLUMNS) if c not in df.columns]
+    if faltan:
+        df = df.reindex(columns=list(df.columns) + faltan)
+    return aplicar_esquema(df)
+
+def _escribir_arrow(df: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa, pyarrow.compute as pc, pyarrow.csv as pa_csv
+
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    for c, fmt in COLUMNAS_FECHA.items():
+        if c in tabla.column_names:
+            i = tabla.schema.get_field_index(c)
+            segundos = tabla[c].cast(pa.timestamp("s"), safe=False)
+            tabla = tabla.set_column(i, c, pc.strftime(segundos, format=fmt))
+    pa_csv.write_csv(tabla, path, pa_csv.WriteOptions(quoting_style="needed"))
+
+@medido("write_csv")
 def write_csv(df: pd.DataFrame):
-    df.to_csv(CSV_PATH, index=False)
+    # Fechas en ISO (como las escribe _order_row) y no en el formato de pandas
+    out = df.copy(deep=False)
+    for c in COLUMNAS_FECHA:
+        if c in out.columns and not pd.api.types.is_datetime64_any_dtype(out[c]):
+            out[c] = pd.to_datetime(out[c], format="ISO8601", errors="coerce")
+    # Se escribe a un temporal y se reemplaza: quien lea en paralelo (otra
+    # sesión, la API) ve la tabla anterior completa, nunca un archivo a medias.
+    tmp = CSV_PATH + ".tmp"
+    if CSV_MOTOR == "pyarrow":
+        _escribir_arrow(out, tmp)
+    else:
+        for c, fmt in COLUMNAS_FECHA.items():
+            if c in out.columns:
+                out[c] = out[c].dt.strftime(fmt)
+        out.to_csv(tmp, index=False)
+    os.replace(tmp, CSV_PATH)
+
+def firma_datos():
+    """
+    (mtime_ns, tamaño, inodo) del CSV: cambia con cada escritura (de este u
+    otro proceso; write_csv reemplaza el archivo), así que sirve como llave de
+    caché barata para vistas derivadas (p. ej. st.cache_data).
+    """
+    init_csv()
+    st_ = os.stat(CSV_PATH)
+    return (st_.st_mtime_ns, st_.st_size, st_.st_ino)
 
 def folio_auto():
     # Folio simple basado en tiempo (aaaaMMddHHmmss)
     return datetime.now().strftime("%Y%m%d%H%M%S")
 
+# Forma de un folio: el de folio_auto más el sufijo -n de _asignar_folios
+FOLIO_RE = re.compile(r"\d+(?:-\d+)?")
+
+def parece_folio(texto) -> bool:
+    return bool(FOLIO_RE.fullmatch(str(texto or "").strip()))
+
 def normalizar_telefono_mx(tel: str, default_country="+52"):
     if not tel: return ""
     digits = re.sub(r"\D", "", tel)
@@ -221,6 +474,7 @@ def normalizar_telefono_mx(tel: str, default_country="+52"):
         return tel.strip()
     return tel.strip()
 
+@medido("decrypt_view")
 def decrypt_view(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty: return df
     out = df.copy()
@@ -237,6 +491,7 @@ def decrypt_view(df: pd.DataFrame) -> pd.DataFrame:
     ]
     return out.reindex(columns=cols)
 
+@medido("filter_df")
 def filter_df(df_dec: pd.DataFrame, query: str) -> pd.DataFrame:
     if not query: return df_dec
     q = query.lower()
@@ -246,31 +501,49 @@ def filter_df(df_dec: pd.DataFrame, query: str) -> pd.DataFrame:
     return df_dec[mask]
 
 def list_folios(status_filter=None):
-    df = read_csv()
+    df = read_csv(columnas=["Folio", "Estado"])
     if df.empty: return []
     if status_filter:
         df = df[df["Estado"].isin(status_filter)]
-    return df["Folio"].astype(str).tolist()
+    return df["Folio"].tolist()
 
+@medido("get_order_summary")
 def get_order_summary(folio: str):
     df = read_csv()
     if df.empty: return None
-    row = df[df["Folio"].astype(str) == str(folio)]
+    row = df[df["Folio"] == str(folio)]
     if row.empty: return None
-    r = row.iloc[0].to_dict()
+    return _resumen_fila(row.iloc[0].to_dict())
+
+def _resumen_fila(r: dict) -> dict:
+    """Fila tipada (read_csv) -> resumen descifrado de la orden."""
     return {
-        "Folio": r["Folio"],
-        "Fecha_Registro": r["Fecha_Registro"],
-        "Fecha_Programada": r["Fecha_Programada"],
-        "Estado": r["Estado"],
-        "Tipo_Estudio": r.get("Tipo_Estudio", ""),
+        "Folio": str(r["Folio"]),
+        "Fecha_Registro": fecha_texto(r["Fecha_Registro"]),
+        "Fecha_Programada": fecha_texto(r["Fecha_Programada"], solo_fecha=True),
+        "Estado": str(r["Estado"]),
+        "Tipo_Estudio": "" if pd.isna(r.get("Tipo_Estudio")) else str(r["Tipo_Estudio"]),
         "Nombre": dec(r.get("Nombre_enc","")),
         "Telefono": dec(r.get("Telefono_enc","")),
         "Direccion": dec(r.get("Direccion_enc","")),
+        "Emails": dec(r.get("Emails_enc","")),
         "Observaciones": dec(r.get("Observaciones_enc","")),
         "Resultados": dec(r.get("Resultados_enc","")),
     }
 
+def parse_resultados(texto) -> dict:
+    """
+    Resultados_enc descifrado -> {estudio: {"valor", "unidad", "ref"}}.
+    Texto vacío o que no sea JSON de resultados regresa {}.
+    """
+    if not texto or not isinstance(texto, str):
+        return {}
+    try:
+        data = json.loads(texto)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
 # -------------------------
 # Catálogo de estudios desde Excel
 # -------------------------
@@ -278,6 +551,7 @@ CATALOGO_XLSX = "catalogo_estudios.xlsx"
 CATALOGO_SHEET = "Estudios"
 
 
+@medido("cargar_catalogo_estudios")
 def cargar_catalogo_estudios():
     """
     Lee el catálogo de estudios desde catalogo_estudios.xlsx.
@@ -335,11 +609,10 @@ def costo_total_desde_catalogo(nombres_estudios):
 
 
 # Catálogo de estudios (recortado/ajustable)
-def save_order(
+def _order_row(
     folio, fecha_prog, costo, nombre, edad, genero, telefono, direccion,
     tipo, observaciones, emails=None
-):
-    df = read_csv()
+) -> dict:
     # normaliza tipo(s) a string unificado
     if isinstance(tipo, list):
         tipo_str = "; ".join([t for t in tipo if t])
@@ -352,7 +625,7 @@ def save_order(
     else:
         emails_str = ""
 
-    row = {
+    return {
         "Folio": folio or folio_auto(),
         "Fecha_Registro": datetime.now().isoformat(timespec="seconds"),
         "Fecha_Programada": fecha_prog if isinstance(fecha_prog, str) else str(fecha_prog),
@@ -368,25 +641,268 @@ def save_order(
         "Resultados_enc": enc(""),
         "Estado": "pendiente"
     }
-    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    write_csv(df)
-    return row["Folio"]
 
-def save_results(folio, resultados_text, liberar=False):
-    df = read_csv()
+def _agregar_filas(df: pd.DataFrame, rows: list) -> pd.DataFrame:
+    """Concatena filas nuevas ya convertidas al esquema (conserva los dtypes)."""
+    nuevas = aplicar_esquema(pd.DataFrame(rows).reindex(columns=df.columns))
     if df.empty:
-        raise ValueError("No hay base de datos.")
-    m = df["Folio"].astype(str) == str(folio)
-    if not m.any():
-        raise ValueError(f"Folio no encontrado: {folio}")
+        return nuevas
+    return pd.concat([df, nuevas], ignore_index=True)
+
+def _asignar_folios(df: pd.DataFrame, rows: list) -> None:
+    """
+    Hace únicos los folios de 'rows' frente a la tabla y entre sí, agregando
+    un sufijo -n. Se llama con _LOCK_ESCRITURA tomado: folio_auto tiene
+    resolución de segundos y varias sesiones o réplicas pueden coincidir.
+    """
+    usados = set(df["Folio"])
+    for row in rows:
+        base = str(row["Folio"])
+        folio, n = base, 1
+        while folio in usados:
+            folio = f"{base}-{n}"
+            n += 1
+        row["Folio"] = folio
+        usados.add(folio)
+
+def _auditar_alta(row: dict, usuario) -> None:
+    auditoria.registrar(
+        "alta_orden", usuario, row["Folio"],
+        estudios=row["Tipo_Estudio"], costo=row["Costo_MXN"], fecha_programada=row["Fecha_Programada"],
+    )
+
+@medido("save_order")
+def save_order(
+    folio, fecha_prog, costo, nombre, edad, genero, telefono, direccion,
+    tipo, observaciones, emails=None, usuario=None
+):
+    """
+    Alta de una orden. Regresa el folio guardado (con sufijo -n si ya existía).
+    'usuario' es quien la captura (para la auditoría).
+    """
+    row = _order_row(
+        folio, fecha_prog, costo, nombre, edad, genero, telefono, direccion,
+        tipo, observaciones, emails
+    )
+    with _LOCK_ESCRITURA:
+        df = read_csv()
+        _asignar_folios(df, [row])
+        df = _agregar_filas(df, [row])
+        write_csv(df)
+        agregados.registrar_orden(row)
+        cambios.emitir([cambios.evento(row, "alta")])
+        _auditar_alta(row, usuario)
+    return row["Folio"]
+
+@medido("save_orders")
+def save_orders(ordenes: list, usuario=None) -> list:
+    """
+    Alta de varias órdenes con una sola lectura/escritura del CSV.
+    Cada orden es un dict con los mismos parámetros que save_order (sin 'usuario').
+    Si un folio (dado o automático) ya existe, se le agrega un sufijo -n.
+    Regresa la lista de folios en el mismo orden.
+    """
+    rows = [_order_row(**o) for o in ordenes]
+    with _LOCK_ESCRITURA:
+        df = read_csv()
+        _asignar_folios(df, rows)
+        df = _agregar_filas(df, rows)
+        write_csv(df)
+        for row in rows:
+            agregados.registrar_orden(row)
+        cambios.emitir([cambios.evento(row, "alta") for row in rows])
+        for row in rows:
+            _auditar_alta(row, usuario)
+    return [r["Folio"] for r in rows]
+
+@medido("save_results")
+def save_results(folio, resultados_text, liberar=False, usuario=None):
+    """
+    Guarda los resultados de un folio ('capturado', o 'firmado' si liberar).
+    'usuario' es quien captura o firma (para la auditoría).
+    """
     estado = "capturado"
     if liberar:
         estado = "firmado"
-    df.loc[m, "Resultados_enc"] = enc(str(resultados_text or ""))
-    df.loc[m, "Estado"] = estado
-    write_csv(df)
+    resultados_enc = enc(str(resultados_text or ""))
+    with _LOCK_ESCRITURA:
+        df = read_csv()
+        if df.empty:
+            raise ValueError("No hay base de datos.")
+        m = (df["Folio"] == str(folio)).fillna(False)
+        if not m.any():
+            raise ValueError(f"Folio no encontrado: {folio}")
+        previa = _fila_texto(df[m].iloc[0].to_dict())
+        estado_anterior = str(previa.get("Estado") or "")
+        # Antes de escribir: sin su diccionario (compresion.py) no se pisa el dato
+        huella_anterior = huella(dec(previa.get("Resultados_enc", "")))
+        fecha_firma = None
+        if estado == "firmado" and estado_anterior != "firmado":
+            fecha_firma = datetime.now().isoformat(timespec="seconds")
+            df.loc[m, "Fecha_Firma"] = pd.Timestamp(fecha_firma)
+        df.loc[m, "Resultados_enc"] = resultados_enc
+        df.loc[m, "Estado"] = estado
+        write_csv(df)
+        agregados.registrar_transicion(previa, estado_anterior, estado, fecha_firma)
+        cambios.emitir([cambios.evento({**previa, "Estado": estado}, "resultados", estado_anterior)])
+        auditoria.registrar(
+            "firma" if liberar else "resultados", usuario, folio,
+            estado_anterior=estado_anterior, estado=estado,
+            huella=huella(resultados_text), huella_anterior=huella_anterior,
+        )
     return True
 
+def estudios_de_orden(tipo_estudio) -> list:
+    """Estudios de Tipo_Estudio ("A; B; C"), como los muestra Laboratorio."""
+    s = str(tipo_estudio or "").strip()
+    if not s or s.lower() == "nan":
+        return []
+    return [e.strip() for e in re.split(r"[;,/]", s) if e.strip()]
+
+def _valor_capturado(r) -> bool:
+    valor = r.get("valor", "") if isinstance(r, dict) else r
+    return bool(str(valor or "").strip())
+
+def _validar_resultados(texto: str, estudios: list, liberar: bool) -> str:
+    """Motivo por el que los resultados no corresponden a la orden ("" si están bien)."""
+    datos = parse_resultados(texto)
+    if texto and not datos:
+        return "Los resultados deben ser JSON por estudio."
+    if estudios:
+        ajenos = [e for e in datos if e not in estudios]
+        if ajenos:
+            return "Estudios que no tiene la orden: " + ", ".join(ajenos)
+        if liberar:
+            faltan = [e for e in estudios if not _valor_capturado(datos.get(e))]
+            if faltan:
+                return "Faltan valores para firmar: " + ", ".join(faltan)
+    elif liberar and not datos:
+        return "No hay resultados para firmar."
+    return ""
+
+def _combinar_resultados(guardado: str, nuevos: dict) -> str:
+    """Aplica {estudio: resultado o None (borrar)} sobre el JSON guardado."""
+    res = parse_resultados(guardado)
+    for estudio, r in nuevos.items():
+        if r is None:
+            res.pop(estudio, None)
+        else:
+            res[estudio] = r
+    return json.dumps(res, ensure_ascii=False) if res else ""
+
+@medido("save_results_lote")
+def save_results_lote(items: list, usuario=None, validar: bool = True) -> list:
+    """
+    Captura o firma de muchos folios con una sola lectura y escritura del CSV
+    (cierre de turno: liberar cientos de reportes). Cada item es
+    {"folio", "resultados" (dict o JSON por estudio), "liberar", "combinar"}.
+
+    Con "combinar" los resultados son solo los estudios que cambian y se
+    aplican sobre lo guardado, leído con el candado tomado (una captura que
+    llegue en medio no se pierde); un estudio con None se borra. Sin
+    "combinar" reemplazan a los guardados.
+
+    Cada folio se valida contra los estudios de su orden (para firmar, todos
+    con valor); los que no pasan no detienen al resto ni se escriben.
+    Con validar=False solo se revisa que el folio exista, no esté repetido ni
+    se quite una firma. Regresa un reporte por item, en el mismo orden:
+    {"folio", "ok", "estado_anterior", "estado", "error"}.
+    """
+    reporte, textos, combinar = [], [], []
+    for it in items:
+        folio = str(it.get("folio") or "").strip() if isinstance(it, dict) else ""
+        res = it.get("resultados") if isinstance(it, dict) else None
+        liberar = bool(it.get("liberar")) if isinstance(it, dict) else False
+        mezcla = bool(it.get("combinar")) if isinstance(it, dict) else False
+        error = "" if folio else "Falta 'folio'."
+        if mezcla:
+            if isinstance(res, str):
+                try:
+                    res = json.loads(res)
+                except ValueError:
+                    res = None
+            if not isinstance(res, dict) and not error:
+                error = "Para combinar, los resultados deben ser JSON por estudio."
+            texto = res if isinstance(res, dict) else {}
+        else:
+            texto = (json.dumps(res, ensure_ascii=False) if res else "") if isinstance(res, dict) else str(res or "")
+        reporte.append({"folio": folio, "ok": False, "estado_anterior": "",
+                        "estado": "firmado" if liberar else "capturado", "error": error})
+        textos.append(texto)
+        combinar.append(mezcla)
+    # Cifrado en una pasada, antes de tomar el candado (es lo más caro); lo
+    # que se combina depende de lo guardado y se cifra adentro
+    cifrados = [enc(t) if r["folio"] and not c else "" for r, t, c in zip(reporte, textos, combinar)]
+
+    with _LOCK_ESCRITURA:
+        df = read_csv()
+        posiciones = pd.Index(df["Folio"]).get_indexer([r["folio"] for r in reporte]) if not df.empty \
+            else [-1] * len(reporte)
+        vistos, aplicar, anteriores = set(), [], {}
+        for i, (r, pos) in enumerate(zip(reporte, posiciones)):
+            if r["error"]:
+                continue
+            if pos < 0:
+                r["error"] = f"Folio no encontrado: {r['folio']}"
+                continue
+            if r["folio"] in vistos:
+                r["error"] = "Folio repetido en el lote."
+                continue
+            vistos.add(r["folio"])
+            fila = df.iloc[pos]
+            r["estado_anterior"] = "" if pd.isna(fila["Estado"]) else str(fila["Estado"])
+            if r["estado_anterior"] == "firmado" and r["estado"] != "firmado":
+                r["error"] = "La orden ya está firmada."
+                continue
+            try:
+                anteriores[i] = dec(fila["Resultados_enc"])
+            except compresion.DiccionarioNoDisponible as e:
+                r["error"] = str(e)
+                continue
+            if combinar[i]:
+                textos[i] = _combinar_resultados(anteriores[i], textos[i])
+            if validar:
+                r["error"] = _validar_resultados(textos[i], estudios_de_orden(fila["Tipo_Estudio"]),
+                                                 r["estado"] == "firmado")
+            if not r["error"]:
+                if combinar[i]:
+                    cifrados[i] = enc(textos[i])
+                aplicar.append((i, pos))
+
+        if aplicar:
+            ahora = datetime.now().isoformat(timespec="seconds")
+            filas = [p for _, p in aplicar]
+            previas = [_fila_texto(d) for d in df.iloc[filas].to_dict("records")]
+            col = df.columns.get_loc
+            df.iloc[filas, col("Resultados_enc")] = [cifrados[i] for i, _ in aplicar]
+            df.iloc[filas, col("Estado")] = [reporte[i]["estado"] for i, _ in aplicar]
+            firmar = [p for (i, p) in aplicar
+                      if reporte[i]["estado"] == "firmado" and reporte[i]["estado_anterior"] != "firmado"]
+            if firmar:
+                df.iloc[firmar, col("Fecha_Firma")] = pd.Timestamp(ahora)
+            write_csv(df)
+
+            transiciones, eventos = [], []
+            for (i, _), previa in zip(aplicar, previas):
+                r = reporte[i]
+                nueva_firma = ahora if r["estado"] == "firmado" and r["estado_anterior"] != "firmado" else None
+                transiciones.append((previa, r["estado_anterior"], r["estado"], nueva_firma))
+                eventos.append(cambios.evento({**previa, "Estado": r["estado"]}, "resultados", r["estado_anterior"]))
+                r["ok"] = True
+            agregados.registrar_transiciones(transiciones)
+            cambios.emitir(eventos)
+            for i, _ in aplicar:
+                r = reporte[i]
+                auditoria.registrar(
+                    "firma" if r["estado"] == "firmado" else "resultados", usuario, r["folio"],
+                    estado_anterior=r["estado_anterior"], estado=r["estado"], lote=True,
+                    huella=huella(textos[i]), huella_anterior=huella(anteriores[i]),
+                )
+    for r in reporte:
+        if not r["ok"]:
+            r["estado"] = r["estado_anterior"]
+    return reporte
+
 def export_excel(df_dec: pd.DataFrame):
     df_dec.to_excel(XLSX_PATH, index=False)
     return XLSX_PATH, "Exportado a Excel."
@@ -394,6 +910,7 @@ def export_excel(df_dec: pd.DataFrame):
 LAB_INFO = _config["lab_info"]
 DOCTOR_INFO = _config["doctor_info"]
 
+@medido("generar_pdf_resultado")
 def generar_pdf_resultado(
     solicitud,
     resultados,
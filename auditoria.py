@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Bitácora de auditoría encadenada por hash (auditoria_lis.jsonl).
+
+Cada operación que modifica datos en app_core (alta de órdenes, captura de
+resultados, firma, cambios de usuarios y de configuración) llama a
+registrar(), que solo arma el evento y lo pone en una cola en memoria: la
+latencia de la petición no cambia. Un hilo de fondo toma todo lo que haya en
+la cola, lo agrega al archivo con un solo write y un solo fsync por lote
+(group commit) y encadena cada registro con el anterior:
+
+    {"seq": 8, "ts": "...", "accion": "firma", "usuario": "medico@lab",
+     "folio": "20250101...", "detalle": {...}, "pid": 4123,
+     "previo": "<hash del registro 7>", "hash": "<sha256 de este registro>"}
+
+Modificar, borrar o reordenar un registro rompe la cadena desde ese punto
+(verificar()). No se guardan datos del paciente en claro: los resultados se
+registran como huellas HMAC (ver app_core.huella).
+
+Entre réplicas el archivo se escribe bajo un candado de archivo, así que la
+cadena es una sola aunque escriban varios procesos. Lo que esté en la cola
+se escribe al salir del proceso (atexit); una caída abrupta puede perder el
+último lote en memoria (milisegundos).
+
+Consultas por folio y por usuario con un índice de desplazamientos en
+memoria que se actualiza de forma incremental (como cambios.Suscriptor).
+
+Uso:
+    python auditoria.py verificar
+    python auditoria.py folio 20250101120000
+    python auditoria.py usuario recepcion@lab.local
+"""
+
+import os, json, hashlib, threading, queue, atexit, time, logging
+from datetime import datetime
+
+from candados import CandadoArchivo
+from cambios import _ultima_linea
+
+
+AUDITORIA_PATH = "auditoria_lis.jsonl"
+LOTE_MAX = 1000
+GENESIS = "0" * 64
+
+_log = logging.getLogger(__name__)
+_lock = CandadoArchivo(lambda: AUDITORIA_PATH + ".lock")
+_cola = queue.Queue()
+_escritor = {"hilo": None, "pid": None}
+_lock_escritor = threading.Lock()
+# Último registro conocido y tamaño/inodo del archivo en ese momento
+_estado = {"seq": None, "hash": None, "tam": None, "inodo": None}
+
+
+# -------------------------
+# Registro
+# -------------------------
+def registrar(accion: str, usuario=None, folio=None, **detalle) -> None:
+    """
+    Encola un evento de auditoría (no bloquea ni toca el disco). El detalle
+    se serializa aquí: lo que no sea JSON (fechas, tipos de numpy) queda como
+    texto y el hilo escritor nunca recibe un evento que no pueda escribir.
+    """
+    _asegurar_escritor()
+    _cola.put({
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "accion": accion,
+        "usuario": str(usuario or ""),
+        "folio": "" if folio is None else str(folio),
+        "detalle": json.loads(json.dumps(detalle, ensure_ascii=False, default=str)),
+        "pid": os.getpid(),
+    })
+
+def _hash(registro: dict) -> str:
+    canon = json.dumps(registro, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canon.encode()).hexdigest()
+
+def _ultimo() -> tuple:
+    """(seq, hash) del último registro; relee la cola del archivo si otro proceso escribió."""
+    try:
+        st_ = os.stat(AUDITORIA_PATH)
+    except OSError:
+        return 0, GENESIS
+    if (_estado["tam"], _estado["inodo"]) == (st_.st_size, st_.st_ino) and _estado["seq"] is not None:
+        return _estado["seq"], _estado["hash"]
+    linea = _ultima_linea(AUDITORIA_PATH)
+    if not linea:
+        return 0, GENESIS
+    ultimo = json.loads(linea)
+    return int(ultimo["seq"]), ultimo["hash"]
+
+def _escribir_lote(eventos: list) -> None:
+    with _lock:
+        seq, previo = _ultimo()
+        lineas = []
+        for ev in eventos:
+            seq += 1
+            registro = {"seq": seq, **ev, "previo": previo}
+            registro["hash"] = previo = _hash(registro)
+            lineas.append(json.dumps(registro, ensure_ascii=False) + "\n")
+        with open(AUDITORIA_PATH, "a", encoding="utf-8") as f:
+            f.write("".join(lineas))
+            f.flush()
+            os.fsync(f.fileno())
+        st_ = os.stat(AUDITORIA_PATH)
+        _estado.update(seq=seq, hash=previo, tam=st_.st_size, inodo=st_.st_ino)
+
+def _escribir_con_reintentos(lote: list) -> None:
+    while True:
+        try:
+            _escribir_lote(lote)
+            return
+        except OSError as e:
+            # Sin disco no se descartan eventos: se reintenta
+            _log.warning("No se pudo escribir la bitácora (%s); reintentando", e)
+            time.sleep(1.0)
+        except Exception as e:
+            if len(lote) == 1:
+                _log.error("Evento de auditoría descartado (%r): %s %s",
+                           e, lote[0].get("accion"), lote[0].get("folio"))
+                return
+            # Se separa el lote para no perder los eventos sanos por uno malo
+            _log.warning("Error al escribir un lote de auditoría (%r); evento por evento", e)
+            for ev in lote:
+                _escribir_con_reintentos([ev])
+            return
+
+def _trabajar() -> None:
+    while True:
+        lote = [_cola.get()]
+        # Lo que se acumuló mientras se escribía el lote anterior va junto
+        while len(lote) < LOTE_MAX:
+            try:
+                lote.append(_cola.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _escribir_con_reintentos(lote)
+        except BaseException:
+            _log.exception("Error inesperado en el escritor de auditoría")
+        finally:
+            # vaciar() no debe quedarse esperando eventos que ya no se escribirán
+            for _ in lote:
+                _cola.task_done()
+
+def _asegurar_escritor() -> None:
+    hilo = _escritor["hilo"]
+    if hilo is not None and hilo.is_alive() and _escritor["pid"] == os.getpid():
+        return
+    with _lock_escritor:
+        hilo = _escritor["hilo"]
+        if hilo is None or not hilo.is_alive() or _escritor["pid"] != os.getpid():
+            hilo = threading.Thread(target=_trabajar, name="auditoria", daemon=True)
+            hilo.start()
+            _escritor.update(hilo=hilo, pid=os.getpid())
+
+def vaciar(timeout: float | None = None) -> bool:
+    """Espera a que la cola quede escrita. Regresa False si se agotó el tiempo."""
+    limite = None if timeout is None else time.monotonic() + timeout
+    with _cola.all_tasks_done:
+        while _cola.unfinished_tasks:
+            restante = None if limite is None else limite - time.monotonic()
+            if restante is not None and restante <= 0:
+                return False
+            _cola.all_tasks_done.wait(restante)
+    return True
+
+atexit.register(vaciar, 5.0)
+
+
+# -------------------------
+# Verificación
+# -------------------------
+def verificar(path: str | None = None) -> dict:
+    """
+    Recorre la bitácora y recalcula la cadena. Regresa {"eventos", "ok",
+    "seq_error", "error"}; seq_error es el primer registro que no cuadra.
+    """
+    path = path or AUDITORIA_PATH
+    n, previo, seq_esperada = 0, GENESIS, 1
+    if not os.path.exists(path):
+        return {"eventos": 0, "ok": True, "seq_error": None, "error": ""}
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                return {"eventos": n, "ok": False, "seq_error": seq_esperada, "error": "registro ilegible"}
+            seq = registro.get("seq")
+            hash_ = registro.pop("hash", None)
+            if seq != seq_esperada:
+                error = f"se esperaba seq {seq_esperada} y hay {seq}"
+            elif registro.get("previo") != previo:
+                error = "el registro no apunta al anterior"
+            elif _hash(registro) != hash_:
+                error = "el contenido no corresponde a su hash"
+            else:
+                n += 1
+                previo, seq_esperada = hash_, seq_esperada + 1
+                continue
+            return {"eventos": n, "ok": False, "seq_error": seq_esperada, "error": error}
+    return {"eventos": n, "ok": True, "seq_error": None, "error": ""}
+
+
+# -------------------------
+# Consulta indexada
+# -------------------------
+class IndiceAuditoria:
+    """Desplazamientos (bytes) de cada registro, por folio y por usuario."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar(None)
+
+    def _reiniciar(self, inodo) -> None:
+        self.offset = 0
+        self.inodo = inodo
+        self.posiciones = []
+        self.por_folio = {}
+        self.por_usuario = {}
+
+    def actualizar(self) -> None:
+        """Indexa lo agregado desde la última vez (un os.stat si no hay nada)."""
+        with self._lock:
+            try:
+                st_ = os.stat(AUDITORIA_PATH)
+            except OSError:
+                return
+            if st_.st_ino != self.inodo or st_.st_size < self.offset:
+                self._reiniciar(st_.st_ino)
+            if st_.st_size == self.offset:
+                return
+            with open(AUDITORIA_PATH, "rb") as f:
+                f.seek(self.offset)
+                datos = f.read(st_.st_size - self.offset)
+            pos = self.offset
+            for linea in datos.splitlines(keepends=True):
+                if not linea.endswith(b"\n"):
+                    break  # a medio escribir: se indexa la próxima vez
+                if linea.strip():
+                    registro = json.loads(linea)
+                    self.posiciones.append(pos)
+                    if registro.get("folio"):
+                        self.por_folio.setdefault(registro["folio"], []).append(pos)
+                    if registro.get("usuario"):
+                        self.por_usuario.setdefault(registro["usuario"], []).append(pos)
+                pos += len(linea)
+            self.offset = pos
+
+    def consultar(self, folio=None, usuario=None, accion=None, desde=None, hasta=None,
+                  limite: int = 100) -> list:
+        """
+        Registros que cumplen todos los filtros, del más reciente al más
+        antiguo. 'desde'/'hasta' son textos ISO comparados contra "ts".
+        """
+        self.actualizar()
+        with self._lock:
+            if folio is not None:
+                candidatas = self.por_folio.get(str(folio), [])
+                if usuario is not None:
+                    del_usuario = set(self.por_usuario.get(str(usuario), []))
+                    candidatas = [p for p in candidatas if p in del_usuario]
+            elif usuario is not None:
+                candidatas = self.por_usuario.get(str(usuario), [])
+            else:
+                candidatas = self.posiciones
+            candidatas = list(candidatas)
+        salida = []
+        if not candidatas:
+            return salida
+        with open(AUDITORIA_PATH, "rb") as f:
+            for pos in reversed(candidatas):
+                f.seek(pos)
+                registro = json.loads(f.readline())
+                if accion and registro["accion"] != accion:
+                    continue
+                if desde and registro["ts"] < desde:
+                    continue
+                if hasta and registro["ts"] > hasta:
+                    continue
+                salida.append(registro)
+                if len(salida) >= limite:
+                    break
+        return salida
+
+
+_indice = {"ruta": None, "indice": None}
+_lock_indice = threading.Lock()
+
+def indice_compartido() -> IndiceAuditoria:
+    with _lock_indice:
+        if _indice["indice"] is None or _indice["ruta"] != AUDITORIA_PATH:
+            _indice.update(ruta=AUDITORIA_PATH, indice=IndiceAuditoria())
+        return _indice["indice"]
+
+def consultar(folio=None, usuario=None, accion=None, desde=None, hasta=None, limite: int = 100) -> list:
+    """Consulta la bitácora (incluye lo que este proceso tenga aún en cola)."""
+    vaciar(timeout=2.0)
+    return indice_compartido().consultar(folio, usuario, accion, desde, hasta, limite)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "verificar":
+        r = verificar()
+        print(json.dumps(r, ensure_ascii=False))
+        sys.exit(0 if r["ok"] else 1)
+    elif len(sys.argv) > 2 and sys.argv[1] in ("folio", "usuario"):
+        for ev in consultar(**{sys.argv[1]: sys.argv[2]}, limite=1000):
+            print(json.dumps(ev, ensure_ascii=False))
+    else:
+        print("Uso: python auditoria.py verificar | folio <folio> | usuario <usuario>")
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks reproducibles del LIS.
+
+- datos_sinteticos: genera tablas de órdenes cifradas (10k–5M filas)
+- bench_app_core: mide las operaciones de app_core y escribe resultados JSON
+- comparar: compara dos corridas y marca regresiones
+
+Todos los benchmarks corren en un directorio de trabajo aislado para no tocar
+solicitudes_lis.csv ni usuarios.json reales.
+"""
+
+import os, sys, json, platform, subprocess, tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
+
+
+@contextmanager
+def entorno_aislado(directorio: str | None = None):
+    """
+    Redirige las rutas de datos de app_core (y módulos satélite) a un
+    directorio temporal. El catálogo se sigue leyendo del repositorio.
+    """
+    import app_core, agregados, cambios, auditoria
+
+    directorio = directorio or tempfile.mkdtemp(prefix="lis_bench_")
+    os.makedirs(directorio, exist_ok=True)
+    previo = {
+        "cwd": os.getcwd(),
+        "CSV_PATH": app_core.CSV_PATH,
+        "XLSX_PATH": app_core.XLSX_PATH,
+        "CATALOGO_XLSX": app_core.CATALOGO_XLSX,
+        "USERS_FILE": app_core.USERS_FILE,
+        "AGREGADOS_PATH": agregados.AGREGADOS_PATH,
+        "CAMBIOS_PATH": cambios.CAMBIOS_PATH,
+        "AUDITORIA_PATH": auditoria.AUDITORIA_PATH,
+    }
+    app_core.CATALOGO_XLSX = str(RAIZ / "catalogo_estudios.xlsx")
+    app_core.CSV_PATH = os.path.join(directorio, "solicitudes_lis.csv")
+    app_core.XLSX_PATH = os.path.join(directorio, "solicitudes_lis.xlsx")
+    app_core.USERS_FILE = Path(directorio) / "usuarios.json"
+    agregados.AGREGADOS_PATH = os.path.join(directorio, "agregados_lis.json")
+    cambios.CAMBIOS_PATH = os.path.join(directorio, "cambios_lis.jsonl")
+    cambios._estado.update(seq=None, tam=None)
+    auditoria.vaciar()
+    auditoria.AUDITORIA_PATH = os.path.join(directorio, "auditoria_lis.jsonl")
+    os.chdir(directorio)
+    try:
+        yield directorio
+    finally:
+        # Lo que quede en la cola de auditoría pertenece a este entorno
+        auditoria.vaciar()
+        auditoria.AUDITORIA_PATH = previo["AUDITORIA_PATH"]
+        app_core.CSV_PATH = previo["CSV_PATH"]
+        app_core.XLSX_PATH = previo["XLSX_PATH"]
+        app_core.CATALOGO_XLSX = previo["CATALOGO_XLSX"]
+        app_core.USERS_FILE = previo["USERS_FILE"]
+        agregados.AGREGADOS_PATH = previo["AGREGADOS_PATH"]
+        cambios.CAMBIOS_PATH = previo["CAMBIOS_PATH"]
+        cambios._estado.update(seq=None, tam=None)
+        os.chdir(previo["cwd"])
+
+
+def info_entorno() -> dict:
+    """Metadatos para que los resultados sean comparables entre versiones."""
+    import pandas as pd
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def guardar_resultados(resultados: dict, salida: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    return salida
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de las operaciones de app_core sobre tablas sintéticas.
+
+Mide save_order, save_results, get_order_summary, decrypt_view, filter_df,
+export_excel, generar_pdf_resultado y login, y escribe un JSON con
+min/mediana/p95 por operación y tamaño de tabla.
+
+Uso:
+    python -m benchmarks.bench_app_core --filas 10000 100000 --salida bench_resultados/actual.json
+"""
+
+import argparse, json, os, random, statistics, time
+from datetime import date, datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla, generar_usuarios
+
+
+OPERACIONES = [
+    "read_csv", "save_order", "save_results", "get_order_summary", "decrypt_view",
+    "filter_df", "export_excel", "generar_pdf_resultado", "login",
+]
+# export_excel está limitado por Excel (1,048,576 filas); se exporta una muestra
+MAX_FILAS_EXCEL = 100_000
+
+
+def _estadisticos(tiempos: list) -> dict:
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+    return {
+        "repeticiones": len(tiempos),
+        "min_s": ordenados[0],
+        "mediana_s": statistics.median(ordenados),
+        "p95_s": p95,
+        "promedio_s": statistics.fmean(ordenados),
+    }
+
+def medir(fn, repeticiones: int, calentamiento: int = 1) -> dict:
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return _estadisticos(tiempos)
+
+
+def bench_tamano(filas: int, repeticiones: int, operaciones: list, semilla: int = 2006) -> dict:
+    import app_core
+
+    rng = random.Random(semilla)
+    resultados = {}
+    with entorno_aislado() as d:
+        t0 = time.perf_counter()
+        generar_tabla(filas, app_core.CSV_PATH, semilla=semilla)
+        resultados["_generacion_s"] = time.perf_counter() - t0
+        resultados["_bytes_csv"] = os.path.getsize(app_core.CSV_PATH)
+
+        base = app_core.read_csv()
+        folios = base["Folio"].astype(str).tolist()
+        nombres_est = base["Tipo_Estudio"].dropna().head(50).tolist() or ["Química sanguínea"]
+
+        if "read_csv" in operaciones:
+            resultados["read_csv"] = medir(app_core.read_csv, repeticiones)
+
+        if "save_order" in operaciones:
+            def _alta():
+                app_core.save_order(
+                    None, date.today().isoformat(), 300, "Paciente Benchmark", 30, "F",
+                    "8991234567", "Primavera #400", [rng.choice(nombres_est)], "", ["bench@example.com"],
+                )
+            resultados["save_order"] = medir(_alta, repeticiones)
+
+        if "save_results" in operaciones:
+            resultado = json.dumps({"Química sanguínea": {"valor": "90", "unidad": "mg/dL", "ref": "70 - 110"}})
+            resultados["save_results"] = medir(
+                lambda: app_core.save_results(rng.choice(folios), resultado, liberar=rng.random() < 0.5),
+                repeticiones,
+            )
+
+        if "get_order_summary" in operaciones:
+            resultados["get_order_summary"] = medir(
+                lambda: app_core.get_order_summary(rng.choice(folios)), repeticiones,
+            )
+
+        df_dec = None
+        if {"decrypt_view", "filter_df", "export_excel"} & set(operaciones):
+            t0 = time.perf_counter()
+            df_dec = app_core.decrypt_view(app_core.read_csv())
+            primera = time.perf_counter() - t0
+            if "decrypt_view" in operaciones:
+                resultados["decrypt_view"] = medir(
+                    lambda: app_core.decrypt_view(app_core.read_csv()), max(1, repeticiones // 5), calentamiento=0,
+                )
+                resultados["decrypt_view"]["primera_s"] = primera
+
+        if "filter_df" in operaciones:
+            resultados["filter_df"] = medir(lambda: app_core.filter_df(df_dec, "garcía"), repeticiones)
+
+        if "export_excel" in operaciones:
+            muestra = df_dec.head(MAX_FILAS_EXCEL)
+            resultados["export_excel"] = medir(lambda: app_core.export_excel(muestra), max(1, repeticiones // 5), calentamiento=0)
+            resultados["export_excel"]["filas"] = len(muestra)
+
+        if "generar_pdf_resultado" in operaciones:
+            folio = rng.choice(folios)
+            info = app_core.get_order_summary(folio)
+            try:
+                res = json.loads(info["Resultados"]) if info["Resultados"] else {}
+            except ValueError:
+                res = {}
+            solicitud = {
+                "id_solicitud": folio, "nombre_paciente": info["Nombre"],
+                "fecha_registro": info["Fecha_Registro"], "fecha_muestra": info["Fecha_Programada"],
+            }
+            resultados["generar_pdf_resultado"] = medir(
+                lambda: app_core.generar_pdf_resultado(solicitud, res, comentarios="Benchmark"), repeticiones,
+            )
+
+        if "login" in operaciones:
+            usuarios = generar_usuarios(20)
+            app_core.save_users_to_file(usuarios)
+
+            def _login():
+                i = rng.randrange(20)
+                assert app_core.verify_user_login(f"usuario{i}@lab.local", f"clave{i}")
+            resultados["login"] = medir(_login, repeticiones)
+
+        resultados["_directorio"] = d
+    return resultados
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de app_core.")
+    ap.add_argument("--filas", type=int, nargs="+", default=[10_000])
+    ap.add_argument("--repeticiones", type=int, default=10)
+    ap.add_argument("--operaciones", nargs="+", default=OPERACIONES, choices=OPERACIONES)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": info_entorno(),
+        "repeticiones": args.repeticiones,
+        "resultados": {},
+    }
+    for n in args.filas:
+        print(f"== {n} filas ==")
+        r = bench_tamano(n, args.repeticiones, args.operaciones)
+        corrida["resultados"][str(n)] = r
+        for op, v in r.items():
+            if isinstance(v, dict):
+                print(f"  {op:<24} mediana {v['mediana_s'] * 1000:10.2f} ms   p95 {v['p95_s'] * 1000:10.2f} ms")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"app_core_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Bitácora de auditoría (auditoria.py).
+
+Por número de eventos mide:
+- registrar: costo por llamada en el hilo de la petición (solo encolar)
+- escritura: eventos/s del escritor de fondo con lotes (un fsync por lote)
+  contra un fsync por evento (LOTE_MAX = 1), y cuántos lotes hubo
+- consulta: eventos de un folio con el índice contra recorrer el archivo
+- verificar: eventos/s al recalcular la cadena completa
+
+Uso:
+    python -m benchmarks.bench_auditoria --eventos 10000 100000
+"""
+
+import argparse, json, os, random, statistics, time
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+
+
+def _cronometro(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t0
+
+def _emitir(auditoria, n: int, folios: list, rng: random.Random) -> list:
+    tiempos = []
+    for i in range(n):
+        folio = rng.choice(folios)
+        t0 = time.perf_counter()
+        auditoria.registrar("resultados", f"lab{i % 8}@bench", folio, estado_anterior="pendiente",
+                            estado="capturado", huella=f"{rng.getrandbits(128):032x}")
+        tiempos.append(time.perf_counter() - t0)
+    return tiempos
+
+def _escritura(auditoria, n: int, folios: list, rng: random.Random, lote_max: int) -> dict:
+    lotes = []
+    original, lote_previo = auditoria._escribir_lote, auditoria.LOTE_MAX
+
+    def _contar(eventos):
+        lotes.append(len(eventos))
+        return original(eventos)
+    auditoria._escribir_lote, auditoria.LOTE_MAX = _contar, lote_max
+    try:
+        t0 = time.perf_counter()
+        tiempos = _emitir(auditoria, n, folios, rng)
+        auditoria.vaciar()
+        dur = time.perf_counter() - t0
+    finally:
+        auditoria._escribir_lote, auditoria.LOTE_MAX = original, lote_previo
+    return {
+        "s": dur, "eventos_por_s": n / dur, "lotes": len(lotes),
+        "registrar_mediana_us": statistics.median(tiempos) * 1e6,
+        "registrar_p99_us": sorted(tiempos)[int(0.99 * (len(tiempos) - 1))] * 1e6,
+    }
+
+
+def bench_tamano(eventos: int, sin_agrupar: int, semilla: int = 2006) -> dict:
+    import auditoria
+
+    rng = random.Random(semilla)
+    folios = [f"2025{i:010d}" for i in range(max(100, eventos // 20))]
+    r = {"eventos": eventos}
+    with entorno_aislado():
+        r["agrupado"] = _escritura(auditoria, eventos, folios, rng, auditoria.LOTE_MAX)
+        # Un fsync por evento: lo que costaría escribir en la petición
+        r["sin_agrupar"] = _escritura(auditoria, sin_agrupar, folios, rng, 1)
+        r["bytes"] = os.path.getsize(auditoria.AUDITORIA_PATH)
+
+        muestra = rng.sample(folios, 50)
+        indice = auditoria.indice_compartido()
+        _, t_indexar = _cronometro(indice.actualizar)
+
+        def _por_indice():
+            return [len(auditoria.consultar(folio=f, limite=1000)) for f in muestra]
+
+        def _recorrido():
+            salida = []
+            for f in muestra:
+                with open(auditoria.AUDITORIA_PATH, "r", encoding="utf-8") as fh:
+                    salida.append(sum(1 for l in fh if json.loads(l)["folio"] == f))
+            return salida
+        n_indice, t_indice = _cronometro(_por_indice)
+        n_recorrido, t_recorrido = _cronometro(_recorrido)
+        assert n_indice == n_recorrido
+        r["consulta"] = {
+            "indexar_s": t_indexar,
+            "indice_ms": t_indice / len(muestra) * 1000,
+            "recorrido_ms": t_recorrido / len(muestra) * 1000,
+        }
+        v, t = _cronometro(auditoria.verificar)
+        r["verificar"] = {"s": t, "eventos_por_s": v["eventos"] / t, "ok": v["ok"]}
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de la bitácora de auditoría.")
+    ap.add_argument("--eventos", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--sin-agrupar", type=int, default=500, help="eventos con un fsync por evento")
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for n in args.eventos:
+        r = bench_tamano(n, args.sin_agrupar)
+        corrida["tamanos"][str(n)] = r
+        ag, sa, c = r["agrupado"], r["sin_agrupar"], r["consulta"]
+        print(f"== {n} eventos ({r['bytes'] / 2**20:.1f} MiB) ==")
+        print(f"  registrar        mediana {ag['registrar_mediana_us']:.1f} µs  p99 {ag['registrar_p99_us']:.1f} µs")
+        print(f"  escritura        agrupada {ag['eventos_por_s']:,.0f} ev/s en {ag['lotes']} lotes; "
+              f"fsync por evento {sa['eventos_por_s']:,.0f} ev/s")
+        print(f"  consulta folio   índice {c['indice_ms']:.2f} ms  recorrido {c['recorrido_ms']:.1f} ms  "
+              f"(indexar {c['indexar_s']:.2f} s)")
+        print(f"  verificar        {r['verificar']['eventos_por_s']:,.0f} ev/s  ok={r['verificar']['ok']}")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"auditoria_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Búsqueda en el catálogo de estudios: índice (catalogo_busqueda) contra la
+lista completa que antes se mandaba al multiselect.
+
+El catálogo real se amplía con variantes sintéticas (paneles, perfiles,
+métodos) hasta N estudios y las frecuencias de pedido siguen una Zipf. Se
+simula a un usuario tecleando nombres letra por letra (con y sin acentos y
+con algún error de dedo) y se mide por tecla:
+- indice: IndiceCatalogo.buscar (top 20), con y sin la caché de consultas
+- lista: filtrar la lista completa por subcadena normalizada
+además de la construcción del índice y los bytes que viajan al navegador.
+
+Uso:
+    python -m benchmarks.bench_catalogo --estudios 1000 5000 20000
+"""
+
+import argparse, json, os, random
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks import guardar_resultados, info_entorno
+from benchmarks.bench_app_core import medir
+from benchmarks.datos_sinteticos import catalogo
+
+
+PREFIJOS = ["Perfil", "Panel", "Determinación de", "Cuantificación de", "Anticuerpos", "Curva de"]
+SUFIJOS = ["en suero", "en orina de 24 h", "por ELISA", "por quimioluminiscencia", "ampliado", "pediátrico"]
+CATEGORIAS = ["General", "Hormonas", "Inmunología", "Microbiología", "Marcadores", "Toxicología"]
+
+
+def catalogo_sintetico(n: int, semilla: int = 2006) -> pd.DataFrame:
+    rng = random.Random(semilla)
+    base = catalogo()
+    nombres = base["Nombre"].astype(str).tolist()
+    filas = base[["Codigo", "Nombre", "Categoria", "Precio_MXN"]].to_dict("records")
+    vistos = set(nombres)
+    while len(filas) < n:
+        nombre = f"{rng.choice(PREFIJOS)} {rng.choice(nombres)} {rng.choice(SUFIJOS)}"
+        if nombre in vistos:
+            nombre = f"{nombre} {len(filas)}"
+        vistos.add(nombre)
+        filas.append({
+            "Codigo": f"SIN{len(filas):05d}", "Nombre": nombre,
+            "Categoria": rng.choice(CATEGORIAS), "Precio_MXN": rng.randrange(80, 4000, 10),
+        })
+    return pd.DataFrame(filas[:n])
+
+
+def frecuencias_zipf(nombres: list, semilla: int = 2006) -> dict:
+    rng = random.Random(semilla)
+    orden = nombres[:]
+    rng.shuffle(orden)
+    return {nom: int(10_000 / (i + 1)) for i, nom in enumerate(orden)}
+
+
+def tecleos(nombres: list, n: int, rng: random.Random) -> list:
+    """Consultas parciales como las teclearía recepción (hasta 8 letras)."""
+    from catalogo_busqueda import normalizar
+    consultas = []
+    for _ in range(n):
+        nombre = rng.choice(nombres)
+        texto = nombre if rng.random() < 0.5 else normalizar(nombre)
+        palabras = texto.split()
+        palabra = rng.choice(palabras)
+        if rng.random() < 0.15 and len(palabra) > 4:
+            i = rng.randrange(1, len(palabra) - 1)
+            palabra = palabra[:i] + palabra[i + 1:]  # letra omitida
+        for k in range(1, min(len(palabra), 8) + 1):
+            consultas.append(palabra[:k])
+    return consultas
+
+
+def bench_tamano(n: int, repeticiones: int, consultas_por_corrida: int = 50, semilla: int = 2006) -> dict:
+    from catalogo_busqueda import IndiceCatalogo, LIMITE, normalizar
+
+    rng = random.Random(semilla)
+    df = catalogo_sintetico(n, semilla)
+    nombres = df["Nombre"].tolist()
+    frec = frecuencias_zipf(nombres, semilla)
+    consultas = tecleos(nombres, consultas_por_corrida, rng)
+
+    indice = IndiceCatalogo(df, frec)
+    normalizados = [normalizar(x) for x in nombres]
+
+    def _por_indice():
+        # Caché vacía al inicio de cada pasada; dentro de ella se reaprovecha
+        indice._cache.clear()
+        for q in consultas:
+            indice.buscar(q, LIMITE)
+
+    def _por_indice_sin_cache():
+        for q in consultas:
+            indice._cache.clear()
+            indice.buscar(q, LIMITE)
+
+    def _por_lista():
+        for q in consultas:
+            nq = normalizar(q)
+            [x for x, nx in zip(nombres, normalizados) if nq in nx]
+
+    sin_resultado = sum(1 for q in consultas if not indice.buscar(q, LIMITE))
+    por_tecla = lambda r: {k: (v / len(consultas) if k.endswith("_s") else v) for k, v in r.items()}
+    return {
+        "estudios": n,
+        "tecleos": len(consultas),
+        "construccion": medir(lambda: IndiceCatalogo(df, frec), repeticiones),
+        "indice_por_tecla": por_tecla(medir(_por_indice, repeticiones)),
+        "indice_sin_cache_por_tecla": por_tecla(medir(_por_indice_sin_cache, repeticiones)),
+        "lista_por_tecla": por_tecla(medir(_por_lista, repeticiones)),
+        "bytes_lista_completa": len(json.dumps(nombres, ensure_ascii=False).encode()),
+        "bytes_top": len(json.dumps(indice.nombres("", LIMITE), ensure_ascii=False).encode()),
+        "tecleos_sin_resultado": sin_resultado,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark del índice de búsqueda del catálogo.")
+    ap.add_argument("--estudios", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for n in args.estudios:
+        r = bench_tamano(n, args.repeticiones)
+        corrida["tamanos"][str(n)] = r
+        print(f"== {n} estudios ({r['tecleos']} tecleos) ==")
+        print(f"  construcción {r['construccion']['mediana_s'] * 1000:8.1f} ms")
+        print(f"  índice       {r['indice_por_tecla']['mediana_s'] * 1e6:8.1f} µs/tecla   "
+              f"{r['bytes_top'] / 1024:8.1f} KiB al navegador")
+        print(f"  sin caché    {r['indice_sin_cache_por_tecla']['mediana_s'] * 1e6:8.1f} µs/tecla")
+        print(f"  lista        {r['lista_por_tecla']['mediana_s'] * 1e6:8.1f} µs/tecla   "
+              f"{r['bytes_lista_completa'] / 1024:8.1f} KiB al navegador")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"catalogo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Sobre comprimido de enc/dec (compresion.py) contra el formato de siempre.
+
+Genera resultados JSON de paneles de distintos tamaños (estudios del
+catálogo con unidad y rango fijos por estudio, como en un laboratorio real, y
+valores al azar) y para cada formato mide:
+- actual: Fernet sobre el texto (sin sobre)
+- zlib: sobre comprimido sin diccionario
+- zlib_dicc: sobre con diccionario entrenado sobre otra muestra
+el tamaño del CSV con la columna Resultados_enc, el tiempo de cifrar la
+columna y el de leerla (read_csv + dec por celda).
+
+Uso:
+    python -m benchmarks.bench_compresion --filas 20000 --estudios 3 10 40
+"""
+
+import argparse, json, os, random, time
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import UNIDADES, catalogo
+
+
+SIN_COMPRIMIR = 10**12
+
+
+def _cronometro(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t0
+
+def _panel(rng: random.Random, estudios: list, k: int) -> str:
+    res = {}
+    for est in rng.sample(estudios, min(k, len(estudios))):
+        # Unidad y rango de referencia dependen del estudio, no de la orden
+        fijo = random.Random(est)
+        ref_min = round(fijo.uniform(1, 100), 1)
+        res[est] = {
+            "valor": f"{rng.uniform(0.5, 250):.1f}",
+            "unidad": fijo.choice(UNIDADES),
+            "ref": f"{ref_min} - {round(ref_min * fijo.uniform(1.2, 3), 1)}",
+        }
+    return json.dumps(res, ensure_ascii=False)
+
+
+def bench_panel(filas: int, k: int, estudios: list, semilla: int = 2006) -> dict:
+    import pandas as pd
+    import app_core, compresion
+
+    rng = random.Random(semilla + k)
+    textos = [_panel(rng, estudios, max(1, int(rng.gauss(k, k / 4)))) for _ in range(filas)]
+    entrenamiento = [_panel(rng, estudios, max(1, int(rng.gauss(k, k / 4)))) for _ in range(2000)]
+    r = {"estudios": k, "filas": filas,
+         "texto_promedio_bytes": sum(len(t.encode()) for t in textos) / filas}
+    previo = compresion.UMBRAL
+    with entorno_aislado() as d:
+        try:
+            for formato in ("actual", "zlib", "zlib_dicc"):
+                compresion.UMBRAL = SIN_COMPRIMIR if formato == "actual" else previo
+                if formato == "zlib_dicc":
+                    compresion.guardar_diccionario(compresion.entrenar(entrenamiento))
+                ruta = os.path.join(d, f"{formato}.csv")
+                columna, t_enc = _cronometro(lambda: [app_core.enc(t) for t in textos])
+                pd.DataFrame({"Folio": [f"{i:014d}" for i in range(filas)],
+                              "Resultados_enc": columna}).to_csv(ruta, index=False)
+
+                def _leer():
+                    df = pd.read_csv(ruta, dtype=str)
+                    return df["Resultados_enc"].map(app_core.dec)
+                claros, t_leer = _cronometro(_leer)
+                assert claros.tolist() == textos
+                r[formato] = {"bytes": os.path.getsize(ruta), "cifrar_s": t_enc, "leer_s": t_leer,
+                              "token_promedio_bytes": sum(map(len, columna)) / filas}
+        finally:
+            compresion.UMBRAL = previo
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark del sobre comprimido de enc/dec.")
+    ap.add_argument("--filas", type=int, default=20_000)
+    ap.add_argument("--estudios", type=int, nargs="+", default=[3, 10, 40],
+                    help="estudios promedio por orden (tamaño del panel)")
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    estudios = catalogo()["Nombre"].astype(str).tolist()
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "paneles": {}}
+    for k in args.estudios:
+        r = bench_panel(args.filas, k, estudios)
+        corrida["paneles"][str(k)] = r
+        base = r["actual"]
+        print(f"== {k} estudios por orden, {args.filas} filas (texto {r['texto_promedio_bytes']:.0f} B) ==")
+        for formato in ("actual", "zlib", "zlib_dicc"):
+            f = r[formato]
+            print(f"  {formato:<10} token {f['token_promedio_bytes']:7.0f} B  "
+                  f"CSV {f['bytes'] / 2**20:6.1f} MiB ({f['bytes'] / base['bytes']:5.0%})  "
+                  f"cifrar {f['cifrar_s']:.2f} s  leer {f['leer_s']:.2f} s ({base['leer_s'] / f['leer_s']:.2f}x)")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"compresion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
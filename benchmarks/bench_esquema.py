@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Carga de la tabla de órdenes: sin tipos vs. esquema explícito (motor C y Arrow).
+
+Para cada variante mide tiempo de carga (mediana), memoria residente de la
+tabla (memory_usage(deep=True)) y el costo de buscar un folio.
+
+Uso:
+    python -m benchmarks.bench_esquema --filas 100000 500000
+"""
+
+import argparse, os, random
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.bench_app_core import medir
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+def _variantes():
+    import pandas as pd
+    import app_core
+
+    def sin_tipos():
+        # Como leía read_csv antes del esquema
+        return pd.read_csv(app_core.CSV_PATH)
+
+    def esquema(motor):
+        def _leer():
+            previo = app_core.CSV_MOTOR
+            app_core.CSV_MOTOR = motor
+            try:
+                return app_core.read_csv()
+            finally:
+                app_core.CSV_MOTOR = previo
+        return _leer
+
+    variantes = {"sin_tipos": (sin_tipos, lambda df, f: df[df["Folio"].astype(str) == f])}
+    tipado = lambda df, f: df[df["Folio"] == f]
+    variantes["esquema_c"] = (esquema("c"), tipado)
+    if app_core._HAY_ARROW:
+        variantes["esquema_pyarrow"] = (esquema("pyarrow"), tipado)
+    return variantes
+
+
+def bench_tamano(filas: int, repeticiones: int, semilla: int = 2006) -> dict:
+    import app_core
+
+    rng = random.Random(semilla)
+    resultados = {}
+    with entorno_aislado():
+        generar_tabla(filas, app_core.CSV_PATH, semilla=semilla)
+        resultados["_bytes_csv"] = os.path.getsize(app_core.CSV_PATH)
+        folios = app_core.read_csv(columnas=["Folio"])["Folio"].tolist()
+        muestra = [rng.choice(folios) for _ in range(repeticiones)]
+
+        for nombre, (leer, buscar) in _variantes().items():
+            carga = medir(leer, repeticiones)
+            df = leer()
+            it = iter(muestra * 2)
+            resultados[nombre] = {
+                "carga": carga,
+                "memoria_bytes": int(df.memory_usage(deep=True).sum()),
+                "busqueda_folio": medir(lambda: buscar(df, next(it)), repeticiones, calentamiento=0),
+                "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+            }
+            del df
+    return resultados
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de carga de la tabla con y sin esquema.")
+    ap.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for filas in args.filas:
+        print(f"== {filas} filas ==")
+        r = bench_tamano(filas, args.repeticiones)
+        corrida["tamanos"][str(filas)] = r
+        for nombre, v in r.items():
+            if nombre.startswith("_"):
+                continue
+            print(f"  {nombre:<16} carga {v['carga']['mediana_s'] * 1000:9.1f} ms  "
+                  f"memoria {v['memoria_bytes'] / 2**20:8.1f} MiB  "
+                  f"búsqueda {v['busqueda_folio']['mediana_s'] * 1000:7.2f} ms")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"esquema_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación para BI: export_excel (XLSX en claro) contra exportacion.py.
+
+Por tamaño de tabla mide tiempo de exportación, tamaño del archivo y cuánto
+tarda BI en leerlo, para:
+- excel: decrypt_view + export_excel (limitado a 1,048,576 filas)
+- parquet / arrow: columnas por defecto con seudónimos
+- proyeccion: Parquet solo con Folio, Fecha_Registro, Estado y Costo_MXN
+- incremental: Parquet tras capturar resultados en K órdenes
+
+Uso:
+    python -m benchmarks.bench_exportacion --filas 20000 100000 --cambios 50
+"""
+
+import argparse, json, os, random, time
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+LIMITE_EXCEL = 1_048_575
+
+
+def _cronometro(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t0
+
+
+def bench_tamano(filas: int, cambios: int, excel: bool = True, semilla: int = 2006) -> dict:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import app_core, exportacion
+
+    rng = random.Random(semilla)
+    r = {"filas": filas}
+    with entorno_aislado() as d:
+        generar_tabla(filas, app_core.CSV_PATH, semilla=semilla)
+
+        if excel and filas <= LIMITE_EXCEL:
+            _, t = _cronometro(lambda: app_core.export_excel(app_core.decrypt_view(app_core.read_csv())))
+            _, t_leer = _cronometro(lambda: pd.read_excel(app_core.XLSX_PATH))
+            r["excel"] = {"s": t, "bytes": os.path.getsize(app_core.XLSX_PATH), "lectura_s": t_leer}
+
+        def _leer_arrow(path):
+            with pa.memory_map(path) as src:
+                return pa.ipc.open_file(src).read_all()
+
+        variantes = {
+            "parquet": dict(formato="parquet"),
+            "arrow": dict(formato="arrow"),
+            "proyeccion": dict(formato="parquet", columnas=["Folio", "Fecha_Registro", "Estado", "Costo_MXN"]),
+        }
+        for nombre, kw in variantes.items():
+            res, t = _cronometro(lambda: exportacion.exportar(os.path.join(d, nombre), **kw))
+            leer = _leer_arrow if kw["formato"] == "arrow" else pq.read_table
+            _, t_leer = _cronometro(lambda: leer(res["archivo"]))
+            r[nombre] = {"s": t, "bytes": os.path.getsize(res["archivo"]), "lectura_s": t_leer,
+                         "filas_por_s": res["filas"] / t}
+
+        folios = app_core.read_csv(columnas=["Folio"])["Folio"].tolist()
+        for f in rng.sample(folios, cambios):
+            app_core.save_results(f, json.dumps({"Glucosa": {"valor": f"{rng.uniform(60, 200):.1f}"}}))
+        res, t = _cronometro(lambda: exportacion.exportar(os.path.join(d, "parquet"), incremental=True))
+        r["incremental"] = {"s": t, "filas": res["filas"], "bytes": os.path.getsize(res["archivo"])}
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de exportación para BI (Excel vs Parquet/Arrow).")
+    ap.add_argument("--filas", type=int, nargs="+", default=[20_000, 100_000])
+    ap.add_argument("--cambios", type=int, default=50)
+    ap.add_argument("--sin-excel", action="store_true", help="omite export_excel (muy lento en tablas grandes)")
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for filas in args.filas:
+        r = bench_tamano(filas, args.cambios, excel=not args.sin_excel)
+        corrida["tamanos"][str(filas)] = r
+        print(f"== {filas} filas ==")
+        for nombre in ("excel", "parquet", "arrow", "proyeccion"):
+            if nombre in r:
+                v = r[nombre]
+                print(f"  {nombre:<12} exportar {v['s']:7.2f} s  {v['bytes'] / 2**20:8.1f} MiB  "
+                      f"leer {v['lectura_s']:6.2f} s")
+        inc = r["incremental"]
+        print(f"  incremental  exportar {inc['s']:7.2f} s  {inc['filas']} filas")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"exportacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
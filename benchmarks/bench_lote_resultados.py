@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Captura y firma por lote: save_results_lote contra un save_results por folio.
+
+Sobre una tabla de N filas toma K órdenes sin firmar (cierre de turno), arma
+sus resultados completos y mide para cada modo el tiempo total, los folios
+por segundo y las escrituras del CSV:
+- uno_por_uno: K llamadas a save_results(liberar=True)
+- lote: una llamada a save_results_lote con los K folios
+Verifica que ambos modos dejen las mismas órdenes firmadas.
+
+Uso:
+    python -m benchmarks.bench_lote_resultados --filas 20000 --folios 50 200
+"""
+
+import argparse, json, os, random, time
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+def _items(app_core, folios: list, rng: random.Random) -> list:
+    df = app_core.read_csv(columnas=["Folio", "Tipo_Estudio"])
+    tipos = dict(zip(df["Folio"], df["Tipo_Estudio"]))
+    return [{
+        "folio": f, "liberar": True,
+        "resultados": {e: {"valor": f"{rng.uniform(0.5, 250):.1f}", "unidad": "mg/dL", "ref": "1 - 2"}
+                       for e in app_core.estudios_de_orden(tipos[f])},
+    } for f in folios]
+
+def _contar_escrituras(app_core, fn):
+    """Corre fn contando las llamadas a write_csv."""
+    original, n = app_core.write_csv, [0]
+
+    def _contado(*a, **kw):
+        n[0] += 1
+        return original(*a, **kw)
+    app_core.write_csv = _contado
+    try:
+        t0 = time.perf_counter()
+        r = fn()
+        return r, time.perf_counter() - t0, n[0]
+    finally:
+        app_core.write_csv = original
+
+
+def bench_tamano(filas: int, k: int, semilla: int = 2006) -> dict:
+    import app_core, auditoria
+
+    rng = random.Random(semilla)
+    r = {"filas": filas, "folios": k}
+    firmados = {}
+    for modo in ("uno_por_uno", "lote"):
+        with entorno_aislado():
+            generar_tabla(filas, app_core.CSV_PATH, semilla=semilla, dias=30)
+            df = app_core.read_csv(columnas=["Folio", "Estado"])
+            candidatos = sorted(df.loc[df["Estado"] != "firmado", "Folio"])
+            folios = random.Random(semilla).sample(candidatos, min(k, len(candidatos)))
+            items = _items(app_core, folios, rng)
+            if modo == "uno_por_uno":
+                def _correr():
+                    for it in items:
+                        app_core.save_results(it["folio"], json.dumps(it["resultados"], ensure_ascii=False),
+                                              liberar=True, usuario="bench")
+            else:
+                def _correr():
+                    rep = app_core.save_results_lote(items, usuario="bench")
+                    assert all(x["ok"] for x in rep), [x for x in rep if not x["ok"]][:3]
+            _, t, escrituras = _contar_escrituras(app_core, _correr)
+            auditoria.vaciar()
+            df = app_core.read_csv(columnas=["Folio", "Estado"])
+            firmados[modo] = set(df.loc[df["Estado"] == "firmado", "Folio"])
+            r[modo] = {"s": t, "folios_por_s": len(items) / t, "escrituras_csv": escrituras}
+    assert firmados["uno_por_uno"] == firmados["lote"]
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de captura y firma por lote.")
+    ap.add_argument("--filas", type=int, nargs="+", default=[20_000])
+    ap.add_argument("--folios", type=int, nargs="+", default=[50, 200])
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for n in args.filas:
+        for k in args.folios:
+            r = bench_tamano(n, k)
+            corrida["tamanos"][f"{n}x{k}"] = r
+            u, l = r["uno_por_uno"], r["lote"]
+            print(f"== {n} filas, {k} folios ==")
+            print(f"  uno por uno   {u['s']:7.2f} s  {u['folios_por_s']:8.1f} folios/s  {u['escrituras_csv']} escrituras")
+            print(f"  lote          {l['s']:7.2f} s  {l['folios_por_s']:8.1f} folios/s  {l['escrituras_csv']} escrituras"
+                  f"  ({u['s'] / l['s']:.0f}x)")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"lote_resultados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Respaldos incrementales (respaldos.py) contra copiar los archivos completos.
+
+Por tamaño de tabla mide:
+- copia: copiar CSV, usuarios y resultados_pdf/ tal cual (lo que se hacía)
+- inicial: primera instantánea (MB/s leídos y bytes guardados)
+- sin_cambios: instantánea sin escrituras de por medio
+- incremental: instantánea después de capturar resultados en K órdenes
+- restauracion: reconstruir la última instantánea (MB/s escritos)
+- escritores: latencia de save_results mientras corre un respaldo contra en
+  reposo (el respaldo no debe bloquear a la app)
+
+Uso:
+    python -m benchmarks.bench_respaldos --filas 20000 100000 --cambios 10
+"""
+
+import argparse, json, os, random, shutil, statistics, tempfile, threading, time
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+def _tam_dir(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(r, a)) for r, _, fs in os.walk(path) for a in fs)
+
+def _cronometro(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t0
+
+def _capturar(app_core, folios: list, rng: random.Random, n: int) -> list:
+    tiempos = []
+    for f in rng.sample(folios, n):
+        res = json.dumps({"Glucosa": {"valor": f"{rng.uniform(60, 200):.1f}", "unidad": "mg/dL"}})
+        tiempos.append(_cronometro(lambda: app_core.save_results(f, res))[1])
+    return tiempos
+
+
+def bench_tamano(filas: int, cambios: int, pdfs: int, semilla: int = 2006) -> dict:
+    import app_core, almacen_pdf, respaldos
+
+    rng = random.Random(semilla)
+    r = {"filas": filas}
+    with entorno_aislado() as d:
+        respaldos_previo = respaldos.RESPALDOS_DIR
+        respaldos.RESPALDOS_DIR = os.path.join(d, "respaldos")
+        try:
+            generar_tabla(filas, app_core.CSV_PATH, semilla=semilla)
+            app_core.write_csv(app_core.read_csv())  # mismo formato que escribe la app
+            app_core.save_users_to_file({"admin@bench": app_core.make_user("x", "admin")})
+            folios = app_core.read_csv(columnas=["Folio"])["Folio"].tolist()
+            for i in range(pdfs):
+                almacen_pdf.guardar_pdf(folios[i], rng.randbytes(200_000))
+            datos = [app_core.CSV_PATH, str(app_core.USERS_FILE), almacen_pdf.PDF_DIR]
+            r["bytes_datos"] = sum(_tam_dir(p) if os.path.isdir(p) else os.path.getsize(p) for p in datos)
+
+            def _copia():
+                dest = tempfile.mkdtemp(dir=d)
+                for p in datos:
+                    if os.path.isdir(p):
+                        shutil.copytree(p, os.path.join(dest, os.path.basename(p)))
+                    else:
+                        shutil.copy2(p, dest)
+                return _tam_dir(dest)
+            bytes_copia, t = _cronometro(_copia)
+            r["copia"] = {"s": t, "bytes": bytes_copia}
+
+            for etapa in ("inicial", "sin_cambios", "incremental"):
+                if etapa == "incremental":
+                    _capturar(app_core, folios, rng, cambios)
+                antes = _tam_dir(respaldos.RESPALDOS_DIR) if os.path.isdir(respaldos.RESPALDOS_DIR) else 0
+                res, t = _cronometro(respaldos.respaldar)
+                r[etapa] = {
+                    "s": t,
+                    "mb_s_leidos": res["bytes_leidos"] / 2**20 / t if res["bytes_leidos"] else None,
+                    "bytes_guardados": _tam_dir(respaldos.RESPALDOS_DIR) - antes,
+                    "trozos_nuevos": res["trozos_nuevos"],
+                }
+            r["bytes_respaldos"] = _tam_dir(respaldos.RESPALDOS_DIR)
+
+            dest = tempfile.mkdtemp(dir=d)
+            res, t = _cronometro(lambda: respaldos.restaurar(dest))
+            r["restauracion"] = {"s": t, "mb_s": res["bytes"] / 2**20 / t, "archivos": res["archivos"]}
+
+            # Escritores con y sin un respaldo corriendo en paralelo
+            reposo = _capturar(app_core, folios, rng, cambios)
+            durante, fin = [], threading.Event()
+
+            def _respaldo_largo():
+                while not fin.is_set():
+                    respaldos.respaldar()
+            hilo = threading.Thread(target=_respaldo_largo)
+            hilo.start()
+            try:
+                durante = _capturar(app_core, folios, rng, cambios)
+            finally:
+                fin.set()
+                hilo.join()
+            r["escritores"] = {
+                "reposo_mediana_ms": statistics.median(reposo) * 1000,
+                "durante_respaldo_mediana_ms": statistics.median(durante) * 1000,
+                "durante_respaldo_max_ms": max(durante) * 1000,
+            }
+        finally:
+            respaldos.RESPALDOS_DIR = respaldos_previo
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de respaldos incrementales y restauración.")
+    ap.add_argument("--filas", type=int, nargs="+", default=[20_000, 100_000])
+    ap.add_argument("--cambios", type=int, default=10)
+    ap.add_argument("--pdfs", type=int, default=20)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for filas in args.filas:
+        r = bench_tamano(filas, args.cambios, args.pdfs)
+        corrida["tamanos"][str(filas)] = r
+        mib = lambda b: b / 2**20
+        print(f"== {filas} filas ({mib(r['bytes_datos']):.1f} MiB de datos) ==")
+        print(f"  copia completa   {r['copia']['s']:7.2f} s  {mib(r['copia']['bytes']):8.1f} MiB")
+        for etapa in ("inicial", "sin_cambios", "incremental"):
+            e = r[etapa]
+            vel = f"{e['mb_s_leidos']:7.1f} MB/s" if e["mb_s_leidos"] else " " * 12
+            print(f"  {etapa:<16} {e['s']:7.2f} s  {mib(e['bytes_guardados']):8.2f} MiB  {vel}")
+        print(f"  restauración     {r['restauracion']['s']:7.2f} s  {r['restauracion']['mb_s']:7.1f} MB/s")
+        esc = r["escritores"]
+        print(f"  save_results     reposo {esc['reposo_mediana_ms']:.1f} ms, durante respaldo "
+              f"{esc['durante_respaldo_mediana_ms']:.1f} ms (máx {esc['durante_respaldo_max_ms']:.1f} ms)")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"respaldos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Retención y archivo (retencion.py).
+
+Por tamaño de tabla (órdenes repartidas en 4 años) mide:
+- la pasada de archivo: tiempo, filas/s, memoria pico de Python y cuánto
+  tuvo tomado el candado de escritura del CSV
+- la tabla viva antes y después: bytes, read_csv, decrypt_view y filter_df
+- el archivo: bytes de los segmentos y latencia de buscar un folio archivado
+- la purga de los meses fuera del plazo de conservación
+
+Uso:
+    python -m benchmarks.bench_retencion --filas 20000 100000
+"""
+
+import argparse, os, random, statistics, time, tracemalloc
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+DIAS = 4 * 365
+
+
+def _cronometro(fn):
+    t0 = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t0
+
+def _tabla_viva(app_core) -> dict:
+    df, t_leer = _cronometro(app_core.read_csv)
+    vista, t_desc = _cronometro(lambda: app_core.decrypt_view(df))
+    _, t_filtro = _cronometro(lambda: app_core.filter_df(vista, "Garcia"))
+    return {"filas": len(df), "bytes": os.path.getsize(app_core.CSV_PATH), "read_csv_s": t_leer,
+            "decrypt_view_s": t_desc, "filter_df_s": t_filtro}
+
+
+def bench_tamano(filas: int, meses: int, purga: int, consultas: int, semilla: int = 2006) -> dict:
+    import app_core, retencion
+
+    rng = random.Random(semilla)
+    r = {"filas": filas}
+    with entorno_aislado():
+        generar_tabla(filas, app_core.CSV_PATH, semilla=semilla, dias=DIAS)
+        folios = app_core.read_csv(columnas=["Folio"])["Folio"].tolist()
+        r["antes"] = _tabla_viva(app_core)
+
+        tracemalloc.start()
+        res, t = _cronometro(lambda: retencion.archivar(meses))
+        _, pico_py = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        r["archivar"] = {
+            "s": t, "filas_por_s": res["leidas"] / t, "archivadas": res["archivadas"], "bloqueo_s": res["bloqueo_s"],
+            # Solo memoria de Python; los lotes de Arrow son de BYTES_LECTURA
+            "segmentos": len(res["segmentos"]), "pico_python_mib": pico_py / 2**20,
+        }
+        r["despues"] = _tabla_viva(app_core)
+        est = retencion.estado()
+        r["archivo"] = {"bytes": est["bytes"], "filas": est["filas"]}
+        assert r["despues"]["filas"] + est["filas"] == filas
+
+        vivos = set(app_core.read_csv(columnas=["Folio"])["Folio"])
+        archivados = [f for f in folios if f not in vivos]
+        tiempos = []
+        for f in rng.sample(archivados, min(consultas, len(archivados))):
+            o, t = _cronometro(lambda: retencion.orden_archivada(f))
+            assert o and o["Folio"] == f
+            tiempos.append(t)
+        if tiempos:
+            r["busqueda_archivada_ms"] = {"mediana": statistics.median(tiempos) * 1000,
+                                          "max": max(tiempos) * 1000}
+        res, t = _cronometro(lambda: retencion.purgar(purga))
+        r["purgar"] = {"s": t, "filas": res["filas"], "segmentos": len(res["segmentos"])}
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de retención y archivo de órdenes.")
+    ap.add_argument("--filas", type=int, nargs="+", default=[20_000, 100_000])
+    ap.add_argument("--meses", type=int, default=12, help="antigüedad para archivar")
+    ap.add_argument("--purga", type=int, default=36, help="antigüedad para purgar (meses)")
+    ap.add_argument("--consultas", type=int, default=50)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(), "tamanos": {}}
+    for n in args.filas:
+        r = bench_tamano(n, args.meses, args.purga, args.consultas)
+        corrida["tamanos"][str(n)] = r
+        a, d, ar = r["antes"], r["despues"], r["archivar"]
+        print(f"== {n} filas ==")
+        print(f"  archivar         {ar['s']:.2f} s ({ar['filas_por_s']:,.0f} filas/s), {ar['archivadas']} filas "
+              f"en {ar['segmentos']} segmentos; pico Python {ar['pico_python_mib']:.1f} MiB; "
+              f"candado del CSV {ar['bloqueo_s'] * 1000:.0f} ms")
+        print(f"  tabla viva       {a['filas']} -> {d['filas']} filas, "
+              f"{a['bytes'] / 2**20:.1f} -> {d['bytes'] / 2**20:.1f} MiB "
+              f"(archivo {r['archivo']['bytes'] / 2**20:.1f} MiB)")
+        for k in ("read_csv_s", "decrypt_view_s", "filter_df_s"):
+            print(f"  {k[:-2]:<16} {a[k] * 1000:8.1f} ms -> {d[k] * 1000:8.1f} ms")
+        if "busqueda_archivada_ms" in r:
+            b = r["busqueda_archivada_ms"]
+            print(f"  folio archivado  mediana {b['mediana']:.1f} ms  máx {b['max']:.1f} ms")
+        print(f"  purgar           {r['purgar']['s']:.2f} s, {r['purgar']['filas']} filas "
+              f"en {r['purgar']['segmentos']} segmentos")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"retencion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
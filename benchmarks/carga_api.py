@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de la API ASGI (api_lis).
+
+Por defecto llama al callable ASGI en el mismo proceso (sin red ni servidor),
+lo que mide el costo de la app y de app_core. Con --url se prueba un servidor
+real (p. ej. uvicorn) usando http.client en hilos.
+
+Uso:
+    python -m benchmarks.carga_api --clientes 16 --peticiones 50
+    python -m benchmarks.carga_api --url http://127.0.0.1:8600 --clientes 16
+"""
+
+import argparse, asyncio, json, os, random, statistics, time, http.client
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+# Mezcla de operaciones (peso relativo)
+MEZCLA = [
+    ("buscar_pagina", 30),
+    ("buscar_texto", 10),
+    ("orden", 30),
+    ("crear_orden", 10),
+    ("crear_lote", 2),
+    ("resultados", 15),
+    ("pdf", 3),
+]
+
+
+# -------------------------
+# Clientes
+# -------------------------
+class ClienteASGI:
+    """Invoca la app ASGI directamente."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def peticion(self, metodo: str, ruta: str, cuerpo=None, token: str = ""):
+        path, _, query = ruta.partition("?")
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+        headers = [(b"content-type", b"application/json")]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        scope = {"type": "http", "method": metodo, "path": path,
+                 "query_string": query.encode(), "headers": headers}
+        enviado = False
+
+        async def receive():
+            nonlocal enviado
+            if enviado:
+                return {"type": "http.disconnect"}
+            enviado = True
+            return {"type": "http.request", "body": datos, "more_body": False}
+
+        respuesta = {}
+
+        async def send(msg):
+            if msg["type"] == "http.response.start":
+                respuesta["status"] = msg["status"]
+            else:
+                respuesta["body"] = msg.get("body", b"")
+
+        await self.app(scope, receive, send)
+        return respuesta["status"], respuesta.get("body", b"")
+
+class ClienteHTTP:
+    """Servidor real; http.client bloqueante en un pool de hilos."""
+
+    def __init__(self, url: str, hilos: int):
+        u = urlparse(url)
+        self.host, self.puerto = u.hostname, u.port or 80
+        self.pool = ThreadPoolExecutor(max_workers=hilos)
+
+    def _sync(self, metodo, ruta, cuerpo, token):
+        c = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        c.request(metodo, ruta, body=json.dumps(cuerpo) if cuerpo is not None else None, headers=headers)
+        r = c.getresponse()
+        body = r.read()
+        c.close()
+        return r.status, body
+
+    async def peticion(self, metodo, ruta, cuerpo=None, token=""):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._sync, metodo, ruta, cuerpo, token)
+
+
+# -------------------------
+# Escenario
+# -------------------------
+async def _cliente(cid: int, cli, tokens: dict, folios: list, n: int, registro: list, semilla: int):
+    rng = random.Random(semilla + cid)
+    ops, pesos = zip(*MEZCLA)
+    for _ in range(n):
+        op = rng.choices(ops, pesos)[0]
+        folio = rng.choice(folios)
+        if op == "buscar_pagina":
+            args = ("GET", f"/ordenes?pagina={rng.randint(1, 20)}&por_pagina=50", None, tokens["recepcion"])
+        elif op == "buscar_texto":
+            args = ("GET", f"/ordenes?q={rng.choice(['garcia', 'SMAC', '2025'])}", None, tokens["recepcion"])
+        elif op == "orden":
+            args = ("GET", f"/ordenes/{folio}", None, tokens["lab"])
+        elif op == "crear_orden":
+            args = ("POST", "/ordenes", {"nombre": f"API {cid}", "estudios": ["SMAC 24"], "costo": 300}, tokens["recepcion"])
+        elif op == "crear_lote":
+            lote = [{"nombre": f"API lote {cid}-{i}", "estudios": ["SMAC 24"]} for i in range(20)]
+            args = ("POST", "/ordenes/lote", {"ordenes": lote}, tokens["recepcion"])
+        elif op == "resultados":
+            res = {"SMAC 24": {"valor": f"{rng.uniform(1, 100):.1f}", "unidad": "mg/dL", "ref": ""}}
+            args = ("POST", "/resultados", {"folio": folio, "resultados": res}, tokens["lab"])
+        else:
+            args = ("GET", f"/ordenes/{folio}/pdf", None, tokens["lab"])
+        t0 = time.perf_counter()
+        status, _ = await cli.peticion(*args)
+        registro.append((op, time.perf_counter() - t0, status))
+
+
+def _percentil(v: list, q: float) -> float:
+    v = sorted(v)
+    return v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+
+def resumen(registro: list, duracion: float) -> dict:
+    por_op = {}
+    for op, dur, status in registro:
+        por_op.setdefault(op, {"t": [], "errores": 0})
+        por_op[op]["t"].append(dur)
+        if status >= 400:
+            por_op[op]["errores"] += 1
+    return {
+        "peticiones": len(registro),
+        "duracion_s": duracion,
+        "throughput_por_s": len(registro) / duracion if duracion else 0.0,
+        "por_operacion": {
+            op: {
+                "n": len(v["t"]), "errores": v["errores"],
+                "p50_ms": _percentil(v["t"], 0.5) * 1000,
+                "p95_ms": _percentil(v["t"], 0.95) * 1000,
+                "p99_ms": _percentil(v["t"], 0.99) * 1000,
+                "promedio_ms": statistics.fmean(v["t"]) * 1000,
+            }
+            for op, v in sorted(por_op.items())
+        },
+    }
+
+
+async def _correr(cli, clientes: int, peticiones: int, folios: list, semilla: int, credenciales: dict) -> dict:
+    tokens = {}
+    for rol, (usuario, pwd) in credenciales.items():
+        status, body = await cli.peticion("POST", "/auth/token", {"usuario": usuario, "password": pwd})
+        if status != 200:
+            raise RuntimeError(f"No se pudo autenticar {usuario}: {body[:200]}")
+        tokens[rol] = json.loads(body)["token"]
+    registro = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        _cliente(i, cli, tokens, folios, peticiones, registro, semilla) for i in range(clientes)
+    ))
+    return resumen(registro, time.perf_counter() - t0)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Prueba de carga de la API ASGI.")
+    ap.add_argument("--clientes", type=int, default=8)
+    ap.add_argument("--peticiones", type=int, default=25, help="peticiones por cliente")
+    ap.add_argument("--filas-base", type=int, default=5_000)
+    ap.add_argument("--url", default=None, help="probar un servidor ya levantado")
+    ap.add_argument("--usuario-recepcion", default="recep@carga.local:recep123")
+    ap.add_argument("--usuario-lab", default="lab@carga.local:lab123")
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+    semilla = 2006
+    credenciales = {
+        "recepcion": tuple(args.usuario_recepcion.split(":", 1)),
+        "lab": tuple(args.usuario_lab.split(":", 1)),
+    }
+
+    if args.url:
+        import app_core
+        folios = app_core.read_csv()["Folio"].astype(str).tolist() or ["0"]
+        cli = ClienteHTTP(args.url, hilos=args.clientes)
+        r = asyncio.run(_correr(cli, args.clientes, args.peticiones, folios, semilla, credenciales))
+    else:
+        import app_core
+        with entorno_aislado():
+            generar_tabla(args.filas_base, app_core.CSV_PATH, semilla=semilla, procesos=1)
+            app_core.save_users_to_file({
+                u: app_core.make_user(p, rol) for rol, (u, p) in credenciales.items()
+            })
+            import api_lis
+            folios = app_core.read_csv()["Folio"].astype(str).tolist()
+            r = asyncio.run(_correr(ClienteASGI(api_lis.app), args.clientes, args.peticiones,
+                                    folios, semilla, credenciales))
+
+    print(f"{r['peticiones']} peticiones en {r['duracion_s']:.1f} s ({r['throughput_por_s']:.1f}/s)")
+    for op, v in r["por_operacion"].items():
+        print(f"  {op:<14} n={v['n']:<5} err={v['errores']:<3} p50 {v['p50_ms']:8.1f}  "
+              f"p95 {v['p95_ms']:8.1f}  p99 {v['p99_ms']:8.1f} ms")
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(),
+               "clientes": args.clientes, "peticiones_por_cliente": args.peticiones,
+               "url": args.url, "resultados": r}
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"carga_api_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
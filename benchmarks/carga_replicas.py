@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Capacidad de sesiones con varias réplicas (procesos) sobre el mismo almacén.
+
+Cada réplica es un proceso con sus propias sesiones simuladas (AppTest, como
+carga_streamlit) apuntando al mismo directorio de datos, igual que varias
+instancias de streamlit_app.py detrás de replicas.py. Por número de réplicas
+reporta throughput, p95 y eficiencia frente a una sola réplica, y verifica la
+integridad del almacén compartido (órdenes perdidas, folios duplicados,
+resultados perdidos).
+
+La escala esperada es ~lineal mientras haya núcleos libres: cada réplica
+tiene su propio GIL y solo las escrituras se serializan (flock). Con un solo
+núcleo el throughput total no sube; la prueba de integridad sigue valiendo.
+
+Uso:
+    python -m benchmarks.carga_replicas --replicas 1 2 4 --recepcion 2 --lab 2 --iteraciones 5
+"""
+
+import argparse, json, multiprocessing, os, tempfile
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.carga_streamlit import (
+    correr_sesiones, preparar_datos, resumen_latencias, verificar_integridad,
+)
+
+
+def _replica(directorio: str, i: int, sesiones: dict, iteraciones: int, folios: list, semilla: int) -> dict:
+    with entorno_aislado(directorio):
+        r = correr_sesiones(sesiones["recepcion"], sesiones["lab"], sesiones["reportes"],
+                            iteraciones, folios, semilla, sid_inicial=i * 1000)
+    r["pid"] = os.getpid()
+    return r
+
+
+def correr_replicas(replicas: int, sesiones: dict, iteraciones: int,
+                    filas_base: int = 2_000, semilla: int = 2006) -> dict:
+    directorio = tempfile.mkdtemp(prefix="lis_replicas_")
+    with entorno_aislado(directorio):
+        folios = preparar_datos(filas_base, semilla)
+
+    # Folios de laboratorio disjuntos por réplica (ver correr_sesiones)
+    tareas = [(directorio, i, sesiones, iteraciones, folios[i::replicas], semilla) for i in range(replicas)]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(replicas) as pool:
+        resultados = pool.starmap(_replica, tareas)
+
+    registro = [x for r in resultados for x in r["registro"]]
+    esperados = [x for r in resultados for x in r["esperados"]]
+    escritos = {k: v for r in resultados for k, v in r["escritos"].items()}
+    duracion = max(r["duracion_s"] for r in resultados)
+    with entorno_aislado(directorio):
+        integridad = verificar_integridad(esperados, escritos)
+    return {
+        "replicas": replicas,
+        "sesiones_por_replica": sum(sesiones.values()),
+        "latencias": resumen_latencias(registro, duracion),
+        "integridad": integridad,
+        "errores": [e for r in resultados for e in r["errores"]][:50],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Capacidad de sesiones con N réplicas sobre el mismo almacén.")
+    ap.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--recepcion", type=int, default=2)
+    ap.add_argument("--lab", type=int, default=2)
+    ap.add_argument("--reportes", type=int, default=1)
+    ap.add_argument("--iteraciones", type=int, default=5)
+    ap.add_argument("--filas-base", type=int, default=2_000)
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    sesiones = {"recepcion": args.recepcion, "lab": args.lab, "reportes": args.reportes}
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(),
+               "nucleos": os.cpu_count(), "sesiones_por_replica": sesiones,
+               "iteraciones": args.iteraciones, "corridas": []}
+    base = None
+    for n in args.replicas:
+        r = correr_replicas(n, sesiones, args.iteraciones, args.filas_base)
+        lat = r["latencias"]
+        base = base or lat["throughput_por_s"] / n
+        r["eficiencia"] = lat["throughput_por_s"] / (n * base) if base else None
+        corrida["corridas"].append(r)
+        p95 = max(v["p95_ms"] for v in lat["por_interaccion"].values())
+        print(f"{n} réplica(s), {n * r['sesiones_por_replica']} sesiones: "
+              f"{lat['throughput_por_s']:.2f} interacciones/s  (eficiencia {r['eficiencia']:.0%}, "
+              f"p95 máx {p95:.0f} ms, {len(r['errores'])} errores)")
+        print("  Integridad:", json.dumps(r["integridad"], ensure_ascii=False))
+    print(f"Núcleos disponibles: {os.cpu_count()}")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"carga_replicas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga multi-sesión de streamlit_app.py (sin navegador).
+
+Usa streamlit.testing.v1.AppTest para simular N sesiones concurrentes:
+- recepción: inicia sesión, busca estudios y envía form_recepcion
+- laboratorio: carga folios y captura resultados
+- reportes: busca en Consultas/Reportes
+
+AppTest no se puede correr en paralelo dentro de un proceso (ver
+_LOCK_APPTEST), así que cada sesión corre en su propio proceso sobre el mismo
+directorio de datos: los reruns sí se traslapan y compiten por el candado de
+escritura como en la app real, y una actualización perdida aparece en la
+integridad. Con --hilos las sesiones van en hilos de un solo proceso y sus
+reruns se ejecutan uno a la vez (solo intercalados).
+
+Reporta p50/p95/p99 por interacción, throughput y verificaciones de
+integridad (órdenes perdidas, folios duplicados, resultados sobrescritos).
+
+Uso:
+    python -m benchmarks.carga_streamlit --recepcion 4 --lab 4 --reportes 2 --iteraciones 5
+"""
+
+import argparse, json, multiprocessing, os, random, statistics, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks import RAIZ, entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import generar_tabla
+
+
+APP = RAIZ / "streamlit_app.py"
+TIMEOUT_S = 120
+
+USUARIOS_CARGA = {
+    "recepcion": ("recep@carga.local", "recep123"),
+    "lab": ("lab@carga.local", "lab123"),
+    "admin": ("admin@carga.local", "admin123"),
+}
+
+
+# AppTest no es seguro entre hilos: cada run reemplaza y luego borra el
+# Runtime simulado global (Runtime._instance), parcha config.get_option y
+# comparte el id de sesión, así que dos runs simultáneos se pisan (timeouts,
+# árboles vacíos). Dentro de un proceso los runs se serializan; la
+# concurrencia real sale de correr las sesiones en procesos distintos
+# (correr_sesiones_procesos).
+_LOCK_APPTEST = threading.Lock()
+
+
+def _widget(lista, etiqueta: str):
+    for w in lista:
+        if w.label == etiqueta:
+            return w
+    raise LookupError(f"Widget no encontrado: {etiqueta}")
+
+
+class SesionSimulada:
+    """Una pestaña del navegador: un AppTest con su propio session_state."""
+
+    def __init__(self, sid: int, rol: str, registro: list, lock: threading.Lock):
+        from streamlit.testing.v1 import AppTest
+
+        self.sid = sid
+        self.rol = rol
+        self.at = AppTest.from_file(str(APP), default_timeout=TIMEOUT_S)
+        self._registro = registro
+        self._lock = lock
+        self.errores = []
+
+    def paso(self, interaccion: str, preparar=None):
+        """Aplica `preparar` (llenado de widgets) y mide el rerun resultante."""
+        if preparar is not None:
+            preparar(self.at)
+        with _LOCK_APPTEST:
+            t0 = time.perf_counter()
+            self.at.run()
+            dur = time.perf_counter() - t0
+        with self._lock:
+            self._registro.append((interaccion, dur))
+        if self.at.exception:
+            self.errores.append(f"{interaccion}: {self.at.exception[0].message}")
+
+    def seleccionar_seccion(self, nombre: str):
+        """Si la app usa navegación explícita (radio en la barra lateral), cambia de sección."""
+        radios = [r for r in self.at.sidebar.radio if nombre in r.options]
+        if radios:
+            self.paso(f"navegar_{nombre}", lambda at: radios[0].set_value(nombre))
+
+    def login(self):
+        email, pwd = USUARIOS_CARGA[self.rol]
+        self.paso("carga_inicial")
+
+        def _llenar(at):
+            _widget(at.text_input, "Usuario / correo").input(email)
+            _widget(at.text_input, "Contraseña").input(pwd)
+            _widget(at.button, "Entrar").click()
+        self.paso("login", _llenar)
+        # Tras el st.rerun del login, AppTest conserva widgets del formulario que
+        # ya no están en session_state; se vacían para que el siguiente run no falle.
+        for w in self.at.text_input:
+            if w.label in ("Usuario / correo", "Contraseña"):
+                w.set_value(None)
+
+
+# -------------------------
+# Escenarios
+# -------------------------
+def escenario_recepcion(s: SesionSimulada, iteraciones: int, rng: random.Random, esperados: list):
+    s.login()
+    s.seleccionar_seccion("Recepción")
+    for i in range(iteraciones):
+        nombre = f"Carga S{s.sid} N{i}"
+        # El selector de estudios es un typeahead: se escribe parte de un nombre
+        termino = rng.choice(["quimica", "biom", "orina", "smac", "EST01", "perfil", "hemo"])
+        s.paso("buscar_estudio", lambda at: _widget(at.text_input, "Buscar estudio").input(termino))
+
+        def _llenar(at, nombre=nombre):
+            _widget(at.text_input, "Nombre del paciente").input(nombre)
+            _widget(at.text_input, "Teléfono").input("8991234567")
+            _widget(at.text_input, "Dirección").input("Primavera #400")
+            estudios = _widget(at.multiselect, "Estudios")
+            if estudios.options:
+                estudios.select(rng.choice(estudios.options))
+            _widget(at.button, "Guardar paciente + solicitud").click()
+        s.paso("guardar_orden", _llenar)
+        esperados.append(nombre)
+
+
+def escenario_lab(s: SesionSimulada, iteraciones: int, folios: list, rng: random.Random, escritos: dict):
+    s.login()
+    s.seleccionar_seccion("Laboratorio")
+    for i in range(iteraciones):
+        folio = rng.choice(folios)
+        # La lista de trabajo está paginada: se busca el folio por prefijo
+        s.paso("buscar_folio", lambda at: _widget(at.text_input, "Folio empieza con").input(folio))
+        s.paso("cargar_folio", lambda at: (
+            _widget(at.selectbox, "Selecciona folio").set_value(folio),
+            _widget(at.button, "Cargar orden").click(),
+        ))
+        valor = f"S{s.sid}-{i}"
+
+        def _capturar(at, folio=folio, valor=valor):
+            campos = [w for w in at.text_input if str(w.key or "").startswith(f"val_{folio}_")]
+            if not campos:
+                raise LookupError(f"La orden {folio} no tiene estudios para capturar")
+            campos[0].input(valor)
+            _widget(at.button, "Guardar resultados").click()
+        try:
+            s.paso("guardar_resultados", _capturar)
+            escritos[folio] = valor
+        except LookupError as e:
+            s.errores.append(str(e))
+
+
+def escenario_reportes(s: SesionSimulada, iteraciones: int, rng: random.Random):
+    s.login()
+    s.seleccionar_seccion("Consultas/Reportes")
+    terminos = ["garcía", "2025", "firmado", "SMAC", "Carga"]
+    for _ in range(iteraciones):
+        termino = rng.choice(terminos)
+        s.paso("buscar", lambda at: _widget(at.text_input, "Buscar por nombre, folio u otro campo").input(termino))
+
+
+# -------------------------
+# Reporte
+# -------------------------
+def _percentil(valores: list, q: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(q * (len(ordenados) - 1))))]
+
+def resumen_latencias(registro: list, duracion_s: float) -> dict:
+    por_interaccion = {}
+    for nombre, dur in registro:
+        por_interaccion.setdefault(nombre, []).append(dur)
+    return {
+        "interacciones": len(registro),
+        "duracion_s": duracion_s,
+        "throughput_por_s": len(registro) / duracion_s if duracion_s else 0.0,
+        "por_interaccion": {
+            k: {
+                "n": len(v),
+                "p50_ms": _percentil(v, 0.50) * 1000,
+                "p95_ms": _percentil(v, 0.95) * 1000,
+                "p99_ms": _percentil(v, 0.99) * 1000,
+                "promedio_ms": statistics.fmean(v) * 1000,
+            }
+            for k, v in sorted(por_interaccion.items())
+        },
+    }
+
+def verificar_integridad(esperados: list, escritos: dict) -> dict:
+    """Compara lo que las sesiones creyeron guardar contra lo que quedó en disco."""
+    import app_core
+
+    df = app_core.decrypt_view(app_core.read_csv())
+    nombres = set(df["Nombre"].astype(str))
+    perdidas = [n for n in esperados if n not in nombres]
+    folios = df["Folio"].astype(str)
+    duplicados = int(folios.duplicated().sum())
+
+    resultados = dict(zip(folios, df["Resultados"].astype(str)))
+    sobrescritos = [f for f, v in escritos.items() if v not in resultados.get(f, "")]
+    return {
+        "ordenes_esperadas": len(esperados),
+        "ordenes_perdidas": len(perdidas),
+        "folios_duplicados": duplicados,
+        "resultados_verificados": len(escritos),
+        "resultados_perdidos": len(sobrescritos),
+        "ejemplos_perdidos": (perdidas + sobrescritos)[:10],
+    }
+
+
+def preparar_datos(filas_base: int = 2_000, semilla: int = 2006) -> list:
+    """
+    Tabla base y usuarios de carga en el entorno actual. Regresa los folios
+    abiertos (las firmadas no salen en la lista de laboratorio), barajados.
+    """
+    import app_core
+
+    generar_tabla(filas_base, app_core.CSV_PATH, semilla=semilla, procesos=1)
+    app_core.save_users_to_file({
+        email: app_core.make_user(pwd, rol) for rol, (email, pwd) in USUARIOS_CARGA.items()
+    })
+    df = app_core.read_csv()
+    folios = df.loc[df["Estado"] != "firmado", "Folio"].astype(str).tolist()
+    random.Random(semilla).shuffle(folios)
+    return folios
+
+
+def _roles(recepcion: int, lab: int, reportes: int, sid_inicial: int = 0) -> list:
+    """[(sid, rol)] de las sesiones a simular."""
+    roles = [r for rol, n in (("recepcion", recepcion), ("lab", lab), ("admin", reportes)) for r in [rol] * n]
+    return [(sid_inicial + i, rol) for i, rol in enumerate(roles)]
+
+def _lotes_lab(roles: list, folios: list) -> dict:
+    """
+    Folios disjuntos por sesión de laboratorio: así un resultado ausente es
+    una actualización perdida y no una sobrescritura legítima de otra sesión.
+    """
+    labs = [sid for sid, rol in roles if rol == "lab"]
+    return {sid: folios[i::max(1, len(labs))] for i, sid in enumerate(labs)}
+
+def _correr_escenario(s: SesionSimulada, iteraciones: int, folios_lab: list, semilla: int,
+                      esperados: list, escritos: dict) -> None:
+    rng = random.Random(semilla + s.sid)
+    if s.rol == "recepcion":
+        escenario_recepcion(s, iteraciones, rng, esperados)
+    elif s.rol == "lab":
+        escenario_lab(s, iteraciones, folios_lab, rng, escritos)
+    else:
+        escenario_reportes(s, iteraciones, rng)
+
+def correr_sesiones(recepcion: int, lab: int, reportes: int, iteraciones: int, folios: list,
+                    semilla: int = 2006, sid_inicial: int = 0) -> dict:
+    """
+    Corre las sesiones en hilos de este proceso sobre el entorno actual: sus
+    reruns se ejecutan uno a la vez (_LOCK_APPTEST), solo intercalados.
+    Regresa {"registro", "esperados", "escritos", "errores", "duracion_s"}.
+    """
+    registro, lock = [], threading.Lock()
+    esperados, escritos = [], {}
+    roles = _roles(recepcion, lab, reportes, sid_inicial)
+    sesiones = [SesionSimulada(sid, rol, registro, lock) for sid, rol in roles]
+    lotes = _lotes_lab(roles, folios)
+
+    def _correr(s: SesionSimulada):
+        _correr_escenario(s, iteraciones, lotes.get(s.sid, []), semilla, esperados, escritos)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sesiones) or 1) as pool:
+        list(pool.map(_correr, sesiones))
+    return {
+        "registro": registro,
+        "esperados": esperados,
+        "escritos": escritos,
+        "errores": [e for s in sesiones for e in s.errores],
+        "duracion_s": time.perf_counter() - t0,
+    }
+
+
+def _sesion_proceso(directorio: str, sid: int, rol: str, iteraciones: int, folios_lab: list,
+                    semilla: int, barrera, salida) -> None:
+    """Una sesión en su propio proceso; espera a las demás para empezar a la vez."""
+    r = {"sid": sid, "registro": [], "esperados": [], "escritos": {}, "errores": []}
+    try:
+        with entorno_aislado(directorio):
+            s = SesionSimulada(sid, rol, r["registro"], threading.Lock())
+            barrera.wait()
+            r["inicio"] = time.time()
+            _correr_escenario(s, iteraciones, folios_lab, semilla, r["esperados"], r["escritos"])
+            r["errores"] = s.errores
+    except Exception as e:
+        r["errores"].append(f"sesión {sid}: {e!r}")
+    r["fin"] = time.time()
+    salida.put(r)
+
+def correr_sesiones_procesos(directorio: str, recepcion: int, lab: int, reportes: int, iteraciones: int,
+                             folios: list, semilla: int = 2006) -> dict:
+    """
+    Una sesión por proceso sobre 'directorio' (reruns simultáneos de verdad).
+    Regresa lo mismo que correr_sesiones.
+    """
+    roles = _roles(recepcion, lab, reportes)
+    lotes = _lotes_lab(roles, folios)
+    ctx = multiprocessing.get_context("spawn")
+    barrera, salida = ctx.Barrier(len(roles)), ctx.Queue()
+    procesos = [
+        ctx.Process(target=_sesion_proceso,
+                    args=(directorio, sid, rol, iteraciones, lotes.get(sid, []), semilla, barrera, salida))
+        for sid, rol in roles
+    ]
+    for p in procesos:
+        p.start()
+    resultados = [salida.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+    inicios = [r["inicio"] for r in resultados if "inicio" in r]
+    return {
+        "registro": [x for r in resultados for x in r["registro"]],
+        "esperados": [x for r in resultados for x in r["esperados"]],
+        "escritos": {k: v for r in resultados for k, v in r["escritos"].items()},
+        "errores": [e for r in resultados for e in r["errores"]],
+        "duracion_s": max(r["fin"] for r in resultados) - min(inicios) if inicios else 0.0,
+    }
+
+
+def correr_carga(recepcion: int, lab: int, reportes: int, iteraciones: int,
+                 filas_base: int = 2_000, semilla: int = 2006, hilos: bool = False) -> dict:
+    directorio = tempfile.mkdtemp(prefix="lis_carga_")
+    with entorno_aislado(directorio):
+        folios = preparar_datos(filas_base, semilla)
+        if hilos:
+            r = correr_sesiones(recepcion, lab, reportes, iteraciones, folios, semilla)
+    if not hilos:
+        # Fuera del entorno: los procesos arrancan en el directorio del repo
+        # (fernet.key es relativa y todos deben usar la misma llave)
+        r = correr_sesiones_procesos(directorio, recepcion, lab, reportes, iteraciones, folios, semilla)
+    with entorno_aislado(directorio):
+        return {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "entorno": info_entorno(),
+            "modo": "hilos (reruns en serie)" if hilos else "procesos (reruns concurrentes)",
+            "sesiones": {"recepcion": recepcion, "lab": lab, "reportes": reportes},
+            "iteraciones": iteraciones,
+            "filas_base": filas_base,
+            "latencias": resumen_latencias(r["registro"], r["duracion_s"]),
+            "integridad": verificar_integridad(r["esperados"], r["escritos"]),
+            "errores": r["errores"][:50],
+        }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Prueba de carga multi-sesión de la app Streamlit.")
+    ap.add_argument("--recepcion", type=int, default=2)
+    ap.add_argument("--lab", type=int, default=2)
+    ap.add_argument("--reportes", type=int, default=1)
+    ap.add_argument("--iteraciones", type=int, default=5)
+    ap.add_argument("--filas-base", type=int, default=2_000)
+    ap.add_argument("--hilos", action="store_true",
+                    help="sesiones en hilos de un proceso (reruns en serie, sin concurrencia real)")
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    r = correr_carga(args.recepcion, args.lab, args.reportes, args.iteraciones, args.filas_base,
+                     hilos=args.hilos)
+    lat = r["latencias"]
+    print(f"[{r['modo']}] {lat['interacciones']} interacciones en {lat['duracion_s']:.1f} s "
+          f"({lat['throughput_por_s']:.2f}/s)")
+    for k, v in lat["por_interaccion"].items():
+        print(f"  {k:<20} n={v['n']:<4} p50 {v['p50_ms']:8.1f}  p95 {v['p95_ms']:8.1f}  p99 {v['p99_ms']:8.1f} ms")
+    print("Integridad:", json.dumps(r["integridad"], ensure_ascii=False))
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"carga_streamlit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(r, os.path.abspath(salida))}")
+    return r
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Compara dos corridas de benchmarks (JSON) y marca regresiones.
+
+Uso:
+    python -m benchmarks.comparar base.json nuevo.json --umbral 0.10
+Sale con código 1 si alguna operación empeora más que el umbral (mediana).
+"""
+
+import argparse, json, sys
+
+
+def cargar(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def comparar(base: dict, nuevo: dict, umbral: float = 0.10, metrica: str = "mediana_s") -> list[dict]:
+    filas = []
+    for tam, ops in nuevo.get("resultados", {}).items():
+        ops_base = base.get("resultados", {}).get(tam, {})
+        for op, v in ops.items():
+            if not isinstance(v, dict) or op not in ops_base or metrica not in v:
+                continue
+            antes, despues = ops_base[op][metrica], v[metrica]
+            cambio = (despues - antes) / antes if antes else 0.0
+            filas.append({
+                "tamano": tam,
+                "operacion": op,
+                "antes_ms": antes * 1000,
+                "despues_ms": despues * 1000,
+                "cambio": cambio,
+                "regresion": cambio > umbral,
+            })
+    return filas
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compara dos resultados de benchmark.")
+    ap.add_argument("base")
+    ap.add_argument("nuevo")
+    ap.add_argument("--umbral", type=float, default=0.10)
+    ap.add_argument("--metrica", default="mediana_s")
+    args = ap.parse_args(argv)
+
+    base, nuevo = cargar(args.base), cargar(args.nuevo)
+    print(f"base:  {base.get('entorno', {}).get('commit', '?')}  nuevo: {nuevo.get('entorno', {}).get('commit', '?')}")
+    filas = comparar(base, nuevo, args.umbral, args.metrica)
+    for r in filas:
+        marca = "  <-- REGRESIÓN" if r["regresion"] else ""
+        print(f"{r['tamano']:>9} {r['operacion']:<24} {r['antes_ms']:10.2f} -> {r['despues_ms']:10.2f} ms "
+              f"({r['cambio']:+.1%}){marca}")
+    return 1 if any(r["regresion"] for r in filas) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de datos sintéticos del LIS.
+
+Produce una tabla de órdenes con el mismo esquema y cifrado que
+solicitudes_lis.csv, con estudios tomados de catalogo_estudios.xlsx,
+resultados JSON por estudio y una mezcla de estados realista.
+
+Uso:
+    python -m benchmarks.datos_sinteticos --filas 100000 --salida /tmp/lis.csv
+"""
+
+import argparse, json, os, random
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import pandas as pd
+
+from benchmarks import RAIZ
+
+
+NOMBRES = ["María", "José", "Juan", "Guadalupe", "Luis", "Ana", "Carlos", "Rosa",
+           "Jorge", "Verónica", "Miguel", "Patricia", "Alejandro", "Nubia", "Fernanda"]
+APELLIDOS = ["Hernández", "García", "Martínez", "López", "González", "Pérez",
+             "Rodríguez", "Sánchez", "Ramírez", "Cruz", "Flores", "Zapata"]
+CALLES = ["Primavera", "Jacaranda", "Hidalgo", "Juárez", "Morelos", "Reforma"]
+GENEROS = ["F", "M", "Otro", "No especifica"]
+GENEROS_P = [0.52, 0.44, 0.02, 0.02]
+# Mezcla de estados: la mayoría de las órdenes históricas ya están firmadas
+ESTADOS = ["pendiente", "capturado", "firmado"]
+ESTADOS_P = [0.10, 0.08, 0.82]
+UNIDADES = ["mg/dL", "g/dL", "U/L", "mmol/L", "%", "x10^3/µL", ""]
+
+
+def catalogo() -> pd.DataFrame:
+    import app_core
+    previo = app_core.CATALOGO_XLSX
+    app_core.CATALOGO_XLSX = str(RAIZ / "catalogo_estudios.xlsx")
+    try:
+        return app_core.cargar_catalogo_estudios()
+    finally:
+        app_core.CATALOGO_XLSX = previo
+
+
+def _resultados(rng: random.Random, estudios: list) -> str:
+    res = {}
+    for est in estudios:
+        ref_min = round(rng.uniform(1, 100), 1)
+        res[est] = {
+            "valor": f"{rng.uniform(0.5, 250):.1f}",
+            "unidad": rng.choice(UNIDADES),
+            "ref": f"{ref_min} - {round(ref_min * rng.uniform(1.2, 3), 1)}",
+        }
+    return json.dumps(res, ensure_ascii=False)
+
+
+def _bloque(args) -> pd.DataFrame:
+    """Genera y cifra un bloque de filas (se ejecuta en un proceso del pool)."""
+    inicio, n, semilla, nombres_est, precios, fecha_fin, dias = args
+    from app_core import enc
+
+    rng = random.Random(semilla + inicio)
+    filas = []
+    for i in range(inicio, inicio + n):
+        registro = fecha_fin - timedelta(seconds=rng.randint(0, dias * 86400))
+        k = min(len(nombres_est), max(1, int(rng.expovariate(0.6)) + 1))
+        estudios = rng.sample(nombres_est, k)
+        estado = rng.choices(ESTADOS, ESTADOS_P)[0]
+        firma = ""
+        if estado == "firmado":
+            firma = (registro + timedelta(hours=rng.lognormvariate(2.5, 0.8))).isoformat(timespec="seconds")
+        resultados = _resultados(rng, estudios) if estado != "pendiente" else ""
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+        filas.append({
+            # Folio con sufijo para que sea único aunque coincidan los segundos
+            "Folio": registro.strftime("%Y%m%d%H%M%S") + f"{i % 100000:05d}",
+            "Fecha_Registro": registro.isoformat(timespec="seconds"),
+            "Fecha_Programada": (registro + timedelta(days=rng.choice([0, 0, 0, 1, 2]))).date().isoformat(),
+            "Costo_MXN": float(sum(precios.get(e, 0.0) for e in estudios) or rng.choice([150, 200, 300, 450])),
+            "Nombre_enc": enc(nombre),
+            "Edad": rng.randint(0, 95),
+            "Genero": rng.choices(GENEROS, GENEROS_P)[0],
+            "Telefono_enc": enc("+52899" + "".join(rng.choice("0123456789") for _ in range(7))),
+            "Direccion_enc": enc(f"{rng.choice(CALLES)} #{rng.randint(1, 999)}, Reynosa"),
+            "Emails_enc": enc(f"paciente{i}@example.com" if rng.random() < 0.6 else ""),
+            "Tipo_Estudio": "; ".join(estudios),
+            "Observaciones_enc": enc("Paciente en ayuno" if rng.random() < 0.3 else ""),
+            "Resultados_enc": enc(resultados),
+            "Estado": estado,
+            "Fecha_Firma": firma,
+        })
+    return pd.DataFrame(filas)
+
+
+def generar_tabla(filas: int, salida: str, semilla: int = 2006, procesos: int | None = None,
+                  bloque: int = 20_000, dias: int = 365) -> str:
+    """
+    Escribe `filas` órdenes sintéticas cifradas en `salida` (CSV), por bloques,
+    para que 5M filas no requieran tenerlas todas en memoria.
+    """
+    from app_core import COLUMNS
+
+    cat = catalogo()
+    nombres_est = cat["Nombre"].astype(str).tolist() or ["Química sanguínea"]
+    precios = dict(zip(cat["Nombre"].astype(str), cat["Precio_MXN"].fillna(0).astype(float)))
+    fecha_fin = datetime(2026, 1, 1)
+    tareas = [
+        (i, min(bloque, filas - i), semilla, nombres_est, precios, fecha_fin, dias)
+        for i in range(0, filas, bloque)
+    ]
+    if os.path.exists(salida):
+        os.remove(salida)
+    procesos = procesos or os.cpu_count() or 1
+    primero = True
+    with Pool(procesos) as pool:
+        for df in pool.imap(_bloque, tareas):
+            df.reindex(columns=COLUMNS).to_csv(salida, mode="a", header=primero, index=False)
+            primero = False
+    return salida
+
+
+def generar_usuarios(n: int = 50) -> dict:
+    """Usuarios sintéticos (contraseña = 'clave' + índice) con la mezcla de roles."""
+    from app_core import make_user
+    roles = ["recepcion", "lab", "admin"]
+    return {
+        f"usuario{i}@lab.local": make_user(f"clave{i}", roles[i % len(roles)])
+        for i in range(n)
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Genera una tabla sintética de órdenes cifradas.")
+    ap.add_argument("--filas", type=int, default=10_000)
+    ap.add_argument("--salida", default="solicitudes_sinteticas.csv")
+    ap.add_argument("--semilla", type=int, default=2006)
+    ap.add_argument("--procesos", type=int, default=None)
+    args = ap.parse_args()
+    path = generar_tabla(args.filas, args.salida, args.semilla, args.procesos)
+    print(f"{args.filas} filas escritas en {path}")
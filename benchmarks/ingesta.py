@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput de la ingesta de analizadores sobre un feed sintético ASTM/HL7.
+
+Uso:
+    python -m benchmarks.ingesta --mensajes 20000 --filas-base 10000
+"""
+
+import argparse, os
+from datetime import datetime
+
+from benchmarks import entorno_aislado, guardar_resultados, info_entorno
+from benchmarks.datos_sinteticos import catalogo, generar_tabla
+
+
+def correr(mensajes: int, filas_base: int, lote: int, con_cola: bool, semilla: int = 2006) -> dict:
+    import app_core
+    import ingesta_analizadores as ing
+
+    with entorno_aislado():
+        generar_tabla(filas_base, app_core.CSV_PATH, semilla=semilla, procesos=1)
+        df = app_core.read_csv()
+        # Solo órdenes no firmadas: las firmadas se descartan por diseño
+        folios = df.loc[df["Estado"] != "firmado", "Folio"].astype(str).tolist()
+        codigos = catalogo()["Codigo"].astype(str).tolist()
+        feed = ing.feed_sintetico(folios, mensajes, codigos, semilla=semilla)
+        pipeline = ing.Ingesta(lote=lote, espera_max_s=3600)
+        return pipeline.procesar_con_cola(feed) if con_cola else pipeline.procesar(feed)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de ingesta de analizadores.")
+    ap.add_argument("--mensajes", type=int, default=5_000)
+    ap.add_argument("--filas-base", type=int, default=5_000)
+    ap.add_argument("--lote", type=int, nargs="+", default=[50, 200, 1000])
+    ap.add_argument("--salida", default=None)
+    args = ap.parse_args(argv)
+
+    corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "entorno": info_entorno(),
+               "mensajes": args.mensajes, "filas_base": args.filas_base, "resultados": {}}
+    for lote in args.lote:
+        for con_cola in (False, True):
+            r = correr(args.mensajes, args.filas_base, lote, con_cola)
+            nombre = f"lote_{lote}_{'cola' if con_cola else 'sincrono'}"
+            corrida["resultados"][nombre] = r
+            print(f"{nombre:<22} {r['mensajes_por_s']:10.1f} msg/s  commits={r['commits']:<5} "
+                  f"duplicados={r['duplicados']} sin_mapeo={r['sin_mapeo']}")
+
+    salida = args.salida or os.path.join(
+        "bench_resultados", f"ingesta_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"Resultados en {guardar_resultados(corrida, os.path.abspath(salida))}")
+    return corrida
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en disco de PDFs renderizados para órdenes firmadas.
+
+Una orden 'firmado' ya no cambia, así que su reporte se renderiza una vez y se
+guarda cifrado. La llave es folio + hash de las entradas (resultados,
+comentarios, datos de la solicitud y configuración del lab/médico); el tamaño
+total está acotado con desalojo LRU.
+
+Un acierto no reescribe el índice: la recencia se marca en el mtime del blob
+(os.utime) y el desalojo toma el más reciente entre ese mtime y el
+'ultimo_acceso' del índice (que queda como la fecha de alta).
+"""
+
+import os, json, hashlib, time
+
+from app_core import FERNET, generar_pdf_resultado
+from candados import CandadoArchivo
+
+
+CACHE_DIR = "cache_pdf"
+INDICE_PATH = os.path.join(CACHE_DIR, "indice.json")
+MAX_BYTES = int(os.getenv("LIS_CACHE_PDF_MAX_MB", "200")) * 1024 * 1024
+
+_lock = CandadoArchivo(lambda: os.path.join(CACHE_DIR, ".lock"))
+# Última versión leída del índice, para los aciertos (solo lectura)
+_memo = {"firma": None, "indice": {}}
+
+
+def _hash(obj) -> str:
+    canon = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canon.encode()).hexdigest()
+
+def hash_config(lab_info: dict, doctor_info: dict) -> str:
+    return _hash({"lab_info": lab_info, "doctor_info": doctor_info})[:16]
+
+def llave(folio, solicitud: dict, resultados: dict, comentarios: str, lab_info: dict, doctor_info: dict) -> str:
+    entradas = _hash({
+        "solicitud": solicitud,
+        "resultados": resultados,
+        "comentarios": (comentarios or "").strip(),
+    })[:24]
+    return f"{folio}_{entradas}_{hash_config(lab_info, doctor_info)}"
+
+
+# -------------------------
+# Índice (llave -> folio, config, tamaño, último acceso)
+# -------------------------
+def _cargar_indice() -> dict:
+    if not os.path.exists(INDICE_PATH):
+        return {}
+    try:
+        with open(INDICE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _indice_lectura() -> dict:
+    """Índice para consultar sin modificarlo: solo se relee si el archivo cambió."""
+    try:
+        st_ = os.stat(INDICE_PATH)
+    except OSError:
+        return {}
+    firma = (st_.st_mtime_ns, st_.st_size, st_.st_ino)
+    if _memo["firma"] != firma:
+        _memo.update(firma=firma, indice=_cargar_indice())
+    return _memo["indice"]
+
+def _guardar_indice(indice: dict) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = INDICE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False)
+    os.replace(tmp, INDICE_PATH)
+
+def _ruta(k: str) -> str:
+    return os.path.join(CACHE_DIR, k + ".bin")
+
+def _borrar(indice: dict, k: str) -> None:
+    indice.pop(k, None)
+    try:
+        os.remove(_ruta(k))
+    except FileNotFoundError:
+        pass
+
+def _ultimo_acceso(indice: dict, k: str) -> float:
+    try:
+        return max(indice[k]["ultimo_acceso"], os.stat(_ruta(k)).st_mtime)
+    except OSError:
+        return indice[k]["ultimo_acceso"]
+
+def _desalojar(indice: dict, max_bytes: int) -> None:
+    total = sum(e["tamano"] for e in indice.values())
+    if total <= max_bytes:
+        return
+    for k in sorted(indice, key=lambda k: _ultimo_acceso(indice, k)):
+        if total <= max_bytes:
+            break
+        total -= indice[k]["tamano"]
+        _borrar(indice, k)
+
+
+# -------------------------
+# API
+# -------------------------
+def obtener(k: str) -> bytes | None:
+    with _lock:
+        if k not in _indice_lectura():
+            return None
+        try:
+            with open(_ruta(k), "rb") as f:
+                pdf = FERNET.decrypt(f.read())
+        except Exception:
+            indice = _cargar_indice()
+            _borrar(indice, k)
+            _guardar_indice(indice)
+            return None
+        try:
+            os.utime(_ruta(k))
+        except OSError:
+            pass
+        return pdf
+
+def guardar(k: str, folio, config: str, pdf: bytes, max_bytes: int | None = None) -> None:
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        token = FERNET.encrypt(pdf)
+        tmp = _ruta(k) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(token)
+        os.replace(tmp, _ruta(k))
+        indice = _cargar_indice()
+        indice[k] = {
+            "folio": str(folio),
+            "config": config,
+            "tamano": len(token),
+            "ultimo_acceso": time.time(),
+        }
+        _desalojar(indice, MAX_BYTES if max_bytes is None else max_bytes)
+        _guardar_indice(indice)
+
+def pdf_resultado(folio, solicitud: dict, resultados: dict, comentarios: str,
+                  lab_info: dict, doctor_info: dict, firmado: bool) -> bytes:
+    """
+    PDF del reporte. Si la orden está firmada se sirve desde la caché (o se
+    renderiza y se guarda); si no, siempre se renderiza.
+    """
+    if not firmado:
+        return generar_pdf_resultado(
+            solicitud, resultados, doctor_info=doctor_info, lab_info=lab_info, comentarios=comentarios,
+        )
+    k = llave(folio, solicitud, resultados, comentarios, lab_info, doctor_info)
+    pdf = obtener(k)
+    if pdf is None:
+        pdf = generar_pdf_resultado(
+            solicitud, resultados, doctor_info=doctor_info, lab_info=lab_info, comentarios=comentarios,
+        )
+        guardar(k, folio, hash_config(lab_info, doctor_info), pdf)
+    return pdf
+
+def invalidar_config(lab_info: dict, doctor_info: dict) -> int:
+    """
+    Borra solo las entradas renderizadas con una configuración distinta a la
+    vigente. Regresa cuántas se borraron.
+    """
+    vigente = hash_config(lab_info, doctor_info)
+    with _lock:
+        indice = _cargar_indice()
+        viejas = [k for k, e in indice.items() if e.get("config") != vigente]
+        for k in viejas:
+            _borrar(indice, k)
+        if viejas:
+            _guardar_indice(indice)
+        return len(viejas)
+
+def invalidar_folio(folio) -> int:
+    with _lock:
+        indice = _cargar_indice()
+        viejas = [k for k, e in indice.items() if e.get("folio") == str(folio)]
+        for k in viejas:
+            _borrar(indice, k)
+        if viejas:
+            _guardar_indice(indice)
+        return len(viejas)
+
+def estadisticas() -> dict:
+    indice = _indice_lectura()
+    return {
+        "entradas": len(indice),
+        "bytes": sum(e["tamano"] for e in indice.values()),
+        "max_bytes": MAX_BYTES,
+    }
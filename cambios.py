@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Feed de cambios (change data capture) del almacén de órdenes.
+
+Cada escritura de app_core (save_order / save_orders / save_results) agrega
+eventos numerados a cambios_lis.jsonl, una línea JSON por evento; las órdenes
+que retencion.archivar saca de la tabla viva emiten "archivado":
+
+    {"seq": 17, "ts": "...", "operacion": "alta|resultados|archivado",
+     "folio": "...", "estado": "capturado", "estado_anterior": "pendiente",
+     "fecha_programada": "...", "fecha_registro": "..."}
+
+Quien quiera enterarse de los cambios (otras sesiones de Streamlit, cachés,
+otros procesos o réplicas que comparten el disco) guarda un Suscriptor y le
+pide los eventos nuevos: solo lee los bytes agregados desde la última vez,
+así que consultar sin cambios cuesta un os.stat y no una lectura del CSV.
+Dentro del mismo proceso también se pueden registrar callbacks con
+suscribir(), que se llaman al emitir.
+"""
+
+import os, json
+from datetime import datetime
+
+from candados import CandadoArchivo
+
+
+CAMBIOS_PATH = "cambios_lis.jsonl"
+
+_lock = CandadoArchivo(lambda: CAMBIOS_PATH + ".lock")
+# Última secuencia conocida y tamaño/inodo del archivo en ese momento
+_estado = {"seq": None, "tam": None, "inodo": None}
+_callbacks = []
+
+
+# -------------------------
+# Emisión
+# -------------------------
+def _ultima_linea(path: str) -> str:
+    """Última línea no vacía del archivo sin leerlo completo."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        fin = f.tell()
+        bloque = 4096
+        datos = b""
+        while fin > 0:
+            inicio = max(0, fin - bloque)
+            f.seek(inicio)
+            datos = f.read(fin - inicio) + datos
+            lineas = datos.strip().splitlines()
+            if len(lineas) > 1 or inicio == 0:
+                return lineas[-1].decode("utf-8") if lineas else ""
+            fin = inicio
+    return ""
+
+def ultima_secuencia() -> int:
+    """Secuencia del último evento emitido (0 si no hay feed)."""
+    with _lock:
+        try:
+            st_ = os.stat(CAMBIOS_PATH)
+        except OSError:
+            return 0
+        tam, inodo = st_.st_size, st_.st_ino
+        if (_estado["tam"], _estado["inodo"]) == (tam, inodo) and _estado["seq"] is not None:
+            return _estado["seq"]
+        # Otro proceso escribió o compactó (o primera vez): se relee solo la cola del archivo
+        try:
+            seq = int(json.loads(_ultima_linea(CAMBIOS_PATH) or "{}").get("seq", 0))
+        except (ValueError, json.JSONDecodeError):
+            seq = 0
+        _estado.update(seq=seq, tam=tam, inodo=inodo)
+        return seq
+
+def evento(row: dict, operacion: str, estado_anterior: str = "") -> dict:
+    """Delta de una fila del CSV (solo columnas no sensibles)."""
+    return {
+        "operacion": operacion,
+        "folio": str(row.get("Folio", "")),
+        "estado": str(row.get("Estado") or ""),
+        "estado_anterior": estado_anterior or "",
+        "fecha_programada": str(row.get("Fecha_Programada") or ""),
+        "fecha_registro": str(row.get("Fecha_Registro") or ""),
+    }
+
+def emitir(eventos: list) -> list:
+    """
+    Numera y agrega los eventos al feed; regresa los eventos con su 'seq'.
+    Se llama con el lock de escritura de app_core tomado, así la secuencia
+    sigue el mismo orden que las escrituras del CSV.
+    """
+    if not eventos:
+        return []
+    with _lock:
+        seq = ultima_secuencia()
+        ts = datetime.now().isoformat(timespec="seconds")
+        salida = []
+        for ev in eventos:
+            seq += 1
+            salida.append({"seq": seq, "ts": ts, **ev})
+        texto = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in salida)
+        with open(CAMBIOS_PATH, "a", encoding="utf-8") as f:
+            f.write(texto)
+        st_ = os.stat(CAMBIOS_PATH)
+        _estado.update(seq=seq, tam=st_.st_size, inodo=st_.st_ino)
+        callbacks = list(_callbacks)
+    for cb in callbacks:
+        try:
+            cb(salida)
+        except Exception:
+            # Un suscriptor con errores no debe tumbar la escritura
+            pass
+    return salida
+
+
+# -------------------------
+# Suscripción
+# -------------------------
+def suscribir(callback) -> None:
+    """Registra callback(eventos) para las emisiones de este proceso."""
+    with _lock:
+        if callback not in _callbacks:
+            _callbacks.append(callback)
+
+def desuscribir(callback) -> None:
+    with _lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+class Suscriptor:
+    """
+    Lee el feed de forma incremental desde una posición (offset en bytes).
+
+    Uso:
+        sub = Suscriptor.desde_ahora()      # tras cargar el estado inicial
+        for ev in sub.pendientes(): ...     # solo lo nuevo
+
+    Si el archivo se truncó o se reemplazó (p. ej. al compactarlo) o hay un
+    hueco en la secuencia, 'reinicio' queda en True: el suscriptor debe
+    recargar su estado completo en vez de aplicar los deltas.
+    """
+
+    def __init__(self, offset: int = 0, seq: int = 0, inodo=None):
+        self.offset = offset
+        self.seq = seq
+        self.inodo = inodo
+        self.reinicio = False
+
+    @classmethod
+    def desde_ahora(cls):
+        with _lock:
+            try:
+                st_ = os.stat(CAMBIOS_PATH)
+            except OSError:
+                return cls()
+            return cls(offset=st_.st_size, seq=ultima_secuencia(), inodo=st_.st_ino)
+
+    def _stat(self):
+        try:
+            st_ = os.stat(CAMBIOS_PATH)
+            return st_.st_size, st_.st_ino
+        except OSError:
+            return 0, None
+
+    def hay_cambios(self) -> bool:
+        return self._stat() != (self.offset, self.inodo)
+
+    def pendientes(self) -> list:
+        self.reinicio = False
+        tam, inodo = self._stat()
+        if (tam, inodo) == (self.offset, self.inodo):
+            return []
+        if inodo != self.inodo or tam < self.offset:
+            # Archivo nuevo, compactado o truncado: se relee desde el inicio
+            self.reinicio = self.inodo is not None or self.seq > 0
+            self.offset, self.inodo = 0, inodo
+        if not tam:
+            return []
+        with open(CAMBIOS_PATH, "rb") as f:
+            f.seek(self.offset)
+            datos = f.read(tam - self.offset)
+        # Una línea a medio escribir se deja para la siguiente lectura
+        completo = datos[: datos.rfind(b"\n") + 1]
+        self.offset += len(completo)
+        eventos = []
+        for linea in completo.splitlines():
+            if not linea.strip():
+                continue
+            ev = json.loads(linea)
+            seq = int(ev.get("seq", 0))
+            if seq <= self.seq and not self.reinicio:
+                continue
+            if self.seq and seq != self.seq + 1 and not eventos:
+                # Hueco en la secuencia: se perdieron eventos
+                self.reinicio = True
+            eventos.append(ev)
+            self.seq = seq
+        return eventos
+
+
+# -------------------------
+# Mantenimiento
+# -------------------------
+def compactar(conservar: int = 10_000) -> int:
+    """
+    Deja solo los últimos 'conservar' eventos (la secuencia no se reinicia).
+    El archivo se reemplaza, así que los suscriptores ven 'reinicio' y recargan.
+    Regresa cuántos eventos se descartaron.
+    """
+    with _lock:
+        if not os.path.exists(CAMBIOS_PATH):
+            return 0
+        with open(CAMBIOS_PATH, "r", encoding="utf-8") as f:
+            lineas = [l for l in f if l.strip()]
+        descartar = max(0, len(lineas) - conservar)
+        if not descartar:
+            return 0
+        tmp = CAMBIOS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lineas[descartar:])
+        os.replace(tmp, CAMBIOS_PATH)
+        _estado.update(seq=None, tam=None)
+        return descartar
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "compactar":
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+        print(f"{compactar(n)} eventos descartados")
+    elif len(sys.argv) > 1 and sys.argv[1] == "seguir":
+        import time
+        sub = Suscriptor.desde_ahora()
+        while True:
+            for ev in sub.pendientes():
+                print(json.dumps(ev, ensure_ascii=False), flush=True)
+            time.sleep(0.5)
+    else:
+        print("Uso: python cambios.py compactar [conservar] | seguir")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Candados entre hilos y entre procesos para los archivos compartidos.
+
+Con varias réplicas de la app (o la API y la ingesta en otros procesos) sobre
+el mismo directorio, un threading.RLock no basta: dos procesos harían
+leer-modificar-escribir del CSV o de un JSON al mismo tiempo y uno pisaría al
+otro. CandadoArchivo combina:
+- un RLock del proceso (reentrante, como el que había);
+- flock(LOCK_EX) sobre un archivo ".lock" junto al dato, tomado solo por el
+  primer nivel de reentrada y soltado al salir del último.
+Funciona en el mismo host y en volúmenes compartidos que respeten flock
+(NFSv4, CIFS con bloqueos). Sin fcntl (Windows) queda solo el RLock: una
+réplica por directorio de datos.
+"""
+
+import os, threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class CandadoArchivo:
+    """
+    Candado reentrante entre hilos y procesos. 'ruta' es la ruta del archivo de
+    candado o una función que la regresa (se evalúa al tomarlo, para seguir a
+    rutas que cambian en tiempo de ejecución, p. ej. en los benchmarks).
+    """
+
+    def __init__(self, ruta):
+        self._ruta = ruta
+        self._rlock = threading.RLock()
+        self._nivel = 0
+        self._fd = None
+        self._fd_ruta = None
+        self._pid = None
+
+    def ruta(self) -> str:
+        return str(self._ruta() if callable(self._ruta) else self._ruta)
+
+    def _abrir(self, ruta: str) -> int:
+        # Tras un fork el descriptor heredado comparte el flock con el padre:
+        # el hijo abre el suyo.
+        if self._fd is not None and self._pid != os.getpid():
+            self._fd = None
+        if self._fd is not None and self._fd_ruta == ruta:
+            return self._fd
+        if self._fd is not None:
+            os.close(self._fd)
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        self._fd_ruta = ruta
+        self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self) -> bool:
+        self._rlock.acquire()
+        if self._nivel == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self._abrir(self.ruta()), fcntl.LOCK_EX)
+            except BaseException:
+                self._rlock.release()
+                raise
+        self._nivel += 1
+        return True
+
+    def release(self) -> None:
+        self._nivel -= 1
+        if self._nivel == 0 and fcntl is not None and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._rlock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+def intentar_exclusivo(ruta: str):
+    """
+    Toma un flock exclusivo sin esperar. Regresa el descriptor (hay que
+    mantenerlo abierto mientras se quiera conservar) o None si otro proceso
+    ya lo tiene. Sirve para elegir un único proceso que haga una tarea.
+    """
+    fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except OSError:
+        os.close(fd)
+        return None
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de búsqueda del catálogo de estudios (typeahead de Recepción).
+
+En vez de mandar todo el catálogo a un multiselect, la búsqueda se resuelve
+en el servidor y solo regresa las mejores coincidencias:
+- texto normalizado: minúsculas, sin acentos ni signos ("Biometría" == "biometria");
+- niveles de relevancia: el nombre empieza con la consulta > cada término es
+  inicio de una palabra > subcadena o parecido por trigramas (errores de dedo),
+  sobre Nombre, Codigo y Categoria; todos los términos deben coincidir;
+- dentro de cada nivel, los más pedidos primero (agregados.py, "por_estudio").
+Los niveles se evalúan solo si hacen falta para llenar el límite.
+
+El índice se arma una vez por proceso y se reconstruye si cambia el archivo
+del catálogo; las frecuencias se refrescan cada FRECUENCIAS_TTL_S segundos.
+"""
+
+import os, re, time, heapq, threading, unicodedata
+from bisect import bisect_left
+
+import pandas as pd
+
+import app_core
+import agregados
+
+
+LIMITE = 20
+# Parecido mínimo (Jaccard de trigramas) para aceptar una palabra con errores
+UMBRAL_TRIGRAMAS = 0.4
+FRECUENCIAS_TTL_S = float(os.getenv("LIS_CATALOGO_FRECUENCIAS_TTL_S", "60"))
+# Consultas recientes que se guardan ya resueltas (al teclear se repiten mucho)
+_MAX_CACHE = 2048
+
+_NO_ALFANUM = re.compile(r"[^0-9a-z]+")
+
+
+def _texto(valor) -> str:
+    return "" if valor is None or pd.isna(valor) else str(valor).strip()
+
+def normalizar(texto) -> str:
+    """Minúsculas, sin acentos y con cualquier separador convertido en espacio."""
+    s = unicodedata.normalize("NFKD", _texto(texto))
+    s = "".join(c for c in s if not unicodedata.combining(c)).casefold()
+    return _NO_ALFANUM.sub(" ", s).strip()
+
+def trigramas(palabra: str) -> set:
+    p = f" {palabra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+class IndiceCatalogo:
+    def __init__(self, catalogo, frecuencias: dict | None = None):
+        self.estudios = []      # [{Nombre, Codigo, Categoria, Precio_MXN}]
+        self.codigos = {}       # código normalizado -> idx
+        por_palabra = {}        # palabra -> {idx de estudio}
+        for row in catalogo.to_dict("records"):
+            nombre = _texto(row.get("Nombre"))
+            if not nombre:
+                continue
+            idx = len(self.estudios)
+            precio = pd.to_numeric(row.get("Precio_MXN"), errors="coerce")
+            estudio = {
+                "Nombre": nombre,
+                "Codigo": _texto(row.get("Codigo")),
+                "Categoria": _texto(row.get("Categoria")),
+                "Precio_MXN": 0.0 if pd.isna(precio) else float(precio),
+            }
+            self.estudios.append(estudio)
+            if estudio["Codigo"]:
+                self.codigos[normalizar(estudio["Codigo"])] = idx
+            texto = " ".join((nombre, estudio["Codigo"], estudio["Categoria"]))
+            for palabra in normalizar(texto).split():
+                por_palabra.setdefault(palabra, set()).add(idx)
+        self.por_palabra = por_palabra
+        self.palabras = sorted(por_palabra)
+        self.trigramas = {p: trigramas(p) for p in self.palabras}
+        self.por_trigrama = {}  # trigrama -> [palabra, ...]
+        for palabra, tris in self.trigramas.items():
+            for t in tris:
+                self.por_trigrama.setdefault(t, []).append(palabra)
+        # Nombres normalizados ordenados, para "el nombre empieza con..."
+        self._norm = [normalizar(e["Nombre"]) for e in self.estudios]
+        nombres = sorted((n, i) for i, n in enumerate(self._norm))
+        self.nombres_norm = [n for n, _ in nombres]
+        self.nombres_idx = [i for _, i in nombres]
+        self.fijar_frecuencias(frecuencias or {})
+
+    def fijar_frecuencias(self, frecuencias: dict) -> None:
+        """frecuencias: nombre de estudio -> número de órdenes."""
+        self.frecuencia = [int(frecuencias.get(e["Nombre"], 0)) for e in self.estudios]
+        self._populares = sorted(
+            range(len(self.estudios)),
+            key=lambda i: (-self.frecuencia[i], self._norm[i]),
+        )
+        self.rango = [0] * len(self._populares)  # idx -> posición por popularidad
+        for r, i in enumerate(self._populares):
+            self.rango[i] = r
+        self._cache = {}
+
+    # -------------------------
+    # Coincidencias
+    # -------------------------
+    def _por_prefijo(self, termino: str) -> set:
+        """Estudios con alguna palabra que empieza con 'termino'."""
+        i = bisect_left(self.palabras, termino)
+        j = bisect_left(self.palabras, termino + "\uffff")
+        return set().union(*(self.por_palabra[p] for p in self.palabras[i:j]))
+
+    def _aproximadas(self, termino: str) -> set:
+        """Estudios donde 'termino' aparece dentro de una palabra o se le parece (trigramas)."""
+        if len(termino) < 3:
+            return set()
+        tq = trigramas(termino)
+        compartidos = {}
+        for t in tq:
+            for palabra in self.por_trigrama.get(t, ()):
+                compartidos[palabra] = compartidos.get(palabra, 0) + 1
+        palabras = [
+            p for p, n in compartidos.items()
+            if termino in p or n / (len(tq) + len(self.trigramas[p]) - n) >= UMBRAL_TRIGRAMAS
+        ]
+        return set().union(*(self.por_palabra[p] for p in palabras))
+
+    def _niveles(self, q: str):
+        """
+        Candidatos por nivel de relevancia (se evalúan solo si hacen falta):
+        0. el nombre empieza con la consulta o el código es exacto;
+        1. cada término es inicio de alguna palabra (Nombre, Codigo, Categoria);
+        2. cada término aparece dentro de una palabra o se le parece.
+        """
+        i = bisect_left(self.nombres_norm, q)
+        j = bisect_left(self.nombres_norm, q + "\uffff")
+        nivel = set(self.nombres_idx[i:j])
+        if q in self.codigos:
+            nivel.add(self.codigos[q])
+        yield nivel
+
+        terminos = list(dict.fromkeys(q.split()))
+        prefijos = [self._por_prefijo(t) for t in terminos]
+        yield set.intersection(*sorted(prefijos, key=len))
+
+        amplios = [p | self._aproximadas(t) for t, p in zip(terminos, prefijos)]
+        yield set.intersection(*sorted(amplios, key=len))
+
+    def buscar(self, consulta: str, limite: int = LIMITE) -> list:
+        """
+        Mejores 'limite' estudios para 'consulta'. Sin consulta regresa los
+        más pedidos; dentro de cada nivel de relevancia (ver _niveles) se
+        ordena por frecuencia de pedido. Cada resultado trae Nombre, Codigo,
+        Categoria, Precio_MXN y Ordenes.
+        """
+        limite = max(1, int(limite))
+        q = normalizar(consulta)
+        llave = (q, limite)
+        elegidos = self._cache.get(llave)
+        if elegidos is None:
+            if not q:
+                elegidos = self._populares[:limite]
+            else:
+                elegidos, vistos = [], set()
+                for candidatos in self._niveles(q):
+                    candidatos -= vistos
+                    mejores = heapq.nsmallest(limite - len(elegidos), candidatos, key=self.rango.__getitem__)
+                    elegidos += mejores
+                    vistos.update(mejores)
+                    if len(elegidos) >= limite:
+                        break
+            if len(self._cache) >= _MAX_CACHE:
+                self._cache.clear()
+            self._cache[llave] = elegidos
+        return [{**self.estudios[i], "Ordenes": self.frecuencia[i]} for i in elegidos]
+
+    def nombres(self, consulta: str, limite: int = LIMITE) -> list:
+        return [r["Nombre"] for r in self.buscar(consulta, limite)]
+
+
+# -------------------------
+# Índice del proceso
+# -------------------------
+def _frecuencias() -> dict:
+    return agregados.ordenes_por_estudio()
+
+def _firma(path):
+    try:
+        stt = os.stat(path)
+        return (path, stt.st_mtime_ns, stt.st_size)
+    except OSError:
+        return (path, None, None)
+
+# Un índice por proceso: las sesiones de Streamlit (hilos) y la API lo comparten
+_compartido = {"indice": None, "firma": None, "frecuencias_t": 0.0}
+_lock_compartido = threading.Lock()
+
+def indice_compartido() -> IndiceCatalogo:
+    """Índice del proceso; se reconstruye si cambió catalogo_estudios.xlsx."""
+    with _lock_compartido:
+        firma = _firma(app_core.CATALOGO_XLSX)
+        ahora = time.monotonic()
+        if _compartido["indice"] is None or _compartido["firma"] != firma:
+            _compartido["indice"] = IndiceCatalogo(app_core.cargar_catalogo_estudios(), _frecuencias())
+            _compartido.update(firma=firma, frecuencias_t=ahora)
+        elif ahora - _compartido["frecuencias_t"] >= FRECUENCIAS_TTL_S:
+            _compartido["indice"].fijar_frecuencias(_frecuencias())
+            _compartido["frecuencias_t"] = ahora
+        return _compartido["indice"]
+
+def buscar_estudios(consulta: str, limite: int = LIMITE) -> list:
+    return indice_compartido().buscar(consulta, limite)
+
+
+if __name__ == "__main__":
+    # Uso: python catalogo_busqueda.py "biometria hem"
+    import sys
+    for r in buscar_estudios(" ".join(sys.argv[1:])):
+        print(f"{r['Codigo']:<10} {r['Nombre']:<45} {r['Categoria']:<15} {r['Ordenes']}")
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Sobre versionado para los campos cifrados (app_core.enc / dec).
+
+Resultados_enc y Observaciones_enc guardan JSON y texto libre que en paneles
+grandes llegan a varios KB; Fernet los cifra tal cual y el base64 los infla
+~33%, y cada lectura descifra el tamaño completo. Arriba de UMBRAL bytes el
+texto se comprime antes de cifrar y se guarda dentro de un sobre:
+
+    0xFF | versión (1) | códec | [id del diccionario, 4 bytes] | datos
+
+- códec b"z": zlib
+- códec b"d": zlib con diccionario precargado (zdict) entrenado sobre JSON de
+  resultados; los nombres de estudio, unidades y rangos se repiten entre
+  órdenes y con el diccionario hasta un JSON corto se comprime bien.
+El byte 0xFF nunca aparece en UTF-8, así que los valores de siempre (texto
+plano dentro del token) se distinguen sin marca y se siguen leyendo igual;
+los valores chicos o que no ganan con la compresión se guardan como antes.
+
+Diccionarios: diccionarios_lis/<id>.zdict (LIS_DICCIONARIOS_DIR) y el
+archivo "activo" con el id que usa enc. Nunca se borran: los tokens guardan
+el id con el que se escribieron. Se entrenan solo con la estructura de los
+resultados (estudios, unidades, rangos), sin valores del paciente, y entran
+en los respaldos. Si falta o está dañado el diccionario de un sobre,
+desempacar (y app_core.dec) lanza DiccionarioNoDisponible en vez de
+regresar texto vacío.
+
+Uso:
+    python compresion.py entrenar      # desde los resultados de solicitudes_lis.csv
+    python compresion.py estado
+"""
+
+import os, json, zlib, struct, threading
+from collections import Counter
+
+
+DICCIONARIOS_DIR = os.getenv("LIS_DICCIONARIOS_DIR", "diccionarios_lis")
+UMBRAL = int(os.getenv("LIS_COMPRIMIR_DESDE", "256"))   # bytes de texto
+NIVEL_ZLIB = 6
+TAM_DICCIONARIO = 32 * 1024   # la ventana de zlib: lo que exceda no se usa
+
+MARCA = b"\xff"
+VERSION = 1
+_ZLIB, _DICC = b"z", b"d"
+
+_diccionarios = {}   # id -> bytes
+_activo = {"firma": None, "id": None}
+_lock = threading.Lock()
+
+
+class DiccionarioNoDisponible(Exception):
+    """
+    Un sobre pide un diccionario que no está (otro directorio de trabajo, una
+    réplica o un respaldo sin diccionarios_lis/) o que está dañado. No es un
+    valor antiguo: el dato existe pero no se puede leer aquí.
+    """
+
+
+# -------------------------
+# Diccionarios
+# -------------------------
+def _ruta_activo() -> str:
+    return os.path.join(DICCIONARIOS_DIR, "activo")
+
+def _ruta_diccionario(id_: int) -> str:
+    return os.path.join(DICCIONARIOS_DIR, f"{id_:08x}.zdict")
+
+def diccionario(id_: int) -> bytes:
+    """Contenido del diccionario 'id_' (se lee una vez por proceso)."""
+    d = _diccionarios.get(id_)
+    if d is None:
+        ruta = _ruta_diccionario(id_)
+        try:
+            with open(ruta, "rb") as f:
+                d = f.read()
+        except OSError as e:
+            raise DiccionarioNoDisponible(
+                f"Falta el diccionario {id_:08x} ({os.path.abspath(ruta)}); "
+                f"revise LIS_DICCIONARIOS_DIR o restáurelo del respaldo."
+            ) from e
+        if zlib.crc32(d) != id_:
+            raise DiccionarioNoDisponible(f"El diccionario {id_:08x} está dañado ({os.path.abspath(ruta)}).")
+        _diccionarios[id_] = d
+    return d
+
+def diccionario_activo() -> int | None:
+    """Id del diccionario con el que se comprime ahora (None = zlib solo)."""
+    try:
+        st_ = os.stat(_ruta_activo())
+        firma = (st_.st_mtime_ns, st_.st_size, st_.st_ino)
+    except OSError:
+        return None
+    # Otra réplica pudo entrenar uno nuevo: se relee solo si cambió el archivo
+    if firma != _activo["firma"]:
+        with _lock:
+            with open(_ruta_activo(), "r", encoding="utf-8") as f:
+                texto = f.read().strip()
+            _activo.update(firma=firma, id=int(texto, 16) if texto else None)
+    return _activo["id"]
+
+def guardar_diccionario(contenido: bytes, activar: bool = True) -> int:
+    """Guarda un diccionario (inmutable, nombrado por su CRC-32) y lo activa."""
+    id_ = zlib.crc32(contenido)
+    os.makedirs(DICCIONARIOS_DIR, exist_ok=True)
+    ruta = _ruta_diccionario(id_)
+    if not os.path.exists(ruta):
+        with open(ruta + ".tmp", "wb") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + ".tmp", ruta)
+    _diccionarios[id_] = contenido
+    if activar:
+        tmp = _ruta_activo() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{id_:08x}\n")
+        os.replace(tmp, _ruta_activo())
+    return id_
+
+def entrenar(textos, tamano: int = TAM_DICCIONARIO) -> bytes:
+    """
+    Diccionario zlib a partir de JSON de resultados ({estudio: {"valor",
+    "unidad", "ref"}}, como los escribe la app). Toma los fragmentos que más
+    bytes ahorrarían (apariciones x longitud) sin el valor medido, y deja los
+    más útiles al final, donde zlib los alcanza con distancias más cortas.
+    """
+    cuenta = Counter()
+    for texto in textos:
+        try:
+            datos = json.loads(texto)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(datos, dict):
+            continue
+        for estudio, r in datos.items():
+            cuenta[json.dumps(estudio, ensure_ascii=False) + ': {"valor": "'] += 1
+            if isinstance(r, dict):
+                resto = {k: v for k, v in r.items() if k != "valor"}
+                # Igual que el texto que va después del valor en json.dumps
+                cuenta['", ' + json.dumps(resto, ensure_ascii=False)[1:]] += 1
+    fragmentos = sorted(cuenta, key=lambda s: cuenta[s] * len(s.encode()), reverse=True)
+    elegidos, total = [], 0
+    for s in fragmentos:
+        b = s.encode()
+        if total + len(b) > tamano:
+            break
+        elegidos.append(b)
+        total += len(b)
+    return b"".join(reversed(elegidos))
+
+
+# -------------------------
+# Sobre
+# -------------------------
+def empacar(datos: bytes) -> bytes:
+    """Texto UTF-8 -> lo que se cifra: el mismo texto o un sobre comprimido."""
+    if len(datos) < UMBRAL:
+        return datos
+    id_ = diccionario_activo()
+    if id_ is not None:
+        c = zlib.compressobj(NIVEL_ZLIB, zdict=diccionario(id_))
+        sobre = MARCA + bytes([VERSION]) + _DICC + struct.pack(">I", id_) + c.compress(datos) + c.flush()
+    else:
+        sobre = MARCA + bytes([VERSION]) + _ZLIB + zlib.compress(datos, NIVEL_ZLIB)
+    return sobre if len(sobre) < len(datos) else datos
+
+def desempacar(datos: bytes) -> bytes:
+    """Inverso de empacar; lo que no es sobre (valores de siempre) pasa igual."""
+    if not datos.startswith(MARCA):
+        return datos
+    version, codec = datos[1], datos[2:3]
+    if version != VERSION:
+        raise ValueError(f"Versión de sobre desconocida: {version}")
+    if codec == _ZLIB:
+        return zlib.decompress(datos[3:])
+    if codec == _DICC:
+        (id_,) = struct.unpack(">I", datos[3:7])
+        d = zlib.decompressobj(zdict=diccionario(id_))
+        return d.decompress(datos[7:]) + d.flush()
+    raise ValueError(f"Códec de sobre desconocido: {codec!r}")
+
+
+if __name__ == "__main__":
+    import sys
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "entrenar":
+        import app_core
+        df = app_core.read_csv(columnas=["Resultados_enc"])
+        contenido = entrenar(app_core.dec(t) for t in df["Resultados_enc"].dropna())
+        if not contenido:
+            print("No hay resultados para entrenar.")
+            sys.exit(1)
+        print(json.dumps({"id": f"{guardar_diccionario(contenido):08x}", "bytes": len(contenido)}))
+    elif cmd == "estado":
+        id_ = diccionario_activo()
+        print(json.dumps({"umbral": UMBRAL, "activo": None if id_ is None else f"{id_:08x}"}))
+    else:
+        print("Uso: python compresion.py entrenar | estado")
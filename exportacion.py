@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Exportación analítica de la tabla de órdenes a Parquet o Arrow IPC (BI).
+
+A diferencia de export_excel (XLSX completo en claro):
+- se lee el CSV por lotes (pyarrow.csv.open_csv) y se escribe lote por lote:
+  la memoria no depende del tamaño de la tabla y no hay límite de filas;
+- proyección de columnas: solo se leen y descifran las que se piden;
+- con seudónimos (por defecto) Nombre, Telefono y Emails no salen en claro:
+  se reemplazan por un HMAC con llave del valor normalizado, estable entre
+  exportaciones (la misma persona da el mismo seudónimo). Direccion y
+  Observaciones son texto libre y en ese modo no se exportan;
+- incremental: con el feed de cambios (cambios.py) solo se exportan los folios
+  que cambiaron desde la corrida anterior. Cada corrida deja un archivo nuevo
+  en el directorio; BI se queda con la última versión de cada Folio. Las
+  órdenes archivadas (retencion.py) salen como una fila con solo Folio y
+  Estado "archivado".
+
+Uso:
+    python exportacion.py completo export_bi/
+    python exportacion.py incremental export_bi/ --formato arrow
+    python exportacion.py completo export_bi/ --columnas Folio,Estado,Nombre --sin-seudonimos
+"""
+
+import os, json, hmac, hashlib, base64
+from datetime import datetime
+
+import pandas as pd
+
+import app_core
+import cambios
+
+
+EXPORT_DIR = os.getenv("LIS_EXPORT_DIR", "export_bi")
+FILAS_POR_LOTE = 50_000
+COMPRESION_PARQUET = "zstd"
+_ESTADO = "_estado_exportacion.json"
+
+# Columna exportada -> columna cifrada de origen
+CIFRADAS = {
+    "Nombre": "Nombre_enc",
+    "Telefono": "Telefono_enc",
+    "Direccion": "Direccion_enc",
+    "Emails": "Emails_enc",
+    "Observaciones": "Observaciones_enc",
+    "Resultados": "Resultados_enc",
+}
+SEUDONIMIZABLES = ("Nombre", "Telefono", "Emails")
+TEXTO_LIBRE = ("Direccion", "Observaciones")
+COLUMNAS = [
+    "Folio", "Fecha_Registro", "Fecha_Programada", "Fecha_Firma", "Costo_MXN",
+    "Edad", "Genero", "Tipo_Estudio", "Estado",
+    "Nombre", "Telefono", "Emails", "Direccion", "Observaciones", "Resultados",
+]
+# Lo que recibe BI si no pide columnas: sin texto libre ni resultados (pesados)
+COLUMNAS_DEFECTO = [
+    "Folio", "Fecha_Registro", "Fecha_Programada", "Fecha_Firma", "Costo_MXN",
+    "Edad", "Genero", "Tipo_Estudio", "Estado", "Nombre", "Telefono", "Emails",
+]
+
+
+# -------------------------
+# Seudónimos
+# -------------------------
+def _llave_seudonimos() -> bytes:
+    """LIS_SEUDONIMO_KEY si existe; si no, derivada de la llave Fernet."""
+    env = os.getenv("LIS_SEUDONIMO_KEY")
+    if env:
+        return env.encode()
+    return hashlib.sha256(b"seudonimos-lis:" + app_core.load_or_create_key()).digest()
+
+def _normalizar(columna: str, valor: str) -> list:
+    if columna == "Telefono":
+        digitos = "".join(c for c in valor if c.isdigit())
+        return [digitos] if digitos else []
+    if columna == "Emails":
+        return sorted({e.strip().casefold() for e in valor.replace(";", ",").split(",") if e.strip()})
+    texto = " ".join(valor.split()).casefold()
+    return [texto] if texto else []
+
+def seudonimo(columna: str, valor, llave: bytes | None = None) -> str:
+    """
+    Seudónimo estable de un valor en claro ("" si está vacío). Emails con
+    varias direcciones dan un seudónimo por dirección, separados por ';'.
+    """
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    llave = llave or _llave_seudonimos()
+    partes = []
+    for v in _normalizar(columna, str(valor)):
+        mac = hmac.new(llave, f"{columna}:{v}".encode(), hashlib.sha256).digest()
+        partes.append(base64.b32encode(mac[:10]).decode().lower())
+    return ";".join(partes)
+
+
+# -------------------------
+# Lotes
+# -------------------------
+def _esquema_salida(columnas: list):
+    import pyarrow as pa
+    tipos = {
+        "Fecha_Registro": pa.timestamp("s"), "Fecha_Programada": pa.date32(),
+        "Fecha_Firma": pa.timestamp("s"), "Costo_MXN": pa.float64(), "Edad": pa.uint8(),
+    }
+    return pa.schema([(c, tipos.get(c, pa.string())) for c in columnas])
+
+def _lote_a_tabla(lote, columnas: list, seudonimos: bool, llave: bytes, esquema):
+    """RecordBatch del CSV (texto) -> tabla con el esquema de salida."""
+    import pyarrow as pa
+
+    crudo = lote.to_pandas()
+    df = app_core.aplicar_esquema(
+        crudo[[c for c in crudo.columns if c in app_core.DTYPES or c in app_core.COLUMNAS_FECHA]]
+    )
+    out = {}
+    for c in columnas:
+        if c in CIFRADAS:
+            claro = crudo[CIFRADAS[c]].map(app_core.dec, na_action="ignore")
+            if seudonimos and c in SEUDONIMIZABLES:
+                out[c] = claro.map(lambda v: seudonimo(c, v, llave))
+            else:
+                out[c] = claro.fillna("").astype(str)
+        elif c == "Fecha_Programada":
+            out[c] = df[c].dt.date
+        elif c in ("Fecha_Registro", "Fecha_Firma"):
+            out[c] = df[c].astype("datetime64[s]")
+        else:
+            out[c] = df[c].astype(object).where(df[c].notna(), None)
+    return pa.Table.from_pandas(pd.DataFrame(out), schema=esquema, preserve_index=False)
+
+def _lapidas(folios: set, esquema):
+    """
+    Filas de las órdenes que salieron de la tabla viva (retencion.py): solo
+    Folio y Estado "archivado", para que BI, que se queda con la última
+    versión de cada folio, sepa que ya no están.
+    """
+    import pyarrow as pa
+    folios = sorted(folios)
+    columnas = {
+        c.name: (pa.array(folios, pa.string()) if c.name == "Folio"
+                 else pa.array(["archivado"] * len(folios), pa.string()) if c.name == "Estado"
+                 else pa.nulls(len(folios), c.type))
+        for c in esquema
+    }
+    return pa.table(columnas, schema=esquema)
+
+def _origen(columnas: list) -> list:
+    """Columnas del CSV que hay que leer para producir 'columnas'."""
+    encabezado = app_core._encabezado()
+    necesarias = ["Folio"] + [CIFRADAS.get(c, c) for c in columnas]
+    return [c for c in dict.fromkeys(necesarias) if c in encabezado]
+
+def _escritor(path: str, formato: str, esquema):
+    import pyarrow as pa
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, esquema, compression=COMPRESION_PARQUET)
+    if formato == "arrow":
+        return pa.ipc.new_file(path, esquema)
+    raise ValueError(f"Formato no soportado: {formato} (parquet o arrow)")
+
+
+# -------------------------
+# Exportación
+# -------------------------
+def _cargar_estado(directorio: str) -> dict:
+    try:
+        with open(os.path.join(directorio, _ESTADO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _guardar_estado(directorio: str, estado: dict) -> None:
+    path = os.path.join(directorio, _ESTADO)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def exportar(directorio: str = EXPORT_DIR, formato: str = "parquet", columnas=None,
+             seudonimos: bool = True, incremental: bool = False,
+             filas_por_lote: int = FILAS_POR_LOTE) -> dict:
+    """
+    Exporta la tabla (o solo lo que cambió si 'incremental') a un archivo nuevo
+    en 'directorio'. Regresa {"archivo", "modo", "filas", "lotes", "seq",
+    "archivados"}; "archivo" es None si no hubo cambios.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    columnas = list(columnas or COLUMNAS_DEFECTO)
+    desconocidas = [c for c in columnas if c not in COLUMNAS]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+    if seudonimos and any(c in TEXTO_LIBRE for c in columnas):
+        raise ValueError("Direccion y Observaciones son texto libre: solo se exportan sin seudónimos.")
+    os.makedirs(directorio, exist_ok=True)
+
+    # Primero el feed y luego el CSV: lo que cambie en medio sale de nuevo la próxima vez
+    estado = _cargar_estado(directorio)
+    folios, archivados, modo = None, set(), "completo"
+    if incremental and estado.get("cambios"):
+        sub = cambios.Suscriptor(**estado["cambios"])
+        eventos = sub.pendientes()
+        if not sub.reinicio:
+            folios, modo = {str(ev.get("folio")) for ev in eventos}, "incremental"
+            archivados = {str(ev.get("folio")) for ev in eventos if ev.get("operacion") == "archivado"}
+    if folios is None:
+        sub = cambios.Suscriptor.desde_ahora()
+    nuevo_estado = {
+        "cambios": {"offset": sub.offset, "seq": sub.seq, "inodo": sub.inodo},
+        "ultima": datetime.now().isoformat(timespec="seconds"),
+    }
+    if folios is not None and not folios:
+        _guardar_estado(directorio, nuevo_estado)
+        return {"archivo": None, "modo": modo, "filas": 0, "lotes": 0, "seq": sub.seq,
+                "archivados": 0}
+
+    origen = _origen(columnas)
+    esquema = _esquema_salida(columnas)
+    llave = _llave_seudonimos() if seudonimos else b""
+    ext = "parquet" if formato == "parquet" else "arrow"
+    nombre = f"ordenes_{modo}_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.{ext}"
+    path = os.path.join(directorio, nombre)
+    tmp = path + ".tmp"
+
+    filas = lotes = 0
+    filtro = pa.array(sorted(folios), pa.string()) if folios is not None else None
+    lector = pa_csv.open_csv(
+        app_core.CSV_PATH,
+        read_options=pa_csv.ReadOptions(block_size=max(1 << 20, filas_por_lote * 1024)),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=origen,
+            column_types={c: pa.string() for c in origen},
+            strings_can_be_null=True,
+        ),
+    )
+    with _escritor(tmp, formato, esquema) as escritor:
+        for lote in lector:
+            if filtro is not None:
+                lote = lote.filter(pc.is_in(lote.column("Folio"), value_set=filtro))
+            if not lote.num_rows:
+                continue
+            tabla = _lote_a_tabla(lote, columnas, seudonimos, llave, esquema)
+            escritor.write_table(tabla)
+            filas += tabla.num_rows
+            lotes += 1
+        if archivados and "Folio" in columnas:
+            escritor.write_table(_lapidas(archivados, esquema))
+            lotes += 1
+    os.replace(tmp, path)
+    _guardar_estado(directorio, nuevo_estado)
+    return {"archivo": path, "modo": modo, "filas": filas, "lotes": lotes, "seq": sub.seq,
+            "archivados": len(archivados)}
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Exportación analítica (Parquet / Arrow IPC).")
+    ap.add_argument("modo", choices=["completo", "incremental"])
+    ap.add_argument("directorio", nargs="?", default=EXPORT_DIR)
+    ap.add_argument("--formato", choices=["parquet", "arrow"], default="parquet")
+    ap.add_argument("--columnas", default="", help="separadas por coma (por defecto: sin texto libre)")
+    ap.add_argument("--sin-seudonimos", action="store_true", help="exporta Nombre/Telefono/Emails en claro")
+    args = ap.parse_args()
+    r = exportar(
+        args.directorio, args.formato,
+        [c for c in args.columnas.split(",") if c] or None,
+        seudonimos=not args.sin_seudonimos, incremental=args.modo == "incremental",
+    )
+    print(json.dumps(r, ensure_ascii=False))
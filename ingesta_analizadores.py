@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""
+Ingesta de resultados de analizadores (ASTM E1394 / HL7 v2 ORU^R01).
+
+Fuentes: directorio de "drop" (archivos .astm/.hl7/.txt) o socket TCP local.
+Pipeline de generadores:
+
+    líneas -> mensajes -> resultados (folio, código) -> mapeo a catálogo
+           -> lotes por folio -> save_results_lote (estado 'capturado')
+
+- idempotencia: cada mensaje (id de control o hash) se aplica una sola vez
+- un archivo del directorio se mueve a procesados/ solo después del commit
+  que guardó sus resultados; si el proceso cae antes, se vuelve a leer y
+  los mensajes ya aplicados se ignoran
+- socket: cada conexión arma sus propios mensajes; al escritor solo llegan
+  mensajes completos, así dos analizadores conectados a la vez no se mezclan
+- backpressure: cola acotada entre el lector y el escritor; si el escritor se
+  atrasa, el lector (y el socket) se bloquean en lugar de acumular memoria
+- mapeo: mapa_analizadores.json {"GLU": "EST001" | "Química sanguínea"}; si
+  no hay entrada se intenta el código directo del catálogo
+
+Uso:
+    python ingesta_analizadores.py directorio entrada_analizadores/
+    python ingesta_analizadores.py tcp 5150
+"""
+
+import os, re, json, time, queue, shutil, hashlib, threading, socketserver
+from dataclasses import dataclass
+
+from app_core import save_results_lote, cargar_catalogo_estudios
+
+
+MAPA_PATH = "mapa_analizadores.json"
+VISTOS_PATH = "ingesta_vistos.json"
+MAX_VISTOS = 200_000
+LOTE_RESULTADOS = 200      # resultados por commit
+ESPERA_MAX_S = 2.0         # o cada cuántos segundos como máximo
+COLA_MAX = 1_000           # mensajes en vuelo antes de bloquear al lector
+USUARIO_AUDITORIA = "ingesta_analizadores"
+
+_CTRL = re.compile(r"^[\x02\x05\x06\x17\x03\x04]*\d?")
+# Tipo de los marcadores de fin de archivo en el flujo de mensajes
+FIN_ARCHIVO = "fin_archivo"
+
+
+@dataclass
+class Resultado:
+    id_mensaje: str
+    folio: str
+    codigo: str
+    valor: str
+    unidad: str = ""
+    ref: str = ""
+
+
+@dataclass
+class FinArchivo:
+    """Fin de un archivo del directorio: se mueve a `procesados` tras el commit."""
+    ruta: str
+    procesados: str
+
+    def mover(self) -> None:
+        if os.path.exists(self.ruta):
+            shutil.move(self.ruta, os.path.join(self.procesados, os.path.basename(self.ruta)))
+
+
+# -------------------------
+# Fuentes de líneas
+# -------------------------
+def lineas_de_texto(texto: str):
+    for linea in re.split(r"\r\n|\r|\n", texto):
+        yield linea
+
+def lineas_de_directorio(directorio: str, procesados: str | None = None, seguir: bool = False,
+                         intervalo_s: float = 1.0, detener: threading.Event | None = None):
+    """
+    Recorre los archivos del directorio (más antiguos primero). Al final de
+    cada uno emite un FinArchivo: Ingesta lo mueve a `procesados` cuando ya
+    guardó sus resultados. Con seguir=True se queda esperando archivos nuevos.
+    """
+    procesados = procesados or os.path.join(directorio, "procesados")
+    os.makedirs(procesados, exist_ok=True)
+    # Archivos ya leídos que siguen ahí porque su commit no ha llegado
+    leidos = set()
+    while True:
+        archivos = []
+        for a in os.listdir(directorio):
+            ruta = os.path.join(directorio, a)
+            if a.startswith(".") or not os.path.isfile(ruta):
+                continue
+            try:
+                st_ = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            archivos.append((st_.st_mtime, ruta, (ruta, st_.st_mtime_ns, st_.st_size, st_.st_ino)))
+        presentes = {ident for _, _, ident in archivos}
+        leidos &= presentes
+        for _, ruta, ident in sorted(archivos):
+            if ident in leidos:
+                continue
+            leidos.add(ident)
+            with open(ruta, "r", encoding="latin-1") as f:
+                for linea in f:
+                    # Sin el salto final: si no, cada línea traería una vacía detrás
+                    # y la vacía cierra el mensaje HL7 en curso
+                    yield from lineas_de_texto(linea.rstrip("\r\n"))
+            yield FinArchivo(ruta, procesados)
+        if not seguir or (detener is not None and detener.is_set()):
+            return
+        time.sleep(intervalo_s)
+
+
+# -------------------------
+# Parser: líneas -> mensajes
+# -------------------------
+def mensajes(lineas):
+    """
+    Agrupa líneas en mensajes. ASTM: de H| a L|. HL7: de MSH| al siguiente MSH|
+    o línea vacía. Quita caracteres de control y el número de frame ASTM.
+    Un FinArchivo cierra el mensaje en curso y pasa como (FIN_ARCHIVO, marca).
+    """
+    actual, tipo = [], None
+    for cruda in lineas:
+        if isinstance(cruda, FinArchivo):
+            if actual:
+                yield tipo, actual
+                actual, tipo = [], None
+            yield FIN_ARCHIVO, cruda
+            continue
+        linea = _CTRL.sub("", cruda).rstrip()
+        if not linea:
+            if tipo == "hl7" and actual:
+                yield tipo, actual
+                actual, tipo = [], None
+            continue
+        if linea.startswith("MSH|"):
+            if actual:
+                yield tipo, actual
+            actual, tipo = [linea], "hl7"
+        elif linea.startswith("H|"):
+            if actual:
+                yield tipo, actual
+            actual, tipo = [linea], "astm"
+        elif tipo is not None:
+            actual.append(linea)
+            if tipo == "astm" and linea.startswith("L|"):
+                yield tipo, actual
+                actual, tipo = [], None
+    if actual:
+        yield tipo, actual
+
+def _id_mensaje(segmentos: list, control: str) -> str:
+    return control or hashlib.sha256("\n".join(segmentos).encode()).hexdigest()[:32]
+
+def _campo(campos: list, i: int, comp: int | None = None, sep: str = "^") -> str:
+    v = campos[i] if i < len(campos) else ""
+    if comp is None:
+        return v.strip()
+    partes = v.split(sep)
+    return partes[comp].strip() if comp < len(partes) else ""
+
+def _resultados_astm(segs: list):
+    h = segs[0].split("|")
+    id_msg = _id_mensaje(segs, _campo(h, 2))
+    folio = ""
+    for s in segs[1:]:
+        c = s.split("|")
+        if c[0] == "O":
+            # Specimen ID (O.3); algunos equipos lo mandan en O.4
+            folio = _campo(c, 2, 0) or _campo(c, 3, 0)
+        elif c[0] == "R" and folio:
+            codigo = next((p for p in reversed(_campo(c, 2).split("^")) if p.strip()), "")
+            if codigo:
+                yield Resultado(id_msg, folio, codigo.strip(), _campo(c, 3), _campo(c, 4, 0), _campo(c, 5))
+
+def _resultados_hl7(segs: list):
+    msh = segs[0].split("|")
+    # En MSH el separador cuenta como MSH-1, así que MSH-10 queda en el índice 9
+    id_msg = _id_mensaje(segs, _campo(msh, 9))
+    folio = ""
+    for s in segs[1:]:
+        c = s.split("|")
+        if c[0] == "OBR":
+            folio = _campo(c, 3, 0) or _campo(c, 2, 0)
+        elif c[0] == "OBX" and folio:
+            codigo = _campo(c, 3, 0)
+            if codigo:
+                yield Resultado(id_msg, folio, codigo, _campo(c, 5), _campo(c, 6, 0), _campo(c, 7))
+
+def resultados(msgs):
+    """Mensajes -> un Resultado por cada registro R (ASTM) u OBX (HL7)."""
+    for tipo, segs in msgs:
+        if tipo == FIN_ARCHIVO:
+            continue
+        parser = _resultados_astm if tipo == "astm" else _resultados_hl7
+        yield from parser(segs)
+
+
+# -------------------------
+# Mapeo a catálogo
+# -------------------------
+def cargar_mapa() -> dict:
+    """código de instrumento -> nombre del estudio en el catálogo."""
+    cat = cargar_catalogo_estudios()
+    por_codigo = {}
+    if not cat.empty and "Codigo" in cat.columns:
+        por_codigo = dict(zip(cat["Codigo"].astype(str).str.upper(), cat["Nombre"].astype(str)))
+    mapa = dict(por_codigo)
+    if os.path.exists(MAPA_PATH):
+        with open(MAPA_PATH, "r", encoding="utf-8") as f:
+            for instr, destino in json.load(f).items():
+                destino = str(destino)
+                # el destino puede ser un Codigo del catálogo o directamente el Nombre
+                mapa[instr.upper()] = por_codigo.get(destino.upper(), destino)
+    return mapa
+
+
+# -------------------------
+# Idempotencia
+# -------------------------
+class RegistroVistos:
+    """Ids de mensajes ya aplicados (persistidos, acotados a MAX_VISTOS)."""
+
+    def __init__(self, path: str = VISTOS_PATH):
+        self.path = path
+        self._ids = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._ids = dict.fromkeys(json.load(f))
+            except Exception:
+                self._ids = {}
+
+    def __contains__(self, id_msg: str) -> bool:
+        return id_msg in self._ids
+
+    def agregar(self, ids) -> None:
+        for i in ids:
+            self._ids[i] = None
+        if len(self._ids) > MAX_VISTOS:
+            for k in list(self._ids)[: len(self._ids) - MAX_VISTOS]:
+                del self._ids[k]
+
+    def guardar(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(list(self._ids), f)
+        os.replace(tmp, self.path)
+
+
+# -------------------------
+# Pipeline
+# -------------------------
+class Ingesta:
+    def __init__(self, lote: int = LOTE_RESULTADOS, espera_max_s: float = ESPERA_MAX_S):
+        self.lote = lote
+        self.espera_max_s = espera_max_s
+        self.mapa = cargar_mapa()
+        self.vistos = RegistroVistos()
+        self.stats = {
+            "mensajes": 0, "resultados": 0, "duplicados": 0, "sin_mapeo": 0,
+            "folios_no_encontrados": 0, "folios_firmados": 0, "commits": 0, "segundos": 0.0,
+        }
+        self._pendiente = {}       # folio -> {estudio: {...}}
+        self._ids_pendientes = set()
+        self._n_pendiente = 0
+        self._archivos = []        # FinArchivo cuyos mensajes ya se acumularon
+        self._ultimo_commit = time.monotonic()
+
+    def _acumular(self, r: Resultado) -> None:
+        estudio = self.mapa.get(r.codigo.upper())
+        if not estudio:
+            self.stats["sin_mapeo"] += 1
+            return
+        self._pendiente.setdefault(r.folio, {})[estudio] = {"valor": r.valor, "unidad": r.unidad, "ref": r.ref}
+        self._n_pendiente += 1
+        self.stats["resultados"] += 1
+
+    def _cerrar_archivos(self) -> None:
+        # Solo después de guardar resultados y vistos: antes, una caída perdería el archivo
+        for fin in self._archivos:
+            fin.mover()
+        self._archivos.clear()
+
+    def commit(self) -> None:
+        """Aplica lo acumulado: una lectura y una escritura del CSV por commit."""
+        if not self._pendiente:
+            if self._ids_pendientes:
+                self.vistos.agregar(self._ids_pendientes)
+                self.vistos.guardar()
+                self._ids_pendientes.clear()
+            self._cerrar_archivos()
+            return
+        # Solo los estudios nuevos: se combinan con lo guardado bajo el candado
+        # de escritura, así no se pierde una captura hecha en medio
+        items = [{"folio": folio, "resultados": nuevos, "liberar": False, "combinar": True}
+                 for folio, nuevos in self._pendiente.items()]
+        # Sin validar contra los estudios de la orden: el analizador puede
+        # reportar estudios extra y antes también se guardaban
+        for r in save_results_lote(items, usuario=USUARIO_AUDITORIA, validar=False):
+            if not r["ok"]:
+                # Un reporte firmado no se modifica desde el analizador
+                self.stats["folios_firmados" if r["estado_anterior"] == "firmado" else "folios_no_encontrados"] += 1
+        self.vistos.agregar(self._ids_pendientes)
+        self.vistos.guardar()
+        self._cerrar_archivos()
+        self._pendiente.clear()
+        self._ids_pendientes.clear()
+        self._n_pendiente = 0
+        self._ultimo_commit = time.monotonic()
+        self.stats["commits"] += 1
+
+    def procesar_mensaje(self, tipo: str, segs) -> None:
+        if tipo == FIN_ARCHIVO:
+            self._archivos.append(segs)
+            return
+        rs = list(resultados([(tipo, segs)]))
+        self.stats["mensajes"] += 1
+        id_msg = rs[0].id_mensaje if rs else None
+        if id_msg and (id_msg in self.vistos or id_msg in self._ids_pendientes):
+            self.stats["duplicados"] += 1
+            return
+        for r in rs:
+            self._acumular(r)
+        if id_msg:
+            self._ids_pendientes.add(id_msg)
+        if self._n_pendiente >= self.lote or time.monotonic() - self._ultimo_commit >= self.espera_max_s:
+            self.commit()
+
+    def procesar(self, lineas) -> dict:
+        """Modo síncrono: consume un iterable de líneas hasta agotarlo."""
+        t0 = time.perf_counter()
+        for tipo, segs in mensajes(lineas):
+            self.procesar_mensaje(tipo, segs)
+        self.commit()
+        self.stats["segundos"] += time.perf_counter() - t0
+        return self.resumen()
+
+    def procesar_con_cola(self, lineas, cola_max: int = COLA_MAX) -> dict:
+        """
+        Lector y escritor en hilos separados unidos por una cola acotada: el
+        parseo no se detiene durante un commit, pero nunca adelanta más de
+        `cola_max` mensajes.
+        """
+        cola = queue.Queue(maxsize=cola_max)
+        fin = object()
+
+        def _lector():
+            for m in mensajes(lineas):
+                cola.put(m)  # bloquea si el escritor va atrasado
+            cola.put(fin)
+
+        hilo = threading.Thread(target=_lector, name="ingesta-lector", daemon=True)
+        hilo.start()
+        resumen = self.consumir(cola, fin)
+        hilo.join()
+        return resumen
+
+    def consumir(self, cola: queue.Queue, fin=None) -> dict:
+        """
+        Escritor: procesa los mensajes (tipo, segmentos) de la cola hasta
+        recibir `fin`; si no llega nada en espera_max_s, aplica lo acumulado.
+        """
+        t0 = time.perf_counter()
+        while True:
+            try:
+                m = cola.get(timeout=self.espera_max_s)
+            except queue.Empty:
+                self.commit()
+                continue
+            if m is fin:
+                break
+            self.procesar_mensaje(*m)
+        self.commit()
+        self.stats["segundos"] += time.perf_counter() - t0
+        return self.resumen()
+
+    def resumen(self) -> dict:
+        s = dict(self.stats)
+        s["mensajes_por_s"] = s["mensajes"] / s["segundos"] if s["segundos"] else 0.0
+        return s
+
+
+# -------------------------
+# Socket TCP
+# -------------------------
+def servidor_tcp(puerto: int, host: str = "127.0.0.1", cola_max: int = COLA_MAX):
+    """
+    Acepta conexiones de analizadores. Cada conexión agrupa sus propias
+    líneas en mensajes y pasa solo mensajes completos a una Ingesta por una
+    cola acotada (si se llena, se deja de leer el socket: backpressure TCP).
+    Regresa (servidor, ingesta, hilo_escritor).
+    """
+    cola = queue.Queue(maxsize=cola_max)
+
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lineas = (l for cruda in self.rfile
+                      for l in lineas_de_texto(cruda.decode("latin-1").rstrip("\r\n")))
+            for m in mensajes(lineas):
+                cola.put(m)
+
+    servidor = socketserver.ThreadingTCPServer((host, puerto), _Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="ingesta-tcp", daemon=True).start()
+    ingesta = Ingesta()
+    escritor = threading.Thread(target=ingesta.consumir, args=(cola,),
+                                name="ingesta-escritor", daemon=True)
+    escritor.start()
+    return servidor, ingesta, escritor
+
+
+# -------------------------
+# Feed sintético
+# -------------------------
+def feed_sintetico(folios: list, n_mensajes: int, codigos: list, semilla: int = 2006,
+                   proporcion_hl7: float = 0.5, duplicados: float = 0.02):
+    """Genera líneas ASTM/HL7 con ~`duplicados` de mensajes repetidos."""
+    import random
+    rng = random.Random(semilla)
+    previos = []
+    for i in range(n_mensajes):
+        if previos and rng.random() < duplicados:
+            yield from rng.choice(previos)
+            continue
+        folio = rng.choice(folios)
+        pruebas = rng.sample(codigos, min(len(codigos), rng.randint(1, 6)))
+        if rng.random() < proporcion_hl7:
+            lineas = [f"MSH|^~\\&|ANALIZADOR|LAB|LIS|LABZA|20260101120000||ORU^R01|M{i:08d}|P|2.5",
+                      f"PID|1||{folio}", f"OBR|1|{folio}|{folio}|PANEL"]
+            lineas += [f"OBX|{j + 1}|NM|{p}^{p}||{rng.uniform(1, 200):.1f}|mg/dL|70-110|N|||F"
+                       for j, p in enumerate(pruebas)]
+            lineas.append("")
+        else:
+            lineas = [f"H|\\^&|A{i:08d}|||ANALIZADOR|||||||P|1", f"P|1||{folio}", f"O|1|{folio}||^^^PANEL"]
+            lineas += [f"R|{j + 1}|^^^{p}|{rng.uniform(1, 200):.1f}|mg/dL|70-110|N||F"
+                       for j, p in enumerate(pruebas)]
+            lineas.append("L|1|N")
+        previos.append(lineas)
+        if len(previos) > 100:
+            previos.pop(0)
+        yield from lineas
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "directorio":
+        ing = Ingesta()
+        print(ing.procesar_con_cola(lineas_de_directorio(sys.argv[2], seguir=True)))
+    elif len(sys.argv) >= 3 and sys.argv[1] == "tcp":
+        srv, ing, escritor = servidor_tcp(int(sys.argv[2]))
+        print(f"Escuchando analizadores en 127.0.0.1:{sys.argv[2]}")
+        try:
+            while True:
+                time.sleep(10)
+                print(ing.resumen())
+        except KeyboardInterrupt:
+            srv.shutdown()
+    else:
+        print(__doc__)
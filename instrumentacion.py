@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación ligera de las rutas calientes de app_core.
+
+- @medido("op") / with medir("op"): latencia y número de llamadas por operación
+- histogramas acumulados compatibles con Prometheus (archivo de texto o HTTP)
+- desglose de tiempos por rerun de Streamlit (panel en la pestaña Admin)
+
+Se activa con la variable de entorno LIS_METRICAS=1 (o activar()). Desactivada,
+el decorador solo agrega una comparación booleana por llamada.
+"""
+
+import os, time, threading, functools
+from contextlib import contextmanager
+
+
+METRICAS_ACTIVAS = os.getenv("LIS_METRICAS", "0").lower() in ("1", "true", "si", "sí")
+PROMETHEUS_PATH = os.getenv("LIS_METRICAS_ARCHIVO", "metricas_lis.prom")
+
+# Límites superiores de las cubetas (segundos)
+CUBETAS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_operaciones = {}          # nombre -> {"n", "suma", "cubetas": [..]}
+_local = threading.local() # desglose del rerun actual (por hilo/sesión)
+
+
+def activar(valor: bool = True) -> None:
+    global METRICAS_ACTIVAS
+    METRICAS_ACTIVAS = bool(valor)
+
+def _registrar(nombre: str, dur: float) -> None:
+    with _lock:
+        op = _operaciones.get(nombre)
+        if op is None:
+            op = _operaciones[nombre] = {"n": 0, "suma": 0.0, "cubetas": [0] * (len(CUBETAS_S) + 1)}
+        op["n"] += 1
+        op["suma"] += dur
+        for i, lim in enumerate(CUBETAS_S):
+            if dur <= lim:
+                op["cubetas"][i] += 1
+                break
+        else:
+            op["cubetas"][-1] += 1
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun.append((nombre, dur))
+
+
+# -------------------------
+# Decorador / context manager
+# -------------------------
+def medido(nombre: str | None = None):
+    """Decorador: mide cada llamada a la función bajo `nombre`."""
+    def deco(fn):
+        etiqueta = nombre or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICAS_ACTIVAS:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _registrar(etiqueta, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+@contextmanager
+def medir(nombre: str):
+    """Context manager equivalente a @medido para bloques de código."""
+    if not METRICAS_ACTIVAS:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar(nombre, time.perf_counter() - t0)
+
+
+# -------------------------
+# Desglose por rerun
+# -------------------------
+def iniciar_rerun() -> None:
+    """Marca el inicio de un rerun; las mediciones del hilo se acumulan aparte."""
+    _local.rerun = []
+    _local.inicio = time.perf_counter()
+
+def desglose_rerun() -> list[dict]:
+    """
+    Regresa [{"Operacion", "Llamadas", "Total_ms"}] del rerun actual, ordenado
+    por tiempo total, más una fila con el tiempo transcurrido del rerun.
+    """
+    rerun = getattr(_local, "rerun", None) or []
+    total = {}
+    for nombre, dur in rerun:
+        n, s = total.get(nombre, (0, 0.0))
+        total[nombre] = (n + 1, s + dur)
+    filas = [
+        {"Operacion": k, "Llamadas": n, "Total_ms": round(s * 1000, 2)}
+        for k, (n, s) in sorted(total.items(), key=lambda kv: -kv[1][1])
+    ]
+    inicio = getattr(_local, "inicio", None)
+    if inicio is not None:
+        filas.append({"Operacion": "(rerun hasta aquí)", "Llamadas": 1,
+                      "Total_ms": round((time.perf_counter() - inicio) * 1000, 2)})
+    return filas
+
+
+# -------------------------
+# Consulta / exportación
+# -------------------------
+def instantanea() -> dict:
+    """Copia de los contadores actuales: {op: {"n", "suma", "cubetas"}}."""
+    with _lock:
+        return {k: {"n": v["n"], "suma": v["suma"], "cubetas": list(v["cubetas"])}
+                for k, v in _operaciones.items()}
+
+def reiniciar() -> None:
+    with _lock:
+        _operaciones.clear()
+
+def texto_prometheus() -> str:
+    """Formato de exposición de texto de Prometheus (histograma por operación)."""
+    lineas = [
+        "# HELP lis_operacion_segundos Latencia de operaciones de app_core.",
+        "# TYPE lis_operacion_segundos histogram",
+    ]
+    for op, v in sorted(instantanea().items()):
+        acumulado = 0
+        for lim, c in zip(CUBETAS_S, v["cubetas"]):
+            acumulado += c
+            lineas.append(f'lis_operacion_segundos_bucket{{op="{op}",le="{lim}"}} {acumulado}')
+        acumulado += v["cubetas"][-1]
+        lineas.append(f'lis_operacion_segundos_bucket{{op="{op}",le="+Inf"}} {acumulado}')
+        lineas.append(f'lis_operacion_segundos_sum{{op="{op}"}} {v["suma"]:.6f}')
+        lineas.append(f'lis_operacion_segundos_count{{op="{op}"}} {v["n"]}')
+    return "\n".join(lineas) + "\n"
+
+def escribir_prometheus(path: str = PROMETHEUS_PATH) -> str:
+    """Escribe el archivo .prom (para el textfile collector de node_exporter)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(texto_prometheus())
+    os.replace(tmp, path)
+    return path
+
+_servidor = {"httpd": None}
+
+def iniciar_servidor_metricas(puerto: int = 9108, host: str = "127.0.0.1"):
+    """
+    Expone /metrics en un hilo de fondo (idempotente: una vez por proceso).
+    """
+    if _servidor["httpd"] is not None:
+        return _servidor["httpd"]
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("/metrics", ""):
+                self.send_error(404)
+                return
+            cuerpo = texto_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, puerto), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    _servidor["httpd"] = httpd
+    return httpd
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Lista de trabajo del laboratorio con índices en memoria.
+
+En vez de mandar todos los folios a un selectbox, se mantienen:
+- por estado: lista ordenada por (Fecha_Programada, Fecha_Registro, Folio)
+  -> las órdenes más próximas y, entre ellas, las más antiguas primero;
+- por folio: lista ordenada para búsqueda por prefijo (typeahead).
+
+Se carga del CSV una vez por proceso (solo columnas no cifradas) y después
+se actualiza con los eventos de cambios.py, así que una consulta cuesta
+O(log n + página) y no una lectura del almacén.
+"""
+
+import heapq, threading
+from bisect import bisect_left, insort
+
+import app_core
+import cambios
+
+
+ESTADOS_ACTIVOS = ("pendiente", "capturado")
+# Las órdenes sin fecha programada van al final
+_SIN_FECHA = "~"
+
+
+def _llave(folio: str, fecha_prog, fecha_reg) -> tuple:
+    prog = app_core.fecha_texto(fecha_prog, solo_fecha=True) or _SIN_FECHA
+    return (prog, app_core.fecha_texto(fecha_reg), folio)
+
+
+class ListaTrabajo:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ordenes = {}       # folio -> (estado, llave)
+        self.por_estado = {}    # estado -> [llave, ...] ordenada
+        self.folios = []        # folios ordenados (prefijo)
+        self.sub = None
+        self.version = 0        # cambia con cada actualización aplicada
+
+    # -------------------------
+    # Carga e índices
+    # -------------------------
+    def cargar(self) -> None:
+        with self._lock:
+            # Primero se suscribe y luego se lee: lo que llegue en medio se reaplica
+            self.sub = cambios.Suscriptor.desde_ahora()
+            df = app_core.read_csv(columnas=["Folio", "Estado", "Fecha_Programada", "Fecha_Registro"])
+            self.ordenes, self.por_estado = {}, {}
+            for folio, estado, prog, reg in zip(
+                df["Folio"], df["Estado"].astype(str),
+                df["Fecha_Programada"], df["Fecha_Registro"],
+            ):
+                self.ordenes[folio] = (estado, _llave(folio, prog, reg))
+            for estado, llave in self.ordenes.values():
+                self.por_estado.setdefault(estado, []).append(llave)
+            for llaves in self.por_estado.values():
+                llaves.sort()
+            self.folios = sorted(self.ordenes)
+            self.version += 1
+
+    def _quitar(self, folio: str) -> None:
+        estado, llave = self.ordenes.pop(folio)
+        llaves = self.por_estado.get(estado, [])
+        i = bisect_left(llaves, llave)
+        if i < len(llaves) and llaves[i] == llave:
+            llaves.pop(i)
+
+    def quitar(self, folios) -> None:
+        """
+        Saca órdenes de los índices (archivadas por retencion.py). Con muchas
+        a la vez (la primera pasada de archivo) las listas se filtran en una
+        sola pasada en vez de quitar una por una.
+        """
+        with self._lock:
+            folios = {f for f in folios if f in self.ordenes}
+            if len(folios) < 64:
+                for folio in folios:
+                    self._quitar(folio)
+                    i = bisect_left(self.folios, folio)
+                    if i < len(self.folios) and self.folios[i] == folio:
+                        self.folios.pop(i)
+                return
+            estados = {self.ordenes.pop(f)[0] for f in folios}
+            for estado in estados:
+                self.por_estado[estado] = [ll for ll in self.por_estado.get(estado, []) if ll[2] not in folios]
+            self.folios = [f for f in self.folios if f not in folios]
+
+    def aplicar(self, ev: dict) -> None:
+        """Aplica un evento del feed (alta, cambio de estado o archivado)."""
+        folio = str(ev.get("folio", ""))
+        if not folio:
+            return
+        if ev.get("operacion") == "archivado":
+            self.quitar([folio])
+            return
+        with self._lock:
+            previa = self.ordenes.get(folio)
+            if previa is not None:
+                self._quitar(folio)
+            else:
+                insort(self.folios, folio)
+            llave = _llave(folio, ev.get("fecha_programada"), ev.get("fecha_registro"))
+            estado = str(ev.get("estado") or "")
+            self.ordenes[folio] = (estado, llave)
+            insort(self.por_estado.setdefault(estado, []), llave)
+
+    def actualizar(self) -> int:
+        """Aplica los eventos nuevos del feed; regresa cuántos se aplicaron."""
+        with self._lock:
+            if self.sub is None:
+                self.cargar()
+                return 0
+            eventos = self.sub.pendientes()
+            if self.sub.reinicio:
+                self.cargar()
+                return 0
+            # Los archivados se juntan y se quitan de una vez (antes de
+            # aplicar otro evento del mismo folio, por si se reusó)
+            archivados = set()
+            for ev in eventos:
+                folio = str(ev.get("folio", ""))
+                if ev.get("operacion") == "archivado":
+                    archivados.add(folio)
+                    continue
+                if folio in archivados:
+                    self.quitar(archivados)
+                    archivados = set()
+                self.aplicar(ev)
+            self.quitar(archivados)
+            if eventos:
+                self.version += 1
+            return len(eventos)
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def conteos(self) -> dict:
+        with self._lock:
+            return {e: len(v) for e, v in self.por_estado.items()}
+
+    def pagina(self, estados=ESTADOS_ACTIVOS, pagina: int = 1, por_pagina: int = 50, prefijo: str = "") -> dict:
+        """
+        Órdenes en 'estados' ordenadas por fecha programada y antigüedad.
+        Con 'prefijo' solo se consideran los folios que empiezan así.
+        Regresa {"total", "pagina", "por_pagina", "items": [{Folio, Estado, Fecha_Programada, Fecha_Registro}]}.
+        """
+        pagina, por_pagina = max(1, int(pagina)), max(1, int(por_pagina))
+        inicio = (pagina - 1) * por_pagina
+        estados = tuple(estados or ())
+        with self._lock:
+            if prefijo:
+                i = bisect_left(self.folios, prefijo)
+                candidatas = []
+                while i < len(self.folios) and self.folios[i].startswith(prefijo):
+                    estado, llave = self.ordenes[self.folios[i]]
+                    if not estados or estado in estados:
+                        candidatas.append((llave, estado))
+                    i += 1
+                candidatas.sort()
+                total = len(candidatas)
+                seleccion = candidatas[inicio: inicio + por_pagina]
+            else:
+                listas = [
+                    [(ll, e) for ll in self.por_estado.get(e, [])[: inicio + por_pagina]]
+                    for e in (estados or tuple(self.por_estado))
+                ]
+                total = sum(len(self.por_estado.get(e, [])) for e in (estados or tuple(self.por_estado)))
+                seleccion = list(heapq.merge(*listas))[inicio: inicio + por_pagina]
+        items = [
+            {
+                "Folio": llave[2],
+                "Estado": estado,
+                "Fecha_Programada": "" if llave[0] == _SIN_FECHA else llave[0],
+                "Fecha_Registro": llave[1],
+            }
+            for llave, estado in seleccion
+        ]
+        return {"total": total, "pagina": pagina, "por_pagina": por_pagina, "items": items}
+
+
+# Una lista por proceso: las sesiones de Streamlit (hilos) y la API la comparten
+_compartida = None
+_lock_compartida = threading.Lock()
+
+def lista_compartida() -> ListaTrabajo:
+    """Instancia del proceso, ya actualizada con el feed de cambios."""
+    global _compartida
+    with _lock_compartida:
+        if _compartida is None:
+            _compartida = ListaTrabajo()
+    _compartida.actualizar()
+    return _compartida
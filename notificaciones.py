@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Envío de resultados por correo en segundo plano.
+
+"Firmar y liberar" solo encola un trabajo (encolar_resultado); un despachador
+con workers asyncio en un hilo propio renderiza el PDF, lo envía por SMTP
+reutilizando conexiones (pool) y en lotes, reintenta con backoff exponencial
+y deja registrado el estado de entrega en cola_notificaciones.json. Los
+trabajos terminados (enviado, fallido, sin_destinatario) se podan al guardar
+la cola cuando pasan LIS_NOTIF_RETENCION_DIAS días (30) sin cambios.
+
+Configuración por entorno: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD,
+SMTP_STARTTLS (1/0) y SMTP_REMITENTE. Para pruebas: ServidorSMTPLocal.
+"""
+
+import os, json, uuid, random, asyncio, threading, time, smtplib, queue, socket
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from app_core import enc, dec, get_order_summary, parse_resultados, load_labza_config
+from candados import CandadoArchivo
+
+
+COLA_PATH = "cola_notificaciones.json"
+MAX_INTENTOS = 5
+BACKOFF_BASE_S = 30
+BACKOFF_MAX_S = 3600
+# Un trabajo 'enviando' de otro host se da por perdido tras este tiempo
+ARRENDAMIENTO_S = int(os.getenv("LIS_NOTIF_ARRENDAMIENTO_S", "900"))
+RECUPERAR_CADA_S = 60
+# Los trabajos terminados se quitan de la cola pasado este plazo (días)
+RETENCION_DIAS = float(os.getenv("LIS_NOTIF_RETENCION_DIAS", "30"))
+TERMINADOS = ("enviado", "fallido", "sin_destinatario")
+
+# La cola la comparten todas las réplicas que usan el mismo directorio
+_lock = CandadoArchivo(lambda: COLA_PATH + ".lock")
+
+
+# -------------------------
+# Cola persistente
+# -------------------------
+def _cargar_cola() -> list:
+    if not os.path.exists(COLA_PATH):
+        return []
+    try:
+        with open(COLA_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return []
+
+def _podar(cola: list, retencion_dias: float = RETENCION_DIAS) -> list:
+    """Quita los trabajos terminados cuya última actualización es anterior al plazo."""
+    limite = (datetime.now() - timedelta(days=retencion_dias)).isoformat(timespec="seconds")
+    # 'actualizado' siempre es ISO con segundos: se compara como texto
+    return [t for t in cola if t["estado"] not in TERMINADOS or t["actualizado"] >= limite]
+
+def _guardar_cola(cola: list) -> None:
+    # Cada escritura reescribe el archivo completo: se poda al guardar para que
+    # el costo dependa de lo reciente y no de todo lo enviado desde el inicio
+    cola = _podar(cola)
+    tmp = COLA_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cola, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, COLA_PATH)
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def _proceso() -> str:
+    """Identifica al proceso que toma un trabajo (host:pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _proceso_vivo(dueno: str) -> bool:
+    host, _, pid = dueno.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # de otro host: no se puede saber, decide el arrendamiento
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def encolar_resultado(folio, comentarios: str = "") -> str:
+    """
+    Agrega un trabajo de envío para el folio (no bloquea: no renderiza ni
+    envía). Si ya hay uno pendiente para el folio, lo reemplaza.
+    """
+    return encolar_resultados([folio], comentarios)[0]
+
+def encolar_resultados(folios: list, comentarios: str = "") -> list:
+    """Como encolar_resultado para varios folios, con una sola escritura de la cola."""
+    comentarios_enc = enc(comentarios or "")
+    trabajos = [{
+        "id": uuid.uuid4().hex,
+        "folio": str(folio),
+        "comentarios_enc": comentarios_enc,
+        "estado": "pendiente",  # pendiente|enviando|enviado|fallido|sin_destinatario
+        "intentos": 0,
+        "proximo_intento": 0.0,
+        "creado": _ahora(),
+        "actualizado": _ahora(),
+        "error": "",
+    } for folio in folios]
+    nuevos = {t["folio"] for t in trabajos}
+    with _lock:
+        cola = [t for t in _cargar_cola()
+                if not (t["folio"] in nuevos and t["estado"] == "pendiente")]
+        cola.extend(trabajos)
+        _guardar_cola(cola)
+    return [t["id"] for t in trabajos]
+
+def estado_folio(folio) -> dict | None:
+    """Último trabajo de envío del folio (para mostrar en la UI)."""
+    trabajos = [t for t in _cargar_cola() if t["folio"] == str(folio)]
+    return trabajos[-1] if trabajos else None
+
+def resumen_cola() -> dict:
+    conteo = {}
+    for t in _cargar_cola():
+        conteo[t["estado"]] = conteo.get(t["estado"], 0) + 1
+    return conteo
+
+def _tomar_lote(n: int) -> list:
+    """Marca como 'enviando' hasta n trabajos vencidos y los regresa."""
+    ahora = time.time()
+    with _lock:
+        cola = _cargar_cola()
+        lote = []
+        for t in cola:
+            if len(lote) >= n:
+                break
+            if t["estado"] == "pendiente" and t["proximo_intento"] <= ahora:
+                t["estado"] = "enviando"
+                t["actualizado"] = _ahora()
+                t["tomado_por"] = _proceso()
+                lote.append(dict(t))
+        if lote:
+            _guardar_cola(cola)
+        return lote
+
+def _actualizar_varios(cambios: dict) -> None:
+    """Aplica {id: campos} con una sola lectura/escritura de la cola."""
+    if not cambios:
+        return
+    with _lock:
+        cola = _cargar_cola()
+        ahora = _ahora()
+        for t in cola:
+            campos = cambios.get(t["id"])
+            if campos is not None:
+                t.update(campos, actualizado=ahora)
+        _guardar_cola(cola)
+
+def recuperar_interrumpidos(arrendamiento_s: float = ARRENDAMIENTO_S) -> int:
+    """
+    Trabajos que quedaron en 'enviando' porque su proceso terminó vuelven a
+    pendiente. Con varias réplicas no se tocan los que otro proceso vivo está
+    enviando: solo los de procesos muertos de este host, los sin dueño
+    (versiones anteriores) y los que llevan más de 'arrendamiento_s'.
+    """
+    limite = time.time() - arrendamiento_s
+    with _lock:
+        cola = _cargar_cola()
+        n = 0
+        for t in cola:
+            if t["estado"] != "enviando":
+                continue
+            dueno = t.get("tomado_por")
+            vencido = datetime.fromisoformat(t["actualizado"]).timestamp() < limite
+            if not dueno or vencido or not _proceso_vivo(dueno):
+                t["estado"] = "pendiente"
+                n += 1
+        if n:
+            _guardar_cola(cola)
+        return n
+
+
+# -------------------------
+# SMTP con pool de conexiones
+# -------------------------
+def config_smtp_desde_entorno() -> dict:
+    return {
+        "host": os.getenv("SMTP_HOST", ""),
+        "puerto": int(os.getenv("SMTP_PORT", "587")),
+        "usuario": os.getenv("SMTP_USER", ""),
+        "password": os.getenv("SMTP_PASSWORD", ""),
+        "starttls": os.getenv("SMTP_STARTTLS", "1") not in ("0", "false", "no"),
+        "remitente": os.getenv("SMTP_REMITENTE", os.getenv("SMTP_USER", "") or "resultados@lab.local"),
+    }
+
+class PoolSMTP:
+    """Conexiones smtplib reutilizables (una por worker como máximo)."""
+
+    def __init__(self, config: dict, tamano: int = 2):
+        self.config = config
+        self._libres = queue.LifoQueue(maxsize=tamano)
+
+    def _conectar(self) -> smtplib.SMTP:
+        c = self.config
+        smtp = smtplib.SMTP(c["host"], c["puerto"], timeout=30)
+        if c["starttls"]:
+            smtp.starttls()
+        if c["usuario"]:
+            smtp.login(c["usuario"], c["password"])
+        return smtp
+
+    def _tomar(self) -> smtplib.SMTP:
+        try:
+            smtp = self._libres.get_nowait()
+        except queue.Empty:
+            return self._conectar()
+        try:
+            smtp.noop()
+            return smtp
+        except (smtplib.SMTPException, OSError):
+            return self._conectar()
+
+    def _devolver(self, smtp: smtplib.SMTP) -> None:
+        try:
+            self._libres.put_nowait(smtp)
+        except queue.Full:
+            smtp.quit()
+
+    def enviar_lote(self, mensajes: list) -> list:
+        """
+        Envía varios mensajes por una misma conexión. Regresa una lista de
+        errores ('' si el mensaje se envió) en el mismo orden. Si la conexión
+        falla a la mitad, lo ya enviado queda como enviado y solo el resto
+        lleva el error (así no se reenvía lo entregado).
+        """
+        errores = []
+        smtp = self._tomar()
+        for i, msg in enumerate(mensajes):
+            try:
+                smtp.send_message(msg)
+                errores.append("")
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                errores.append(str(e))
+            except Exception as e:
+                smtp.close()
+                return errores + [f"smtp: {e}"] * (len(mensajes) - i)
+        self._devolver(smtp)
+        return errores
+
+    def cerrar(self) -> None:
+        while True:
+            try:
+                self._libres.get_nowait().quit()
+            except queue.Empty:
+                break
+            except smtplib.SMTPException:
+                pass
+
+
+# -------------------------
+# Construcción del mensaje
+# -------------------------
+def construir_mensaje(trabajo: dict, remitente: str) -> EmailMessage | None:
+    """Renderiza el PDF del folio y arma el correo. None si no hay destinatarios."""
+    import cache_pdf
+
+    info = get_order_summary(trabajo["folio"])
+    if not info:
+        raise ValueError(f"Folio no encontrado: {trabajo['folio']}")
+    destinatarios = [e.strip() for e in str(info.get("Emails", "")).split(";") if e.strip()]
+    if not destinatarios:
+        return None
+
+    config = load_labza_config()
+    solicitud = {
+        "id_solicitud": trabajo["folio"],
+        "nombre_paciente": info["Nombre"],
+        "fecha_registro": info["Fecha_Registro"],
+        "fecha_muestra": info["Fecha_Programada"],
+    }
+    pdf = cache_pdf.pdf_resultado(
+        trabajo["folio"], solicitud, parse_resultados(info["Resultados"]),
+        dec(trabajo["comentarios_enc"]), config["lab_info"], config["doctor_info"],
+        firmado=info["Estado"] == "firmado",
+    )
+
+    msg = EmailMessage()
+    msg["From"] = remitente
+    msg["To"] = ", ".join(destinatarios)
+    msg["Subject"] = f"Resultados de laboratorio — folio {trabajo['folio']}"
+    msg.set_content(
+        f"Hola {info['Nombre']},\n\n"
+        f"Adjuntamos sus resultados de laboratorio (folio {trabajo['folio']}).\n\n"
+        f"{config['lab_info'].get('nombre', '')}\n{config['lab_info'].get('telefono', '')}\n"
+    )
+    msg.add_attachment(pdf, maintype="application", subtype="pdf",
+                       filename=f"resultado_{trabajo['folio']}.pdf")
+    return msg
+
+
+def _backoff(intentos: int) -> float:
+    espera = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (intentos - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+# -------------------------
+# Despachador (asyncio en un hilo de fondo)
+# -------------------------
+class DespachadorNotificaciones:
+    """
+    Hilo con un event loop asyncio y `workers` corrutinas. Cada worker toma
+    lotes de la cola; el render y el SMTP (bloqueantes) corren en el executor
+    por defecto para no detener el loop.
+    """
+
+    def __init__(self, config_smtp: dict | None = None, workers: int = 2, lote: int = 10,
+                 intervalo_s: float = 2.0):
+        self.config = config_smtp or config_smtp_desde_entorno()
+        self.workers = workers
+        self.lote = lote
+        self.intervalo_s = intervalo_s
+        self.pool = PoolSMTP(self.config, tamano=workers)
+        self._loop = None
+        self._hilo = None
+        self._detener = None
+        self._recuperado = 0.0
+
+    def iniciar(self) -> "DespachadorNotificaciones":
+        if self._hilo is not None:
+            return self
+        recuperar_interrumpidos()
+        self._recuperado = time.monotonic()
+        listo = threading.Event()
+
+        def _correr():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._detener = asyncio.Event()
+            listo.set()
+            self._loop.run_until_complete(self._principal())
+            self._loop.close()
+
+        self._hilo = threading.Thread(target=_correr, name="notificaciones", daemon=True)
+        self._hilo.start()
+        listo.wait()
+        return self
+
+    def detener(self, timeout: float = 10.0) -> None:
+        if self._hilo is None:
+            return
+        self._loop.call_soon_threadsafe(self._detener.set)
+        self._hilo.join(timeout)
+        self._hilo = None
+        self.pool.cerrar()
+
+    async def _principal(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while not self._detener.is_set():
+            lote = _tomar_lote(self.lote)
+            if not lote:
+                # Ocioso: recoge lo que haya dejado a medias otra réplica caída
+                if time.monotonic() - self._recuperado > RECUPERAR_CADA_S:
+                    self._recuperado = time.monotonic()
+                    await loop.run_in_executor(None, recuperar_interrumpidos)
+                try:
+                    await asyncio.wait_for(self._detener.wait(), self.intervalo_s)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await loop.run_in_executor(None, self._procesar_lote, lote)
+
+    def procesar_pendientes(self) -> int:
+        """Procesa en el hilo actual todo lo vencido (útil en pruebas y cron)."""
+        n = 0
+        while True:
+            lote = _tomar_lote(self.lote)
+            if not lote:
+                return n
+            self._procesar_lote(lote)
+            n += len(lote)
+
+    def _procesar_lote(self, lote: list) -> None:
+        # Los estados del lote se escriben juntos al final (una escritura de la cola)
+        cambios = {}
+        listos = []
+        for t in lote:
+            try:
+                msg = construir_mensaje(t, self.config["remitente"])
+            except Exception as e:
+                cambios[t["id"]] = self._fallo(t, f"render: {e}")
+                continue
+            if msg is None:
+                cambios[t["id"]] = {"estado": "sin_destinatario", "error": "La orden no tiene correos."}
+                continue
+            listos.append((t, msg))
+        try:
+            errores = self.pool.enviar_lote([m for _, m in listos]) if listos else []
+        except Exception as e:
+            # No se pudo abrir la conexión: no salió ninguno
+            errores = [f"smtp: {e}"] * len(listos)
+        for (t, _), err in zip(listos, errores):
+            if err:
+                cambios[t["id"]] = self._fallo(t, err)
+            else:
+                cambios[t["id"]] = {"estado": "enviado", "intentos": t["intentos"] + 1,
+                                    "error": "", "enviado": _ahora()}
+        _actualizar_varios(cambios)
+
+    def _fallo(self, t: dict, error: str) -> dict:
+        """Campos del trabajo tras un intento fallido (reintento o 'fallido')."""
+        intentos = t["intentos"] + 1
+        if intentos >= MAX_INTENTOS:
+            return {"estado": "fallido", "intentos": intentos, "error": error}
+        return {"estado": "pendiente", "intentos": intentos, "error": error,
+                "proximo_intento": time.time() + _backoff(intentos)}
+
+
+# -------------------------
+# Servidor SMTP local (pruebas)
+# -------------------------
+class ServidorSMTPLocal:
+    """
+    Servidor SMTP mínimo en memoria para probar el envío sin red externa.
+    Guarda cada mensaje recibido en `mensajes` como (remitente, destinatarios, bytes).
+
+        srv = ServidorSMTPLocal().iniciar()
+        despachador = DespachadorNotificaciones(srv.config_smtp())
+    """
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 0):
+        self.host = host
+        self.puerto = puerto
+        self.mensajes = []
+        self._loop = None
+        self._server = None
+        self._hilo = None
+
+    def config_smtp(self) -> dict:
+        return {"host": self.host, "puerto": self.puerto, "usuario": "", "password": "",
+                "starttls": False, "remitente": "resultados@lab.local"}
+
+    async def _sesion(self, reader, writer):
+        async def responder(linea: str):
+            writer.write((linea + "\r\n").encode())
+            await writer.drain()
+
+        await responder("220 lis-local ESMTP")
+        remitente, destinatarios = None, []
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                break
+            cmd = linea.decode(errors="replace").strip()
+            verbo = cmd[:4].upper()
+            if verbo in ("HELO", "EHLO"):
+                await responder("250 lis-local")
+            elif verbo == "MAIL":
+                remitente, destinatarios = cmd.split(":", 1)[1].strip(), []
+                await responder("250 OK")
+            elif verbo == "RCPT":
+                destinatarios.append(cmd.split(":", 1)[1].strip())
+                await responder("250 OK")
+            elif verbo == "DATA":
+                await responder("354 Fin con <CRLF>.<CRLF>")
+                datos = []
+                while True:
+                    l = await reader.readline()
+                    if l in (b".\r\n", b".\n", b""):
+                        break
+                    datos.append(l[1:] if l.startswith(b"..") else l)
+                self.mensajes.append((remitente, destinatarios, b"".join(datos)))
+                await responder("250 OK")
+            elif verbo in ("RSET", "NOOP"):
+                await responder("250 OK")
+            elif verbo == "QUIT":
+                await responder("221 Adiós")
+                break
+            else:
+                await responder("502 No implementado")
+        writer.close()
+
+    def iniciar(self) -> "ServidorSMTPLocal":
+        listo = threading.Event()
+
+        def _correr():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._sesion, self.host, self.puerto)
+            )
+            self.puerto = self._server.sockets[0].getsockname()[1]
+            listo.set()
+            self._loop.run_forever()
+
+        self._hilo = threading.Thread(target=_correr, name="smtp-local", daemon=True)
+        self._hilo.start()
+        listo.wait()
+        return self
+
+    def detener(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._hilo.join(5)
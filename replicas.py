@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Varias réplicas de streamlit_app.py detrás de un balanceador TCP local.
+
+Streamlit corre todas las sesiones como hilos de un solo proceso (un GIL, un
+núcleo). Para usar más núcleos se levantan N procesos sobre el mismo
+directorio de datos, cada uno en su puerto, y un balanceador en el puerto
+público reparte las conexiones:
+- afinidad por IP de origen (rendezvous hashing): el estado de la sesión, los
+  archivos de st.download_button y el websocket viven en la réplica que
+  atendió al navegador, así que un cliente siempre cae en la misma;
+- si esa réplica no responde se usa la siguiente del orden del cliente;
+- las réplicas que terminan se relanzan.
+La coherencia entre réplicas la dan app_core y compañía (candados.py y las
+cachés por firma de archivo). Todas comparten cookieSecret para que las
+cookies XSRF valgan en cualquiera.
+
+Uso:
+    python replicas.py --replicas 4 --puerto 8501
+"""
+
+import os, sys, asyncio, hashlib, signal, subprocess, time
+
+
+REPLICAS = int(os.getenv("LIS_REPLICAS", str(os.cpu_count() or 1)))
+PUERTO = int(os.getenv("LIS_PUERTO", "8501"))
+PUERTO_BASE_REPLICAS = int(os.getenv("LIS_PUERTO_BASE_REPLICAS", "8601"))
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+TIMEOUT_CONEXION_S = 2.0
+TAM_BUFFER = 64 * 1024
+
+
+# -------------------------
+# Procesos
+# -------------------------
+def _secreto_cookies() -> str:
+    env = os.getenv("LIS_COOKIE_SECRET")
+    if env:
+        return env
+    import app_core
+    return hashlib.sha256(b"cookies-lis:" + app_core.load_or_create_key()).hexdigest()
+
+def _entorno_replica(i: int, secreto: str) -> dict:
+    """Entorno de la réplica i: cookieSecret común y métricas en puerto/archivo propios."""
+    # Streamlit no acepta cookieSecret como argumento, solo por entorno/config
+    env = dict(os.environ, LIS_REPLICA=str(i), STREAMLIT_SERVER_COOKIE_SECRET=secreto)
+    if env.get("LIS_METRICAS_PUERTO"):
+        env["LIS_METRICAS_PUERTO"] = str(int(env["LIS_METRICAS_PUERTO"]) + i)
+    base, ext = os.path.splitext(env.get("LIS_METRICAS_ARCHIVO", "metricas_lis.prom"))
+    env["LIS_METRICAS_ARCHIVO"] = f"{base}.{i}{ext}"
+    return env
+
+def iniciar_replica(i: int, puerto: int, secreto: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP,
+         "--server.port", str(puerto), "--server.address", "127.0.0.1",
+         "--server.headless", "true", "--browser.gatherUsageStats", "false"],
+        env=_entorno_replica(i, secreto),
+    )
+
+
+# -------------------------
+# Balanceador
+# -------------------------
+class Balanceador:
+    """Proxy TCP con afinidad por IP de origen."""
+
+    def __init__(self, destinos: list, host: str = "0.0.0.0", puerto: int = PUERTO):
+        self.destinos = list(destinos)  # [(host, puerto)]
+        self.host = host
+        self.puerto = puerto
+        self.conexiones = {d: 0 for d in self.destinos}
+
+    def candidatos(self, ip: str) -> list:
+        """Réplicas en orden de preferencia para la IP (estable si cae una)."""
+        def peso(d):
+            return hashlib.sha1(f"{ip}|{d[0]}:{d[1]}".encode()).digest()
+        return sorted(self.destinos, key=peso, reverse=True)
+
+    async def _tubo(self, lector, escritor):
+        try:
+            while datos := await lector.read(TAM_BUFFER):
+                escritor.write(datos)
+                await escritor.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _atender(self, lector, escritor):
+        ip = (escritor.get_extra_info("peername") or ("",))[0]
+        for destino in self.candidatos(ip):
+            try:
+                d_lector, d_escritor = await asyncio.wait_for(
+                    asyncio.open_connection(*destino), TIMEOUT_CONEXION_S)
+                break
+            except (OSError, asyncio.TimeoutError):
+                continue
+        else:
+            escritor.close()
+            return
+        self.conexiones[destino] += 1
+        try:
+            await asyncio.gather(self._tubo(lector, d_escritor), self._tubo(d_lector, escritor))
+        finally:
+            self.conexiones[destino] -= 1
+
+    async def servir(self):
+        servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        async with servidor:
+            await servidor.serve_forever()
+
+
+async def _supervisar(procesos: dict, secreto: str, intervalo_s: float = 2.0):
+    while True:
+        await asyncio.sleep(intervalo_s)
+        for i, (puerto, proc) in list(procesos.items()):
+            if proc.poll() is not None:
+                print(f"réplica {i} (:{puerto}) terminó con código {proc.returncode}; se relanza",
+                      file=sys.stderr, flush=True)
+                procesos[i] = (puerto, iniciar_replica(i, puerto, secreto))
+
+
+def correr(replicas: int = REPLICAS, puerto: int = PUERTO, puerto_base: int = PUERTO_BASE_REPLICAS,
+           host: str = "0.0.0.0") -> None:
+    secreto = _secreto_cookies()
+    procesos = {i: (puerto_base + i, iniciar_replica(i, puerto_base + i, secreto)) for i in range(replicas)}
+    balanceador = Balanceador([("127.0.0.1", p) for p, _ in procesos.values()], host, puerto)
+    print(f"{replicas} réplica(s) en :{puerto_base}-{puerto_base + replicas - 1}, "
+          f"balanceador en {host}:{puerto}", flush=True)
+
+    async def _principal():
+        await asyncio.gather(balanceador.servir(), _supervisar(procesos, secreto))
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(_principal())
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for _, proc in procesos.values():
+            proc.terminate()
+        limite = time.monotonic() + 10
+        for _, proc in procesos.values():
+            try:
+                proc.wait(max(0.1, limite - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Réplicas de la app Streamlit con balanceador local.")
+    ap.add_argument("--replicas", type=int, default=REPLICAS)
+    ap.add_argument("--puerto", type=int, default=PUERTO)
+    ap.add_argument("--puerto-base", type=int, default=PUERTO_BASE_REPLICAS)
+    ap.add_argument("--host", default="0.0.0.0")
+    args = ap.parse_args()
+    correr(args.replicas, args.puerto, args.puerto_base, args.host)
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Respaldos incrementales cifrados y restauración a un punto en el tiempo.
+
+Qué se respalda: solicitudes_lis.csv, usuarios.json, config_labza.json,
+resultados_pdf/ (índice y blobs), la bitácora de auditoría, los diccionarios
+de compresión y el archivo de órdenes antiguas (archivo/).
+
+- Instantánea consistente sin bloquear a los escritores: bajo el candado de
+  escritura solo se abren los archivos (microsegundos). Como todos se
+  reemplazan con os.replace, el descriptor abierto sigue viendo la versión de
+  ese momento aunque la app guarde mientras se lee.
+- Trozos definidos por contenido: los cortes caen en fin de línea y dependen
+  del texto de la línea, así que editar una orden solo cambia su trozo y no
+  desplaza los demás. Cada trozo se identifica con HMAC-SHA256 (con llave, para
+  no revelar hashes del contenido) y se guarda una sola vez: comprimido (zlib)
+  y cifrado (Fernet).
+- Si un archivo no cambió (tamaño, mtime e inodo) ni siquiera se vuelve a leer.
+- Cada instantánea es un manifiesto cifrado con la lista de trozos por archivo;
+  restaurar = elegir la última instantánea <= instante y concatenar trozos
+  (en paralelo), verificando el SHA-256 de cada archivo.
+
+Los respaldos usan la misma llave Fernet que la app (fernet.key / FERNET_KEY):
+sin ella no se pueden restaurar, así que la llave se respalda por separado.
+
+Uso:
+    python respaldos.py respaldar
+    python respaldos.py listar
+    python respaldos.py restaurar destino/ [2026-10-19T08:30:00]
+    python respaldos.py verificar [instantanea]
+    python respaldos.py podar 30
+"""
+
+import os, json, zlib, hmac, base64, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+
+import app_core
+import almacen_pdf
+import auditoria
+import compresion
+import retencion
+from candados import CandadoArchivo
+
+
+RESPALDOS_DIR = os.getenv("LIS_RESPALDOS_DIR", "respaldos")
+VERSION_RESPALDO = 1
+# Los datos son casi todo texto cifrado en base64: el nivel 1 comprime casi
+# lo mismo que el 6 (~33%) en menos tiempo
+NIVEL_ZLIB = int(os.getenv("LIS_RESPALDO_NIVEL", "1"))
+HILOS = int(os.getenv("LIS_RESPALDO_HILOS", str(min(4, os.cpu_count() or 1))))
+
+# Tamaño de trozo: promedio, mínimo y máximo (bytes)
+TROZO_PROMEDIO = 64 * 1024
+TROZO_MIN = 16 * 1024
+TROZO_MAX = 256 * 1024
+_LECTURA = 4 * 1024 * 1024
+
+# Marca del primer byte del trozo antes de cifrar
+_ZLIB, _CRUDO = b"z", b"r"
+
+# Entre procesos: un 'podar' de cron no debe borrar los trozos que un
+# 'respaldar' de otro proceso ya dio por existentes y no volvió a escribir
+_lock = CandadoArchivo(lambda: os.path.join(RESPALDOS_DIR, ".lock"))
+
+
+def _llave_hmac() -> bytes:
+    # Derivada de la llave Fernet: mismo secreto, distinto uso
+    return hashlib.sha256(b"respaldos-lis:" + app_core.load_or_create_key()).digest()
+
+def _dir_trozos() -> str:
+    return os.path.join(RESPALDOS_DIR, "trozos")
+
+def _dir_instantaneas() -> str:
+    return os.path.join(RESPALDOS_DIR, "instantaneas")
+
+def _ruta_trozo(tid: str) -> str:
+    return os.path.join(_dir_trozos(), tid[:2], tid)
+
+
+# -------------------------
+# Trozos
+# -------------------------
+def trocear(f, limite: int | None = None):
+    """
+    Parte un archivo abierto (binario) en trozos definidos por contenido.
+    Se corta después de una línea con probabilidad len(linea)/TROZO_PROMEDIO
+    (decidida por el CRC32 de la línea), respetando TROZO_MIN y TROZO_MAX.
+    Con 'limite' se leen solo esos bytes (archivos que crecen por el final).
+    """
+    umbral = 2**32 // TROZO_PROMEDIO
+    actual, tam, pendiente = [], 0, b""
+    restante = limite
+    while True:
+        bloque = f.read(_LECTURA if restante is None else min(_LECTURA, restante))
+        if restante is not None:
+            restante -= len(bloque)
+        datos = pendiente + bloque
+        corte = datos.rfind(b"\n") + 1 if bloque else len(datos)
+        if bloque and corte == 0 and len(datos) >= TROZO_MAX:
+            corte = len(datos)  # binario sin saltos de línea
+        pendiente, datos = datos[corte:], datos[:corte]
+        for linea in datos.splitlines(keepends=True):
+            while len(linea) > TROZO_MAX:
+                if actual:
+                    yield b"".join(actual)
+                    actual, tam = [], 0
+                yield linea[:TROZO_MAX]
+                linea = linea[TROZO_MAX:]
+            actual.append(linea)
+            tam += len(linea)
+            if tam >= TROZO_MAX or (tam >= TROZO_MIN and zlib.crc32(linea) < len(linea) * umbral):
+                yield b"".join(actual)
+                actual, tam = [], 0
+        if not bloque:
+            break
+    if actual:
+        yield b"".join(actual)
+
+def _cifrar(datos: bytes) -> bytes:
+    comprimido = zlib.compress(datos, NIVEL_ZLIB)
+    cuerpo = _ZLIB + comprimido if len(comprimido) < len(datos) else _CRUDO + datos
+    # El token Fernet es base64; se guarda decodificado (25% menos espacio)
+    return base64.urlsafe_b64decode(app_core.FERNET.encrypt(cuerpo))
+
+def _descifrar(crudo: bytes) -> bytes:
+    cuerpo = app_core.FERNET.decrypt(base64.urlsafe_b64encode(crudo))
+    return zlib.decompress(cuerpo[1:]) if cuerpo[:1] == _ZLIB else cuerpo[1:]
+
+def _escribir_atomico(path: str, datos: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(datos)
+    os.replace(tmp, path)
+
+def _guardar_trozo(tid: str, datos: bytes) -> int:
+    crudo = _cifrar(datos)
+    _escribir_atomico(_ruta_trozo(tid), crudo)
+    return len(crudo)
+
+def leer_trozo(tid: str) -> bytes:
+    with open(_ruta_trozo(tid), "rb") as f:
+        return _descifrar(f.read())
+
+
+# -------------------------
+# Instantáneas
+# -------------------------
+def _fuentes() -> list:
+    """(nombre en el respaldo, ruta) de los archivos de datos que existen."""
+    fuentes = [
+        (os.path.basename(app_core.CSV_PATH), app_core.CSV_PATH),
+        (os.path.basename(str(app_core.USERS_FILE)), str(app_core.USERS_FILE)),
+        (os.path.basename(str(app_core.CONFIG_PATH)), str(app_core.CONFIG_PATH)),
+        ("resultados_pdf/indice.json", almacen_pdf.INDICE_PATH),
+        (os.path.basename(auditoria.AUDITORIA_PATH), auditoria.AUDITORIA_PATH),
+    ]
+    return [(n, r) for n, r in fuentes if os.path.exists(r)]
+
+def _blobs() -> list:
+    """Blobs del almacén de PDFs (inmutables: se nombran por su hash)."""
+    salida = []
+    if os.path.isdir(almacen_pdf.BLOB_DIR):
+        for raiz, _, archivos in os.walk(almacen_pdf.BLOB_DIR):
+            for a in archivos:
+                if a.endswith(".bin"):
+                    ruta = os.path.join(raiz, a)
+                    nombre = os.path.relpath(ruta, os.path.dirname(almacen_pdf.BLOB_DIR))
+                    salida.append(("resultados_pdf/" + nombre.replace(os.sep, "/"), ruta))
+    return sorted(salida)
+
+def _diccionarios() -> list:
+    """Diccionarios de compresion.py: sin ellos no se leen los campos que los usan."""
+    d = compresion.DICCIONARIOS_DIR
+    if not os.path.isdir(d):
+        return []
+    base = os.path.basename(os.path.abspath(d))
+    return sorted((f"{base}/{a}", os.path.join(d, a)) for a in os.listdir(d)
+                  if a.endswith(".zdict") or a == "activo")
+
+def _archivo() -> list:
+    """Catálogo, índice y segmentos del archivo de órdenes antiguas (retencion.py)."""
+    salida = []
+    if os.path.isdir(retencion.ARCHIVO_DIR):
+        for raiz, _, archivos in os.walk(retencion.ARCHIVO_DIR):
+            for a in archivos:
+                if a.endswith((".json", ".seg")):
+                    ruta = os.path.join(raiz, a)
+                    nombre = os.path.relpath(ruta, os.path.dirname(os.path.abspath(retencion.ARCHIVO_DIR)))
+                    salida.append((nombre.replace(os.sep, "/"), ruta))
+    return sorted(salida)
+
+def listar_instantaneas() -> list:
+    """Nombres de las instantáneas, de la más antigua a la más reciente."""
+    d = _dir_instantaneas()
+    if not os.path.isdir(d):
+        return []
+    return sorted(a[:-5] for a in os.listdir(d) if a.endswith(".snap"))
+
+def _instante(nombre: str) -> datetime:
+    return datetime.strptime(nombre, "%Y%m%dT%H%M%S%f")
+
+def cargar_manifiesto(nombre: str) -> dict:
+    with open(os.path.join(_dir_instantaneas(), nombre + ".snap"), "rb") as f:
+        return json.loads(_descifrar(f.read()))
+
+def respaldar() -> dict:
+    """
+    Toma una instantánea incremental. Regresa el resumen: archivos, bytes
+    leídos, trozos nuevos y bytes escritos.
+    """
+    with _lock:
+        previas = listar_instantaneas()
+        anterior = cargar_manifiesto(previas[-1])["archivos"] if previas else {}
+        llave = _llave_hmac()
+        ahora = datetime.now()
+        nombre = ahora.strftime("%Y%m%dT%H%M%S%f")
+        stats = {"archivos": 0, "sin_cambios": 0, "bytes_leidos": 0, "trozos": 0,
+                 "trozos_nuevos": 0, "bytes_nuevos": 0, "bytes_escritos": 0}
+        archivos, enviados = {}, set()
+
+        with ExitStack() as pila, ThreadPoolExecutor(max_workers=HILOS) as pool:
+            # Corte consistente: se abren los archivos sin que nadie esté a medio guardar
+            # (el de retencion primero: archivar lo toma antes que el del CSV)
+            with retencion._lock, app_core._LOCK_ESCRITURA, almacen_pdf._lock, auditoria._lock:
+                # El archivo va en el mismo corte que el CSV: una orden está en uno o en otro
+                abiertos = [(n, pila.enter_context(open(r, "rb"))) for n, r in _fuentes() + _diccionarios() + _archivo()]
+                # Tamaños del corte (la bitácora sigue creciendo mientras se lee)
+                abiertos = [(n, f, os.fstat(f.fileno())) for n, f in abiertos]
+            # Los blobs referenciados por el índice ya existían al abrirlo
+            abiertos += [(n, f, os.fstat(f.fileno()))
+                         for n, f in ((n, pila.enter_context(open(r, "rb"))) for n, r in _blobs())]
+
+            for nom, f, st in abiertos:
+                firma = {"tamano": st.st_size, "mtime_ns": st.st_mtime_ns, "inodo": st.st_ino}
+                stats["archivos"] += 1
+                previa = anterior.get(nom)
+                if previa and all(previa.get(k) == v for k, v in firma.items()):
+                    archivos[nom] = previa
+                    stats["sin_cambios"] += 1
+                    continue
+                h, trozos, pendientes = hashlib.sha256(), [], []
+                for trozo in trocear(f, st.st_size):
+                    h.update(trozo)
+                    tid = hmac.new(llave, trozo, hashlib.sha256).hexdigest()
+                    trozos.append(tid)
+                    stats["bytes_leidos"] += len(trozo)
+                    if tid not in enviados and not os.path.exists(_ruta_trozo(tid)):
+                        enviados.add(tid)
+                        stats["trozos_nuevos"] += 1
+                        stats["bytes_nuevos"] += len(trozo)
+                        pendientes.append(pool.submit(_guardar_trozo, tid, trozo))
+                    if len(pendientes) >= 4 * HILOS:
+                        stats["bytes_escritos"] += sum(p.result() for p in pendientes)
+                        pendientes = []
+                stats["bytes_escritos"] += sum(p.result() for p in pendientes)
+                stats["trozos"] += len(trozos)
+                archivos[nom] = {**firma, "sha256": h.hexdigest(), "trozos": trozos}
+
+        manifiesto = {
+            "version": VERSION_RESPALDO,
+            "creado": ahora.isoformat(timespec="seconds"),
+            "archivos": archivos,
+        }
+        _escribir_atomico(
+            os.path.join(_dir_instantaneas(), nombre + ".snap"),
+            _cifrar(json.dumps(manifiesto).encode()),
+        )
+        return {"instantanea": nombre, **stats}
+
+def elegir_instantanea(instante=None) -> str:
+    """Última instantánea tomada en o antes de 'instante' (la más reciente si es None)."""
+    nombres = listar_instantaneas()
+    if instante is not None:
+        if not isinstance(instante, datetime):
+            instante = datetime.fromisoformat(str(instante))
+        nombres = [n for n in nombres if _instante(n) <= instante]
+    if not nombres:
+        raise FileNotFoundError("No hay instantáneas para ese instante.")
+    return nombres[-1]
+
+def restaurar(destino: str, instante=None, instantanea: str | None = None) -> dict:
+    """
+    Reconstruye los archivos de una instantánea en 'destino' (no toca los datos
+    en uso: para volver a ellos se detiene la app y se copian). Los trozos se
+    descifran en paralelo y cada archivo se verifica contra su SHA-256.
+    """
+    nombre = instantanea or elegir_instantanea(instante)
+    archivos = cargar_manifiesto(nombre)["archivos"]
+    total = 0
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        for nom, info in archivos.items():
+            ruta = os.path.join(destino, *nom.split("/"))
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            tmp = ruta + ".tmp"
+            h = hashlib.sha256()
+            with open(tmp, "wb") as out:
+                for datos in pool.map(leer_trozo, info["trozos"]):
+                    h.update(datos)
+                    out.write(datos)
+                    total += len(datos)
+            if h.hexdigest() != info["sha256"]:
+                os.remove(tmp)
+                raise ValueError(f"El respaldo de {nom} no coincide con su SHA-256.")
+            os.replace(tmp, ruta)
+    return {"instantanea": nombre, "archivos": len(archivos), "bytes": total}
+
+def verificar(instantanea: str | None = None) -> dict:
+    """Descifra todos los trozos de la instantánea y revisa los SHA-256 sin escribir nada."""
+    nombre = instantanea or elegir_instantanea()
+    archivos = cargar_manifiesto(nombre)["archivos"]
+    errores = []
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        for nom, info in archivos.items():
+            h = hashlib.sha256()
+            try:
+                for datos in pool.map(leer_trozo, info["trozos"]):
+                    h.update(datos)
+            except Exception as e:
+                errores.append(f"{nom}: {e}")
+                continue
+            if h.hexdigest() != info["sha256"]:
+                errores.append(f"{nom}: SHA-256 distinto")
+    return {"instantanea": nombre, "archivos": len(archivos), "errores": errores}
+
+def podar(conservar: int = 30) -> dict:
+    """Deja las últimas 'conservar' instantáneas y borra los trozos que ya nadie usa."""
+    with _lock:
+        nombres = listar_instantaneas()
+        borrar = nombres[:-conservar] if conservar > 0 else nombres
+        for n in borrar:
+            os.remove(os.path.join(_dir_instantaneas(), n + ".snap"))
+        vivos = set()
+        for n in listar_instantaneas():
+            for info in cargar_manifiesto(n)["archivos"].values():
+                vivos.update(info["trozos"])
+        trozos_borrados = 0
+        if os.path.isdir(_dir_trozos()):
+            for raiz, _, archivos in os.walk(_dir_trozos()):
+                for a in archivos:
+                    if a not in vivos:
+                        os.remove(os.path.join(raiz, a))
+                        trozos_borrados += 1
+        return {"instantaneas_borradas": len(borrar), "trozos_borrados": trozos_borrados}
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    cmd = args[0] if args else "respaldar"
+    if cmd == "respaldar":
+        print(json.dumps(respaldar(), ensure_ascii=False))
+    elif cmd == "listar":
+        for n in listar_instantaneas():
+            print(_instante(n).isoformat(timespec="seconds"), n)
+    elif cmd == "restaurar" and len(args) >= 2:
+        print(json.dumps(restaurar(args[1], args[2] if len(args) > 2 else None), ensure_ascii=False))
+    elif cmd == "verificar":
+        print(json.dumps(verificar(args[1] if len(args) > 1 else None), ensure_ascii=False))
+    elif cmd == "podar":
+        print(json.dumps(podar(int(args[1]) if len(args) > 1 else 30), ensure_ascii=False))
+    else:
+        print(__doc__)
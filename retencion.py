@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+Retención y archivo de órdenes antiguas.
+
+La tabla viva (solicitudes_lis.csv) solo crece y cada read_csv, decrypt_view y
+búsqueda paga por años de órdenes firmadas que ya nadie abre. archivar():
+- recorre el CSV por lotes (pyarrow.csv.open_csv, memoria acotada);
+- las órdenes 'firmado' con firma (o registro) anterior a MESES_ARCHIVO
+  meses se escriben en segmentos de archivo por mes de firma
+  (archivo/segmentos/aaaa-mm_<corrida>.seg), en bloques de FILAS_POR_BLOQUE
+  filas: CSV -> zlib -> Fernet, con el formato [4 bytes longitud][token] de
+  almacen_pdf;
+- el resto se reescribe como la nueva tabla viva (.tmp + os.replace).
+La pasada lee una copia fija del CSV (el descriptor abierto; write_csv
+reemplaza el archivo) sin el candado de escritura de app_core, así que las
+capturas no esperan. Solo el cambio final de la tabla viva toma el candado:
+si nadie escribió mientras tanto es un os.replace; si no, se vuelve a
+filtrar la tabla actual (sin cifrar ni comprimir) y las órdenes archivadas
+que cambiaron en medio se quedan vivas. Por cada orden que sale se emite un
+evento "archivado" en cambios.py (lista de trabajo, exportación incremental)
+y se descuenta de agregados.por_estado. La primera pasada sobre años de
+historia tarda (~10 s por 100k filas); las siguientes solo mueven un mes.
+
+Índice por folio para las consultas raras: 256 fragmentos JSON
+(archivo/indice/<xx>.json, por hash del folio) con segmento, desplazamiento y
+longitud del bloque; buscar un folio lee un fragmento y descifra un bloque.
+
+purgar() borra los segmentos (meses completos) más antiguos que
+MESES_PURGA, el plazo legal de conservación, y sus entradas del índice.
+Ambas operaciones quedan en la bitácora de auditoría.
+
+Configuración: LIS_ARCHIVO_DIR, LIS_RETENCION_ARCHIVO_MESES (12),
+LIS_RETENCION_PURGA_MESES (60) y LIS_RETENCION_CADA_H (0 = sin ejecución
+automática; con N > 0 una réplica la corre en segundo plano cada N horas).
+
+Uso:
+    python retencion.py archivar [--meses 12]
+    python retencion.py purgar [--meses 60]
+    python retencion.py buscar 20230101120000
+    python retencion.py estado
+"""
+
+import os, io, csv, json, zlib, struct, hashlib, threading, time, logging
+from datetime import datetime
+
+import agregados
+import app_core
+import auditoria
+import cambios
+from candados import CandadoArchivo, intentar_exclusivo
+
+
+ARCHIVO_DIR = os.getenv("LIS_ARCHIVO_DIR", "archivo")
+MESES_ARCHIVO = int(os.getenv("LIS_RETENCION_ARCHIVO_MESES", "12"))
+MESES_PURGA = int(os.getenv("LIS_RETENCION_PURGA_MESES", "60"))
+CADA_H = float(os.getenv("LIS_RETENCION_CADA_H", "0"))
+FILAS_POR_BLOQUE = 500
+BYTES_LECTURA = 4 << 20
+INDICE_PENDIENTES_MAX = 50_000   # entradas del índice en memoria antes de volcarlas
+# Casi todo es texto cifrado en base64: el nivel 1 comprime casi lo mismo que el 6
+NIVEL_ZLIB = 1
+USUARIO_AUDITORIA = "retencion"
+
+_log = logging.getLogger(__name__)
+# Archivar y purgar no corren a la vez (tampoco entre réplicas)
+_lock = CandadoArchivo(lambda: os.path.join(ARCHIVO_DIR, ".lock"))
+
+
+# -------------------------
+# Rutas y catálogo de segmentos
+# -------------------------
+def _dir_segmentos() -> str:
+    return os.path.join(ARCHIVO_DIR, "segmentos")
+
+def _fragmento(folio: str) -> str:
+    return hashlib.sha1(folio.encode()).hexdigest()[:2]
+
+def _ruta_fragmento(xx: str) -> str:
+    return os.path.join(ARCHIVO_DIR, "indice", xx + ".json")
+
+def _ruta_catalogo() -> str:
+    return os.path.join(ARCHIVO_DIR, "segmentos.json")
+
+def _leer_json(path: str, defecto):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return defecto
+
+def _escribir_json(path: str, datos) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(datos, ensure_ascii=False, separators=(",", ":")))
+    os.replace(tmp, path)
+
+def segmentos() -> list:
+    """[{"nombre", "mes", "filas", "bytes", "creado"}] de los segmentos vigentes."""
+    return _leer_json(_ruta_catalogo(), [])
+
+def _mes_corte(meses: int, hoy: datetime | None = None) -> str:
+    """'aaaa-mm' del mes que queda 'meses' antes del actual."""
+    hoy = hoy or datetime.now()
+    total = hoy.year * 12 + (hoy.month - 1) - meses
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+# -------------------------
+# Bloques cifrados
+# -------------------------
+def _empacar(tabla) -> bytes:
+    import pyarrow.csv as pa_csv
+    buf = io.BytesIO()
+    pa_csv.write_csv(tabla, buf, pa_csv.WriteOptions(quoting_style="needed"))
+    return app_core.FERNET.encrypt(zlib.compress(buf.getvalue(), NIVEL_ZLIB))
+
+def _desempacar(token: bytes):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    crudo = zlib.decompress(app_core.FERNET.decrypt(token))
+    # Todo como texto, igual que en el CSV vivo: los tipos los pone aplicar_esquema
+    encabezado = crudo.split(b"\n", 1)[0].decode("utf-8")
+    nombres = [c.strip() for c in next(csv.reader([encabezado]), []) if c.strip()]
+    return pa_csv.read_csv(
+        io.BytesIO(crudo),
+        convert_options=pa_csv.ConvertOptions(column_types={c: pa.string() for c in nombres},
+                                              strings_can_be_null=True),
+    )
+
+
+class _Segmento:
+    """Segmento de un mes en escritura: acumula filas y las emite por bloques."""
+
+    def __init__(self, mes: str, corrida: str):
+        self.mes = mes
+        self.nombre = f"{mes}_{corrida}.seg"
+        self.ruta = os.path.join(_dir_segmentos(), self.nombre)
+        os.makedirs(_dir_segmentos(), exist_ok=True)
+        self._f = open(self.ruta + ".tmp", "wb")
+        self._pendientes = []
+        self._n_pendientes = 0
+        self.filas = 0
+
+    def agregar(self, tabla, indice: dict) -> None:
+        self._pendientes.append(tabla)
+        self._n_pendientes += tabla.num_rows
+        if self._n_pendientes >= FILAS_POR_BLOQUE:
+            self.volcar(indice)
+
+    def volcar(self, indice: dict) -> None:
+        import pyarrow as pa
+        if not self._n_pendientes:
+            return
+        tabla = pa.concat_tables(self._pendientes)
+        token = _empacar(tabla)
+        offset = self._f.tell()
+        self._f.write(struct.pack(">I", len(token)))
+        self._f.write(token)
+        for folio in tabla.column("Folio").to_pylist():
+            indice[folio] = [self.nombre, offset, len(token) + 4]
+        self.filas += tabla.num_rows
+        self._pendientes, self._n_pendientes = [], 0
+
+    def cerrar(self) -> dict:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.ruta + ".tmp", self.ruta)
+        return {"nombre": self.nombre, "mes": self.mes, "filas": self.filas,
+                "bytes": os.path.getsize(self.ruta), "creado": datetime.now().isoformat(timespec="seconds")}
+
+    def descartar(self) -> None:
+        self._f.close()
+        os.remove(self.ruta + ".tmp")
+
+
+def _volcar_indice(entradas: dict) -> None:
+    """Agrega {folio: [segmento, offset, largo]} a los fragmentos del índice."""
+    por_fragmento = {}
+    for folio, pos in entradas.items():
+        por_fragmento.setdefault(_fragmento(folio), {})[folio] = pos
+    for xx, nuevas in por_fragmento.items():
+        ruta = _ruta_fragmento(xx)
+        fragmento = _leer_json(ruta, {})
+        fragmento.update(nuevas)
+        _escribir_json(ruta, fragmento)
+    entradas.clear()
+
+
+# -------------------------
+# Archivo
+# -------------------------
+def _mes_referencia(tabla):
+    """'aaaa-mm' de la firma de cada fila (del registro si no hay firma)."""
+    import pyarrow.compute as pc
+    fecha = tabla.column("Fecha_Registro")
+    if "Fecha_Firma" in tabla.column_names:
+        fecha = pc.coalesce(tabla.column("Fecha_Firma"), fecha)
+    return pc.utf8_slice_codeunits(fecha, 0, 7)
+
+def _abrir_lector(origen, nombres: list):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    return pa_csv.open_csv(
+        origen,
+        read_options=pa_csv.ReadOptions(block_size=BYTES_LECTURA),
+        convert_options=pa_csv.ConvertOptions(column_types={c: pa.string() for c in nombres},
+                                              strings_can_be_null=True),
+    )
+
+def _firma(st_) -> tuple:
+    return (st_.st_mtime_ns, st_.st_size, st_.st_ino)
+
+def _conciliar(tmp: str, nombres: list, huellas: dict) -> set:
+    """
+    Con el candado de escritura tomado, tras una escritura posterior a la
+    copia: vuelve a filtrar la tabla viva actual quitando las órdenes
+    archivadas que no cambiaron (mismo Resultados_enc; cada captura lo cifra
+    de nuevo). Regresa los folios que sí cambiaron: se quedan en la tabla viva.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    archivados = pa.array(list(huellas), pa.string())
+    cambiados = set()
+    lector = _abrir_lector(app_core.CSV_PATH, nombres)
+    with pa_csv.CSVWriter(tmp, lector.schema,
+                          write_options=pa_csv.WriteOptions(quoting_style="needed")) as escritor:
+        for lote in lector:
+            en_archivo = pc.fill_null(pc.is_in(lote.column("Folio"), value_set=archivados), False)
+            if pc.any(en_archivo).as_py():
+                mascara = en_archivo.to_numpy(zero_copy_only=False).copy()
+                pos = mascara.nonzero()[0]
+                folios = lote.column("Folio").take(pos).to_pylist()
+                resultados = lote.column("Resultados_enc").take(pos).to_pylist()
+                for p, folio, res in zip(pos, folios, resultados):
+                    if huellas[folio][0] != hash(res):
+                        mascara[p] = False
+                        cambiados.add(folio)
+                lote = lote.filter(pa.array(~mascara))
+            escritor.write_batch(lote)
+    os.replace(tmp, app_core.CSV_PATH)
+    return cambiados
+
+def _olvidar(folios: set, huellas: dict, nuevos: list) -> None:
+    """Quita del índice y del conteo de sus segmentos folios que se quedaron vivos."""
+    por_fragmento = {}
+    for folio in folios:
+        por_fragmento.setdefault(_fragmento(folio), []).append(folio)
+    for xx, lista in por_fragmento.items():
+        ruta = _ruta_fragmento(xx)
+        fragmento = _leer_json(ruta, {})
+        for folio in lista:
+            fragmento.pop(folio, None)
+        _escribir_json(ruta, fragmento)
+    quitar = {}
+    for folio in folios:
+        nombre = huellas[folio][1]
+        quitar[nombre] = quitar.get(nombre, 0) + 1
+    for s in nuevos:
+        s["filas"] -= quitar.get(s["nombre"], 0)
+    vigentes = {s["nombre"]: s for s in nuevos}
+    _escribir_json(_ruta_catalogo(), [vigentes.get(s["nombre"], s) for s in segmentos()])
+
+def archivar(meses: int = MESES_ARCHIVO, hoy: datetime | None = None) -> dict:
+    """
+    Mueve al archivo las órdenes firmadas cuya firma (o registro, si no hay
+    fecha de firma) es anterior al inicio del mes de hace 'meses' meses.
+    Regresa {"leidas", "archivadas", "vivas", "segmentos", "s", "bloqueo_s"}.
+
+    La pasada larga (leer, comprimir, cifrar y escribir segmentos) se hace
+    sobre una copia sin el candado de escritura de app_core: las capturas
+    siguen. Al final se toma el candado solo para cambiar la tabla viva; si
+    alguien escribió mientras tanto, se vuelve a filtrar la tabla actual
+    (sin cifrar nada) y las órdenes archivadas que cambiaron se quedan vivas.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    t0 = time.perf_counter()
+    corte = _mes_corte(meses, hoy)
+    corrida = datetime.now().strftime("%Y%m%dT%H%M%S")
+    abiertos, indice = {}, {}
+    # folio -> (hash de Resultados_enc, segmento, Fecha_Programada, Fecha_Registro)
+    huellas = {}
+    leidas = 0
+    with _lock:
+        app_core.init_csv()
+        nombres = app_core._encabezado()
+        tmp = app_core.CSV_PATH + ".retencion.tmp"
+        # write_csv reemplaza el archivo: el descriptor abierto es una copia fija
+        with open(app_core.CSV_PATH, "rb") as origen:
+            firma = _firma(os.fstat(origen.fileno()))
+            lector = _abrir_lector(origen, nombres)
+            escritor = pa_csv.CSVWriter(tmp, lector.schema,
+                                        write_options=pa_csv.WriteOptions(quoting_style="needed"))
+            escritor_abierto = True
+            try:
+                for lote in lector:
+                    leidas += lote.num_rows
+                    mover = pc.fill_null(pc.and_(pc.equal(lote.column("Estado"), "firmado"),
+                                                 pc.less(_mes_referencia(lote), corte)), False)
+                    escritor.write_batch(lote.filter(pc.invert(mover)))
+                    if not pc.any(mover).as_py():
+                        continue
+                    viejas = pa.Table.from_batches([lote.filter(mover)])
+                    meses_lote = _mes_referencia(viejas)
+                    for m in pc.unique(meses_lote).to_pylist():
+                        if m not in abiertos:
+                            abiertos[m] = _Segmento(m, corrida)
+                        abiertos[m].agregar(viejas.filter(pc.equal(meses_lote, m)), indice)
+                    for folio, res, m, prog, reg in zip(
+                        viejas.column("Folio").to_pylist(), viejas.column("Resultados_enc").to_pylist(),
+                        meses_lote.to_pylist(), viejas.column("Fecha_Programada").to_pylist(),
+                        viejas.column("Fecha_Registro").to_pylist(),
+                    ):
+                        huellas[folio] = (hash(res), abiertos[m].nombre, prog, reg)
+                    if len(indice) >= INDICE_PENDIENTES_MAX:
+                        _volcar_indice(indice)
+                escritor.close()
+                escritor_abierto = False
+                if not huellas:
+                    os.remove(tmp)
+                    return {"leidas": leidas, "archivadas": 0, "vivas": leidas, "segmentos": [],
+                            "s": time.perf_counter() - t0, "bloqueo_s": 0.0}
+                # Primero el archivo (segmentos, índice y catálogo) y al final la
+                # tabla viva: si algo falla antes, las órdenes siguen en el CSV.
+                nuevos = []
+                for seg in abiertos.values():
+                    seg.volcar(indice)
+                    nuevos.append(seg.cerrar())
+                _volcar_indice(indice)
+                _escribir_json(_ruta_catalogo(), segmentos() + nuevos)
+
+                with app_core._LOCK_ESCRITURA:
+                    t_bloqueo = time.perf_counter()
+                    if _firma(os.stat(app_core.CSV_PATH)) == firma:
+                        os.replace(tmp, app_core.CSV_PATH)
+                        cambiados = set()
+                    else:
+                        os.remove(tmp)
+                        cambiados = _conciliar(tmp, nombres, huellas)
+                    salen = [f for f in huellas if f not in cambiados]
+                    agregados.registrar_archivadas({"firmado": len(salen)})
+                    cambios.emitir([
+                        cambios.evento({"Folio": f, "Estado": "firmado", "Fecha_Programada": huellas[f][2],
+                                        "Fecha_Registro": huellas[f][3]}, "archivado", "firmado")
+                        for f in salen
+                    ])
+                    bloqueo = time.perf_counter() - t_bloqueo
+            except BaseException:
+                if escritor_abierto:
+                    escritor.close()
+                for seg in abiertos.values():
+                    if not seg._f.closed:
+                        seg.descartar()
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        if cambiados:
+            _olvidar(cambiados, huellas, nuevos)
+    archivadas = len(salen)
+    r = {"leidas": leidas, "archivadas": archivadas, "vivas": leidas - archivadas,
+         "segmentos": [s["nombre"] for s in nuevos], "s": time.perf_counter() - t0, "bloqueo_s": bloqueo}
+    auditoria.registrar("archivado", USUARIO_AUDITORIA, filas=archivadas, mes_corte=corte,
+                        segmentos=r["segmentos"], conservadas=len(cambiados))
+    return r
+
+
+def purgar(meses: int = MESES_PURGA, hoy: datetime | None = None) -> dict:
+    """
+    Borra los segmentos de meses anteriores a hace 'meses' meses (plazo legal
+    de conservación) y sus entradas del índice. Regresa {"segmentos", "filas"}.
+    """
+    corte = _mes_corte(meses, hoy)
+    with _lock:
+        todos = segmentos()
+        borrar = [s for s in todos if s["mes"] < corte]
+        if not borrar:
+            return {"segmentos": [], "filas": 0}
+        nombres = {s["nombre"] for s in borrar}
+        # Primero el catálogo y el índice: un segmento sin referencias solo ocupa espacio
+        _escribir_json(_ruta_catalogo(), [s for s in todos if s["nombre"] not in nombres])
+        dir_indice = os.path.join(ARCHIVO_DIR, "indice")
+        for a in sorted(os.listdir(dir_indice)) if os.path.isdir(dir_indice) else []:
+            if not a.endswith(".json"):
+                continue
+            ruta = os.path.join(dir_indice, a)
+            fragmento = _leer_json(ruta, {})
+            quedan = {f: pos for f, pos in fragmento.items() if pos[0] not in nombres}
+            if len(quedan) != len(fragmento):
+                _escribir_json(ruta, quedan)
+        for nombre in nombres:
+            try:
+                os.remove(os.path.join(_dir_segmentos(), nombre))
+            except FileNotFoundError:
+                pass
+    filas = sum(s["filas"] for s in borrar)
+    auditoria.registrar("purga", USUARIO_AUDITORIA, filas=filas, mes_corte=corte, segmentos=sorted(nombres))
+    return {"segmentos": sorted(nombres), "filas": filas}
+
+
+# -------------------------
+# Consulta
+# -------------------------
+def fila_archivada(folio) -> dict | None:
+    """Fila (tipada como read_csv) de una orden archivada, o None."""
+    folio = str(folio)
+    pos = _leer_json(_ruta_fragmento(_fragmento(folio)), {}).get(folio)
+    if pos is None:
+        return None
+    segmento, offset, largo = pos
+    try:
+        with open(os.path.join(_dir_segmentos(), segmento), "rb") as f:
+            f.seek(offset)
+            crudo = f.read(largo)
+    except FileNotFoundError:
+        return None
+    (n,) = struct.unpack(">I", crudo[:4])
+    import pyarrow.compute as pc
+    tabla = _desempacar(crudo[4:4 + n])
+    fila = app_core.aplicar_esquema(tabla.filter(pc.equal(tabla.column("Folio"), folio)).to_pandas())
+    return None if fila.empty else fila.iloc[0].to_dict()
+
+def orden_archivada(folio) -> dict | None:
+    """Como app_core.get_order_summary, para una orden archivada."""
+    fila = fila_archivada(folio)
+    return None if fila is None else {**app_core._resumen_fila(fila), "Archivada": True}
+
+def estado() -> dict:
+    segs = segmentos()
+    return {
+        "segmentos": len(segs),
+        "filas": sum(s["filas"] for s in segs),
+        "bytes": sum(s["bytes"] for s in segs),
+        "mes_mas_antiguo": min((s["mes"] for s in segs), default=None),
+        "mes_mas_reciente": max((s["mes"] for s in segs), default=None),
+    }
+
+
+# -------------------------
+# Ejecución periódica
+# -------------------------
+_fondo = {"hilo": None, "fd": None}
+
+def correr() -> dict:
+    """Una pasada completa: archivar y luego purgar."""
+    return {"archivo": archivar(), "purga": purgar()}
+
+def iniciar_en_segundo_plano(cada_h: float = CADA_H):
+    """
+    Corre archivar+purgar cada 'cada_h' horas en un hilo del proceso. Con
+    varias réplicas solo la que obtiene el candado de líder lo hace.
+    Regresa el hilo, o None si está desactivado o ya lo corre otra réplica.
+    """
+    if cada_h <= 0 or _fondo["hilo"] is not None:
+        return _fondo["hilo"]
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    fd = intentar_exclusivo(os.path.join(ARCHIVO_DIR, ".lider"))
+    if fd is None:
+        return None
+
+    def _ciclo():
+        while True:
+            try:
+                correr()
+            except Exception:
+                _log.exception("Falló la pasada de retención")
+            time.sleep(cada_h * 3600)
+    _fondo["fd"] = fd
+    _fondo["hilo"] = threading.Thread(target=_ciclo, name="retencion", daemon=True)
+    _fondo["hilo"].start()
+    return _fondo["hilo"]
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Retención: archivo y purga de órdenes antiguas.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("archivar")
+    p.add_argument("--meses", type=int, default=MESES_ARCHIVO)
+    p = sub.add_parser("purgar")
+    p.add_argument("--meses", type=int, default=MESES_PURGA)
+    p = sub.add_parser("buscar")
+    p.add_argument("folio")
+    sub.add_parser("estado")
+    args = ap.parse_args()
+    if args.cmd == "archivar":
+        r = archivar(args.meses)
+    elif args.cmd == "purgar":
+        r = purgar(args.meses)
+    elif args.cmd == "buscar":
+        r = orden_archivada(args.folio)
+    else:
+        r = estado()
+    auditoria.vaciar()
+    print(json.dumps(r, ensure_ascii=False, default=str))
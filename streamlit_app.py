@@ -7,11 +7,22 @@ import secrets
 from datetime import datetime, date
 from app_core import (
     USERS, verify_password, make_user,
-    lista_estudios, list_folios, get_order_summary,
+    get_order_summary,
     save_order, save_results, read_csv, decrypt_view, filter_df, export_excel,
     load_users_from_file, save_users_to_file, verify_user_login,
     generar_pdf_resultado, LAB_INFO, DOCTOR_INFO, save_labza_config, load_labza_config,
+    firma_datos, parse_resultados, save_results_lote, estudios_de_orden, dec, parece_folio,
 )
+from agregados import resumen_tablero, reconstruir_desde_csv
+import instrumentacion
+import almacen_pdf
+import cache_pdf
+import notificaciones
+import lista_trabajo
+import catalogo_busqueda
+import exportacion
+import auditoria
+import retencion
 
 # -------------------------
 # Inicializar usuarios (JSON)
@@ -21,7 +32,7 @@ users = load_users_from_file()
 # Si el archivo está vacío, creamos un admin por defecto
 if not users:
     users["admin@lab.local"] = make_user("admin123", "admin")
-    save_users_to_file(users)
+    save_users_to_file(users, usuario="sistema")
 
 
 # Detectar logo en la raíz y usarlo como page_icon si existe
@@ -33,6 +44,31 @@ for _name in ("logo.png", "logo.jpg", "logo.jpeg"):
 
 st.set_page_config(page_title="LABZA | Laboratorio de Análisis Clínicos", page_icon=logo_path or None, layout="wide")
 
+# Instrumentación: desglose por rerun y, opcionalmente, endpoint /metrics
+instrumentacion.iniciar_rerun()
+if instrumentacion.METRICAS_ACTIVAS and os.getenv("LIS_METRICAS_PUERTO"):
+    instrumentacion.iniciar_servidor_metricas(int(os.getenv("LIS_METRICAS_PUERTO")))
+
+# -------------------------
+# Servicios de fondo (uno por proceso)
+# -------------------------
+@st.cache_resource(show_spinner=False)
+def _despachador():
+    """Un despachador de correos por proceso; solo si hay SMTP configurado."""
+    if not os.getenv("SMTP_HOST"):
+        return None
+    return notificaciones.DespachadorNotificaciones().iniciar()
+
+@st.cache_resource(show_spinner=False)
+def _retencion():
+    """Archivo/purga periódicos (LIS_RETENCION_CADA_H); una sola réplica los corre."""
+    return retencion.iniciar_en_segundo_plano()
+
+# Arrancan con el proceso y no con la primera firma: los reintentos y lo que
+# dejó pendiente otra réplica se envían aunque nadie firme en esta sesión
+_despachador()
+_retencion()
+
 # --- Auth (simple en memoria) ---
 if "user" not in st.session_state:
     st.session_state.user = None
@@ -80,424 +116,766 @@ if not st.session_state.user:
 else:
     logout_button()
 
-# Tabs por rol
-tabs = st.tabs(["Recepción", "Laboratorio", "Consultas/Reportes", "Admin"])
+# -------------------------
+# Bloques costosos en caché (se invalidan cuando cambia el archivo)
+# -------------------------
+@st.cache_data(show_spinner="Descifrando registros...", max_entries=2)
+def _tabla_descifrada(firma_csv):
+    return decrypt_view(read_csv())
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _formato_resultados(firma):
+    if firma is None:
+        return None
+    with open("Formato Resultados.pdf", "rb") as f:
+        return f.read()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _pdf_guardado(folio, digest):
+    return almacen_pdf.leer_pdf(folio)
+
+# Cada cuánto revisa la lista de trabajo del laboratorio el feed de cambios
+LAB_REFRESCO_S = float(os.getenv("LIS_LAB_REFRESCO_S", "5"))
+LAB_POR_PAGINA = 50
+# Folios que ofrece la captura por lote (cierre de turno)
+LOTE_FOLIOS_MAX = 500
+# Coincidencias del catálogo que se mandan al selector de Recepción
+ESTUDIOS_SUGERIDOS = 20
+
+def _firma_archivo(path):
+    try:
+        stt = os.stat(path)
+        return (stt.st_mtime_ns, stt.st_size)
+    except OSError:
+        return None
+
+# -------------------------
+# Secciones (solo se ejecuta la sección activa)
+# -------------------------
 
 # ========== Recepción ==========
-with tabs[0]:
-    if st.session_state.user["role"] not in ("recepcion", "admin"):
-        st.info("No tienes permisos para esta sección.")
-    else:
-        st.subheader("➕ Alta de paciente / solicitud")
-        with st.form("form_recepcion", clear_on_submit=True):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                from app_core import folio_auto
-                if "folio_actual" not in st.session_state:
-                    st.session_state["folio_actual"] = folio_auto()
-                folio = st.text_input("Folio (auto)", value=st.session_state["folio_actual"], disabled=True)
-                fecha_prog = st.date_input("Fecha programada", value=date.today())
-                costo = st.number_input("Costo (MXN)", min_value=0.0, step=50.0)
-            with col2:
-                nombre = st.text_input("Nombre del paciente")
-                edad   = st.number_input("Edad", min_value=0, max_value=120, step=1)
-                genero = st.selectbox("Género", ["F","M","Otro","No especifica"])
-            with col3:
-                telefono   = st.text_input("Teléfono")
-                direccion  = st.text_input("Dirección")
-                emails_raw = st.text_area("Correos electrónicos (uno por línea o separados por coma)")
-                tipo       = st.multiselect("Estudios", lista_estudios(), default=[])
-            auto_cost = st.checkbox("Calcular costo automático desde catálogo")
-            observaciones = st.text_area("Observaciones", height=90)
-            submitted = st.form_submit_button("Guardar paciente + solicitud")
-        if submitted:
-            try:
-                # Si el checkbox está activo, ignoramos costo manual
-                if auto_cost:
-                    from app_core import costo_total_desde_catalogo
-                    costo = costo_total_desde_catalogo(tipo)
-                # Procesar emails
-                if emails_raw:
-                    emails = [e.strip() for e in emails_raw.replace("\n", ",").split(",") if e.strip()]
-                else:
-                    emails = []
-                folio_final = save_order(
-                    folio, str(fecha_prog), costo, nombre, edad, genero, telefono, direccion, tipo, observaciones, emails
-                )
-                st.success(f"Guardado folio: {folio_final}")
-                # Generar nuevo folio para el siguiente paciente
-                from app_core import folio_auto
+@st.fragment
+def _selector_estudios():
+    """
+    Búsqueda en el catálogo (typeahead): solo se rerenderiza este bloque y solo
+    viajan al navegador las mejores coincidencias más lo ya elegido.
+    """
+    elegidos = st.session_state.setdefault("rec_estudios", [])
+    # Cambia con cada orden guardada para que el selector arranque vacío
+    n = st.session_state.setdefault("rec_orden_n", 0)
+    c1, c2 = st.columns([1, 2])
+    consulta = c1.text_input("Buscar estudio", key=f"rec_busqueda_{n}", placeholder="Nombre, código o categoría")
+    sugeridos = catalogo_busqueda.indice_compartido().nombres(consulta, ESTUDIOS_SUGERIDOS)
+    opciones = list(dict.fromkeys(elegidos + sugeridos))
+    st.session_state["rec_estudios"] = c2.multiselect("Estudios", opciones, default=elegidos, key=f"rec_estudios_{n}")
+    if consulta and not sugeridos:
+        c2.caption("Sin coincidencias en el catálogo.")
+
+def vista_recepcion():
+    """Alta de paciente / solicitud."""
+    st.subheader("➕ Alta de paciente / solicitud")
+    if "rec_guardado" in st.session_state:
+        st.success(f"Guardado folio: {st.session_state.pop('rec_guardado')}")
+    # Fuera del formulario para que la búsqueda responda sin enviarlo
+    _selector_estudios()
+    with st.form("form_recepcion", clear_on_submit=True):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            from app_core import folio_auto
+            if "folio_actual" not in st.session_state:
                 st.session_state["folio_actual"] = folio_auto()
-            except Exception as e:
-                st.error(f"Error al guardar: {e}")
+            folio = st.text_input("Folio (auto)", value=st.session_state["folio_actual"], disabled=True)
+            fecha_prog = st.date_input("Fecha programada", value=date.today())
+            costo = st.number_input("Costo (MXN)", min_value=0.0, step=50.0)
+        with col2:
+            nombre = st.text_input("Nombre del paciente")
+            edad   = st.number_input("Edad", min_value=0, max_value=120, step=1)
+            genero = st.selectbox("Género", ["F","M","Otro","No especifica"])
+        with col3:
+            telefono   = st.text_input("Teléfono")
+            direccion  = st.text_input("Dirección")
+            emails_raw = st.text_area("Correos electrónicos (uno por línea o separados por coma)")
+        auto_cost = st.checkbox("Calcular costo automático desde catálogo")
+        observaciones = st.text_area("Observaciones", height=90)
+        submitted = st.form_submit_button("Guardar paciente + solicitud")
+    if submitted:
+        tipo = list(st.session_state.get("rec_estudios", []))
+        try:
+            # Si el checkbox está activo, ignoramos costo manual
+            if auto_cost:
+                from app_core import costo_total_desde_catalogo
+                costo = costo_total_desde_catalogo(tipo)
+            # Procesar emails
+            if emails_raw:
+                emails = [e.strip() for e in emails_raw.replace("\n", ",").split(",") if e.strip()]
+            else:
+                emails = []
+            folio_final = save_order(
+                folio, str(fecha_prog), costo, nombre, edad, genero, telefono, direccion, tipo, observaciones, emails,
+                usuario=st.session_state.user["email"],
+            )
+            # Generar nuevo folio para el siguiente paciente y limpiar la selección
+            from app_core import folio_auto
+            st.session_state["folio_actual"] = folio_auto()
+            st.session_state["rec_estudios"] = []
+            st.session_state["rec_orden_n"] += 1
+            st.session_state["rec_guardado"] = folio_final
+        except Exception as e:
+            st.error(f"Error al guardar: {e}")
+        else:
+            st.rerun()
 
 # ========== Laboratorio ==========
-with tabs[1]:
-    if st.session_state.user["role"] not in ("lab","medico","admin"):
-        st.info("No tienes permisos para esta sección.")
-    else:
-        st.subheader("🧪 Captura de resultados")
-        cols = st.columns([2,1])
-        with cols[0]:
-            folios = list_folios()  # puedes filtrar por estado si deseas
-            folio_sel = st.selectbox("Selecciona folio", ["—"] + folios, index=0)
-            if st.button("Cargar orden"):
-                st.session_state["folio_loaded"] = folio_sel if folio_sel != "—" else None
-
-            folio_loaded = st.session_state.get("folio_loaded")
-            if folio_loaded:
-                info = get_order_summary(folio_loaded)
-                if info:
-                    st.markdown(f"**Paciente:** {info['Nombre']} — **Estado:** {info['Estado']}")
-                    st.markdown(f"**Estudios:** {info['Tipo_Estudio']}")
+@st.fragment(run_every=LAB_REFRESCO_S)
+def _selector_folio():
+    """
+    Lista de trabajo paginada (próximas y más antiguas primero). Se re-ejecuta
+    sola para aplicar los cambios del feed sin recargar la página.
+    """
+    lista = lista_trabajo.lista_compartida()
+    c1, c2, c3 = st.columns([2, 1, 1])
+    estados = c1.multiselect(
+        "Estados", ["pendiente", "capturado", "firmado"],
+        default=list(lista_trabajo.ESTADOS_ACTIVOS), key="lt_estados",
+    )
+    prefijo = c2.text_input("Folio empieza con", key="lt_prefijo").strip()
+    pagina = c3.number_input("Página", min_value=1, value=1, step=1, key="lt_pagina")
+    res = lista.pagina(estados, pagina=int(pagina), por_pagina=LAB_POR_PAGINA, prefijo=prefijo)
+    etiquetas = {
+        it["Folio"]: f"{it['Folio']} — {it['Fecha_Programada'] or 'sin fecha'} — {it['Estado']}"
+        for it in res["items"]
+    }
+    folio_sel = st.selectbox(
+        "Selecciona folio", ["—"] + list(etiquetas), index=0,
+        format_func=lambda f: etiquetas.get(f, f),
+    )
+    paginas = max(1, -(-res["total"] // LAB_POR_PAGINA))
+    st.caption(f"{res['total']} orden(es) · página {res['pagina']} de {paginas}")
+    if st.button("Cargar orden"):
+        st.session_state["folio_loaded"] = folio_sel if folio_sel != "—" else None
+        st.rerun()
+
+def vista_laboratorio():
+    """Captura de resultados y PDFs por folio."""
+    st.subheader("🧪 Captura de resultados")
+    cols = st.columns([2,1])
+    with cols[0]:
+        _selector_folio()
+
+        folio_loaded = st.session_state.get("folio_loaded")
+        # Una sola lectura de la orden por rerun: la usan el encabezado, la
+        # captura por estudio y el PDF autollenado
+        info_orden = (get_order_summary(folio_loaded) or {}) if folio_loaded else {}
+        if folio_loaded:
+            if info_orden:
+                st.markdown(f"**Paciente:** {info_orden['Nombre']} — **Estado:** {info_orden['Estado']}")
+                st.markdown(f"**Estudios:** {info_orden['Tipo_Estudio']}")
+                envio = notificaciones.estado_folio(folio_loaded)
+                if envio:
+                    st.caption(f"Envío por correo: {envio['estado']} ({envio['actualizado']})"
+                               + (f" — {envio['error']}" if envio["error"] else ""))
+            else:
+                st.warning("Folio no encontrado")
+    with cols[1]:
+        st.write(" ")
+
+    # Opciones de descargar/subir formato PDF de resultados
+    st.markdown("---")
+    st.subheader("📄 Formato de Resultados (PDF)")
+    pdf_cols = st.columns([2, 2, 2])
+
+    # Botón descargar formato
+    with pdf_cols[0]:
+        formato = _formato_resultados(_firma_archivo("Formato Resultados.pdf"))
+        if formato is not None:
+            st.download_button(
+                label="📥 Descargar Formato",
+                data=formato,
+                file_name="Formato Resultados.pdf",
+                mime="application/pdf"
+            )
+        else:
+            st.warning("Archivo de formato no disponible")
+
+    # Uploader para cargar PDF completado
+    with pdf_cols[1]:
+        pdf_file = st.file_uploader("📤 Cargar PDF de resultados", type=["pdf"], key="pdf_uploader")
+        if pdf_file is not None and st.session_state.get("folio_loaded"):
+            if st.button("Guardar PDF", key="save_pdf_btn"):
+                try:
+                    folio_loaded = st.session_state.get("folio_loaded")
+                    almacen_pdf.guardar_pdf(folio_loaded, pdf_file, pdf_file.name)
+                    st.success(f"PDF guardado para folio {folio_loaded}")
+                except Exception as e:
+                    st.error(f"Error al guardar PDF: {e}")
+        elif pdf_file is not None and not st.session_state.get("folio_loaded"):
+            st.warning("Carga primero un folio para asociar el PDF")
+
+    # Mostrar PDF cargado si existe
+    with pdf_cols[2]:
+        folio_loaded = st.session_state.get("folio_loaded")
+        if folio_loaded:
+            meta = almacen_pdf.metadata(folio_loaded)
+            if meta or almacen_pdf.existe_pdf(folio_loaded):
+                st.success("✅ PDF cargado para este folio")
+                if meta:
+                    st.caption(f"{meta['tamano'] / 1024:,.0f} KB — subido {meta['subido']}")
+                # La descarga se descifra una sola vez por contenido (hash)
+                try:
+                    datos_pdf = _pdf_guardado(folio_loaded, meta["hash"] if meta else None)
+                except almacen_pdf.BlobCorrupto as e:
+                    st.error(f"El PDF guardado está dañado; vuelve a subirlo o restáuralo del respaldo. ({e})")
                 else:
-                    st.warning("Folio no encontrado")
-        with cols[1]:
-            st.write(" ")
-            
-        # Opciones de descargar/subir formato PDF de resultados
-        st.markdown("---")
-        st.subheader("📄 Formato de Resultados (PDF)")
-        pdf_cols = st.columns([2, 2, 2])
-        
-        # Botón descargar formato
-        with pdf_cols[0]:
-            if os.path.exists("Formato Resultados.pdf"):
-                with open("Formato Resultados.pdf", "rb") as f:
                     st.download_button(
-                        label="📥 Descargar Formato",
-                        data=f.read(),
-                        file_name="Formato Resultados.pdf",
+                        label="📥 Descargar PDF guardado",
+                        data=datos_pdf,
+                        file_name=f"{folio_loaded}.pdf",
                         mime="application/pdf"
                     )
             else:
-                st.warning("Archivo de formato no disponible")
-        
-        # Uploader para cargar PDF completado
-        with pdf_cols[1]:
-            pdf_file = st.file_uploader("📤 Cargar PDF de resultados", type=["pdf"], key="pdf_uploader")
-            if pdf_file is not None and st.session_state.get("folio_loaded"):
-                if st.button("Guardar PDF", key="save_pdf_btn"):
-                    try:
-                        os.makedirs("resultados_pdf", exist_ok=True)
-                        folio_loaded = st.session_state.get("folio_loaded")
-                        pdf_path = os.path.join("resultados_pdf", f"{folio_loaded}.pdf")
-                        with open(pdf_path, "wb") as f:
-                            f.write(pdf_file.getbuffer())
-                        st.success(f"PDF guardado para folio {folio_loaded}")
-                    except Exception as e:
-                        st.error(f"Error al guardar PDF: {e}")
-            elif pdf_file is not None and not st.session_state.get("folio_loaded"):
-                st.warning("Carga primero un folio para asociar el PDF")
-        
-        # Mostrar PDF cargado si existe
-        with pdf_cols[2]:
-            folio_loaded = st.session_state.get("folio_loaded")
-            if folio_loaded:
-                pdf_path = os.path.join("resultados_pdf", f"{folio_loaded}.pdf")
-                if os.path.exists(pdf_path):
-                    st.success("✅ PDF cargado para este folio")
-                    with open(pdf_path, "rb") as f:
-                        st.download_button(
-                            label="📥 Descargar PDF guardado",
-                            data=f.read(),
-                            file_name=f"{folio_loaded}.pdf",
-                            mime="application/pdf"
-                        )
-                else:
-                    st.info("No hay PDF cargado para este folio")
-        
-        st.markdown("---")
-
-        # -------- Comentarios adicionales (ya no JSON) --------
-        comentarios = st.text_area(
-            "Comentarios adicionales (opcional)",
-            height=100,
-            placeholder="Ej: Paciente en ayuno 8 horas, repetir estudio en 3 meses..."
-        )
+                st.info("No hay PDF cargado para este folio")
 
-        # -------- Captura amigable por estudio --------
-        st.subheader("Resultados por estudio")
+    st.markdown("---")
 
-        res_formateados = {}
-        folio_actual = st.session_state.get("folio_loaded")
+    # -------- Comentarios adicionales (ya no JSON) --------
+    comentarios = st.text_area(
+        "Comentarios adicionales (opcional)",
+        height=100,
+        placeholder="Ej: Paciente en ayuno 8 horas, repetir estudio en 3 meses..."
+    )
 
-        # Volvemos a obtener la info de la orden para leer los estudios
-        info_orden = {}
-        if folio_actual:
-            info_orden = get_order_summary(folio_actual) or {}
+    # -------- Captura amigable por estudio --------
+    st.subheader("Resultados por estudio")
 
-        if folio_actual and info_orden:
-            import re
-            estudios_str = str(info_orden.get("Tipo_Estudio", "")).strip()
+    res_formateados = {}
+    folio_actual = st.session_state.get("folio_loaded")
 
-            # Evitar que 'nan' se vuelva un estudio
-            if estudios_str and estudios_str.lower() != "nan":
-                estudios = [e.strip() for e in re.split(r"[;,/]", estudios_str) if e.strip()]
-            else:
-                estudios = []
+    if folio_actual and info_orden:
+        estudios = estudios_de_orden(info_orden.get("Tipo_Estudio"))
 
-            if estudios:
-                for est in estudios:
-                    col_val, col_uni, col_ref = st.columns([2, 1, 2])
+        if estudios:
+            for est in estudios:
+                col_val, col_uni, col_ref = st.columns([2, 1, 2])
 
-                    etiqueta_valor = f"Valor ({est})" if est else "Valor"
-                    with col_val:
-                        val = st.text_input(etiqueta_valor, key=f"val_{folio_actual}_{est}")
+                etiqueta_valor = f"Valor ({est})" if est else "Valor"
+                with col_val:
+                    val = st.text_input(etiqueta_valor, key=f"val_{folio_actual}_{est}")
 
-                    with col_uni:
-                        uni = st.text_input("Unidad", key=f"uni_{folio_actual}_{est}")
+                with col_uni:
+                    uni = st.text_input("Unidad", key=f"uni_{folio_actual}_{est}")
 
-                    with col_ref:
-                        ref = st.text_input("Referencia", key=f"ref_{folio_actual}_{est}")
+                with col_ref:
+                    ref = st.text_input("Referencia", key=f"ref_{folio_actual}_{est}")
 
-                    if val or uni or ref:
-                        res_formateados[est] = {
-                            "valor": val,
-                            "unidad": uni,
-                            "ref": ref,
-                        }
-            else:
-                st.info("Esta orden no tiene estudios listados; puedes usar solo comentarios si lo prefieres.")
+                if val or uni or ref:
+                    res_formateados[est] = {
+                        "valor": val,
+                        "unidad": uni,
+                        "ref": ref,
+                    }
         else:
-            st.info("Selecciona y carga un folio para capturar resultados.")
-
-        # Lo que se guarda en CSV: JSON de los resultados por estudio
-        resultados_json = json.dumps(res_formateados, ensure_ascii=False) if res_formateados else ""
-
-        c1, c2, c3 = st.columns(3)
+            st.info("Esta orden no tiene estudios listados; puedes usar solo comentarios si lo prefieres.")
+    else:
+        st.info("Selecciona y carga un folio para capturar resultados.")
 
-        # Guardar resultados (capturado)
-        with c1:
-            if st.button("Guardar resultados"):
-                try:
-                    folio = st.session_state.get("folio_loaded", "")
-                    ok = save_results(folio, resultados_json, liberar=False)
-                    if ok:
-                        st.success("Resultados guardados (estado: capturado)")
-                except Exception as e:
-                    st.error(f"Error: {e}")
+    # Lo que se guarda en CSV: JSON de los resultados por estudio
+    resultados_json = json.dumps(res_formateados, ensure_ascii=False) if res_formateados else ""
 
-        # Firmar y liberar
-        with c2:
-            if st.button("Firmar y liberar"):
-                try:
-                    folio = st.session_state.get("folio_loaded", "")
-                    ok = save_results(folio, resultados_json, liberar=True)
-                    if ok:
-                        st.success("Orden firmada (estado: firmado)")
-                except Exception as e:
-                    st.error(f"Error: {e}")
-
-        # Generar PDF autollenado
-        with c3:
-            if st.button("Generar PDF autollenado"):
-                folio = st.session_state.get("folio_loaded")
-                if not folio:
-                    st.warning("Primero selecciona y carga un folio.")
-                else:
-                    info = get_order_summary(folio) or {}
+    c1, c2, c3 = st.columns(3)
 
-                    solicitud = {
-                        "id_solicitud": folio,
-                        "nombre_paciente": info.get("Nombre", info.get("nombre", "")),
-                        "fecha_registro": info.get("Fecha_Registro", info.get("fecha_registro", "")),
-                        "fecha_muestra": info.get("Fecha_Programada", info.get("fecha_muestra", "")),
-                    }
+    # Guardar resultados (capturado)
+    with c1:
+        if st.button("Guardar resultados"):
+            try:
+                folio = st.session_state.get("folio_loaded", "")
+                ok = save_results(folio, resultados_json, liberar=False, usuario=st.session_state.user["email"])
+                if ok:
+                    st.success("Resultados guardados (estado: capturado)")
+            except Exception as e:
+                st.error(f"Error: {e}")
 
-                    # Config más reciente del lab y médico
-                    config = load_labza_config()
-                    lab_info = config["lab_info"]
-                    doctor_info = config["doctor_info"]
-
-                    # Generar el PDF con resultados + comentarios
-                    pdf_bytes = generar_pdf_resultado(
-                        solicitud,
-                        res_formateados,
-                        doctor_info=doctor_info,
-                        lab_info=lab_info,
-                        comentarios=comentarios,
-                    )
+    # Firmar y liberar
+    with c2:
+        if st.button("Firmar y liberar"):
+            try:
+                folio = st.session_state.get("folio_loaded", "")
+                ok = save_results(folio, resultados_json, liberar=True, usuario=st.session_state.user["email"])
+                if ok:
+                    st.success("Orden firmada (estado: firmado)")
+                    # El envío al paciente ocurre en segundo plano
+                    notificaciones.encolar_resultado(folio, comentarios)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+    # Generar PDF autollenado
+    with c3:
+        if st.button("Generar PDF autollenado"):
+            folio = st.session_state.get("folio_loaded")
+            if not folio:
+                st.warning("Primero selecciona y carga un folio.")
+            else:
+                info = info_orden
+
+                solicitud = {
+                    "id_solicitud": folio,
+                    "nombre_paciente": info.get("Nombre", info.get("nombre", "")),
+                    "fecha_registro": info.get("Fecha_Registro", info.get("fecha_registro", "")),
+                    "fecha_muestra": info.get("Fecha_Programada", info.get("fecha_muestra", "")),
+                }
+
+                # Config más reciente del lab y médico
+                config = load_labza_config()
+                lab_info = config["lab_info"]
+                doctor_info = config["doctor_info"]
+
+                # Una orden firmada ya no cambia: se usan sus resultados
+                # guardados y el PDF sale de la caché si ya se había generado.
+                firmado = info.get("Estado") == "firmado"
+                resultados_pdf = parse_resultados(info.get("Resultados")) if firmado else res_formateados
+                pdf_bytes = cache_pdf.pdf_resultado(
+                    folio,
+                    solicitud,
+                    resultados_pdf or res_formateados,
+                    comentarios,
+                    lab_info,
+                    doctor_info,
+                    firmado=firmado,
+                )
 
-                    st.download_button(
-                        label="📥 Descargar PDF de resultados",
-                        data=pdf_bytes,
-                        file_name=f"resultado_{folio}.pdf",
-                        mime="application/pdf",
-                    )
+                st.download_button(
+                    label="📥 Descargar PDF de resultados",
+                    data=pdf_bytes,
+                    file_name=f"resultado_{folio}.pdf",
+                    mime="application/pdf",
+                )
 
+    st.markdown("---")
+    _captura_lote()
+
+COLUMNAS_LOTE = ["Folio", "Estudio", "Valor", "Unidad", "Referencia"]
+
+def _resultados_actuales(folios):
+    """{folio: (estudios de la orden, resultados guardados)} descifrando solo esos folios."""
+    df = read_csv(columnas=["Folio", "Tipo_Estudio", "Resultados_enc"])
+    df = df[df["Folio"].isin([str(f) for f in folios])]
+    return {
+        str(r["Folio"]): (estudios_de_orden(r["Tipo_Estudio"]), parse_resultados(dec(r["Resultados_enc"])))
+        for r in df.to_dict("records")
+    }
+
+def _plantilla_lote(folios) -> pd.DataFrame:
+    """Una fila por folio y estudio, con lo que ya esté capturado."""
+    filas = []
+    for folio, (estudios, res) in _resultados_actuales(folios).items():
+        for est in estudios or list(res):
+            r = res.get(est) if isinstance(res.get(est), dict) else {}
+            filas.append([folio, est, r.get("valor", ""), r.get("unidad", ""), r.get("ref", "")])
+    return pd.DataFrame(filas, columns=COLUMNAS_LOTE)
+
+def _leer_hoja(archivo) -> pd.DataFrame:
+    if archivo.name.lower().endswith(".xlsx"):
+        df = pd.read_excel(archivo, dtype=str)
+    else:
+        df = pd.read_csv(archivo, dtype=str)
+    df.columns = [str(c).strip().capitalize() for c in df.columns]
+    faltan = [c for c in ("Folio", "Estudio", "Valor") if c not in df.columns]
+    if faltan:
+        raise ValueError("A la hoja le faltan columnas: " + ", ".join(faltan))
+    return df.reindex(columns=COLUMNAS_LOTE).fillna("")
+
+def _items_lote(tabla: pd.DataFrame, liberar: bool, base: pd.DataFrame | None = None) -> list:
+    """
+    Filas (folio, estudio, valor...) -> items de save_results_lote que se
+    combinan con lo guardado al escribir. Con 'base' (la plantilla de la
+    tabla) solo van las filas que cambiaron y una fila vaciada borra ese
+    estudio; sin base (hoja) las filas vacías se ignoran.
+    """
+    def _limpia(t):
+        t = t.reindex(columns=COLUMNAS_LOTE).fillna("").astype(str).apply(lambda c: c.str.strip())
+        return t[(t["Folio"] != "") & (t["Estudio"] != "")]
+
+    tabla = _limpia(tabla)
+    previos = {}
+    if base is not None:
+        previos = {(r.Folio, r.Estudio): r for r in _limpia(base).itertuples(index=False)}
+    items = []
+    for folio, grupo in tabla.groupby("Folio", sort=False):
+        res = {}
+        for r in grupo.itertuples(index=False):
+            if base is not None and previos.get((r.Folio, r.Estudio)) == r:
+                continue
+            if r.Valor or r.Unidad or r.Referencia:
+                res[r.Estudio] = {"valor": r.Valor, "unidad": r.Unidad, "ref": r.Referencia}
+            elif base is not None:
+                res[r.Estudio] = None
+        if res or liberar:
+            items.append({"folio": folio, "resultados": res, "liberar": liberar, "combinar": True})
+    return items
+
+def _captura_lote():
+    """Resultados de muchos folios a la vez (tabla o hoja) con una sola escritura."""
+    st.subheader("📋 Captura y firma por lote")
+    modo = st.radio("Origen", ["Tabla", "Hoja (CSV/Excel)"], horizontal=True, key="lote_modo")
+    tabla = base = None
+    if modo == "Tabla":
+        res = lista_trabajo.lista_compartida().pagina(
+            st.session_state.get("lt_estados") or list(lista_trabajo.ESTADOS_ACTIVOS),
+            por_pagina=LOTE_FOLIOS_MAX, prefijo=st.session_state.get("lt_prefijo", "").strip(),
+        )
+        disponibles = [it["Folio"] for it in res["items"] if it["Estado"] != "firmado"]
+        folios = st.multiselect("Folios", disponibles, key="lote_folios")
+        if folios:
+            # La clave depende de los folios: otra selección es otra tabla
+            base = _plantilla_lote(folios)
+            tabla = st.data_editor(
+                base, key=f"lote_tabla_{hash(tuple(folios))}",
+                disabled=["Folio", "Estudio"], hide_index=True, use_container_width=True,
+            )
+    else:
+        archivo = st.file_uploader(
+            "Hoja con columnas Folio, Estudio, Valor, Unidad, Referencia", type=["csv", "xlsx"], key="lote_hoja",
+        )
+        if archivo is not None:
+            try:
+                tabla = _leer_hoja(archivo)
+                st.caption(f"{tabla['Folio'].nunique()} folio(s), {len(tabla)} resultado(s)")
+            except Exception as e:
+                st.error(f"No se pudo leer la hoja: {e}")
+    liberar = st.checkbox("Firmar y liberar (requiere todos los estudios de cada orden)", key="lote_liberar")
+    if st.button("Aplicar lote", key="lote_aplicar", disabled=tabla is None or tabla.empty):
+        reporte = save_results_lote(_items_lote(tabla, liberar, base), usuario=st.session_state.user["email"])
+        aplicados = [r for r in reporte if r["ok"]]
+        firmados = [r["folio"] for r in aplicados if r["estado"] == "firmado"]
+        if firmados:
+            notificaciones.encolar_resultados(firmados)
+        (st.success if len(aplicados) == len(reporte) else st.warning)(
+            f"{len(aplicados)} de {len(reporte)} folio(s) aplicados"
+            + (f", {len(firmados)} firmados" if firmados else "")
+        )
+        st.dataframe(pd.DataFrame(reporte), use_container_width=True, hide_index=True)
 
 # ========== Consultas / Reportes ==========
-with tabs[2]:
+def vista_consultas():
+    """Búsqueda y exportación."""
     st.subheader("🔎 Búsqueda y exportación")
     q = st.text_input("Buscar por nombre, folio u otro campo")
-    df = decrypt_view(read_csv())
+    df = _tabla_descifrada(firma_datos())
     df_f = filter_df(df, q) if q else df
     st.dataframe(df_f, use_container_width=True, height=300)
-    if st.button("Exportar a Excel"):
+    if q and df_f.empty and parece_folio(q):
+        # Órdenes antiguas: ya no están en la tabla viva sino en el archivo
+        archivada = retencion.orden_archivada(q.strip())
+        if archivada:
+            st.info(f"Folio {archivada['Folio']} en el archivo de órdenes antiguas (registrado el {archivada['Fecha_Registro'][:10]}).")
+            st.json({k: v for k, v in archivada.items() if k != "Resultados"})
+            st.json(parse_resultados(archivada["Resultados"]) or archivada["Resultados"])
+    c1, c2 = st.columns(2)
+    if c1.button("Exportar a Excel"):
         path, msg = export_excel(df_f)
         st.success(f"{msg}. Archivo: {path}")
+    if c2.button("Exportar para BI (Parquet, con seudónimos)"):
+        r = exportacion.exportar(incremental=True)
+        if r["archivo"]:
+            st.success(f"{r['filas']} órdenes ({r['modo']}). Archivo: {r['archivo']}")
+        else:
+            st.info("Sin cambios desde la última exportación.")
 
 # ========== Admin ==========
-with tabs[3]:
-    if st.session_state.user["role"] != "admin":
-        st.info("Solo admin puede gestionar usuarios.")
-    else:
-        st.subheader("👤 Gestión de usuarios")
-
-        # Cargar usuarios actuales desde el archivo JSON
-        users = load_users_from_file()
+def vista_admin():
+    """Usuarios, configuración, tablero y rendimiento."""
+    st.subheader("👤 Gestión de usuarios")
 
-        # ---- Crear / actualizar usuario ----
-        with st.form("form_new_user"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                name = st.text_input("Nombre (solo referencia local)")
-            with col2:
-                email = st.text_input("Usuario / correo")
-            with col3:
-                role = st.selectbox("Rol", ["recepcion", "lab", "admin"])
-            pwd = st.text_input("Contraseña", type="password")
-            submitted_u = st.form_submit_button("Crear/Actualizar usuario")
-
-        if submitted_u:
-            if not email or not pwd or not role:
-                st.error("Completa usuario/correo, rol y contraseña.")
-            else:
-                record = make_user(pwd, role)
-                if name:
-                    record["name"] = name
-                users[email] = record
-                save_users_to_file(users)
-                st.success(f"Usuario {email} creado/actualizado.")
-                st.rerun()
+    # Cargar usuarios actuales desde el archivo JSON
+    users = load_users_from_file()
 
-        # Tabla: mostrar usuarios y permitir cambiar contraseñas
-        st.markdown("**Usuarios actuales:**")
+    # ---- Crear / actualizar usuario ----
+    with st.form("form_new_user"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            name = st.text_input("Nombre (solo referencia local)")
+        with col2:
+            email = st.text_input("Usuario / correo")
+        with col3:
+            role = st.selectbox("Rol", ["recepcion", "lab", "admin"])
+        pwd = st.text_input("Contraseña", type="password")
+        submitted_u = st.form_submit_button("Crear/Actualizar usuario")
+
+    if submitted_u:
+        if not email or not pwd or not role:
+            st.error("Completa usuario/correo, rol y contraseña.")
+        else:
+            record = make_user(pwd, role)
+            if name:
+                record["name"] = name
+            users[email] = record
+            save_users_to_file(users, usuario=st.session_state.user["email"])
+            st.success(f"Usuario {email} creado/actualizado.")
+            st.rerun()
 
-        if users:
-            for u, rec in users.items():
-                safe = u.replace("@", "_at_").replace(".", "_")
-                cols = st.columns([3, 2, 4, 1])
+    # Tabla: mostrar usuarios y permitir cambiar contraseñas
+    st.markdown("**Usuarios actuales:**")
 
-                # Usuario
-                cols[0].markdown(f"**{u}**")
+    if users:
+        for u, rec in users.items():
+            safe = u.replace("@", "_at_").replace(".", "_")
+            cols = st.columns([3, 2, 4, 1])
 
-                # Rol
-                cols[1].markdown(rec.get("role", ""))
+            # Usuario
+            cols[0].markdown(f"**{u}**")
 
-                # Controles de contraseña
-                with cols[2]:
-                    pwd_in = st.text_input(
-                        "Nueva contraseña",
-                        type="password",
-                        key=f"pwd_in_{safe}",
-                    )
-                    pwd_conf = st.text_input(
-                        "Confirmar contraseña",
-                        type="password",
-                        key=f"pwd_conf_{safe}",
-                    )
-                    set_key = f"set_{safe}"
-                    gen_key = f"gen_{safe}"
-                    c1, c2 = st.columns([1, 1])
-
-                    # Establecer contraseña manual
-                    with c1:
-                        if st.button("Establecer contraseña", key=set_key):
-                            if not pwd_in:
-                                st.error("Introduce la nueva contraseña.")
-                            elif len(pwd_in) < 6:
-                                st.error("La contraseña debe tener al menos 6 caracteres.")
-                            elif pwd_in != pwd_conf:
-                                st.error("Las contraseñas no coinciden.")
-                            else:
-                                new_rec = make_user(pwd_in, rec.get("role", ""))
-                                if "name" in rec:
-                                    new_rec["name"] = rec["name"]
-                                users[u] = new_rec
-                                save_users_to_file(users)
-                                st.success(f"Contraseña actualizada para {u}")
-                                st.code(pwd_in)
-                                st.rerun()
+            # Rol
+            cols[1].markdown(rec.get("role", ""))
 
-                    # Generar contraseña temporal
-                    with c2:
-                        if st.button("Generar contraseña temporal", key=gen_key):
-                            temp_pwd = secrets.token_urlsafe(6)
-                            new_rec = make_user(temp_pwd, rec.get("role", ""))
+            # Controles de contraseña
+            with cols[2]:
+                pwd_in = st.text_input(
+                    "Nueva contraseña",
+                    type="password",
+                    key=f"pwd_in_{safe}",
+                )
+                pwd_conf = st.text_input(
+                    "Confirmar contraseña",
+                    type="password",
+                    key=f"pwd_conf_{safe}",
+                )
+                set_key = f"set_{safe}"
+                gen_key = f"gen_{safe}"
+                c1, c2 = st.columns([1, 1])
+
+                # Establecer contraseña manual
+                with c1:
+                    if st.button("Establecer contraseña", key=set_key):
+                        if not pwd_in:
+                            st.error("Introduce la nueva contraseña.")
+                        elif len(pwd_in) < 6:
+                            st.error("La contraseña debe tener al menos 6 caracteres.")
+                        elif pwd_in != pwd_conf:
+                            st.error("Las contraseñas no coinciden.")
+                        else:
+                            new_rec = make_user(pwd_in, rec.get("role", ""))
                             if "name" in rec:
                                 new_rec["name"] = rec["name"]
                             users[u] = new_rec
-                            save_users_to_file(users)
-                            st.success(f"Contraseña temporal para {u}:")
-                            st.code(temp_pwd)
+                            save_users_to_file(users, usuario=st.session_state.user["email"])
+                            st.success(f"Contraseña actualizada para {u}")
+                            st.code(pwd_in)
                             st.rerun()
 
-                # Columna para botón de eliminar + confirmación
-                with cols[3]:
-                    if u == st.session_state.user["email"]:
-                        st.caption("No puedes borrar tu propio usuario")
+                # Generar contraseña temporal
+                with c2:
+                    if st.button("Generar contraseña temporal", key=gen_key):
+                        temp_pwd = secrets.token_urlsafe(6)
+                        new_rec = make_user(temp_pwd, rec.get("role", ""))
+                        if "name" in rec:
+                            new_rec["name"] = rec["name"]
+                        users[u] = new_rec
+                        save_users_to_file(users, usuario=st.session_state.user["email"])
+                        st.success(f"Contraseña temporal para {u}:")
+                        st.code(temp_pwd)
+                        st.rerun()
+
+            # Columna para botón de eliminar + confirmación
+            with cols[3]:
+                if u == st.session_state.user["email"]:
+                    st.caption("No puedes borrar tu propio usuario")
+                else:
+                    if st.session_state.get("confirm_delete") != u:
+                        if st.button("🗑️ Borrar", key=f"del_{safe}"):
+                            st.session_state["confirm_delete"] = u
+                            st.rerun()
                     else:
-                        if st.session_state.get("confirm_delete") != u:
-                            if st.button("🗑️ Borrar", key=f"del_{safe}"):
-                                st.session_state["confirm_delete"] = u
+                        st.warning(
+                            f"¿Seguro que quieres borrar el usuario:\n\n**{u}**?\n\nEsta acción no se puede deshacer."
+                        )
+                        c1, c2 = st.columns(2)
+                        with c1:
+                            if st.button("Sí, borrar", key=f"yes_{safe}"):
+                                users = load_users_from_file()
+                                if u in users:
+                                    del users[u]
+                                    save_users_to_file(users, usuario=st.session_state.user["email"])
+                                st.session_state.pop("confirm_delete", None)
+                                st.success(f"Usuario {u} eliminado.")
                                 st.rerun()
-                        else:
-                            st.warning(
-                                f"¿Seguro que quieres borrar el usuario:\n\n**{u}**?\n\nEsta acción no se puede deshacer."
-                            )
-                            c1, c2 = st.columns(2)
-                            with c1:
-                                if st.button("Sí, borrar", key=f"yes_{safe}"):
-                                    users = load_users_from_file()
-                                    if u in users:
-                                        del users[u]
-                                        save_users_to_file(users)
-                                    st.session_state.pop("confirm_delete", None)
-                                    st.success(f"Usuario {u} eliminado.")
-                                    st.rerun()
-                            with c2:
-                                if st.button("Cancelar", key=f"no_{safe}"):
-                                    st.session_state.pop("confirm_delete", None)
-                                    st.info("Operación cancelada.")
-                                    st.rerun()
+                        with c2:
+                            if st.button("Cancelar", key=f"no_{safe}"):
+                                st.session_state.pop("confirm_delete", None)
+                                st.info("Operación cancelada.")
+                                st.rerun()
+    else:
+        st.write("No hay usuarios creados.")
+
+    # ------------------------------
+    # Configuración LABZA (lab + médico)
+    # ------------------------------
+    st.markdown("---")
+    st.subheader("Configuración del laboratorio y del médico")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("**Datos del laboratorio**")
+        lab_nombre = st.text_input("Nombre del laboratorio", LAB_INFO.get("nombre", ""))
+        lab_dir = st.text_area("Dirección", LAB_INFO.get("direccion", ""), height=70)
+        lab_tel = st.text_input("Teléfono", LAB_INFO.get("telefono", ""))
+        lab_mail = st.text_input("Correo", LAB_INFO.get("correo", ""))
+
+    with col2:
+        st.markdown("**Datos del médico responsable**")
+        doc_nombre = st.text_input("Nombre del médico", DOCTOR_INFO.get("nombre", ""))
+        doc_ced = st.text_input("Cédula profesional", DOCTOR_INFO.get("cedula", ""))
+        doc_esp = st.text_input("Especialidad", DOCTOR_INFO.get("especialidad", ""))
+
+    if st.button("💾 Guardar información"):
+        new_lab = {
+            "nombre": lab_nombre,
+            "direccion": lab_dir,
+            "telefono": lab_tel,
+            "correo": lab_mail,
+        }
+        new_doc = {
+            "nombre": doc_nombre,
+            "cedula": doc_ced,
+            "especialidad": doc_esp,
+        }
+
+        save_labza_config(new_lab, new_doc, usuario=st.session_state.user["email"])
+        cache_pdf.invalidar_config(new_lab, new_doc)
+        st.success("Datos guardados exitosamente.")
+
+    # ------------------------------
+    # Envío de resultados por correo
+    # ------------------------------
+    st.markdown("---")
+    st.subheader("✉️ Envío de resultados")
+    if not os.getenv("SMTP_HOST"):
+        st.info("SMTP no configurado (SMTP_HOST); los envíos se quedan en cola.")
+    cola = notificaciones.resumen_cola()
+    if cola:
+        st.dataframe(pd.DataFrame([{"Estado": k, "Trabajos": v} for k, v in cola.items()]),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.write("Sin envíos registrados.")
+
+    # ------------------------------
+    # Auditoría (bitácora encadenada)
+    # ------------------------------
+    st.markdown("---")
+    st.subheader("🔏 Auditoría")
+    acol1, acol2 = st.columns(2)
+    with acol1:
+        aud_folio = st.text_input("Folio", key="aud_folio")
+    with acol2:
+        aud_usuario = st.text_input("Usuario", key="aud_usuario")
+    eventos = auditoria.consultar(folio=aud_folio.strip() or None, usuario=aud_usuario.strip() or None, limite=200)
+    if eventos:
+        st.dataframe(pd.DataFrame([
+            {"Seq": e["seq"], "Fecha": e["ts"], "Acción": e["accion"], "Usuario": e["usuario"],
+             "Folio": e["folio"], "Detalle": json.dumps(e["detalle"], ensure_ascii=False)}
+            for e in eventos
+        ]), use_container_width=True, hide_index=True)
+    else:
+        st.write("Sin eventos para ese filtro.")
+    if st.button("Verificar integridad de la bitácora"):
+        r = auditoria.verificar()
+        if r["ok"]:
+            st.success(f"Cadena íntegra: {r['eventos']} eventos.")
         else:
-            st.write("No hay usuarios creados.")
-
-        # ------------------------------
-        # Configuración LABZA (lab + médico)
-        # ------------------------------
-        st.markdown("---")
-        st.subheader("Configuración del laboratorio y del médico")
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.markdown("**Datos del laboratorio**")
-            lab_nombre = st.text_input("Nombre del laboratorio", LAB_INFO.get("nombre", ""))
-            lab_dir = st.text_area("Dirección", LAB_INFO.get("direccion", ""), height=70)
-            lab_tel = st.text_input("Teléfono", LAB_INFO.get("telefono", ""))
-            lab_mail = st.text_input("Correo", LAB_INFO.get("correo", ""))
-
-        with col2:
-            st.markdown("**Datos del médico responsable**")
-            doc_nombre = st.text_input("Nombre del médico", DOCTOR_INFO.get("nombre", ""))
-            doc_ced = st.text_input("Cédula profesional", DOCTOR_INFO.get("cedula", ""))
-            doc_esp = st.text_input("Especialidad", DOCTOR_INFO.get("especialidad", ""))
-
-        if st.button("💾 Guardar información"):
-            new_lab = {
-                "nombre": lab_nombre,
-                "direccion": lab_dir,
-                "telefono": lab_tel,
-                "correo": lab_mail,
-            }
-            new_doc = {
-                "nombre": doc_nombre,
-                "cedula": doc_ced,
-                "especialidad": doc_esp,
+            st.error(f"La cadena se rompe en el evento {r['seq_error']}: {r['error']}")
+
+    # ------------------------------
+    # Tablero operativo (agregados incrementales)
+    # ------------------------------
+    st.markdown("---")
+    st.subheader("📊 Tablero operativo")
+
+    dcol1, dcol2 = st.columns(2)
+    with dcol1:
+        tablero_desde = st.date_input("Desde", value=date.today().replace(day=1), key="tablero_desde")
+    with dcol2:
+        tablero_hasta = st.date_input("Hasta", value=date.today(), key="tablero_hasta")
+
+    resumen = resumen_tablero(str(tablero_desde), str(tablero_hasta))
+    serie = pd.DataFrame(resumen["serie_diaria"])
+    entrega = resumen["entrega"]
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Órdenes", int(serie["Ordenes"].sum()) if not serie.empty else 0)
+    m2.metric("Ingresos (MXN)", f"{serie['Ingresos_MXN'].sum():,.2f}" if not serie.empty else "0.00")
+    m3.metric("Entrega p50 (h)", f"{entrega['p50_h']:.1f}" if entrega["p50_h"] is not None else "—")
+    m4.metric("Entrega p95 (h)", f"{entrega['p95_h']:.1f}" if entrega["p95_h"] is not None else "—")
+
+    if not serie.empty:
+        serie = serie.set_index("Dia")
+        st.bar_chart(serie[["Ordenes", "Firmadas"]])
+        st.line_chart(serie[["Ingresos_MXN"]])
+    else:
+        st.info("Sin órdenes en el rango seleccionado.")
+
+    tcol1, tcol2 = st.columns(2)
+    with tcol1:
+        st.markdown("**Órdenes por estado**")
+        st.dataframe(pd.DataFrame(
+            [{"Estado": k, "Ordenes": v} for k, v in resumen["por_estado"].items()]
+        ), use_container_width=True, hide_index=True)
+    with tcol2:
+        st.markdown("**Estudios más solicitados**")
+        st.dataframe(pd.DataFrame(resumen["top_estudios"]), use_container_width=True, hide_index=True)
+
+    st.caption(f"Última actualización: {resumen['actualizado'] or '—'}")
+    if st.button("🔄 Reconstruir agregados desde la base"):
+        reconstruir_desde_csv()
+        st.success("Agregados reconstruidos.")
+        st.rerun()
+
+    # ------------------------------
+    # Rendimiento (instrumentación de app_core)
+    # ------------------------------
+    st.markdown("---")
+    st.subheader("⏱️ Rendimiento")
+
+    if not instrumentacion.METRICAS_ACTIVAS:
+        st.info("Instrumentación desactivada. Inicia la app con LIS_METRICAS=1 para medir.")
+    else:
+        st.markdown("**Desglose de este rerun**")
+        st.dataframe(pd.DataFrame(instrumentacion.desglose_rerun()), use_container_width=True, hide_index=True)
+
+        st.markdown("**Acumulado del proceso**")
+        filas = [
+            {
+                "Operacion": op,
+                "Llamadas": v["n"],
+                "Promedio_ms": round(v["suma"] / v["n"] * 1000, 3) if v["n"] else 0.0,
+                "Total_s": round(v["suma"], 3),
             }
+            for op, v in sorted(instrumentacion.instantanea().items(), key=lambda kv: -kv[1]["suma"])
+        ]
+        st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
+        pcol1, pcol2 = st.columns(2)
+        with pcol1:
+            if st.button("Exportar métricas (Prometheus)"):
+                path = instrumentacion.escribir_prometheus()
+                st.success(f"Métricas escritas en {path}")
+        with pcol2:
+            if st.button("Reiniciar contadores"):
+                instrumentacion.reiniciar()
+                st.rerun()
 
-            save_labza_config(new_lab, new_doc)
-            st.success("Datos guardados exitosamente.")
+
+# -------------------------
+# Navegación explícita por rol
+# -------------------------
+SECCIONES = {
+    "Recepción": (vista_recepcion, ("recepcion", "admin")),
+    "Laboratorio": (vista_laboratorio, ("lab", "medico", "admin")),
+    "Consultas/Reportes": (vista_consultas, None),  # todos los roles
+    "Admin": (vista_admin, ("admin",)),
+}
+
+rol = st.session_state.user["role"]
+permitidas = [n for n, (_, roles) in SECCIONES.items() if roles is None or rol in roles]
+seccion = st.sidebar.radio("Sección", permitidas, key="seccion_activa")
+vista, _ = SECCIONES[seccion]
+with instrumentacion.medir(f"vista_{seccion}"):
+    vista()
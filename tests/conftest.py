@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures comunes: cada prueba corre en un directorio de trabajo aislado
+(benchmarks.entorno_aislado) con las cachés de los módulos limpias, así que
+no toca solicitudes_lis.csv, usuarios.json ni la bitácora reales.
+
+Cada archivo marca la solicitud que cubre (pytestmark = solicitud("user-0NN"));
+`pytest --solicitud user-026` corre solo esas.
+"""
+
+import pytest
+
+from benchmarks import entorno_aislado
+
+
+def pytest_addoption(parser):
+    parser.addoption("--solicitud", action="append", default=[],
+                     help="Solo las pruebas marcadas con esa solicitud (se puede repetir).")
+
+def pytest_collection_modifyitems(config, items):
+    elegidas = set(config.getoption("--solicitud"))
+    if not elegidas:
+        return
+    quedan, fuera = [], []
+    for item in items:
+        marcas = {m.args[0] for m in item.iter_markers("solicitud")}
+        (quedan if marcas & elegidas else fuera).append(item)
+    config.hook.pytest_deselected(items=fuera)
+    items[:] = quedan
+
+
+def _limpiar_caches():
+    import agregados, cache_pdf, compresion, lista_trabajo, api_lis
+
+    compresion._diccionarios.clear()
+    compresion._activo.update(firma=None, id=None)
+    agregados._cache.update(mtime=None, data=None)
+    lista_trabajo._compartida = None
+    api_lis._cache_busqueda.update(firma=None, df=None)
+    cache_pdf._memo.update(firma=None, indice={})
+
+
+@pytest.fixture
+def entorno(tmp_path):
+    """Directorio temporal como directorio de trabajo; regresa su ruta."""
+    _limpiar_caches()
+    with entorno_aislado(str(tmp_path / "lis")) as directorio:
+        yield directorio
+    _limpiar_caches()
+
+
+@pytest.fixture
+def nueva_orden():
+    """Fábrica de parámetros de save_orders para órdenes de prueba."""
+    def _orden(nombre: str = "Paciente Prueba", estudios=("BH", "QS"), **extra) -> dict:
+        return {
+            "folio": None, "fecha_prog": "2026-10-19", "costo": 100, "nombre": nombre,
+            "edad": 40, "genero": "F", "telefono": "", "direccion": "",
+            "tipo": list(estudios), "observaciones": "", "emails": [], **extra,
+        }
+    return _orden
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Agregados del tablero: actualización incremental, reconstrucción y caché."""
+
+import json, os, random
+
+import pytest
+
+import agregados
+import app_core
+
+pytestmark = pytest.mark.solicitud("user-026")
+
+
+def _sin_fecha(data: dict) -> dict:
+    return {k: v for k, v in data.items() if k != "actualizado"}
+
+def _operar(nueva_orden) -> list:
+    folios = app_core.save_orders([nueva_orden(f"P{i}", costo=100 + i, estudios=("BH", "QS") if i % 2 else ("BH",))
+                                   for i in range(6)])
+    app_core.save_results(folios[0], json.dumps({"BH": {"valor": "13"}}))
+    app_core.save_results(folios[1], json.dumps({"BH": {"valor": "13"}, "QS": {"valor": "90"}}), liberar=True)
+    app_core.save_results_lote([
+        {"folio": folios[2], "resultados": {"BH": {"valor": "12"}}, "liberar": True},
+        {"folio": folios[3], "resultados": {"BH": {"valor": "12"}}},
+    ])
+    return folios
+
+
+def test_incremental_igual_a_reconstruir(entorno, nueva_orden):
+    _operar(nueva_orden)
+    incremental = json.loads(json.dumps(agregados.cargar_agregados()))
+    assert incremental["por_estado"] == {"pendiente": 2, "capturado": 2, "firmado": 2}
+    assert incremental["por_estudio"]["BH"] == {"ordenes": 6, "firmadas": 2}
+    assert incremental["por_estudio"]["QS"] == {"ordenes": 3, "firmadas": 1}
+    (dia, cubeta), = incremental["por_dia"].items()
+    assert cubeta == {"ordenes": 6, "ingresos": sum(100 + i for i in range(6)), "firmadas": 2}
+    assert incremental["entrega"]["global"]["n"] == 2
+    assert _sin_fecha(agregados.reconstruir_desde_csv()) == _sin_fecha(incremental)
+
+def test_reconstruir_sin_archivo(entorno, nueva_orden):
+    _operar(nueva_orden)
+    antes = _sin_fecha(json.loads(json.dumps(agregados.cargar_agregados())))
+    os.remove(agregados.AGREGADOS_PATH)
+    assert agregados.cargar_agregados()["por_estado"] == {}
+    agregados.reconstruir_desde_csv()
+    assert _sin_fecha(agregados.cargar_agregados()) == antes
+    assert agregados.resumen_tablero()["por_estado"]["firmado"] == 2
+
+def test_cache_por_mtime_e_inodo(entorno, nueva_orden):
+    app_core.save_orders([nueva_orden()])
+    primera = agregados.cargar_agregados()
+    assert agregados.cargar_agregados() is primera
+    # Otro proceso reemplaza el archivo (os.replace: inodo nuevo)
+    otra = {**json.loads(json.dumps(primera)), "por_estado": {"pendiente": 41}}
+    tmp = agregados.AGREGADOS_PATH + ".otro"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(otra, f)
+    os.replace(tmp, agregados.AGREGADOS_PATH)
+    assert agregados.cargar_agregados()["por_estado"] == {"pendiente": 41}
+    # Una versión distinta o un JSON dañado se tratan como vacío
+    with open(agregados.AGREGADOS_PATH, "w", encoding="utf-8") as f:
+        f.write("{dañado")
+    assert agregados.cargar_agregados()["por_estado"] == {}
+
+def test_cuantiles_del_sketch():
+    rng = random.Random(26)
+    valores = sorted(rng.lognormvariate(3, 1) for _ in range(5000))
+    sk = agregados.sketch_nuevo()
+    for v in valores:
+        agregados.sketch_agregar(sk, v)
+    for q in (0.5, 0.9, 0.95):
+        exacto = valores[int(q * (len(valores) - 1))]
+        assert abs(agregados.sketch_cuantil(sk, q) - exacto) <= agregados.SKETCH_ALPHA * exacto * 1.01
+    assert agregados.sketch_cuantil(agregados.sketch_nuevo(), 0.5) is None
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Almacén de PDFs: dedup por contenido, cifrado en reposo, verificación y legados."""
+
+import io, os
+
+import pytest
+
+import almacen_pdf
+
+pytestmark = pytest.mark.solicitud("user-031")
+
+
+def _pdf(n: int = 2_500_000) -> bytes:
+    # Más de un bloque (TAM_BLOQUE = 1 MiB) para cubrir el streaming
+    return b"%PDF-1.4\n" + os.urandom(n)
+
+def _blobs() -> list:
+    return [a for _, _, archivos in os.walk(almacen_pdf.BLOB_DIR) for a in archivos if a.endswith(".bin")]
+
+
+def test_guardar_leer_y_dedup(entorno):
+    datos = _pdf()
+    a = almacen_pdf.guardar_pdf("F1", datos)
+    b = almacen_pdf.guardar_pdf("F2", io.BytesIO(datos), "otro.pdf")
+    assert a["hash"] == b["hash"] and a["tamano"] == len(datos)
+    assert len(_blobs()) == 1
+    assert almacen_pdf.leer_pdf("F1") == almacen_pdf.leer_pdf("F2") == datos
+    assert almacen_pdf.metadata("F2")["nombre"] == "otro.pdf"
+    # En disco va cifrado: el contenido no aparece en claro
+    with open(almacen_pdf._ruta_blob(a["hash"]), "rb") as f:
+        assert b"%PDF" not in f.read()
+    assert not [x for x in os.listdir(almacen_pdf.BLOB_DIR) if x.startswith(".subida_")]
+
+def test_blob_danado_y_reparado(entorno):
+    datos = _pdf()
+    meta = almacen_pdf.guardar_pdf("F1", datos)
+    ruta = almacen_pdf._ruta_blob(meta["hash"])
+    with open(ruta, "r+b") as f:
+        f.truncate(os.path.getsize(ruta) - 10)
+    assert not almacen_pdf.blob_valido(meta["hash"])
+    with pytest.raises(almacen_pdf.BlobCorrupto):
+        almacen_pdf.leer_pdf("F1")
+    # Volver a subir el mismo PDF reemplaza el blob dañado
+    almacen_pdf.guardar_pdf("F1", datos)
+    assert almacen_pdf.leer_pdf("F1") == datos
+
+def test_migrar_legados_y_huerfanos(entorno):
+    os.makedirs(almacen_pdf.PDF_DIR, exist_ok=True)
+    datos = _pdf(1000)
+    with open(os.path.join(almacen_pdf.PDF_DIR, "F9.pdf"), "wb") as f:
+        f.write(datos)
+    assert almacen_pdf.existe_pdf("F9") and almacen_pdf.leer_pdf("F9") == datos
+    assert almacen_pdf.migrar_legados() == 1
+    assert not os.path.exists(os.path.join(almacen_pdf.PDF_DIR, "F9.pdf"))
+    assert almacen_pdf.leer_pdf("F9") == datos
+    viejo = almacen_pdf.metadata("F9")["hash"]
+    almacen_pdf.guardar_pdf("F9", _pdf(1000))
+    assert almacen_pdf.blobs_huerfanos() == [viejo]
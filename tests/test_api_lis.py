@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""API ASGI: autenticación, cuerpos inválidos y el flujo alta -> resultados -> consulta."""
+
+import asyncio, json
+
+import pytest
+
+import api_lis
+import app_core
+
+pytestmark = pytest.mark.solicitud("user-034")
+
+
+def _llamar(metodo: str, ruta: str, cuerpo=None, token: str = "", query: str = "") -> tuple:
+    """(status, JSON) de una petición al app ASGI, sin servidor."""
+    if cuerpo is not None and not isinstance(cuerpo, bytes):
+        cuerpo = json.dumps(cuerpo).encode()
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request", "body": cuerpo or b"", "more_body": False}
+
+    async def send(m):
+        mensajes.append(m)
+
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    scope = {"type": "http", "method": metodo, "path": ruta, "headers": headers,
+             "query_string": query.encode()}
+    asyncio.run(api_lis.app(scope, receive, send))
+    return mensajes[0]["status"], json.loads(mensajes[1]["body"])
+
+
+@pytest.fixture
+def usuarios(entorno):
+    app_core.save_users_to_file({
+        "lab@lab.local": app_core.make_user("clave-lab", "lab"),
+        "recepcion@lab.local": app_core.make_user("clave-rec", "recepcion"),
+    })
+
+def _token(usuario: str, password: str) -> str:
+    status, r = _llamar("POST", "/auth/token", {"usuario": usuario, "password": password})
+    assert status == 200
+    return r["token"]
+
+
+def test_login(usuarios):
+    assert _llamar("POST", "/auth/token", {"usuario": "lab@lab.local", "password": "otra"})[0] == 401
+    status, r = _llamar("POST", "/auth/token", {"usuario": "lab@lab.local", "password": "clave-lab"})
+    assert status == 200 and r["rol"] == "lab"
+
+@pytest.mark.parametrize("cuerpo", [b"[1, 2]", b'"texto"', b"42", b"null", b"{no es json"])
+def test_cuerpo_que_no_es_objeto(usuarios, cuerpo):
+    status, r = _llamar("POST", "/auth/token", cuerpo)
+    assert status == 400 and "error" in r
+    token = _token("lab@lab.local", "clave-lab")
+    for ruta in ("/resultados", "/resultados/lote"):
+        status, r = _llamar("POST", ruta, cuerpo, token)
+        assert status == 400, (ruta, r)
+
+def test_sin_token_o_token_invalido(usuarios):
+    assert _llamar("GET", "/ordenes")[0] == 401
+    assert _llamar("GET", "/ordenes", token="abc.def")[0] == 401
+
+def test_permisos_por_rol(usuarios):
+    token = _token("recepcion@lab.local", "clave-rec")
+    status, _ = _llamar("POST", "/resultados", {"folio": "X", "resultados": {}}, token)
+    assert status == 403
+
+def test_alta_resultados_y_consulta(usuarios):
+    rec = _token("recepcion@lab.local", "clave-rec")
+    lab = _token("lab@lab.local", "clave-lab")
+    status, r = _llamar("POST", "/ordenes", {"nombre": "Ana López", "estudios": ["BH"]}, rec)
+    assert status == 201
+    folio = r["folio"]
+
+    status, r = _llamar("POST", "/resultados", {"folio": folio, "resultados": {"QS": {"valor": "1"}}}, lab)
+    assert status == 400 and "QS" in r["error"]  # estudio que la orden no tiene
+    status, r = _llamar("POST", "/resultados", {"folio": folio, "resultados": {"BH": {"valor": "13"}}}, lab)
+    assert status == 200 and r["estado"] == "capturado"
+    status, r = _llamar("POST", "/resultados/lote", {"resultados": [
+        {"folio": folio, "resultados": {"BH": {"valor": "13.5"}}, "liberar": True},
+        {"folio": "NO-EXISTE", "resultados": {"BH": {"valor": "1"}}},
+    ]}, lab)
+    assert status == 200 and r["aplicados"] == 1 and r["rechazados"] == 1
+
+    status, r = _llamar("GET", f"/ordenes/{folio}", token=lab)
+    assert status == 200
+    assert r["Estado"] == "firmado"
+    assert r["Resultados"] == {"BH": {"valor": "13.5"}}
+    assert _llamar("GET", "/ordenes/NO-EXISTE", token=lab)[0] == 404
+
+def test_resultados_no_tocan_una_orden_firmada(usuarios):
+    lab = _token("lab@lab.local", "clave-lab")
+    folio, = app_core.save_orders([{
+        "folio": None, "fecha_prog": "2026-10-19", "costo": 0, "nombre": "Ana", "edad": 30,
+        "genero": "F", "telefono": "", "direccion": "", "tipo": ["BH"], "observaciones": "", "emails": [],
+    }])
+    status, r = _llamar("POST", "/resultados", {"folio": folio, "resultados": {"BH": {"valor": "13"}},
+                                                "liberar": True}, lab)
+    assert status == 200 and r["estado"] == "firmado"
+    status, r = _llamar("POST", "/resultados", {"folio": folio, "resultados": {"BH": {"valor": "1"}}}, lab)
+    assert status == 409 and "firmada" in r["error"]
+    orden = app_core.get_order_summary(folio)
+    assert orden["Estado"] == "firmado"
+    assert app_core.parse_resultados(orden["Resultados"]) == {"BH": {"valor": "13"}}
+
+def test_folio_faltante(usuarios):
+    token = _token("lab@lab.local", "clave-lab")
+    status, r = _llamar("POST", "/resultados", {"resultados": {}}, token)
+    assert status == 400
+    status, r = _llamar("POST", "/resultados", {"folio": "NO-EXISTE", "resultados": {}}, token)
+    assert status == 404
+
+@pytest.mark.solicitud("user-033")
+def test_el_despachador_arranca_con_el_worker(entorno, monkeypatch):
+    import notificaciones
+    iniciados = []
+
+    class _Despachador:
+        def iniciar(self):
+            iniciados.append(self)
+            return self
+
+    monkeypatch.setattr(notificaciones, "DespachadorNotificaciones", _Despachador)
+    monkeypatch.setattr(api_lis, "_despachador", None)
+    monkeypatch.delenv("SMTP_HOST", raising=False)
+    api_lis._iniciar_despachador()
+    assert api_lis._despachador is None
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    api_lis._iniciar_despachador()
+    api_lis._iniciar_despachador()
+    assert len(iniciados) == 1 and api_lis._despachador is iniciados[0]
+
+@pytest.mark.parametrize("campo, valor", [
+    ("costo", "cien"), ("costo", -5), ("costo", [1]), ("costo", "nan"),
+    ("fecha_programada", "19/19/2026"), ("fecha_programada", "mañana"), ("fecha_programada", 20261019),
+])
+def test_orden_con_campo_invalido(usuarios, campo, valor):
+    rec = _token("recepcion@lab.local", "clave-rec")
+    status, r = _llamar("POST", "/ordenes", {"nombre": "Ana", "estudios": ["BH"], campo: valor}, rec)
+    assert status == 400 and campo in r["error"]
+    status, r = _llamar("POST", "/ordenes/lote", {"ordenes": [{"nombre": "Ana"}, {"nombre": "Luis", campo: valor}]}, rec)
+    assert status == 400 and r["error"].startswith("Orden 2:")
+    assert app_core.read_csv(columnas=["Folio"]).empty
+
+def test_orden_con_costo_y_fecha(usuarios):
+    rec = _token("recepcion@lab.local", "clave-rec")
+    status, r = _llamar("POST", "/ordenes", {"nombre": "Ana", "costo": "250.5", "fecha_programada": "2026-11-02"}, rec)
+    assert status == 201
+    fila = app_core.read_csv(columnas=["Folio", "Costo_MXN", "Fecha_Programada"]).iloc[0]
+    assert fila["Folio"] == r["folio"] and fila["Costo_MXN"] == 250.5
+    assert str(fila["Fecha_Programada"].date()) == "2026-11-02"
+
+def test_error_interno_no_expone_detalles(usuarios, monkeypatch, caplog):
+    def _falla(*args, **kwargs):
+        raise RuntimeError("ruta secreta /srv/lis/fernet.key")
+
+    monkeypatch.setattr(app_core, "save_orders", _falla)
+    rec = _token("recepcion@lab.local", "clave-rec")
+    status, r = _llamar("POST", "/ordenes", {"nombre": "Ana"}, rec)
+    assert status == 500 and r == {"error": "Error interno."}
+    assert "ruta secreta" in caplog.text
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Bitácora de auditoría: cadena de hashes, alteraciones y eventos que no son JSON."""
+
+import json
+from datetime import datetime
+
+import pytest
+
+import auditoria
+
+pytestmark = pytest.mark.solicitud("user-043")
+
+
+def _escribir(n: int) -> None:
+    for i in range(n):
+        auditoria.registrar("resultados", "usuario@lab.local", f"F{i}", estado="capturado", i=i)
+    assert auditoria.vaciar(10)
+
+def _lineas() -> list:
+    with open(auditoria.AUDITORIA_PATH, "r", encoding="utf-8") as f:
+        return f.readlines()
+
+def _reescribir(lineas: list) -> None:
+    with open(auditoria.AUDITORIA_PATH, "w", encoding="utf-8") as f:
+        f.writelines(lineas)
+    auditoria._estado.update(seq=None, hash=None, tam=None, inodo=None)
+
+
+def test_cadena_integra(entorno):
+    _escribir(5)
+    r = auditoria.verificar()
+    assert r["ok"] and r["eventos"] == 5
+    registros = [json.loads(l) for l in _lineas()]
+    assert [r["seq"] for r in registros] == [1, 2, 3, 4, 5]
+    assert registros[0]["previo"] == auditoria.GENESIS
+    assert all(b["previo"] == a["hash"] for a, b in zip(registros, registros[1:]))
+
+def test_linea_alterada(entorno):
+    _escribir(4)
+    lineas = _lineas()
+    registro = json.loads(lineas[1])
+    registro["detalle"]["estado"] = "firmado"
+    lineas[1] = json.dumps(registro, ensure_ascii=False) + "\n"
+    _reescribir(lineas)
+    r = auditoria.verificar()
+    assert not r["ok"]
+    assert r["seq_error"] == 2 and r["eventos"] == 1
+    assert "hash" in r["error"]
+
+def test_linea_borrada(entorno):
+    _escribir(4)
+    lineas = _lineas()
+    _reescribir(lineas[:2] + lineas[3:])
+    r = auditoria.verificar()
+    assert not r["ok"] and r["seq_error"] == 3
+
+def test_linea_ilegible(entorno):
+    _escribir(3)
+    lineas = _lineas()
+    lineas[2] = lineas[2][:20] + "\n"
+    _reescribir(lineas)
+    r = auditoria.verificar()
+    assert not r["ok"] and r["error"] == "registro ilegible"
+
+def test_detalle_que_no_es_json(entorno):
+    # Fechas y objetos arbitrarios quedan como texto; el escritor sigue vivo
+    auditoria.registrar("prueba", "u", "F1", cuando=datetime(2026, 10, 19, 8, 30), objeto=object(), estudios={"BH"})
+    _escribir(2)
+    assert auditoria._escritor["hilo"].is_alive()
+    r = auditoria.verificar()
+    assert r["ok"] and r["eventos"] == 3
+    primero = json.loads(_lineas()[0])
+    assert primero["detalle"]["cuando"] == "2026-10-19 08:30:00"
+
+def test_cadena_continua_entre_lotes(entorno):
+    _escribir(3)
+    # Otro proceso escribió: el estado en memoria ya no vale y se relee la cola del archivo
+    auditoria._estado.update(seq=None, hash=None, tam=None, inodo=None)
+    _escribir(2)
+    r = auditoria.verificar()
+    assert r["ok"] and r["eventos"] == 5
+
+def test_error_de_disco_va_al_log_y_se_reintenta(entorno, monkeypatch, caplog):
+    original = auditoria._escribir_lote
+    fallas = [OSError("disco lleno")]
+
+    def _escribir(eventos):
+        if fallas:
+            raise fallas.pop()
+        original(eventos)
+
+    monkeypatch.setattr(auditoria, "_escribir_lote", _escribir)
+    auditoria.registrar("resultados", "usuario@lab.local", "F1")
+    assert auditoria.vaciar(10)
+    assert "disco lleno" in caplog.text and "reintentando" in caplog.text
+    assert [json.loads(l)["folio"] for l in _lineas()] == ["F1"]
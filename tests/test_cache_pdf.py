@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Caché de PDFs firmados: un render por contenido, LRU por mtime e invalidación."""
+
+import os, time
+
+import pytest
+
+import cache_pdf
+
+pytestmark = pytest.mark.solicitud("user-032")
+
+LAB = {"nombre": "LABZA"}
+DOCTOR = {"nombre": "Dra. Prueba"}
+
+
+def _pdf_de(folio, resultados, lab=LAB):
+    return cache_pdf.pdf_resultado(folio, {"id_solicitud": folio}, resultados, "", lab, DOCTOR, firmado=True)
+
+
+def test_un_render_por_contenido(entorno, monkeypatch):
+    renders = []
+    monkeypatch.setattr(cache_pdf, "generar_pdf_resultado",
+                        lambda solicitud, resultados, **kw: renders.append(1) or f"pdf {resultados}".encode())
+    assert _pdf_de("F1", {"BH": {"valor": "13"}}) == _pdf_de("F1", {"BH": {"valor": "13"}})
+    assert len(renders) == 1
+    # Otros resultados u otra configuración: otra llave
+    _pdf_de("F1", {"BH": {"valor": "14"}})
+    _pdf_de("F1", {"BH": {"valor": "13"}}, lab={"nombre": "Otro"})
+    assert len(renders) == 3
+    # Sin firmar no se guarda
+    cache_pdf.pdf_resultado("F2", {}, {}, "", LAB, DOCTOR, firmado=False)
+    assert len(renders) == 4 and cache_pdf.estadisticas()["entradas"] == 3
+
+def test_acierto_no_reescribe_el_indice(entorno):
+    cache_pdf.guardar("k1", "F1", "c", b"x" * 100)
+    antes = os.stat(cache_pdf.INDICE_PATH)
+    time.sleep(0.01)
+    assert cache_pdf.obtener("k1") == b"x" * 100
+    despues = os.stat(cache_pdf.INDICE_PATH)
+    assert (antes.st_mtime_ns, antes.st_ino) == (despues.st_mtime_ns, despues.st_ino)
+    assert cache_pdf.obtener("no-existe") is None
+
+def test_lru_usa_el_ultimo_acierto(entorno):
+    for k in ("a", "b", "c"):
+        cache_pdf.guardar(k, k, "c", os.urandom(1000))
+    tam = cache_pdf.estadisticas()["bytes"] // 3
+    # 'a' es la más antigua, pero un acierto la vuelve la más reciente
+    viejo = time.time() - 3600
+    indice = cache_pdf._cargar_indice()
+    for i, k in enumerate(("a", "b", "c")):
+        os.utime(cache_pdf._ruta(k), (viejo + i, viejo + i))
+        indice[k]["ultimo_acceso"] = viejo - 100
+    cache_pdf._guardar_indice(indice)
+    assert cache_pdf.obtener("a") is not None
+    cache_pdf.guardar("d", "d", "c", os.urandom(1000), max_bytes=3 * tam + tam // 2)
+    assert sorted(cache_pdf._cargar_indice()) == ["a", "c", "d"]
+    assert not os.path.exists(cache_pdf._ruta("b"))
+
+def test_invalidar(entorno):
+    vigente = cache_pdf.hash_config(LAB, DOCTOR)
+    cache_pdf.guardar("k1", "F1", vigente, b"1")
+    cache_pdf.guardar("k2", "F1", "vieja", b"2")
+    cache_pdf.guardar("k3", "F2", vigente, b"3")
+    assert cache_pdf.invalidar_config(LAB, DOCTOR) == 1
+    assert cache_pdf.invalidar_folio("F1") == 1
+    assert sorted(cache_pdf._cargar_indice()) == ["k3"]
+    # Un blob que no se descifra se trata como fallo y se quita
+    with open(cache_pdf._ruta("k3"), "wb") as f:
+        f.write(b"basura")
+    assert cache_pdf.obtener("k3") is None
+    assert cache_pdf._cargar_indice() == {}
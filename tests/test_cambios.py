@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Feed de cambios: eventos por escritura, lectura incremental, líneas a medias y compactación."""
+
+import json
+
+import pytest
+
+import app_core
+import cambios
+import lista_trabajo
+
+pytestmark = pytest.mark.solicitud("user-036")
+
+
+def test_eventos_de_alta_y_resultados(entorno, nueva_orden):
+    sub = cambios.Suscriptor.desde_ahora()
+    vistos = []
+    cambios.suscribir(vistos.extend)
+    try:
+        folio, = app_core.save_orders([nueva_orden()])
+        app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}}))
+    finally:
+        cambios.desuscribir(vistos.extend)
+    eventos = sub.pendientes()
+    assert [(e["operacion"], e["folio"], e["estado_anterior"], e["estado"]) for e in eventos] == [
+        ("alta", folio, "", "pendiente"), ("resultados", folio, "pendiente", "capturado"),
+    ]
+    assert [e["seq"] for e in eventos] == [1, 2] and vistos == eventos
+    # Sin cambios no hay nada que leer
+    assert not sub.hay_cambios() and sub.pendientes() == []
+
+def test_linea_a_medias_se_lee_despues(entorno, nueva_orden):
+    app_core.save_orders([nueva_orden()])
+    sub = cambios.Suscriptor.desde_ahora()
+    linea = json.dumps({"seq": 2, "operacion": "alta", "folio": "X"}) + "\n"
+    with open(cambios.CAMBIOS_PATH, "a", encoding="utf-8") as f:
+        f.write(linea[:10])
+    assert sub.pendientes() == []
+    with open(cambios.CAMBIOS_PATH, "a", encoding="utf-8") as f:
+        f.write(linea[10:])
+    assert [e["folio"] for e in sub.pendientes()] == ["X"]
+    assert not sub.reinicio
+
+def test_compactar_avisa_reinicio(entorno, nueva_orden):
+    app_core.save_orders([nueva_orden(f"P{i}") for i in range(5)])
+    sub = cambios.Suscriptor.desde_ahora()
+    assert cambios.compactar(2) == 3
+    # La secuencia sigue después de compactar
+    folio, = app_core.save_orders([nueva_orden()])
+    eventos = sub.pendientes()
+    assert sub.reinicio
+    assert [e["seq"] for e in eventos] == [4, 5, 6] and eventos[-1]["folio"] == folio
+    assert cambios.ultima_secuencia() == 6
+
+def test_lista_de_otra_sesion_se_actualiza_con_el_feed(entorno, nueva_orden, monkeypatch):
+    a, = app_core.save_orders([nueva_orden("A")])
+    lista = lista_trabajo.ListaTrabajo()
+    lista.cargar()
+    lecturas = []
+    original = app_core.read_csv
+    monkeypatch.setattr(app_core, "read_csv", lambda *args, **kw: lecturas.append(1) or original(*args, **kw))
+    b, = app_core.save_orders([nueva_orden("B")])
+    app_core.save_results(a, json.dumps({"BH": {"valor": "13"}}))
+    lecturas.clear()
+    assert lista.actualizar() == 2
+    # Se actualizó solo con los eventos, sin releer el CSV
+    assert lecturas == []
+    assert {i["Folio"]: i["Estado"] for i in lista.pagina()["items"]} == {a: "capturado", b: "pendiente"}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Búsqueda del catálogo: acentos, prefijos, errores de dedo, frecuencia y límite."""
+
+import pandas as pd
+import pytest
+
+import catalogo_busqueda as cb
+
+pytestmark = pytest.mark.solicitud("user-039")
+
+
+def _indice(frecuencias=None) -> cb.IndiceCatalogo:
+    catalogo = pd.DataFrame([
+        {"Codigo": "BH", "Nombre": "Biometría hemática", "Categoria": "Hematología", "Precio_MXN": 150},
+        {"Codigo": "QS", "Nombre": "Química sanguínea", "Categoria": "Química", "Precio_MXN": "200"},
+        {"Codigo": "EGO", "Nombre": "Examen general de orina", "Categoria": "Orina", "Precio_MXN": None},
+        {"Codigo": "HBA1C", "Nombre": "Hemoglobina glucosilada", "Categoria": "Química", "Precio_MXN": 300},
+        {"Codigo": "TP", "Nombre": "Tiempo de protrombina", "Categoria": "Hematología", "Precio_MXN": 180},
+        {"Codigo": "X", "Nombre": None, "Categoria": "", "Precio_MXN": 1},
+    ])
+    return cb.IndiceCatalogo(catalogo, frecuencias)
+
+
+def test_normalizar_quita_acentos_y_signos():
+    assert cb.normalizar("  Biometría-Hemática (BH) ") == "biometria hematica bh"
+    assert cb.normalizar(None) == ""
+
+
+def test_acentos_y_codigo_exacto():
+    indice = _indice()
+    assert indice.nombres("biometria")[0] == "Biometría hemática"
+    assert indice.nombres("QUÍMICA SANG") == ["Química sanguínea"]
+    # El código exacto va en el primer nivel aunque el nombre no empiece igual
+    assert indice.nombres("ego")[0] == "Examen general de orina"
+    # Filas sin nombre no entran y el precio inválido queda en 0
+    assert len(indice.estudios) == 5
+    assert indice.buscar("orina")[0]["Precio_MXN"] == 0.0
+
+
+def test_niveles_de_relevancia():
+    indice = _indice({"Tiempo de protrombina": 50})
+    # "hem": Hemoglobina empieza con la consulta; los de categoría Hematología
+    # solo tienen una palabra que empieza con "hem", aunque sean más pedidos
+    assert indice.nombres("hem") == ["Hemoglobina glucosilada", "Tiempo de protrombina",
+                                     "Biometría hemática"]
+    # Todos los términos deben coincidir
+    assert indice.nombres("hem orina") == []
+
+
+def test_errores_de_dedo_por_trigramas():
+    indice = _indice()
+    assert indice.nombres("protrombna") == ["Tiempo de protrombina"]
+    assert indice.nombres("glucosilda")[0] == "Hemoglobina glucosilada"
+    # Menos de tres letras no se busca por parecido
+    assert indice.nombres("zz") == []
+
+
+def test_frecuencia_y_limite():
+    indice = _indice({"Química sanguínea": 3, "Examen general de orina": 7})
+    populares = indice.buscar("", limite=2)
+    assert [r["Nombre"] for r in populares] == ["Examen general de orina", "Química sanguínea"]
+    assert populares[0]["Ordenes"] == 7
+    assert len(indice.buscar("", limite=50)) == 5
+    assert len(indice.buscar("quimica", limite=0)) == 1
+    # Cambiar frecuencias limpia las consultas ya resueltas
+    indice.fijar_frecuencias({"Biometría hemática": 9})
+    assert indice.nombres("", limite=1) == ["Biometría hemática"]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Sobre de enc/dec: compresión, diccionarios y diccionario faltante o dañado."""
+
+import json, os, shutil, zlib
+
+import pytest
+
+import app_core
+import compresion
+
+pytestmark = pytest.mark.solicitud("user-045")
+
+
+def _resultados(n: int = 30) -> str:
+    return json.dumps(
+        {f"Estudio {i}": {"valor": str(i * 1.5), "unidad": "mg/dL", "ref": "70 - 110"} for i in range(n)},
+        ensure_ascii=False,
+    )
+
+def _sobre(token: str) -> bytes:
+    return app_core.FERNET.decrypt(token.encode())
+
+
+def test_texto_chico_sin_sobre(entorno):
+    token = app_core.enc("hola")
+    assert _sobre(token) == b"hola"
+    assert app_core.dec(token) == "hola"
+
+def test_texto_grande_comprimido(entorno):
+    texto = _resultados()
+    token = app_core.enc(texto)
+    assert _sobre(token).startswith(compresion.MARCA)
+    assert app_core.dec(token) == texto
+
+def test_valores_antiguos_se_leen_igual(entorno):
+    # Lo cifrado antes del sobre (sin MARCA) y lo no cifrado siguen leyéndose
+    token = app_core.FERNET.encrypt(_resultados().encode()).decode()
+    assert app_core.dec(token) == _resultados()
+    assert app_core.dec("no es un token") == ""
+    assert app_core.dec(None) == ""
+
+def test_con_diccionario(entorno):
+    id_ = compresion.guardar_diccionario(compresion.entrenar([_resultados(40)]))
+    assert compresion.diccionario_activo() == id_
+    texto = _resultados()
+    token = app_core.enc(texto)
+    sobre = _sobre(token)
+    assert sobre[2:3] == compresion._DICC
+    # El diccionario precargado ahorra respecto a zlib solo
+    assert len(sobre) < len(zlib.compress(texto.encode(), compresion.NIVEL_ZLIB)) + 3
+    assert app_core.dec(token) == texto
+
+def test_diccionario_faltante_no_regresa_vacio(entorno):
+    compresion.guardar_diccionario(compresion.entrenar([_resultados(40)]))
+    token = app_core.enc(_resultados())
+    # Otra réplica u otro directorio de trabajo: el diccionario no está
+    shutil.rmtree(compresion.DICCIONARIOS_DIR)
+    compresion._diccionarios.clear()
+    with pytest.raises(compresion.DiccionarioNoDisponible):
+        app_core.dec(token)
+
+def test_diccionario_danado(entorno):
+    id_ = compresion.guardar_diccionario(compresion.entrenar([_resultados(40)]))
+    token = app_core.enc(_resultados())
+    ruta = compresion._ruta_diccionario(id_)
+    with open(ruta, "r+b") as f:
+        f.write(b"x")
+    compresion._diccionarios.clear()
+    with pytest.raises(compresion.DiccionarioNoDisponible):
+        app_core.dec(token)
+    assert os.path.exists(ruta)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""usuarios.json y config_labza.json: escrituras concurrentes y su auditoría."""
+
+import json, os, threading
+
+import pytest
+
+import app_core
+import auditoria
+
+pytestmark = pytest.mark.solicitud("user-042")
+
+
+def _en_paralelo(fn, n: int = 8) -> list:
+    errores = []
+
+    def _correr(i):
+        try:
+            fn(i)
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=_correr, args=(i,)) for i in range(n)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return errores
+
+def _eventos(accion: str) -> list:
+    assert auditoria.vaciar(10)
+    with open(auditoria.AUDITORIA_PATH, "r", encoding="utf-8") as f:
+        return [r for r in map(json.loads, f) if r["accion"] == accion]
+
+
+def test_usuarios_en_paralelo(entorno):
+    base = {"admin@lab.local": app_core.make_user("admin123", "admin")}
+    app_core.save_users_to_file(base)
+
+    def _alta(i):
+        app_core.save_users_to_file({**base, f"u{i}@lab.local": app_core.make_user("x", "lab")}, usuario="admin")
+
+    assert _en_paralelo(_alta) == []
+    usuarios = app_core.load_users_from_file()
+    assert len(usuarios) == 2 and "admin@lab.local" in usuarios
+    # Sin temporales huérfanos junto al archivo
+    assert not [a for a in os.listdir(os.path.dirname(str(app_core.USERS_FILE))) if a.endswith(".tmp")]
+    # Cada guardado compara contra lo que había justo antes: 1 alta inicial,
+    # luego 8 altas y 7 bajas (cada escritor reemplaza al anterior)
+    assert len(_eventos("usuario_alta")) == 1 + 8
+    assert len(_eventos("usuario_baja")) == 7
+
+def test_configuracion_en_paralelo(entorno, tmp_path, monkeypatch):
+    (tmp_path / "cfg").mkdir()
+    monkeypatch.setattr(app_core, "CONFIG_PATH", tmp_path / "cfg" / "config_labza.json")
+
+    def _guardar(i):
+        app_core.save_labza_config({**app_core.DEFAULT_LAB_INFO, "telefono": str(i)},
+                                   app_core.DEFAULT_DOCTOR_INFO, usuario="admin")
+
+    assert _en_paralelo(_guardar) == []
+    assert app_core.load_labza_config()["lab_info"]["telefono"] in {str(i) for i in range(8)}
+    assert sorted(os.listdir(tmp_path / "cfg")) == ["config_labza.json", "config_labza.json.lock"]
+    assert all(r["detalle"]["campos"] == ["lab_info.telefono"] for r in _eventos("configuracion"))
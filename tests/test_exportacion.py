@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Exportación a Parquet/Arrow: seudónimos, texto libre fuera e incremental por el feed."""
+
+import json
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+import app_core
+import exportacion
+
+pytestmark = pytest.mark.solicitud("user-041")
+
+
+def _leer(archivo: str):
+    if archivo.endswith(".parquet"):
+        return pq.read_table(archivo)
+    with pa.ipc.open_file(archivo) as lector:
+        return lector.read_all()
+
+
+def test_completo_con_seudonimos(entorno, nueva_orden):
+    datos = dict(telefono="(55) 1234-5678", emails=["Ana@Correo.mx", "otro@x.mx"],
+                 direccion="Calle 1", observaciones="ayuno")
+    a, b = app_core.save_orders([nueva_orden("Ana López", **datos), nueva_orden("ana  lópez")])
+    r = exportacion.exportar("bi")
+    assert r["modo"] == "completo" and r["filas"] == 2
+    tabla = _leer(r["archivo"])
+    assert tabla.column_names == exportacion.COLUMNAS_DEFECTO
+    assert tabla.schema.field("Fecha_Programada").type == pa.date32()
+    filas = {f["Folio"]: f for f in tabla.to_pylist()}
+    # La misma persona da el mismo seudónimo; nada sale en claro
+    assert filas[a]["Nombre"] == filas[b]["Nombre"] != ""
+    assert "Ana" not in json.dumps(tabla.to_pylist(), default=str)
+    assert filas[a]["Telefono"] == exportacion.seudonimo("Telefono", app_core.normalizar_telefono_mx("55 1234 5678"))
+    assert len(filas[a]["Emails"].split(";")) == 2 and filas[b]["Emails"] == ""
+    assert filas[a]["Costo_MXN"] == 100.0
+
+def test_texto_libre_solo_sin_seudonimos(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden("Ana", direccion="Calle 1")])
+    with pytest.raises(ValueError, match="texto libre"):
+        exportacion.exportar("bi", columnas=["Folio", "Direccion"])
+    with pytest.raises(ValueError, match="desconocidas"):
+        exportacion.exportar("bi", columnas=["Folio", "Curp"])
+    r = exportacion.exportar("bi", formato="arrow", columnas=["Folio", "Nombre", "Direccion"],
+                             seudonimos=False)
+    assert r["archivo"].endswith(".arrow")
+    assert _leer(r["archivo"]).to_pylist() == [{"Folio": folio, "Nombre": "Ana", "Direccion": "Calle 1"}]
+
+def test_incremental_por_feed_de_cambios(entorno, nueva_orden):
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    assert exportacion.exportar("bi", incremental=True)["modo"] == "completo"
+    # Sin cambios no se escribe archivo
+    r = exportacion.exportar("bi", incremental=True)
+    assert r["archivo"] is None and r["modo"] == "incremental"
+
+    app_core.save_results(b, json.dumps({"BH": {"valor": "13"}}))
+    c, = app_core.save_orders([nueva_orden("C")])
+    r = exportacion.exportar("bi", incremental=True, columnas=["Folio", "Estado"])
+    assert r["modo"] == "incremental" and r["filas"] == 2
+    assert sorted(_leer(r["archivo"]).to_pylist(), key=lambda f: f["Folio"]) == sorted(
+        [{"Folio": b, "Estado": "capturado"}, {"Folio": c, "Estado": "pendiente"}],
+        key=lambda f: f["Folio"])
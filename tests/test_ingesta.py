@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Ingesta de analizadores: socket con varias conexiones y directorio de drop."""
+
+import json, os, socket, time
+
+import pytest
+
+import app_core
+import ingesta_analizadores as ia
+
+pytestmark = pytest.mark.solicitud("user-035")
+
+
+def _mapa():
+    with open(ia.MAPA_PATH, "w", encoding="utf-8") as f:
+        json.dump({"HGB": "BH", "GLU": "QS"}, f)
+
+def _resultados(folio) -> dict:
+    return app_core.parse_resultados(app_core.get_order_summary(folio)["Resultados"])
+
+def _esperar(condicion, limite_s: float = 15.0) -> bool:
+    fin = time.monotonic() + limite_s
+    while time.monotonic() < fin:
+        if condicion():
+            return True
+        time.sleep(0.05)
+    return False
+
+def _hl7(folio: str, control: str, codigo: str, valor: str) -> list:
+    return [f"MSH|^~\\&|ANALIZADOR|LAB|LIS|LABZA|20260101120000||ORU^R01|{control}|P|2.5",
+            f"PID|1||{folio}", f"OBR|1|{folio}|{folio}|PANEL",
+            f"OBX|1|NM|{codigo}^{codigo}||{valor}|mg/dL|70-110|N|||F"]
+
+def _astm(folio: str, control: str, codigo: str, valor: str) -> list:
+    return [f"H|\\^&|{control}|||ANALIZADOR|||||||P|1", f"P|1||{folio}", f"O|1|{folio}||^^^PANEL",
+            f"R|1|^^^{codigo}|{valor}|mg/dL|70-110|N||F", "L|1|N"]
+
+def _enviar(conexion, lineas: list) -> None:
+    conexion.sendall("".join(l + "\r\n" for l in lineas).encode("latin-1"))
+
+
+def test_dos_conexiones_no_se_mezclan(entorno, nueva_orden):
+    _mapa()
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    servidor, ingesta, _ = ia.servidor_tcp(0)
+    try:
+        puerto = servidor.server_address[1]
+        with socket.create_connection(("127.0.0.1", puerto)) as c1, \
+             socket.create_connection(("127.0.0.1", puerto)) as c2:
+            m1, m2 = _hl7(a, "M1", "HGB", "13.1"), _hl7(b, "M2", "HGB", "14.2")
+            # Las líneas de los dos analizadores llegan intercaladas
+            for l1, l2 in zip(m1, m2):
+                _enviar(c1, [l1])
+                _enviar(c2, [l2])
+                time.sleep(0.02)
+            # Un mensaje HL7 de c2 cerrado con línea vacía no corta el de c1
+            _enviar(c2, [""])
+            _enviar(c1, _astm(a, "A1", "GLU", "90"))
+        assert _esperar(lambda: ingesta.stats["commits"] and ingesta.stats["mensajes"] == 3)
+        assert _esperar(lambda: "QS" in _resultados(a))
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+    assert _resultados(a)["BH"]["valor"] == "13.1"
+    assert _resultados(a)["QS"]["valor"] == "90"
+    assert _resultados(b) == {"BH": {"valor": "14.2", "unidad": "mg/dL", "ref": "70-110"}}
+
+def test_directorio_mueve_despues_del_commit(entorno, nueva_orden, monkeypatch):
+    _mapa()
+    folio, = app_core.save_orders([nueva_orden()])
+    os.makedirs("drop")
+    ruta = os.path.join("drop", "corrida.hl7")
+    with open(ruta, "w", encoding="latin-1") as f:
+        f.write("\r\n".join(_hl7(folio, "M1", "HGB", "13.1")))   # sin línea vacía final
+
+    def _cae(*args, **kwargs):
+        raise RuntimeError("caída antes de guardar")
+
+    monkeypatch.setattr(ia, "save_results_lote", _cae)
+    try:
+        ia.Ingesta().procesar(ia.lineas_de_directorio("drop"))
+    except RuntimeError:
+        pass
+    # Nada se guardó: el archivo sigue en el directorio para la próxima pasada
+    assert os.path.exists(ruta)
+    monkeypatch.undo()
+
+    r = ia.Ingesta().procesar(ia.lineas_de_directorio("drop"))
+    assert r["resultados"] == 1 and r["commits"] == 1
+    assert not os.path.exists(ruta)
+    assert os.path.exists(os.path.join("drop", "procesados", "corrida.hl7"))
+    assert _resultados(folio)["BH"]["valor"] == "13.1"
+
+def test_mensajes_sin_mapeo_guardan_vistos(entorno):
+    _mapa()
+    os.makedirs("drop")
+    with open(os.path.join("drop", "x.astm"), "w", encoding="latin-1") as f:
+        f.write("\n".join(_astm("F-1", "A1", "DESCONOCIDO", "1")))
+    r = ia.Ingesta().procesar(ia.lineas_de_directorio("drop"))
+    assert r["sin_mapeo"] == 1
+    assert "A1" in ia.RegistroVistos()
+    assert os.listdir(os.path.join("drop", "procesados")) == ["x.astm"]
+
+def test_duplicados_y_firmados(entorno, nueva_orden):
+    _mapa()
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    app_core.save_results(b, json.dumps({"BH": {"valor": "1"}, "QS": {"valor": "2"}}), liberar=True)
+    lineas = _astm(a, "A1", "HGB", "13.1") + _hl7(a, "M1", "GLU", "90") + [""] \
+        + _astm(a, "A1", "HGB", "99") + _hl7(b, "M2", "HGB", "5") + [""]
+    r = ia.Ingesta().procesar(iter(lineas))
+    assert r["mensajes"] == 4 and r["duplicados"] == 1 and r["folios_firmados"] == 1
+    assert _resultados(a) == {"BH": {"valor": "13.1", "unidad": "mg/dL", "ref": "70-110"},
+                              "QS": {"valor": "90", "unidad": "mg/dL", "ref": "70-110"}}
+    assert _resultados(b)["BH"]["valor"] == "1"
+    # Los ids aplicados persisten: otra corrida con el mismo feed no reaplica nada
+    r = ia.Ingesta().procesar(iter(lineas))
+    assert r["duplicados"] == 4 and r["resultados"] == 0
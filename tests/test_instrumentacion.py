@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Instrumentación: conteos por operación, histograma Prometheus y desglose por rerun."""
+
+import re
+
+import pytest
+
+import app_core
+import instrumentacion
+
+pytestmark = pytest.mark.solicitud("user-027")
+
+
+@pytest.fixture
+def metricas(monkeypatch):
+    monkeypatch.setattr(instrumentacion, "METRICAS_ACTIVAS", True)
+    instrumentacion.reiniciar()
+    yield
+    instrumentacion.reiniciar()
+
+
+def test_desactivada_no_registra(entorno, nueva_orden, monkeypatch):
+    monkeypatch.setattr(instrumentacion, "METRICAS_ACTIVAS", False)
+    instrumentacion.reiniciar()
+    app_core.save_orders([nueva_orden()])
+    assert instrumentacion.instantanea() == {}
+
+def test_conteos_y_prometheus(entorno, nueva_orden, metricas, tmp_path):
+    folio, = app_core.save_orders([nueva_orden()])
+    for _ in range(3):
+        app_core.get_order_summary(folio)
+    ops = instrumentacion.instantanea()
+    assert ops["get_order_summary"]["n"] == 3
+    assert sum(ops["get_order_summary"]["cubetas"]) == 3
+    assert ops["enc"]["n"] >= 1 and ops["read_csv"]["n"] >= 1
+
+    ruta = instrumentacion.escribir_prometheus(str(tmp_path / "m.prom"))
+    with open(ruta, encoding="utf-8") as f:
+        texto = f.read()
+    cubetas = [int(n) for n in re.findall(r'bucket\{op="get_order_summary",le="[^"]+"\} (\d+)', texto)]
+    assert len(cubetas) == len(instrumentacion.CUBETAS_S) + 1
+    assert cubetas == sorted(cubetas) and cubetas[-1] == 3
+    assert 'lis_operacion_segundos_count{op="get_order_summary"} 3' in texto
+
+def test_desglose_por_rerun(metricas):
+    @instrumentacion.medido("lenta")
+    def lenta():
+        return 1
+
+    instrumentacion.iniciar_rerun()
+    for _ in range(2):
+        lenta()
+    with instrumentacion.medir("bloque"):
+        pass
+    filas = {f["Operacion"]: f for f in instrumentacion.desglose_rerun()}
+    assert filas["lenta"]["Llamadas"] == 2 and filas["bloque"]["Llamadas"] == 1
+    assert "(rerun hasta aquí)" in filas
+    # Un rerun nuevo empieza en cero; los acumulados del proceso siguen
+    instrumentacion.iniciar_rerun()
+    assert [f["Operacion"] for f in instrumentacion.desglose_rerun()] == ["(rerun hasta aquí)"]
+    assert instrumentacion.instantanea()["lenta"]["n"] == 2
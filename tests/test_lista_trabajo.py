@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Lista de trabajo: orden por fecha programada y antigüedad, páginas y prefijo."""
+
+import json
+
+import pytest
+
+import app_core
+import lista_trabajo
+
+pytestmark = pytest.mark.solicitud("user-037")
+
+
+def _folios(pagina: dict) -> list:
+    return [i["Folio"] for i in pagina["items"]]
+
+
+def test_orden_y_paginas(entorno, nueva_orden):
+    lejana, proxima, sin_fecha, otra_proxima = app_core.save_orders([
+        nueva_orden("A", fecha_prog="2026-12-01"), nueva_orden("B", fecha_prog="2026-10-20"),
+        nueva_orden("C", fecha_prog=""), nueva_orden("D", fecha_prog="2026-10-20"),
+    ])
+    firmada, = app_core.save_orders([nueva_orden("E", fecha_prog="2026-10-01")])
+    app_core.save_results(firmada, json.dumps({"BH": {"valor": "1"}, "QS": {"valor": "2"}}), liberar=True)
+    app_core.save_results(otra_proxima, json.dumps({"BH": {"valor": "1"}}))
+
+    lista = lista_trabajo.ListaTrabajo()
+    lista.cargar()
+    # Misma fecha: la registrada antes va primero; sin fecha al final; firmadas fuera
+    esperado = [proxima, otra_proxima, lejana, sin_fecha]
+    assert _folios(lista.pagina()) == esperado
+    assert lista.pagina()["total"] == 4
+    assert _folios(lista.pagina(por_pagina=3, pagina=2)) == [sin_fecha]
+    assert _folios(lista.pagina(estados=("capturado",))) == [otra_proxima]
+    assert lista.conteos() == {"pendiente": 3, "capturado": 1, "firmado": 1}
+
+def test_prefijo(entorno, nueva_orden):
+    a, b, c = app_core.save_orders([nueva_orden("A", folio="777001"), nueva_orden("B", folio="777002"),
+                                    nueva_orden("C", folio="888001")])
+    lista = lista_trabajo.ListaTrabajo()
+    lista.cargar()
+    assert _folios(lista.pagina(prefijo="777")) == [a, b]
+    assert lista.pagina(prefijo="9")["total"] == 0
+
+def test_incremental_igual_a_recargar(entorno, nueva_orden):
+    folios = app_core.save_orders([nueva_orden(f"P{i}", fecha_prog=f"2026-11-{i % 5 + 1:02d}") for i in range(12)])
+    lista = lista_trabajo.ListaTrabajo()
+    lista.cargar()
+    nuevos = app_core.save_orders([nueva_orden("N", fecha_prog="2026-10-30")])
+    app_core.save_results_lote([{"folio": f, "resultados": {"BH": {"valor": "1"}}} for f in folios[:4]])
+    app_core.save_results(folios[5], json.dumps({"BH": {"valor": "1"}, "QS": {"valor": "2"}}), liberar=True)
+    lista.actualizar()
+    desde_cero = lista_trabajo.ListaTrabajo()
+    desde_cero.cargar()
+    assert lista.pagina(por_pagina=100) == desde_cero.pagina(por_pagina=100)
+    assert lista.conteos() == desde_cero.conteos()
+    assert nuevos[0] == _folios(lista.pagina())[0]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""save_results_lote: reemplazo, combinación por estudio, validación y eventos."""
+
+import json, shutil
+
+import pytest
+
+import app_core
+import cambios
+import compresion
+
+pytestmark = pytest.mark.solicitud("user-046")
+
+
+def _resultados(folio) -> dict:
+    return app_core.parse_resultados(app_core.get_order_summary(folio)["Resultados"])
+
+def _estado(folio) -> str:
+    return app_core.get_order_summary(folio)["Estado"]
+
+
+def test_reemplazo_y_firma(entorno, nueva_orden):
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    reporte = app_core.save_results_lote([
+        {"folio": a, "resultados": {"BH": {"valor": "13"}, "QS": {"valor": "90"}}, "liberar": True},
+        {"folio": b, "resultados": json.dumps({"BH": {"valor": "12"}})},
+    ], usuario="lab@lab.local")
+    assert [r["ok"] for r in reporte] == [True, True]
+    assert [r["estado"] for r in reporte] == ["firmado", "capturado"]
+    assert _estado(a) == "firmado" and _estado(b) == "capturado"
+    assert _resultados(b) == {"BH": {"valor": "12"}}
+
+def test_rechazos_no_detienen_al_resto(entorno, nueva_orden):
+    a, b, c = app_core.save_orders([nueva_orden("A"), nueva_orden("B"), nueva_orden("C")])
+    reporte = app_core.save_results_lote([
+        {"folio": "NO-EXISTE", "resultados": {"BH": {"valor": "1"}}},
+        {"folio": a, "resultados": {"XX": {"valor": "1"}}},                 # estudio ajeno
+        {"folio": b, "resultados": {"BH": {"valor": "1"}}, "liberar": True},  # falta QS para firmar
+        {"folio": "", "resultados": {}},
+        {"folio": c, "resultados": {"BH": {"valor": "13"}}},
+        {"folio": c, "resultados": {"BH": {"valor": "14"}}},
+    ])
+    assert [r["ok"] for r in reporte] == [False, False, False, False, True, False]
+    assert "XX" in reporte[1]["error"] and "QS" in reporte[2]["error"]
+    assert "repetido" in reporte[5]["error"]
+    assert _estado(a) == _estado(b) == "pendiente"
+    assert _resultados(c) == {"BH": {"valor": "13"}}
+
+def test_combinar_conserva_lo_guardado(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden()])
+    app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}}))
+    # Otra captura (analizador u otra sesión) solo trae QS
+    reporte = app_core.save_results_lote([{"folio": folio, "resultados": {"QS": {"valor": "90"}}, "combinar": True}])
+    assert reporte[0]["ok"]
+    assert _resultados(folio) == {"BH": {"valor": "13"}, "QS": {"valor": "90"}}
+
+def test_combinar_con_none_borra_el_estudio(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden()])
+    app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}, "QS": {"valor": "90"}}))
+    reporte = app_core.save_results_lote([{"folio": folio, "resultados": {"QS": None}, "combinar": True}])
+    assert reporte[0]["ok"]
+    assert _resultados(folio) == {"BH": {"valor": "13"}}
+    app_core.save_results_lote([{"folio": folio, "resultados": {"BH": None}, "combinar": True}])
+    assert _resultados(folio) == {}
+
+def test_combinar_y_firmar_valida_el_resultado_combinado(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden()])
+    app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}}))
+    reporte = app_core.save_results_lote([
+        {"folio": folio, "resultados": {"QS": {"valor": "90"}}, "liberar": True, "combinar": True},
+    ])
+    assert reporte[0]["ok"] and _estado(folio) == "firmado"
+
+def test_combinar_requiere_json_por_estudio(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden()])
+    reporte = app_core.save_results_lote([{"folio": folio, "resultados": "texto libre", "combinar": True}])
+    assert not reporte[0]["ok"] and "JSON" in reporte[0]["error"]
+
+def test_no_se_quita_una_firma(entorno, nueva_orden):
+    folio, = app_core.save_orders([nueva_orden()])
+    app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}, "QS": {"valor": "90"}}), liberar=True)
+    reporte = app_core.save_results_lote([{"folio": folio, "resultados": {"BH": {"valor": "1"}}}], validar=False)
+    assert not reporte[0]["ok"]
+    assert _estado(folio) == "firmado"
+
+def test_un_evento_por_folio_aplicado(entorno, nueva_orden):
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    sub = cambios.Suscriptor.desde_ahora()
+    app_core.save_results_lote([
+        {"folio": a, "resultados": {"BH": {"valor": "13"}}},
+        {"folio": "NO-EXISTE", "resultados": {"BH": {"valor": "1"}}},
+        {"folio": b, "resultados": {"BH": {"valor": "13"}, "QS": {"valor": "1"}}, "liberar": True},
+    ])
+    eventos = sub.pendientes()
+    assert [(e["folio"], e["estado"], e["estado_anterior"]) for e in eventos] == [
+        (a, "capturado", "pendiente"), (b, "firmado", "pendiente"),
+    ]
+
+def test_diccionario_faltante_rechaza_solo_ese_folio(entorno, nueva_orden):
+    a, b = app_core.save_orders([nueva_orden("A"), nueva_orden("B")])
+    grande = {"BH": {"valor": "13", "unidad": "g/dL", "ref": "12 - 16 " * 40}}
+    compresion.guardar_diccionario(compresion.entrenar([json.dumps(grande)]))
+    app_core.save_results(a, json.dumps(grande))
+    shutil.rmtree(compresion.DICCIONARIOS_DIR)
+    compresion._diccionarios.clear()
+    compresion._activo.update(firma=None, id=None)
+    reporte = app_core.save_results_lote([
+        {"folio": a, "resultados": {"QS": {"valor": "90"}}, "combinar": True},
+        {"folio": b, "resultados": {"BH": {"valor": "12"}}},
+    ])
+    assert [r["ok"] for r in reporte] == [False, True]
+    assert "diccionario" in reporte[0]["error"].lower()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Notificaciones: estados de entrega por lote y poda de la cola."""
+
+import json, smtplib, socket
+
+import pytest
+
+import app_core
+import notificaciones
+
+pytestmark = pytest.mark.solicitud("user-033")
+
+
+class _SMTPQueSeCae:
+    """Entrega `n` mensajes y luego pierde la conexión."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.enviados = []
+
+    def send_message(self, msg):
+        if len(self.enviados) >= self.n:
+            raise smtplib.SMTPServerDisconnected("conexión perdida")
+        self.enviados.append(msg["To"])
+
+    def close(self):
+        pass
+
+
+def _firmadas(nueva_orden, n: int) -> list:
+    folios = app_core.save_orders([nueva_orden(f"P{i}", emails=[f"p{i}@correo.test"]) for i in range(n)])
+    for folio in folios:
+        app_core.save_results(folio, json.dumps({"BH": {"valor": "13"}, "QS": {"valor": "90"}}), liberar=True)
+    return folios
+
+
+def test_falla_a_la_mitad_no_reenvia_lo_entregado(entorno, nueva_orden, monkeypatch):
+    folios = _firmadas(nueva_orden, 4)
+    notificaciones.encolar_resultados(folios)
+    smtp = _SMTPQueSeCae(2)
+    monkeypatch.setattr(notificaciones.PoolSMTP, "_tomar", lambda self: smtp)
+    despachador = notificaciones.DespachadorNotificaciones(notificaciones.config_smtp_desde_entorno(), lote=10)
+    assert despachador.procesar_pendientes() == 4
+
+    estados = [notificaciones.estado_folio(f) for f in folios]
+    assert [t["estado"] for t in estados] == ["enviado", "enviado", "pendiente", "pendiente"]
+    assert all("conexión perdida" in t["error"] for t in estados[2:])
+    assert all(t["intentos"] == 1 for t in estados)
+    assert smtp.enviados == ["p0@correo.test", "p1@correo.test"]
+
+def test_poda_de_terminados(entorno):
+    cola = [
+        {"id": "a", "estado": "enviado", "actualizado": "2000-01-01T00:00:00"},
+        {"id": "b", "estado": "pendiente", "actualizado": "2000-01-01T00:00:00"},
+        {"id": "c", "estado": "fallido", "actualizado": notificaciones._ahora()},
+    ]
+    assert [t["id"] for t in notificaciones._podar(cola, 30)] == ["b", "c"]
+
+def test_envio_de_punta_a_punta(entorno, nueva_orden):
+    con_correo = _firmadas(nueva_orden, 2)
+    sin_correo, = app_core.save_orders([nueva_orden("Sin correo")])
+    app_core.save_results(sin_correo, json.dumps({"BH": {"valor": "1"}, "QS": {"valor": "2"}}), liberar=True)
+    notificaciones.encolar_resultados(con_correo + [sin_correo])
+    # Encolar otra vez un folio pendiente reemplaza su trabajo
+    notificaciones.encolar_resultado(con_correo[0], "segunda")
+    assert notificaciones.resumen_cola() == {"pendiente": 3}
+
+    srv = notificaciones.ServidorSMTPLocal().iniciar()
+    try:
+        despachador = notificaciones.DespachadorNotificaciones(srv.config_smtp())
+        assert despachador.procesar_pendientes() == 3
+        despachador.pool.cerrar()
+    finally:
+        srv.detener()
+    assert notificaciones.resumen_cola() == {"enviado": 2, "sin_destinatario": 1}
+    assert sorted(d for _, destinos, _ in srv.mensajes for d in destinos) == \
+        ["<p0@correo.test>", "<p1@correo.test>"]
+    assert all(b"application/pdf" in datos for _, _, datos in srv.mensajes)
+
+def test_recupera_trabajos_de_un_proceso_muerto(entorno, nueva_orden):
+    folio, = _firmadas(nueva_orden, 1)
+    notificaciones.encolar_resultado(folio)
+    trabajo, = notificaciones._tomar_lote(10)
+    assert notificaciones.estado_folio(folio)["estado"] == "enviando"
+    # Otro proceso vivo lo está enviando: no se toca
+    assert notificaciones.recuperar_interrumpidos() == 0
+    # El proceso que lo tomó ya terminó (mismo host, pid inexistente)
+    notificaciones._actualizar_varios({trabajo["id"]: {"tomado_por": f"{socket.gethostname()}:4194305"}})
+    assert notificaciones.recuperar_interrumpidos() == 1
+    assert notificaciones.estado_folio(folio)["estado"] == "pendiente"
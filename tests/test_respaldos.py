@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Respaldos incrementales: restaurar a un instante, verificar y podar."""
+
+import os
+
+import pytest
+
+import almacen_pdf
+import app_core
+import respaldos
+
+pytestmark = pytest.mark.solicitud("user-040")
+
+
+def _leer(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _restaurado(destino, nombre: str = "solicitudes_lis.csv") -> bytes:
+    return _leer(os.path.join(str(destino), nombre))
+
+
+def test_restaurar_a_un_instante(entorno, nueva_orden, tmp_path):
+    folio, = app_core.save_orders([nueva_orden("Ana")])
+    almacen_pdf.guardar_pdf(folio, os.urandom(200_000))
+    primera = respaldos.respaldar()
+    csv_1 = _leer(app_core.CSV_PATH)
+
+    app_core.save_results(folio, '{"BH": {"valor": "13.5"}}')
+    app_core.save_orders([nueva_orden(f"Paciente {i}") for i in range(20)])
+    segunda = respaldos.respaldar()
+    csv_2 = _leer(app_core.CSV_PATH)
+    assert segunda["trozos_nuevos"] >= 1
+    # El blob del PDF no cambió: no se vuelve a leer
+    assert segunda["sin_cambios"] >= 1
+
+    antes, despues = respaldos.listar_instantaneas()
+    respaldos.restaurar(str(tmp_path / "a"), instantanea=antes)
+    respaldos.restaurar(str(tmp_path / "b"))
+    assert _restaurado(tmp_path / "a") == csv_1
+    assert _restaurado(tmp_path / "b") == csv_2
+    meta = almacen_pdf.metadata(folio)
+    blob = os.path.join("resultados_pdf", "blobs", meta["hash"][:2], meta["hash"] + ".bin")
+    assert _restaurado(tmp_path / "a", blob) == _leer(almacen_pdf._ruta_blob(meta["hash"]))
+    assert primera["archivos"] >= 3
+    assert respaldos.verificar(antes)["errores"] == []
+
+def test_sin_cambios_no_escribe_trozos(entorno, nueva_orden):
+    app_core.save_orders([nueva_orden()])
+    respaldos.respaldar()
+    r = respaldos.respaldar()
+    assert r["trozos_nuevos"] == 0
+    assert r["sin_cambios"] == r["archivos"]
+
+def test_restaurar_despues_de_podar(entorno, nueva_orden, tmp_path):
+    folios = app_core.save_orders([nueva_orden(f"Paciente {i}") for i in range(50)])
+    respaldos.respaldar()
+    for i, folio in enumerate(folios[:3]):
+        app_core.save_results(folio, f'{{"BH": {{"valor": "{i}"}}}}')
+        respaldos.respaldar()
+    actual = _leer(app_core.CSV_PATH)
+    assert len(respaldos.listar_instantaneas()) == 4
+
+    r = respaldos.podar(1)
+    assert r["instantaneas_borradas"] == 3
+    assert r["trozos_borrados"] >= 1
+    assert len(respaldos.listar_instantaneas()) == 1
+    # Los trozos compartidos con las instantáneas borradas siguen ahí
+    assert respaldos.verificar()["errores"] == []
+    respaldos.restaurar(str(tmp_path / "r"))
+    assert _restaurado(tmp_path / "r") == actual
+
+def test_restaurar_antes_de_la_primera(entorno, nueva_orden, tmp_path):
+    app_core.save_orders([nueva_orden()])
+    respaldos.respaldar()
+    with pytest.raises(FileNotFoundError):
+        respaldos.restaurar(str(tmp_path / "r"), instante="2000-01-01T00:00:00")
+
+def test_trozo_danado(entorno, nueva_orden, tmp_path):
+    app_core.save_orders([nueva_orden()])
+    respaldos.respaldar()
+    info = respaldos.cargar_manifiesto(respaldos.elegir_instantanea())["archivos"]["solicitudes_lis.csv"]
+    ruta = respaldos._ruta_trozo(info["trozos"][0])
+    crudo = bytearray(_leer(ruta))
+    crudo[len(crudo) // 2] ^= 1
+    with open(ruta, "wb") as f:
+        f.write(crudo)
+    assert respaldos.verificar()["errores"]
+    with pytest.raises(Exception):
+        respaldos.restaurar(str(tmp_path / "r"))
+    assert not os.path.exists(tmp_path / "r" / "solicitudes_lis.csv")
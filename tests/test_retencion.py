@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Retención: archivar sin perder órdenes, eventos 'archivado' y purga."""
+
+import pandas as pd
+import pytest
+
+import agregados
+import app_core
+import cambios
+import lista_trabajo
+import retencion
+from benchmarks.datos_sinteticos import generar_tabla
+
+pytestmark = pytest.mark.solicitud("user-044")
+
+
+def _tabla(filas: int = 400) -> list:
+    generar_tabla(filas, app_core.CSV_PATH, semilla=7, dias=4 * 365)
+    agregados.reconstruir_desde_csv()
+    return app_core.read_csv(columnas=["Folio"])["Folio"].tolist()
+
+def _vivos() -> set:
+    return set(app_core.read_csv(columnas=["Folio"])["Folio"])
+
+
+def test_archivar_mueve_sin_perder(entorno):
+    folios = _tabla()
+    lista = lista_trabajo.lista_compartida()
+    sub = cambios.Suscriptor.desde_ahora()
+
+    r = retencion.archivar(12)
+    vivos = _vivos()
+    archivados = [f for f in folios if f not in vivos]
+    assert r["archivadas"] == len(archivados) > 0
+    assert r["leidas"] == len(folios)
+    assert retencion.estado()["filas"] == len(archivados)
+
+    o = retencion.orden_archivada(archivados[0])
+    assert o["Folio"] == archivados[0] and o["Archivada"] and o["Estado"] == "firmado"
+    assert retencion.orden_archivada(next(iter(vivos))) is None
+
+    eventos = sub.pendientes()
+    assert sorted(e["folio"] for e in eventos if e["operacion"] == "archivado") == sorted(archivados)
+    lista.actualizar()
+    assert not set(archivados) & set(lista.ordenes)
+    # El conteo por estado queda igual que si se reconstruyera con la tabla viva
+    firmados = agregados.cargar_agregados()["por_estado"].get("firmado", 0)
+    df = app_core.read_csv(columnas=["Estado"])
+    assert firmados == int((df["Estado"] == "firmado").sum())
+
+def test_segunda_pasada_no_mueve_nada(entorno):
+    _tabla(200)
+    retencion.archivar(12)
+    r = retencion.archivar(12)
+    assert r["archivadas"] == 0
+
+def test_orden_modificada_durante_la_pasada_queda_viva(entorno, monkeypatch):
+    _tabla()
+    df = app_core.read_csv(columnas=["Folio", "Estado", "Fecha_Firma"])
+    corte = pd.Timestamp(retencion._mes_corte(12) + "-01")
+    candidato = df[(df["Estado"] == "firmado") & (df["Fecha_Firma"] < corte)]["Folio"].iloc[0]
+    original = retencion._abrir_lector
+
+    def _abrir_y_capturar(origen, nombres):
+        # La pasada ya tiene su copia fija: esta escritura llega "en medio"
+        lector = original(origen, nombres)
+        if not isinstance(origen, str):
+            app_core.save_results(candidato, '{"BH": {"valor": "corregido"}}', liberar=True)
+        return lector
+
+    monkeypatch.setattr(retencion, "_abrir_lector", _abrir_y_capturar)
+    r = retencion.archivar(12)
+    assert candidato in _vivos()
+    assert retencion.orden_archivada(candidato) is None
+    assert app_core.get_order_summary(candidato)["Resultados"] == '{"BH": {"valor": "corregido"}}'
+    assert len(_vivos()) + retencion.estado()["filas"] == r["leidas"]
+
+def test_purgar(entorno):
+    _tabla()
+    retencion.archivar(12)
+    antes = retencion.segmentos()
+    r = retencion.purgar(24)
+    assert r["segmentos"] and r["filas"] > 0
+    quedan = retencion.segmentos()
+    assert len(quedan) == len(antes) - len(r["segmentos"])
+    assert all(s["mes"] >= retencion._mes_corte(24) for s in quedan)
+    assert retencion.estado()["filas"] == sum(s["filas"] for s in antes) - r["filas"]
+
+def test_folio_con_sufijo_en_el_archivo(entorno, nueva_orden):
+    # Dos órdenes en el mismo segundo: la segunda recibe el sufijo -1
+    a, b = app_core.save_orders([nueva_orden("A", folio="20200101120000"), nueva_orden("B", folio="20200101120000")])
+    assert b == a + "-1"
+    assert app_core.parece_folio(b) and app_core.parece_folio(f" {a} ")
+    assert not app_core.parece_folio("Ana López") and not app_core.parece_folio("2020-")
+    for folio in (a, b):
+        app_core.save_results(folio, '{"BH": {"valor": "1"}, "QS": {"valor": "2"}}', liberar=True)
+    df = app_core.read_csv()
+    df["Fecha_Firma"] = pd.Timestamp("2020-01-01")
+    app_core.write_csv(df)
+    assert retencion.archivar(12)["archivadas"] == 2
+    assert retencion.orden_archivada(b)["Folio"] == b